@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The Lambda runtime puts the common layer's python/ directory on sys.path. The stack (which builds
+# the gateway's request models from st_james.schema) and src/tools run as this package instead,
+# outside Lambda: put it there for them too, so they import st_james as the functions do
+LAYER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compute', 'common', 'python')
+if LAYER_PATH not in sys.path:
+    sys.path.append(LAYER_PATH)
@@ -1,5 +1,16 @@
-from aws_cdk import aws_apigateway as apigw
+from aws_cdk import Size, aws_apigateway as apigw, aws_secretsmanager as secretsmanager
 from constructs import Construct
+# The request schemas are in the common layer (on the path: see src/__init__.py), with the
+# functions that also enforce them
+from st_james import schema
+
+# JSON Schema keywords -> apigw.JsonSchema arguments
+SCHEMA_KEYWORDS = {
+    '$schema': 'schema', 'additionalProperties': 'additional_properties', 'uniqueItems': 'unique_items',
+    'anyOf': 'any_of', 'title': 'title', 'description': 'description', 'type': 'type', 'enum': 'enum',
+    'pattern': 'pattern', 'required': 'required', 'properties': 'properties', 'items': 'items',
+    'minItems': 'min_items', 'maxItems': 'max_items'
+}
 
 
 # ---------- helper: add default 4XX/5XX with CORS (uses your CDK enum spelling) ----------
@@ -20,10 +31,36 @@ def add_default_gateway_cors(api: apigw.RestApi, scope: Construct) -> None:
         )
 
 
+def json_schema(definition: dict) -> apigw.JsonSchema:
+    """A schema from st_james.schema as a gateway model schema."""
+    kwargs = {}
+    for keyword, value in definition.items():
+        if keyword == '$schema':
+            value = apigw.JsonSchemaVersion.DRAFT4
+        elif keyword == 'type':
+            value = apigw.JsonSchemaType[value.upper()]
+        elif keyword == 'properties':
+            value = {name: json_schema(sub) for name, sub in value.items()}
+        elif keyword == 'items':
+            value = json_schema(value)
+        elif keyword == 'anyOf':
+            value = [json_schema(sub) for sub in value]
+        kwargs[SCHEMA_KEYWORDS[keyword]] = value
+    return apigw.JsonSchema(**kwargs)
+
+
 class StJamesApi(Construct):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id)
 
+        # Who compresses responses: 'gateway' (default) has API Gateway gzip/deflate bodies of
+        # 1 KiB or more; 'lambda' has the /events functions do it (st_james.api), which adds
+        # brotli if it's in the layer. 'lambda' treats every payload as binary, which means
+        # request bodies reach the functions base64-encoded and the gateway can't validate them.
+        self.compression = self.node.try_get_context('api_compression') or 'gateway'
+        if self.compression not in ('gateway', 'lambda'):
+            raise ValueError(f"api_compression must be 'gateway' or 'lambda', not {self.compression!r}")
+
         # Rest API (key comes from header)
         self.events_api = apigw.RestApi(
             self, 'EventsApi',
@@ -32,7 +69,9 @@ class StJamesApi(Construct):
             deploy_options=apigw.StageOptions(
                 throttling_rate_limit=50,
                 throttling_burst_limit=100
-            )
+            ),
+            **({'binary_media_types': ['*/*']} if self.compression == 'lambda'
+               else {'min_compression_size': Size.kibibytes(1)})
         )
 
         # >>> CALL THE HELPER HERE <<<
@@ -52,6 +91,31 @@ class StJamesApi(Construct):
         self.usage_plan.add_api_stage(stage=self.events_api.deployment_stage)
         self.usage_plan.add_api_key(self.lovable_key)
 
+        # The posters' key for /status, generated into a secret they read it from; a plan of its own,
+        # so their status updates don't count against the client's quota
+        self.poster_key_secret = secretsmanager.Secret(
+            self, 'PosterApiKeySecret',
+            secret_name='StJamesPosterApiKey',
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                secret_string_template='{}',
+                generate_string_key='key',
+                exclude_punctuation=True,
+                password_length=40
+            )
+        )
+        self.poster_key = self.events_api.add_api_key(
+            "PosterApiKey",
+            api_key_name="poster-key",
+            value=self.poster_key_secret.secret_value_from_json('key').unsafe_unwrap()
+        )
+        self.poster_usage_plan = self.events_api.add_usage_plan(
+            "PosterUsagePlan",
+            name="PosterUsage",
+            throttle=apigw.ThrottleSettings(rate_limit=50, burst_limit=100)
+        )
+        self.poster_usage_plan.add_api_stage(stage=self.events_api.deployment_stage)
+        self.poster_usage_plan.add_api_key(self.poster_key)
+
 
 class StJamesApiResources(Construct):
     """
@@ -59,7 +123,8 @@ class StJamesApiResources(Construct):
     Expects in kwargs:
       - api
       - post_events_handler, status_handler
-      - events_create, events_list, events_get, events_update, events_delete
+      - events_create, events_list, events_get, events_update, events_delete, events_batch_get
+      - export_handler
     """
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id)
@@ -73,24 +138,34 @@ class StJamesApiResources(Construct):
         events_get    = kwargs['events_get']
         events_update = kwargs['events_update']
         events_delete = kwargs['events_delete']
+        events_batch_get = kwargs['events_batch_get']
+        export_handler = kwargs['export_handler']
 
         # ---------------- existing endpoints ----------------
+        # POST starts a background job and returns 202 with its ID; GET /post-events/{job} reports progress
         post_events = api.events_api.root.add_resource('post-events')
         post_events.add_method('POST', apigw.LambdaIntegration(post_events_handler))
 
-        status = api.events_api.root.add_resource('status')
-        status.add_method(
-            'POST',
-            apigw.LambdaIntegration(status_handler),
-            request_parameters={
-                'method.request.querystring.old-status': False,
-                'method.request.querystring.new-status': True,
-                'method.request.querystring.sort-key': True,
-                'method.request.querystring.website': True
-            }
+        post_events_job = post_events.add_resource('{job}')
+        post_events_job.add_method(
+            'GET',
+            apigw.LambdaIntegration(post_events_handler),
+            request_parameters={'method.request.path.job': True}
+        )
+
+        # Admin: POST /exports starts a full export of the table to the data bucket (202 with its ID,
+        # or {"job": ...} resumes one); GET /exports/{job} reports progress
+        exports = api.events_api.root.add_resource('exports')
+        exports.add_method('POST', apigw.LambdaIntegration(export_handler), api_key_required=True)
+
+        exports_job = exports.add_resource('{job}')
+        exports_job.add_method(
+            'GET',
+            apigw.LambdaIntegration(export_handler),
+            request_parameters={'method.request.path.job': True},
+            api_key_required=True
         )
 
-        # ---------------- /events CRUD surface ----------------
         # Validators
         body_validator = apigw.RequestValidator(
             api.events_api, 'EventsBodyValidator',
@@ -105,81 +180,43 @@ class StJamesApiResources(Construct):
             validate_request_parameters=True
         )
 
-        allowed_lists_enum = ['moms', 'sojourner', 'patch', 'test']
+        # The query string's values are checked by process_status (schema.STATUS_QUERY). It sets
+        # what was last sent to a site, which decides whether the event is sent there again, so it
+        # takes an API key: the posters' (StJamesApi.poster_key)
+        status = api.events_api.root.add_resource('status')
+        status.add_method(
+            'POST',
+            apigw.LambdaIntegration(status_handler),
+            request_parameters={
+                f"method.request.querystring.{name}": name in schema.STATUS_QUERY['required']
+                for name in schema.STATUS_QUERY['properties']
+            },
+            request_validator=params_validator,
+            api_key_required=True
+        )
 
-        # Create model: accept either 'date' or 'date_id' (Lambda enforces at-least-one)
+        # ---------------- /events CRUD surface ----------------
+        # Models generated from the schemas the functions validate with (st_james.schema)
         event_create_model = apigw.Model(
             api.events_api, 'EventCreateModel',
             rest_api=api.events_api,
             content_type='application/json',
             model_name='EventCreate',
-            schema=apigw.JsonSchema(
-                schema=apigw.JsonSchemaVersion.DRAFT4,
-                title='EventCreate',
-                type=apigw.JsonSchemaType.OBJECT,
-                additional_properties=False,
-                required=['access', 'title'],
-                properties={
-                    'access': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.STRING,
-                        enum=['public', 'private']
-                    ),
-                    'date': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.STRING,
-                        pattern=r'^\d{4}-\d{2}-\d{2}$'
-                    ),
-                    'date_id': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.STRING,
-                        pattern=r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$'
-                    ),
-                    'title': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'time': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'description': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'posted': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    ),
-                    'posting': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    ),
-                    'post': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    )
-                }
-            )
+            schema=json_schema(schema.EVENT_CREATE)
         )
-
-        # Update model
         event_update_model = apigw.Model(
             api.events_api, 'EventUpdateModel',
             rest_api=api.events_api,
             content_type='application/json',
             model_name='EventUpdate',
-            schema=apigw.JsonSchema(
-                schema=apigw.JsonSchemaVersion.DRAFT4,
-                title='EventUpdate',
-                type=apigw.JsonSchemaType.OBJECT,
-                additional_properties=False,
-                properties={
-                    'title': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'time': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'description': apigw.JsonSchema(type=apigw.JsonSchemaType.STRING),
-                    'posted': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    ),
-                    'posting': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    ),
-                    'post': apigw.JsonSchema(
-                        type=apigw.JsonSchemaType.ARRAY, unique_items=True,
-                        items=apigw.JsonSchema(type=apigw.JsonSchemaType.STRING, enum=allowed_lists_enum)
-                    )
-                }
-            )
+            schema=json_schema(schema.EVENT_UPDATE)
+        )
+        event_batch_get_model = apigw.Model(
+            api.events_api, 'EventBatchGetModel',
+            rest_api=api.events_api,
+            content_type='application/json',
+            model_name='EventBatchGet',
+            schema=json_schema(schema.EVENT_BATCH_GET)
         )
 
         # Helpers to declare + set CORS on method responses
@@ -270,14 +307,35 @@ class StJamesApiResources(Construct):
             ]
         )
 
+        # POST /events:batchGet (up to schema.MAX_BATCH_KEYS items by key in one request)
+        events_batch = api.events_api.root.add_resource('events:batchGet')
+        events_batch.add_cors_preflight(
+            allow_origins=apigw.Cors.ALL_ORIGINS,
+            allow_methods=['POST', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization', 'X-Requested-With']
+        )
+        events_batch.add_method(
+            http_method='POST',
+            integration=apigw.LambdaIntegration(events_batch_get),
+            request_models={'application/json': event_batch_get_model},
+            request_validator=body_validator,
+            api_key_required=True,
+            method_responses=method_cors_responses(['200'])
+        )
+
         # /events/{access}
         events_access = events.add_resource('{access}')
 
-        # GET /events/{access} (list)
+        # GET /events/{access} (list; ?q= searches titles and descriptions, ?archived=YYYY-MM lists expired events)
         events_access.add_method(
             http_method='GET',
             integration=apigw.LambdaIntegration(events_list),
-            request_parameters={'method.request.path.access': True},
+            request_parameters={
+                'method.request.path.access': True,
+                'method.request.querystring.q': False,
+                'method.request.querystring.limit': False,
+                'method.request.querystring.archived': False
+            },
             request_validator=params_validator,
             api_key_required=True,
             method_responses=method_cors_responses(['200'])
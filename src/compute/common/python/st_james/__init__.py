@@ -0,0 +1,2 @@
+# Code shared by the St. James Lambda functions.
+# Deployed as a Lambda layer; the layer's python/ directory is on sys.path at runtime.
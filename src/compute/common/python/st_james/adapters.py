@@ -0,0 +1,347 @@
+"""
+The sites we post to, as adapters for the poster engine (st_james.poster). An adapter knows only
+its site: how to log in, how to build an event's payload, and how to submit it. The record loop,
+status updates, breaker, rate limit, results and metrics are the engine's.
+
+    login(credentials)          -> (success, error_message)     once per invocation
+    build_payload(item)         -> (payload, error_message)
+    submit(item, payload)       -> (success, error_message, external_id)
+
+Each reads its settings from the environment as {SITE}_{NAME} (PATCH_POST_URL, MOMS_SECRET_NAME),
+so one function can carry several sites. submit() hands every site response to observe(), for
+the site's rate limit (st_james.ratelimit). To add a site, subclass Adapter and add it to REGISTRY.
+"""
+import json
+import re
+
+import requests
+
+from bs4 import BeautifulSoup
+from st_james import event_times, fingerprint, payloads
+
+
+class Adapter:
+    site = None
+
+    def __init__(self, environ, limiter=None):
+        self.environ = environ
+        self.limiter = limiter
+        # Kept for the container's lifetime, so warm invocations reuse its connections
+        self.session = requests.Session()
+
+    def setting(self, name, default=None):
+        return self.environ.get(f"{self.site.upper()}_{name}", default)
+
+    @property
+    def secret_name(self):
+        """The Secrets Manager secret with the site's username and password, if it has one."""
+        return self.setting('SECRET_NAME')
+
+    def observe(self, response):
+        if self.limiter:
+            self.limiter.observe(response)
+
+    def login(self, credentials):
+        return True, None
+
+    def build_payload(self, item):
+        raise NotImplementedError
+
+    def submit(self, item, payload):
+        raise NotImplementedError
+
+
+class Patch(Adapter):
+    """
+    Posts with a POST to POST_URL, and changes an event it posted before with a PUT to UPDATE_URL,
+    formatted with the ID the POST returned ({"data": {"id": ...}}). The original poster only ever
+    POSTed: the PUT follows the write API's REST layout and hasn't been tried against the live
+    site, so it's a setting (by default POST_URL/{event_id}). A 404 from it posts the event again.
+    """
+    site = 'patch'
+
+    def __init__(self, environ, limiter=None):
+        super().__init__(environ, limiter)
+        self.login_url = self.setting('LOGIN_URL')
+        self.post_url = self.setting('POST_URL')
+        self.update_url = self.setting('UPDATE_URL') or f"{self.post_url}/{{event_id}}"
+        self.access_token = None
+
+    def login(self, credentials):
+        try:
+            payload = {
+                "username": credentials['username'],
+                "password": credentials['password']
+            }
+            response = self.session.post(self.login_url, json=payload, headers={"Content-Type": "application/json"})
+
+            if response.status_code == 200:
+                self.access_token = response.json()['data']['access_token']
+                return True, None
+            else:
+                return False, f"Failed to obtain access token: status code={response.status_code}"
+
+        except Exception as e:
+            return False, f"Failed to obtain access token: {e}"
+
+    def build_payload(self, item):
+        start_time, _ = event_times.epochs_ms(item)
+        return payloads.build_patch_payload(item, start_time // 1000), None
+
+    def submit(self, item, payload):
+        headers = {
+            "Content-Type": "application/json",
+            "Patch-Authorization": f"Bearer {self.access_token}"
+        }
+
+        # Posted before: change that event rather than posting a second one
+        event_id = fingerprint.external_id(item, self.site)
+        if event_id:
+            response = self.session.put(self.update_url.format(event_id=event_id), json=payload, headers=headers)
+            self.observe(response)
+            if response.status_code == 404:
+                print(f"Event {event_id} is gone from the site; posting it again")
+                event_id = None
+        if not event_id:
+            response = self.session.post(self.post_url, json=payload, headers=headers)
+            self.observe(response)
+
+        if response.status_code == 200:
+            print("Post successful" if not event_id else f"Updated event {event_id}")
+            return True, None, event_id or self.posted_event_id(response)
+        else:
+            return False, f"Post failed with status code {response.status_code}: {response.text}", None
+
+    @staticmethod
+    def posted_event_id(response):
+        # {"data": {"id": ...}}; None if the site didn't say
+        try:
+            return (response.json().get('data') or {}).get('id')
+        except (ValueError, AttributeError):
+            return None
+
+
+class Moms(Adapter):
+    site = 'moms'
+
+    def __init__(self, environ, limiter=None):
+        super().__init__(environ, limiter)
+        self.url = self.setting('URL')
+        self.email = None
+
+    def login(self, credentials):
+        # Nothing to log in to: the submitter's email goes in each payload
+        self.email = credentials['username']
+        return True, None
+
+    def build_payload(self, item):
+        start_time, end_time = event_times.epochs_ms(item)
+        return payloads.build_moms_payload(item, start_time, end_time, self.email), None
+
+    def submit(self, item, payload):
+        response = self.session.post(self.url, json=payload, headers={"Content-Type": "application/json"})
+        self.observe(response)
+
+        if response.status_code == 200:
+            print("Post successful")
+            return True, None, None
+        else:
+            return False, f"Post failed with status code {response.status_code}: {response.text}", None
+
+
+class Sojourner(Adapter):
+    site = 'sojourner'
+
+    CAPTCHA_RE = re.compile(r"\w+\('([0-9a-fA-F]+)'\);")
+
+    def __init__(self, environ, limiter=None):
+        super().__init__(environ, limiter)
+        self.url = self.setting('URL')
+        self.email = None
+
+    def login(self, credentials):
+        self.email = credentials['username']
+        return True, None
+
+    def build_payload(self, item):
+        # Every submission needs a fresh copy of the form's hidden fields and captcha
+        form_values, error_message = self.get_form_values()
+        if not form_values:
+            return None, error_message
+        date_and_time = item['date_id'].split('#')[0] + ' ' + item['time']
+        payload = payloads.build_sojourner_payload(item, date_and_time, form_values, self.email)
+        return {'data': payload, 'cookies': form_values['cookies']}, None
+
+    def submit(self, item, payload):
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        response = self.session.post(self.url, data=payload['data'], headers=headers, cookies=payload['cookies'])
+        self.observe(response)
+
+        if response.status_code == 200:
+            print("Post successful")
+            return True, None, None
+        else:
+            return False, f"Post failed with status code {response.status_code}: {response.text}", None
+
+    def get_form_values(self):
+        try:
+            response = self.session.get(self.url)
+            if response.status_code in (429, 503):
+                self.observe(response)
+            if response.status_code != 200:
+                return None, f"Request failed with status code {response.status_code}"
+
+            soup = BeautifulSoup(response.text, 'html.parser')
+            fields = {name: soup.find('input', {'name': name})['value']
+                      for name in ('hs_fv_hash', 'hs_fv_ip', 'hs_fv_timestamp', '_token')}
+
+            # The captcha is the argument of a script call, obfuscated
+            script_tag = soup.find('script', string=self.CAPTCHA_RE)
+            if not (script_tag and script_tag.string):
+                return None, "Script tag containing captcha function not found in response"
+            match = self.CAPTCHA_RE.search(script_tag.string)
+            if not match:
+                return None, "Captcha value not found in response"
+
+            return {**fields, 'captcha_value': decode_captcha(match.group(1)), 'cookies': response.cookies}, None
+
+        except Exception as e:
+            return None, f"Error getting form values: {e}"
+
+
+def decode_captcha(e):
+    result = ""
+    for i in range(0, len(e), 2):
+        hex_value = e[i : i + 2]
+        char_code = int(hex_value, 16) + 1
+        result += chr(char_code)
+    return result
+
+
+class Gov(Adapter):
+    site = 'gov'
+
+    EVID_RE = re.compile(r'[?&;]evid=(\d+)')
+    # The link to edit the event just saved, on the confirmation page
+    EDIT_TASK = 'task=icalevent.edit'
+    LOGIN_HEADERS = {
+        'sec-ch-ua': '"Google Chrome";v="89", "Chromium";v="89", ";Not A Brand";v="99"',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Sec-Fetch-Site': 'same-origin',
+        'Sec-Fetch-User': '?1',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"',
+        'Upgrade-Insecure-Requests': '1'
+    }
+
+    def __init__(self, environ, limiter=None):
+        super().__init__(environ, limiter)
+        self.login_url = self.setting('LOGIN_URL')
+        self.post_url = self.setting('POST_URL')
+
+    def login(self, credentials):
+        try:
+            response = self.session.get(self.login_url)
+            if response.status_code != 200:
+                return False, f"Login page failed: status code={response.status_code}"
+
+            csrf_token = None
+            soup = BeautifulSoup(response.text, 'html.parser')
+            script_tag = soup.find('script', {'type': 'application/json', 'class': 'joomla-script-options new'})
+            if script_tag:
+                csrf_token = json.loads(script_tag.string).get('csrf.token')
+            if not csrf_token:
+                return False, 'CSRF token not found.'
+
+            payload = {
+                'Submit': '',
+                csrf_token: '1',  # CSRF token
+                'option': 'com_users',
+                'password': credentials['password'],
+                'return': 'aW5kZXgucGhwp0I0ZW1pZD0xMTc=',
+                'task': 'user.login',
+                'username': credentials['username']
+            }
+            self.session.headers.update(self.LOGIN_HEADERS)
+            response = self.session.post(self.login_url, data=payload, headers=self.LOGIN_HEADERS)
+
+            if (response.status_code == 200) and (2 <= len(self.session.cookies)):
+                print('Login successful')
+                return True, None
+            else:
+                return False, f"Login failed: status code={response.status_code}, number of cookies={len(self.session.cookies)}"
+
+        except Exception as e:
+            return False, f"Unable to login: {e}"
+
+    def build_payload(self, item):
+        form_data = payloads.build_gov_payload(item, *get_times(item))
+
+        # Posted before: JEvents saves over the event with this evid instead of adding one
+        event_id = fingerprint.external_id(item, self.site)
+        if event_id:
+            form_data = {**form_data, 'evid': str(event_id)}
+        return form_data, None
+
+    def submit(self, item, payload):
+        response = self.session.post(self.post_url, data=payload)
+        self.observe(response)
+
+        if response.status_code == 200:
+            soup = BeautifulSoup(response.text, 'html.parser')
+            for div in soup.find_all('div', class_='alert-message'):
+                print(div.get_text(strip=True))
+
+            event_id = payload.get('evid') if payload.get('evid', '0') != '0' else None
+            print("Post successful" if not event_id else f"Updated event {event_id}")
+            return True, None, event_id or self.saved_event_id(response, soup)
+        else:
+            return False, f"Post failed with status code {response.status_code}: {response.text}", None
+
+    def saved_event_id(self, response, soup):
+        """
+        The evid JEvents gave the event just saved: from the page it redirected to, or else the
+        confirmation's edit link (task=icalevent.edit&evid=123). None if the page has edit links
+        for more than one event (or none): taking the wrong one would have later changes saved
+        over another event.
+        """
+        if response.history:
+            match = self.EVID_RE.search(response.url or '')
+            if match:
+                return match.group(1)
+
+        evids = set()
+        for link in soup.find_all('a', href=True):
+            if self.EDIT_TASK in link['href']:
+                match = self.EVID_RE.search(link['href'])
+                if match:
+                    evids.add(match.group(1))
+        if len(evids) != 1:
+            print(f"Saved event's evid not found: edit links for {sorted(evids) or 'no events'}")
+            return None
+        return evids.pop()
+
+
+def get_times(item):
+    """(start 12h, end 12h, start 24h, end 24h) clock times, as the gov form takes them."""
+    times = event_times.for_item(item)
+    return (times.start.strftime('%I:%M'), times.end.strftime('%I:%M'),
+            times.start.strftime('%H:%M'), times.end.strftime('%H:%M'))
+
+
+class Test(Adapter):
+    """Posts nowhere: for trying out the pipeline."""
+    site = 'test'
+
+    def build_payload(self, item):
+        return item, None
+
+    def submit(self, item, payload):
+        print(f'Posting {item["title"]} to {self.site}')
+        return True, None, None
+
+
+REGISTRY = {adapter.site: adapter for adapter in (Patch, Moms, Sojourner, Gov, Test)}
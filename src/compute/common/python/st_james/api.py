@@ -0,0 +1,104 @@
+"""
+Request and response helpers for the API Gateway (Lambda proxy) functions.
+
+Responses are encoded in one pass: the table returns numbers as Decimal, and the encoder's
+default hook converts them as it goes, instead of a walk over the items first. orjson is used
+when it's installed (it isn't in the layer by default). With compression on (RESPONSE_COMPRESSION
+=lambda, see StJamesApi), bodies of MIN_COMPRESS_BYTES or more are compressed to what the client
+accepts: brotli when the brotli module is installed, else gzip.
+"""
+import base64
+import gzip
+import json
+
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(document):
+    """The document as UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(document, default=decimal_default)
+    return json.dumps(document, default=decimal_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def request_body(event):
+    """The request body as text; API Gateway base64-encodes it when it treats the payload as binary."""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def _header(event, name):
+    for key, value in ((event or {}).get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+
+def accepted_encoding(event):
+    """'br', 'gzip' or None: the best encoding we can produce that the request's Accept-Encoding allows."""
+    accepted = {}
+    for part in _header(event, 'accept-encoding').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+
+    def allowed(encoding):
+        return accepted.get(encoding, accepted.get('*', 0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def respond(status, document, event=None, headers=None, compression=False):
+    """A proxy integration response with the document as its JSON body."""
+    body = dumps(document)
+    headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    encoding = accepted_encoding(event) if compression and len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding is None:
+        return {'statusCode': status, 'headers': headers, 'body': body.decode('utf-8')}
+
+    headers.update({'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'})
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'body': base64.b64encode(compress(body, encoding)).decode('ascii'),
+        'isBase64Encoded': True
+    }
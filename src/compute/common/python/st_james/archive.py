@@ -0,0 +1,97 @@
+"""
+Expiry and archival of past events.
+
+With EXPIRE_AFTER_DAYS set (context expire_after_days), the functions that write events give
+each one an expires_at attribute: that many days after its date, in epoch seconds. The table's
+TTL deletes it some time after that. publish_calendar sees the delete on the stream and writes
+the old image to the data bucket, as gzipped NDJSON partitioned by access, year and month:
+
+    archive/{access}/{yyyy}/{mm}/{first stream sequence number of the batch}.ndjson.gz
+
+A retried batch writes the same object again. events_list (?archived=YYYY-MM) and events_get
+(an event past its expiry that isn't in the table) read them back.
+"""
+import datetime
+import gzip
+import json
+
+from st_james import api
+
+PREFIX = 'archive/'
+ATTRIBUTE = 'expires_at'
+TTL_PRINCIPAL = 'dynamodb.amazonaws.com'
+COMPRESS_LEVEL = 6
+
+
+def expires_at(date_id, days):
+    """Epoch seconds, `days` after the start (UTC) of the event's date; None if expiry is off."""
+    if not days:
+        return None
+    day = datetime.date.fromisoformat(date_id[:10])
+    start = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+    return int((start + datetime.timedelta(days=days)).timestamp())
+
+
+def set_expiry(item, days):
+    """Gives the item its expires_at, if expiry is on."""
+    expiry = expires_at(item['date_id'], days)
+    if expiry is not None:
+        item[ATTRIBUTE] = expiry
+    return item
+
+
+def may_be_archived(date_id, days, today=None):
+    """Whether the event could have expired by now (so a miss in the table is worth an archive look)."""
+    if not days:
+        return False
+    today = today or datetime.date.today()
+    return datetime.date.fromisoformat(date_id[:10]) + datetime.timedelta(days=days) <= today
+
+
+def is_expiry(record):
+    """A stream record for an item the table's TTL deleted, not a DELETE by us."""
+    identity = record.get('userIdentity') or {}
+    return record.get('eventName') == 'REMOVE' and identity.get('type') == 'Service' \
+        and identity.get('principalId') == TTL_PRINCIPAL
+
+
+def month_prefix(access, month, prefix=PREFIX):
+    """The prefix of a month's archive objects; month is 'YYYY-MM'."""
+    return f"{prefix}{access}/{month[:4]}/{month[5:7]}/"
+
+
+def object_key(access, month, batch_id, prefix=PREFIX):
+    return f"{month_prefix(access, month, prefix)}{batch_id}.ndjson.gz"
+
+
+def to_ndjson_gz(items):
+    lines = b''.join(api.dumps(item) + b'\n' for item in items)
+    return gzip.compress(lines, compresslevel=COMPRESS_LEVEL)
+
+
+def from_ndjson_gz(body):
+    return [json.loads(line) for line in gzip.decompress(body).splitlines() if line]
+
+
+def read_month(s3, bucket, access, month, prefix=PREFIX):
+    """The archived events of a month, in date_id order."""
+    items = {}
+    kwargs = {'Bucket': bucket, 'Prefix': month_prefix(access, month, prefix)}
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            body = s3.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read()
+            for item in from_ndjson_gz(body):
+                items[item['date_id']] = item
+        if not response.get('IsTruncated'):
+            break
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+    return [items[date_id] for date_id in sorted(items)]
+
+
+def find(s3, bucket, access, date_id, prefix=PREFIX):
+    """An archived event, or None."""
+    for item in read_month(s3, bucket, access, date_id[:7], prefix):
+        if item['date_id'] == date_id:
+            return item
+    return None
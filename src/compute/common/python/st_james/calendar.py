@@ -0,0 +1,49 @@
+"""
+The public calendar as static objects: upcoming public events in monthly shards, built from the
+table by the publish_calendar stream consumer, for clients that don't need the API.
+
+    calendar/public/index.json      {"months": [{"month": "2026-10", "key": ..., "etag": ...}, ...]}
+    calendar/public/2026-10.json    {"month": "2026-10", "events": [...]}
+    calendar/public/events.ics      every public event, as an iCalendar feed (st_james.ics)
+
+Only the fields the public sees go into a shard, so a change to an event's posting status
+doesn't rewrite it.
+"""
+import hashlib
+import json
+
+from decimal import Decimal
+
+PREFIX = 'calendar/public/'
+INDEX = 'index.json'
+
+PUBLIC_FIELDS = ('date_id', 'title', 'time', 'endtime', 'description', 'start_iso', 'end_iso', 'start_epoch_ms', 'end_epoch_ms')
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value % 1 == 0 else float(value)
+    return value
+
+
+def public_event(item):
+    """The event as published, or None for no item."""
+    if not item:
+        return None
+    event = {k: _plain(item[k]) for k in PUBLIC_FIELDS if k in item}
+    event['date'] = item['date_id'].split('#')[0]
+    return event
+
+
+def month_of(date_id):
+    return date_id[:7]
+
+
+def shard_key(month, prefix=PREFIX):
+    return f"{prefix}{month}.json"
+
+
+def render(document):
+    """(body, sha256) of a shard or the index: compact and stable, so equal content hashes equal."""
+    body = json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()
@@ -0,0 +1,48 @@
+"""
+A log of the changes that give the posters new work (a site put back on an event's post list),
+kept in the state partition in time order, so the scheduled sweep can read just what changed
+since its watermark instead of every upcoming event.
+
+    changes.record(table, 'public', date_id)     # after the write that changed the event
+    changes.record(table, 'public', date_id, at_ms=retry_at)    # not to be picked up before then
+    for entry in changes.since(table, watermark, until_ms): ...
+"""
+import time
+
+from boto3.dynamodb.conditions import Key
+from st_james.state import STATE_ACCESS, state_key
+
+CHANGE_PREFIX = 'change#'
+
+
+def change_id(at_ms, access, date_id):
+    # Zero-padded so the ids sort in time order
+    return f"{CHANGE_PREFIX}{at_ms:013d}#{access}#{date_id}"
+
+
+def record(table, access, date_id, at_ms=None):
+    """Logs a change to an event, now or at at_ms. Never raises: the change itself has already been written."""
+    try:
+        table.put_item(Item={
+            **state_key(change_id(at_ms or int(time.time() * 1000), access, date_id)),
+            'event_access': access,
+            'event_date_id': date_id
+        })
+    except Exception as e:
+        print(f"Failed to log change to {access}/{date_id}: {e}")
+
+
+def since(table, watermark, until_ms):
+    """The changes logged after the watermark (a change id, or None) up to until_ms, oldest first."""
+    start = watermark or CHANGE_PREFIX
+    # '~' sorts after the rest of any change id at until_ms
+    end = f"{CHANGE_PREFIX}{until_ms:013d}~"
+    kwargs = {'KeyConditionExpression': Key('access').eq(STATE_ACCESS) & Key('date_id').between(start, end)}
+    while True:
+        response = table.query(**kwargs)
+        for entry in response.get('Items', []):
+            if entry['date_id'] != watermark:
+                yield entry
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,186 @@
+"""
+A circuit breaker per site, kept in the events table so every invocation of a poster shares it.
+
+    closed      posts go out. Each site failure (a failed login or post) adds to failures, and
+                a success sets them back to 0; THRESHOLD failures in a row open the breaker.
+    open        until open_until the poster parks its work without calling the site: a
+                'parked#{site}#{date_id}' item in the state partition, the event left on its
+                post list.
+    half_open   past open_until, one invocation claims the probe (for PROBE_SECONDS) and posts.
+                A success closes the breaker and releases the parked events into the change log
+                (st_james.changes), for the scheduled sweep to post; a failure opens it again.
+
+A site with no new work would never be probed, so the scheduled sweep sends each breaker due for
+a probe one of its parked events (probes_due).
+
+    breaker = circuit.from_environment(website)
+    if breaker.allow() == circuit.OPEN:
+        breaker.park(item)
+    ... breaker.success() or breaker.failure(error_message)
+
+BREAKER_THRESHOLD (0 turns the breaker off) and BREAKER_OPEN_SECONDS configure it.
+"""
+import os
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from st_james import changes, clients
+from st_james.state import STATE_ACCESS, state_key
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+# What allow() returns to the invocation that claimed the probe
+PROBE = 'probe'
+
+BREAKER_PREFIX = 'breaker#'
+PARKED_PREFIX = 'parked#'
+THRESHOLD = 5
+OPEN_SECONDS = 300
+# Longer than a poster's timeout: a probe that dies is taken over after this
+PROBE_SECONDS = 60
+
+
+def breaker_key(site):
+    return state_key(f"{BREAKER_PREFIX}{site}")
+
+
+def parked_key(site, date_id):
+    return state_key(f"{PARKED_PREFIX}{site}#{date_id}")
+
+
+class Breaker:
+    def __init__(self, table, site, threshold=THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.table = table
+        self.site = site
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.key = breaker_key(site)
+        # As last read by allow()
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def allow(self, now=None):
+        """CLOSED or PROBE: go ahead and post; OPEN: park the work."""
+        self.probing = False
+        if not self.threshold:
+            return CLOSED
+        now = now or time.time()
+        item = self.table.get_item(Key=self.key, ConsistentRead=True).get('Item') or {}
+        self.state = item.get('state', CLOSED)
+        self.failures = int(item.get('failures', 0))
+        if self.state == CLOSED:
+            return CLOSED
+
+        # Open and waited long enough, or a probe that never reported back
+        deadline = 'open_until' if self.state == OPEN else 'probe_until'
+        if now < int(item.get(deadline, 0)):
+            return OPEN
+        try:
+            self.table.update_item(
+                Key=self.key,
+                UpdateExpression='SET #state = :half_open, probe_until = :until',
+                ConditionExpression=f"#state = :seen AND {deadline} = :deadline",
+                ExpressionAttributeNames={'#state': 'state'},
+                ExpressionAttributeValues={':half_open': HALF_OPEN, ':until': int(now) + PROBE_SECONDS,
+                                           ':seen': self.state, ':deadline': item.get(deadline, 0)}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # Another invocation claimed it
+                return OPEN
+            raise
+        print(f"Circuit for {self.site} half open: this invocation is the probe")
+        self.probing = True
+        return PROBE
+
+    def success(self):
+        """Closes the breaker if it wasn't, and releases the events parked while the site was failing."""
+        if not self.threshold or (self.state == CLOSED and not self.failures and not self.probing):
+            return
+        self.table.put_item(Item={**self.key, 'state': CLOSED, 'failures': 0, 'updated_at': int(time.time())})
+        self.state, self.failures, self.probing = CLOSED, 0, False
+        print(f"Circuit for {self.site} closed; released {self.release()} parked events")
+
+    def failure(self, reason=None, now=None):
+        """Counts a site failure; opens the breaker at THRESHOLD in a row, or when a probe fails."""
+        if not self.threshold:
+            return
+        now = int(now or time.time())
+        if self.probing:
+            self._open(now, reason)
+            return
+        response = self.table.update_item(
+            Key=self.key,
+            UpdateExpression='ADD failures :one SET updated_at = :now',
+            ExpressionAttributeValues={':one': 1, ':now': now},
+            ReturnValues='ALL_NEW'
+        )
+        attributes = response['Attributes']
+        self.failures = int(attributes['failures'])
+        if self.failures >= self.threshold and attributes.get('state', CLOSED) == CLOSED:
+            self._open(now, reason)
+
+    def _open(self, now, reason):
+        self.table.update_item(
+            Key=self.key,
+            UpdateExpression='SET #state = :open, open_until = :until, reason = :reason REMOVE probe_until',
+            ExpressionAttributeNames={'#state': 'state'},
+            ExpressionAttributeValues={':open': OPEN, ':until': now + self.open_seconds,
+                                       ':reason': (reason or '')[:500]}
+        )
+        self.state, self.probing = OPEN, False
+        print(f"Circuit for {self.site} open for {self.open_seconds}s after {self.failures} failures: {reason}")
+
+    def park(self, item):
+        """Sets an event aside until the site is back; it stays on the post list."""
+        self.table.put_item(Item={
+            **parked_key(self.site, item['date_id']),
+            'event_access': item.get('access', 'public'),
+            'event_date_id': item['date_id'],
+            'parked_at': int(time.time())
+        })
+        print(f"Parked {item['date_id']} for {self.site}")
+
+    def parked(self, limit=None):
+        """The parked entries, oldest date first."""
+        kwargs = {'KeyConditionExpression': Key('access').eq(STATE_ACCESS) &
+                  Key('date_id').begins_with(f"{PARKED_PREFIX}{self.site}#")}
+        if limit:
+            kwargs['Limit'] = limit
+        while True:
+            response = self.table.query(**kwargs)
+            yield from response.get('Items', [])
+            if limit or 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def release(self):
+        """Moves the parked events to the change log; returns how many."""
+        released = 0
+        for entry in self.parked():
+            changes.record(self.table, entry['event_access'], entry['event_date_id'])
+            self.table.delete_item(Key={'access': entry['access'], 'date_id': entry['date_id']})
+            released += 1
+        return released
+
+
+def probes_due(table, now=None):
+    """(site, parked entry) for each open breaker past its open_until (or dead probe) with parked events."""
+    now = now or time.time()
+    response = table.query(KeyConditionExpression=Key('access').eq(STATE_ACCESS) &
+                           Key('date_id').begins_with(BREAKER_PREFIX))
+    for item in response.get('Items', []):
+        state = item.get('state', CLOSED)
+        if state == CLOSED or now < int(item.get('open_until' if state == OPEN else 'probe_until', 0)):
+            continue
+        site = item['date_id'][len(BREAKER_PREFIX):]
+        for entry in Breaker(table, site).parked(limit=1):
+            yield site, entry
+
+
+def from_environment(website):
+    """The Breaker for a poster, from TABLE_NAME, BREAKER_THRESHOLD and BREAKER_OPEN_SECONDS."""
+    return Breaker(clients.events_table(), website,
+                   threshold=int(os.getenv('BREAKER_THRESHOLD', str(THRESHOLD))),
+                   open_seconds=int(os.getenv('BREAKER_OPEN_SECONDS', str(OPEN_SECONDS))))
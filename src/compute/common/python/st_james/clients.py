@@ -0,0 +1,37 @@
+"""
+boto3 clients and resources, created once per container and shared by all the code in it.
+
+Creating a boto3 client is one of the larger costs of a cold start. The /events handlers get the
+events table from here, so when they share a container (the merged events_api function) they
+share one DynamoDB resource and its connection pool too.
+"""
+import boto3
+import os
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def client(service_name):
+    return boto3.client(service_name)
+
+
+@lru_cache(maxsize=None)
+def resource(service_name):
+    return boto3.resource(service_name)
+
+
+@lru_cache(maxsize=None)
+def table(name):
+    return resource('dynamodb').Table(name)
+
+
+def events_table():
+    return table(os.environ['TABLE_NAME'])
+
+
+def reset():
+    """Drops the cached clients, so the next call creates new ones (boto3 may have been swapped out in tests)."""
+    client.cache_clear()
+    resource.cache_clear()
+    table.cache_clear()
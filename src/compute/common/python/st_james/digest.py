@@ -0,0 +1,184 @@
+"""
+Collects the outcome of every post a Lambda makes and publishes them to the results topic as
+one digest, instead of one SNS message per event and per failure. A poster for several sites
+publishes one digest for them all, with counts per site.
+
+By default a digest covers one invocation. With a window (DIGEST_WINDOW_SECONDS > 0) each
+invocation adds its counts per site (and the site's last error) to a state item in the events
+table, and the digest is published once the window has elapsed: by the invocation that finds it
+expired, or by flush(), which the poster runs on a schedule so a window is published even when
+the posts stop. Only counts are kept, so the state item stays the same size however many posts
+the window sees. The invocation that publishes a window claims it (deletes the state item) first,
+and puts its counts back if the publish fails, for the next one to try.
+"""
+import json
+import os
+import time
+
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from st_james import clients
+from st_james.state import state_key
+
+MAX_ERROR_LENGTH = 500
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec='seconds')
+
+
+def count_by_site(outcomes):
+    sites = {}
+    for outcome in outcomes:
+        counts = sites.setdefault(outcome['website'], {'succeeded': 0, 'failed': 0})
+        counts['succeeded' if outcome['success'] else 'failed'] += 1
+    return sites
+
+
+class Digest:
+    def __init__(self, website, topic_arn, sns, table=None, window_seconds=0):
+        # The poster's site, or its sites ('patch,moms')
+        self.website = website
+        self.topic_arn = topic_arn
+        self.sns = sns
+        self.table = table
+        self.window_seconds = window_seconds if table is not None else 0
+        self.key = state_key(f"digest#{website}")
+        self.outcomes = []
+        self.started = time.time()
+
+    def record(self, success, item, error_message=None, website=None):
+        self.outcomes.append({
+            'website': website or self.website,
+            'date_id': item.get('date_id') if item else None,
+            'title': item.get('title', '') if item else '',
+            'trace_id': item.get('trace_id') if item else None,
+            'success': success,
+            'error': (error_message or '')[:MAX_ERROR_LENGTH] or None
+        })
+
+    def publish(self):
+        """Publishes (or, in window mode, adds to the window) what has been recorded so far. Never raises."""
+        outcomes, self.outcomes = self.outcomes, []
+        started, self.started = self.started, time.time()
+        if not outcomes:
+            return
+
+        try:
+            if self.window_seconds > 0:
+                window_start = self._buffer(outcomes, started)
+                if time.time() - window_start >= self.window_seconds:
+                    self._publish_window(window_start)
+            else:
+                self._send(count_by_site(outcomes), started, outcomes)
+        except Exception as e:
+            print(f"Failed to publish results digest: {e}")
+
+    def flush(self):
+        """In window mode, publishes the window if it has elapsed, whether or not anything was posted since. Never raises."""
+        if self.window_seconds <= 0:
+            return
+        try:
+            window = self.table.get_item(Key=self.key, ConsistentRead=True).get('Item')
+            if window and time.time() - int(window['window_start']) >= self.window_seconds:
+                self._publish_window(int(window['window_start']))
+        except Exception as e:
+            print(f"Failed to flush results digest: {e}")
+
+    def _buffer(self, outcomes, started):
+        last_errors = {o['website']: o['error'] for o in outcomes if o['error']}
+        return self._add(count_by_site(outcomes), last_errors, int(started))
+
+    def _add(self, sites, last_errors, start, restore=False):
+        """
+        Adds counts per site (and each site's last error) to the window; returns when it started.
+        restore puts back a claimed window that wasn't published: it keeps its (earlier) start, and
+        any error recorded since wins over its own.
+        """
+        names, values, adds = {}, {':start': start}, []
+        sets = ['window_start = :start' if restore else 'window_start = if_not_exists(window_start, :start)']
+        for n, site in enumerate(sorted(set(sites) | set(last_errors))):
+            for field, count in sites.get(site, {}).items():
+                if count:
+                    names[f"#{field}{n}"] = f"{field}_{site}"
+                    values[f":{field}{n}"] = count
+                    adds.append(f"#{field}{n} :{field}{n}")
+            if site in last_errors:
+                names[f"#error{n}"] = f"last_error_{site}"
+                values[f":error{n}"] = last_errors[site]
+                sets.append(f"#error{n} = if_not_exists(#error{n}, :error{n})" if restore else f"#error{n} = :error{n}")
+
+        response = self.table.update_item(
+            Key=self.key,
+            UpdateExpression='SET ' + ', '.join(sets) + (' ADD ' + ', '.join(adds) if adds else ''),
+            **({'ExpressionAttributeNames': names} if names else {}),
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )
+        return int(response['Attributes']['window_start'])
+
+    def _publish_window(self, window_start):
+        # Claim the window, so only one invocation publishes it
+        try:
+            response = self.table.delete_item(
+                Key=self.key,
+                ConditionExpression='window_start = :start',
+                ExpressionAttributeValues={':start': window_start},
+                ReturnValues='ALL_OLD'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # another invocation published this window
+                return
+            raise
+
+        sites, last_errors = {}, {}
+        for name, value in response['Attributes'].items():
+            field, _, site = name.partition('_')
+            if field in ('succeeded', 'failed') and site:
+                sites.setdefault(site, {'succeeded': 0, 'failed': 0})[field] = int(value)
+            elif name.startswith('last_error_'):
+                last_errors[name[len('last_error_'):]] = value
+        try:
+            self._send(sites, window_start, last_errors=last_errors)
+        except Exception:
+            # Not published: the counts go back in the window, for the next invocation or flush
+            self._add(sites, last_errors, window_start, restore=True)
+            raise
+
+    def _send(self, sites, started, outcomes=None, last_errors=None):
+        succeeded = sum(counts['succeeded'] for counts in sites.values())
+        failed = sum(counts['failed'] for counts in sites.values())
+
+        digest = {
+            'website': self.website,
+            'window_start': _iso(int(started)),
+            'window_end': _iso(int(time.time())),
+            'succeeded': succeeded,
+            'failed': failed,
+            'sites': sites
+        }
+        if outcomes is not None:
+            digest['failures'] = [o for o in outcomes if not o['success']]
+            digest['successes'] = [o for o in outcomes if o['success']]
+        else:
+            # A window has only counts, and each site's last error
+            digest['last_errors'] = last_errors or {}
+        subject = f"Post to {self.website}: {succeeded} succeeded, {failed} failed"[:100]
+        self.sns.publish(
+            TopicArn=self.topic_arn,
+            Message=json.dumps(digest, indent=2, default=str),
+            Subject=subject,
+            MessageAttributes={
+                'website': {'DataType': 'String', 'StringValue': self.website},
+                'failed': {'DataType': 'Number', 'StringValue': str(failed)}
+            }
+        )
+
+
+def from_environment(website, sns):
+    """Creates the Digest for a posting Lambda from its TOPIC_ARN, TABLE_NAME and DIGEST_WINDOW_SECONDS."""
+    window_seconds = int(os.getenv('DIGEST_WINDOW_SECONDS', '0'))
+    table = clients.events_table() if window_seconds > 0 else None
+    return Digest(website, os.environ['TOPIC_ARN'], sns, table, window_seconds)
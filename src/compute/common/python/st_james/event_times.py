@@ -0,0 +1,164 @@
+"""
+Parses the free-text event times we store ('3 pm', '10:30 am', '7-10 pm', '10 am - 4 pm', 'noon')
+into timezone-aware start and end times.
+
+Writers call normalize() so every item carries start_epoch_ms/end_epoch_ms and ISO strings; the
+posters read those numbers and only fall back to parsing for items written before that.
+Parse results are memoized per (date, time, endtime) string.
+"""
+import re
+
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from st_james.sites import TIMEZONE
+
+EASTERN = ZoneInfo(TIMEZONE)
+DEFAULT_DURATION = timedelta(hours=1)
+NORMALIZED_FIELDS = ('start_epoch_ms', 'end_epoch_ms', 'start_iso', 'end_iso')
+
+_CLOCK = r'(?:(?P<{0}word>noon|midnight)|(?P<{0}hour>\d{{1,2}})(?:[:.](?P<{0}minute>\d{{2}}))?\s*(?P<{0}ampm>[ap])?\.?\s*(?:m\.?)?)'
+TIME_RE = re.compile(r'^\s*' + _CLOCK.format('start') + r'(?:\s*(?:-|–|—|to)\s*' + _CLOCK.format('end') + r')?\s*$', re.IGNORECASE)
+
+
+class EventTimes(NamedTuple):
+    start: datetime
+    end: datetime
+
+    @property
+    def start_epoch(self):
+        return int(self.start.timestamp())
+
+    @property
+    def end_epoch(self):
+        return int(self.end.timestamp())
+
+    @property
+    def start_epoch_ms(self):
+        return self.start_epoch * 1000
+
+    @property
+    def end_epoch_ms(self):
+        return self.end_epoch * 1000
+
+
+def _clock(match, prefix):
+    # Returns (hour, minute, meridiem); meridiem is 'a', 'p' or None when the text doesn't say
+    word = match.group(prefix + 'word')
+    if word:
+        return (12, 0, 'p') if word.lower() == 'noon' else (0, 0, 'a')
+
+    hour = int(match.group(prefix + 'hour'))
+    minute = int(match.group(prefix + 'minute') or 0)
+    ampm = match.group(prefix + 'ampm')
+    if ampm and not 1 <= hour <= 12:
+        raise ValueError(f"Hour out of range: {hour}")
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Time out of range: {hour}:{minute:02d}")
+    return hour, minute, ampm.lower() if ampm else None
+
+
+def _to_24_hour(hour, ampm):
+    if ampm == 'a':
+        return 0 if hour == 12 else hour
+    if ampm == 'p':
+        return hour if hour == 12 else hour + 12
+    return hour
+
+
+def _minutes(hour, minute, ampm):
+    return _to_24_hour(hour, ampm) * 60 + minute
+
+
+def parse_time_of_day(time_str):
+    """
+    Parses a time of day or a range into (start, end) datetime.time values; end is None if no range.
+    One end of a range without am/pm borrows it from the other ('7-10 pm', '7 pm - 9:30'); if that
+    would put the start after the end ('11-1 pm') the start is taken as the other half of the day.
+    Without am/pm anywhere, 'H:MM' is read as a 24-hour clock and a bare hour is rejected.
+    """
+    match = TIME_RE.match(time_str or '')
+    if not match:
+        raise ValueError(f"Unrecognized time: {time_str!r}")
+
+    start_hour, start_minute, start_ampm = _clock(match, 'start')
+    if not (match.group('endword') or match.group('endhour')):
+        if start_ampm is None and match.group('startminute') is None:
+            raise ValueError(f"Missing am/pm: {time_str!r}")
+        return time(_to_24_hour(start_hour, start_ampm), start_minute), None
+
+    end_hour, end_minute, end_ampm = _clock(match, 'end')
+    if start_ampm is None and end_ampm is not None and start_hour <= 12:
+        start_ampm = end_ampm
+        if _minutes(start_hour, start_minute, start_ampm) > _minutes(end_hour, end_minute, end_ampm):
+            start_ampm = 'a' if end_ampm == 'p' else 'p'
+    elif end_ampm is None and start_ampm is not None and end_hour <= 12:
+        end_ampm = start_ampm
+        if _minutes(end_hour, end_minute, end_ampm) < _minutes(start_hour, start_minute, start_ampm):
+            end_ampm = 'a' if start_ampm == 'p' else 'p'
+    elif start_ampm is None and end_ampm is None and None in (match.group('startminute'), match.group('endminute')):
+        raise ValueError(f"Missing am/pm: {time_str!r}")
+
+    return time(_to_24_hour(start_hour, start_ampm), start_minute), time(_to_24_hour(end_hour, end_ampm), end_minute)
+
+
+@lru_cache(maxsize=1024)
+def parse(date_str, time_str, endtime_str=None):
+    """
+    Returns the EventTimes for an event on date_str ('YYYY-MM-DD') at time_str, in Eastern time.
+    An explicit endtime_str overrides the end of a range; with neither, the event lasts an hour.
+    Raises ValueError if the date or either time can't be parsed.
+    """
+    day = date.fromisoformat(date_str)
+    start_time, end_time = parse_time_of_day(time_str)
+    if endtime_str:
+        end_time, _ = parse_time_of_day(endtime_str)
+
+    start = datetime.combine(day, start_time, tzinfo=EASTERN)
+    if end_time is None:
+        end = (start.astimezone(timezone.utc) + DEFAULT_DURATION).astimezone(EASTERN)
+    else:
+        end = datetime.combine(day, end_time, tzinfo=EASTERN)
+        if end <= start:
+            # ends after midnight
+            end = datetime.combine(day + timedelta(days=1), end_time, tzinfo=EASTERN)
+    return EventTimes(start, end)
+
+
+def for_item(item):
+    """Returns the EventTimes for an event item, from its normalized fields if it has them."""
+    if 'start_epoch_ms' in item and 'end_epoch_ms' in item:
+        return EventTimes(
+            datetime.fromtimestamp(int(item['start_epoch_ms']) / 1000, EASTERN),
+            datetime.fromtimestamp(int(item['end_epoch_ms']) / 1000, EASTERN)
+        )
+    return parse(item['date_id'].split('#')[0], item['time'], item.get('endtime'))
+
+
+def epochs_ms(item):
+    """Returns (start, end) in epoch milliseconds for an event item."""
+    if 'start_epoch_ms' in item and 'end_epoch_ms' in item:
+        return int(item['start_epoch_ms']), int(item['end_epoch_ms'])
+    times = for_item(item)
+    return times.start_epoch_ms, times.end_epoch_ms
+
+
+def normalize(item):
+    """
+    Sets the normalized time fields on an item about to be written, replacing any stale ones.
+    Items without a time get none. Raises ValueError if the time can't be parsed.
+    """
+    for field in NORMALIZED_FIELDS:
+        item.pop(field, None)
+
+    if not item.get('time'):
+        return item
+
+    times = for_item(item)
+    item['start_epoch_ms'] = times.start_epoch_ms
+    item['end_epoch_ms'] = times.end_epoch_ms
+    item['start_iso'] = times.start.isoformat()
+    item['end_iso'] = times.end.isoformat()
+    return item
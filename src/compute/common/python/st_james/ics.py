@@ -0,0 +1,99 @@
+"""
+The public calendar as an iCalendar (RFC 5545) feed, for subscribers who'd rather poll one URL
+than have us post to their calendar.
+
+Each event is one VEVENT, timed from the same normalized fields the posters use (UTC, so the feed
+needs no VTIMEZONE). The feed is kept as VEVENT blocks keyed by UID, so a change to a few events
+re-renders just those blocks; the rest, DTSTAMP included, stay byte for byte the same.
+"""
+from datetime import datetime, timezone
+
+from st_james import event_times
+from st_james.sites import SITES, TIMEZONE
+
+PRODID = '-//Church of St. James the Less//Events//EN'
+CALENDAR_NAME = 'St. James the Less Events'
+UID_DOMAIN = 'events.stjamestheless'
+LOCATION = f"{SITES['moms']['place']}, {SITES['moms']['address']}"
+
+CRLF = '\r\n'
+
+
+def escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Splits a content line into lines of at most 75 octets, without splitting a character."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size, limit = [], '', 0, 75
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > limit:
+            parts.append(current)
+            # continuation lines start with a space, which counts toward their 75
+            current, size, limit = '', 0, 74
+        current += char
+        size += width
+    parts.append(current)
+    return (CRLF + ' ').join(parts)
+
+
+def _utc(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def uid(date_id):
+    return f"{date_id.replace('#', '-')}@{UID_DOMAIN}"
+
+
+def vevent(event, stamp=None):
+    """The VEVENT block for a public event (see st_james.calendar.public_event)."""
+    lines = ['BEGIN:VEVENT', f"UID:{uid(event['date_id'])}", f"DTSTAMP:{_utc(stamp or datetime.now(timezone.utc))}"]
+
+    times = None
+    if event.get('time') or 'start_epoch_ms' in event:
+        try:
+            times = event_times.for_item(event)
+        except ValueError:
+            pass
+    if times:
+        lines += [f"DTSTART:{_utc(times.start)}", f"DTEND:{_utc(times.end)}"]
+    else:
+        # No (usable) time: an all-day event
+        day = event['date_id'].split('#')[0].replace('-', '')
+        lines.append(f"DTSTART;VALUE=DATE:{day}")
+
+    lines.append(f"SUMMARY:{escape(event.get('title', ''))}")
+    if event.get('description'):
+        lines.append(f"DESCRIPTION:{escape(event['description'])}")
+    lines += [f"LOCATION:{escape(LOCATION)}", 'END:VEVENT']
+    return CRLF.join(fold(line) for line in lines)
+
+
+def parse_feed(text):
+    """{uid: VEVENT block} of a feed render_feed wrote."""
+    blocks = {}
+    for chunk in text.split('BEGIN:VEVENT')[1:]:
+        block = 'BEGIN:VEVENT' + chunk[:chunk.index('END:VEVENT')] + 'END:VEVENT'
+        uid_line = next(line for line in block.split(CRLF) if line.startswith('UID:'))
+        blocks[uid_line[4:]] = block
+    return blocks
+
+
+def render_feed(blocks):
+    """The feed for {uid: VEVENT block}, in UID (so date) order."""
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f"PRODID:{PRODID}",
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f"X-WR-CALNAME:{CALENDAR_NAME}",
+        f"X-WR-TIMEZONE:{TIMEZONE}"
+    ]
+    lines += [blocks[key] for key in sorted(blocks)]
+    lines.append('END:VCALENDAR')
+    return CRLF.join(lines) + CRLF
@@ -0,0 +1,165 @@
+"""
+Per-phase latency metrics in CloudWatch Embedded Metric Format (EMF).
+
+Each Lambda creates one Metrics object and decorates its handler with it; the phases it wants
+timed (login, status update, post, SNS publish, table reads and writes) are decorated with
+timed() or wrapped in a phase() block; a function serving several sites names the site a phase
+is for (phase(name, site=...)). At the end of each invocation the durations are printed
+as EMF JSON, which CloudWatch turns into metrics without any API calls. Inside a trace, each
+timed phase is also recorded as a span (see st_james.tracing).
+
+    Duration            by Function/Phase and Function/Site/Phase/Outcome
+    InvocationDuration  by Function, Function/ColdStart and Function/RecordCount
+"""
+import functools
+import json
+import time
+
+from contextlib import contextmanager
+from st_james import tracing
+
+NAMESPACE = 'StJames'
+_cold_start = True
+
+
+def _outcome(result):
+    # Most of our helpers return (success, error_message) or (value, error_message), some just
+    # an error message or None; handlers return an API response
+    if isinstance(result, str):
+        return 'failure'
+    if isinstance(result, tuple) and result:
+        return 'failure' if result[0] is False or result[-1] else 'success'
+    if isinstance(result, bool):
+        return 'success' if result else 'failure'
+    if isinstance(result, dict) and 'statusCode' in result:
+        return 'success' if int(result['statusCode']) < 400 else 'failure'
+    return 'success'
+
+
+def _record_count_bucket(count):
+    if count <= 1:
+        return str(count)
+    if count <= 10:
+        return '2-10'
+    if count <= 100:
+        return '11-100'
+    return '>100'
+
+
+class Phase:
+    def __init__(self):
+        self.outcome = 'success'
+
+
+class Metrics:
+    def __init__(self, function, site=None, namespace=NAMESPACE):
+        self.function = function
+        self.site = site
+        self.namespace = namespace
+        self.durations = {}
+
+    def record(self, phase, duration_ms, outcome='success', site=None):
+        self.durations.setdefault((phase, outcome, site or self.site), []).append(round(duration_ms, 3))
+
+    def _record(self, phase, start_ns, start, outcome, site=None):
+        site = site or self.site
+        self.record(phase, (time.perf_counter() - start) * 1000, outcome, site)
+        attributes = {'outcome': outcome, **({'site': site} if site else {})}
+        tracing.record_span(phase, start_ns, time.time_ns(), 'error' if outcome == 'error' else 'ok', attributes)
+
+    @contextmanager
+    def phase(self, name, site=None):
+        """Times a block (for the site, if not the function's); set .outcome on the yielded object to report a failure without raising."""
+        current = Phase()
+        start_ns, start = time.time_ns(), time.perf_counter()
+        try:
+            yield current
+        except Exception:
+            current.outcome = 'error'
+            raise
+        finally:
+            self._record(name, start_ns, start, current.outcome, site)
+
+    def timed(self, name):
+        """Decorator that times every call of a function as phase `name`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start_ns, start = time.time_ns(), time.perf_counter()
+                outcome = 'error'
+                try:
+                    result = func(*args, **kwargs)
+                    outcome = _outcome(result)
+                    return result
+                finally:
+                    self._record(name, start_ns, start, outcome)
+            return wrapper
+        return decorator
+
+    def handler(self, func):
+        """Decorator for a Lambda handler: times the invocation and flushes metrics and spans when it ends."""
+        @functools.wraps(func)
+        def wrapper(event, context):
+            global _cold_start
+            cold_start, _cold_start = _cold_start, False
+            records = event.get('Records') if isinstance(event, dict) else None
+            self.durations = {}
+
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = func(event, context)
+                outcome = _outcome(result)
+                return result
+            finally:
+                self.flush((time.perf_counter() - start) * 1000, outcome, cold_start, len(records or []))
+                tracing.flush(self.function)
+        return wrapper
+
+    def flush(self, invocation_ms, outcome, cold_start, record_count):
+        try:
+            timestamp = int(time.time() * 1000)
+            for (phase, phase_outcome, site), values in self.durations.items():
+                dimensions = [['Function', 'Phase']]
+                properties = {'Function': self.function, 'Phase': phase, 'Outcome': phase_outcome}
+                if site:
+                    dimensions.append(['Function', 'Site', 'Phase', 'Outcome'])
+                    properties['Site'] = site
+                else:
+                    dimensions.append(['Function', 'Phase', 'Outcome'])
+                # EMF takes at most 100 values per metric
+                for i in range(0, len(values), 100):
+                    self._emit(timestamp, dimensions, 'Duration', values[i:i + 100], properties)
+
+            self._emit(
+                timestamp,
+                [['Function'], ['Function', 'ColdStart'], ['Function', 'RecordCount']],
+                'InvocationDuration',
+                round(invocation_ms, 3),
+                {
+                    'Function': self.function,
+                    'ColdStart': 'true' if cold_start else 'false',
+                    'RecordCount': _record_count_bucket(record_count),
+                    'Outcome': outcome,
+                    'Records': record_count,
+                    **({'Site': self.site} if self.site else {})
+                }
+            )
+        except Exception as e:
+            print(f"Failed to emit metrics: {e}")
+        finally:
+            self.durations = {}
+
+    def _emit(self, timestamp, dimensions, metric, value, properties):
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': dimensions,
+                    'Metrics': [{'Name': metric, 'Unit': 'Milliseconds'}]
+                }]
+            },
+            metric: value,
+            **properties
+        }))
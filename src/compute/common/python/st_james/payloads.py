@@ -0,0 +1,237 @@
+"""
+Per-site payload templates.
+
+The static part of each site's payload is built once, at import time, from the
+per-site configuration in sites.py. The build_*_payload functions only fill in
+the fields that change from event to event. Nested branches that never change
+are shared with the template, so treat the returned payloads as read-only.
+"""
+from datetime import date
+from functools import lru_cache
+
+from st_james.sites import SITES, SUBMITTER_NAME, TIMEZONE
+
+
+def _moms_template(config):
+    return {
+        "event": {
+            "what": {
+                "summary": None,
+                "description": None,
+                "image": dict(config['image'])
+            },
+            "where": {
+                "place": config['place'],
+                "address": config['address'],
+                "location": dict(config['location']),
+                "virtualLoc": {}
+            },
+            "when": {
+                "start": None,
+                "end": None,
+                "allDay": False
+            },
+            "emeta": {
+                "tags": {
+                    "default": []
+                }
+            }
+        },
+        "submitter": {
+            "name": SUBMITTER_NAME,
+            "email": None,
+            "notes": ""
+        }
+    }
+
+
+def _patch_template(config):
+    return {
+        "eventDateEpoch": None,
+        "eventType": config['event_type'],
+        "title": None,
+        "contentHtml": None,
+        "patchId": config['patch_id'],
+        "eventAddress": dict(config['address']),
+        "imageUrls": [config['image_url']],
+        "eventLocation": {
+            "type": "Point",
+            "coordinates": list(config['coordinates'])
+        },
+        "imageValidation": [
+            {
+                "image_filename": config['image_filename'],
+                "image_src": "",
+                "image_suspect": 0,
+                "image_url": config['image_url']
+            }
+        ]
+    }
+
+
+def _sojourner_template(config):
+    return {
+        "Custom12": "Yes",
+        "Custom14": config['ages'],
+        "Custom15": config['city'],
+        "Custom16": config['street'],
+        "Custom17": config['state'],
+        "Custom19": "",
+        "Custom20": "",
+        "Custom21": "",
+        "Custom3": None,
+        "Custom4": None,
+        "Custom5": None,
+        "Custom8": config['place'],
+        "Custom9": "",
+        "_token": None,
+        "additional": "",
+        "captcha": None,
+        "doc[]": "",
+        "fullname": SUBMITTER_NAME,
+        "hs_fv_hash": None,
+        "hs_fv_ip": None,
+        "hs_fv_timestamp": None,
+        "required": "sEmail,fullname",
+        "sEmail": None,
+        "simple": "",
+        "submit": "Submit Request",
+        "xCategory": config['category']
+    }
+
+
+def _gov_template(config):
+    return {
+        "Itemid": config['item_id'],
+        "access": "1",
+        "boxchecked": "0",
+        "catid[]": list(config['category_ids']),
+        "contact_info": "",
+        "count": "1",
+        "countuntil": "count",
+        "end_ampm": "none",
+        "evid": "0",
+        "extra_info": "",
+        "freq": "none",
+        "ics_id": "1",
+        "jevtype": "icaldb",
+        "location": config['location'],
+        "multiday": "1",
+        "option": "com_jevents",
+        "rinterval": "1",
+        "rp_id": "0",
+        "start_ampm": "none",
+        "state": "1",  # 1 for published, 0 for unpublished
+        "task": "icalevent.save",
+        "updaterepeats": "0",
+        "valid_dates": "1",
+        "view12Hour": "1",
+        "weekdays[]": ["5"],
+        "weeknums[]": ["1", "2", "3", "4", "5"]
+    }
+
+
+MOMS_TEMPLATE = _moms_template(SITES['moms'])
+PATCH_TEMPLATE = _patch_template(SITES['patch'])
+SOJOURNER_TEMPLATE = _sojourner_template(SITES['sojourner'])
+GOV_TEMPLATE = _gov_template(SITES['gov'])
+
+
+def build_moms_payload(message, start_ms, end_ms, email):
+    event = MOMS_TEMPLATE['event']
+    return {
+        "event": {
+            **event,
+            "what": {
+                **event['what'],
+                "summary": message['title'],
+                "description": f"<p>{message['description']}</p>"
+            },
+            "when": {
+                "start": {"millis": start_ms, "tzid": TIMEZONE},
+                "end": {"millis": end_ms, "tzid": TIMEZONE},
+                "allDay": False
+            }
+        },
+        "submitter": {**MOMS_TEMPLATE['submitter'], "email": email}
+    }
+
+
+def build_patch_payload(message, epoch_time):
+    return {
+        **PATCH_TEMPLATE,
+        "eventDateEpoch": epoch_time,
+        "title": message['title'],
+        "contentHtml": f"<p>{ message['description'] }</p>"
+    }
+
+
+def build_sojourner_payload(message, date_and_time, form_values, email):
+    return {
+        **SOJOURNER_TEMPLATE,
+        "Custom3": message['title'],
+        "Custom4": message['description'],
+        "Custom5": date_and_time,
+        "_token": form_values['_token'],
+        "captcha": form_values['captcha_value'],
+        "hs_fv_hash": form_values['hs_fv_hash'],
+        "hs_fv_ip": form_values['hs_fv_ip'],
+        "hs_fv_timestamp": form_values['hs_fv_timestamp'],
+        "sEmail": email
+    }
+
+
+def calculate_week_and_julian(date_string):
+    # Parse the input date string
+    parsed = date.fromisoformat(date_string)
+
+    # Calculate the week number
+    week_number = parsed.isocalendar()[1]
+
+    # Calculate the Julian date
+    julian_date = parsed.timetuple().tm_yday
+
+    return week_number, julian_date
+
+
+@lru_cache(maxsize=8)
+def _gov_submission_date_fields(today):
+    # Fields that depend only on the day we submit, shared by every event posted that day
+    current_date_format1 = today.strftime("%m/%d/%Y")
+    current_week_number = today.isocalendar()[1]
+    return {
+        "bymonth": f"{today.month}",
+        "byweekno": f"{current_week_number}",
+        "irregular": current_date_format1,
+        "publish_down": current_date_format1,
+        "until": current_date_format1
+    }
+
+
+def build_gov_payload(message, start_time_12hr, end_time_12hr, start_time_24hr, end_time_24hr, today=None):
+    date_str = message['date_id'].split('#')[0]
+    _, julian_date = calculate_week_and_julian(date_str)
+
+    year, month, day = date_str.split('-')
+    date_format1 = f"{month}/{day}/{year}"
+    date_format2 = f"{year}-{int(month)}-{int(day)}"
+
+    return {
+        **GOV_TEMPLATE,
+        **_gov_submission_date_fields(today or date.today()),
+        "bymonthday": f"{int(day)}",
+        "byyearday": f"{julian_date}",
+        "day": f"{int(day)}",
+        "end_12h": end_time_12hr,
+        "end_time": end_time_24hr,
+        "jevcontent": f"<p>{message['description']}<p>",
+        "month": f"{int(month)}",
+        "publish_down2": date_format2,
+        "publish_up": date_format1,
+        "publish_up2": date_format2,
+        "start_12h": start_time_12hr,
+        "start_time": start_time_24hr,
+        "title": message["title"],
+        "until2": date_format2,
+        "year": year
+    }
@@ -0,0 +1,282 @@
+"""
+The engine every poster function runs, with a site adapter (st_james.adapters) for each site it
+posts to: one site per function by default, every site in one function with context
+merge_posters (see StJamesCompute).
+
+For each SNS record and each of the function's sites on the event's post list, the engine
+    - parks the event if the site's breaker is open (st_james.circuit), or its login fails;
+      it logs in to a site once per invocation, the first time the site is needed
+    - waits for a slot in the site's rate limit, or defers the event (st_james.ratelimit)
+    - sets the site's status to posting through the status API, has the adapter build and
+      submit the payload, and sets the status to posted, with what was sent and the site's ID
+      for the event (st_james.fingerprint), or back to post, with the error if the post failed
+      (st_james.retries)
+and publishes one results digest, with counts per site (st_james.digest). A scheduled event
+flushes the digest's window, in window mode.
+
+    engine = poster.from_environment()      # SITES, STATUS_URL, STATUS_API_KEY_SECRET, TOPIC_ARN, ...
+    handler = engine.handler
+"""
+import json
+import os
+
+import requests
+
+from st_james import adapters, circuit, clients, digest, fingerprint, ratelimit, retries, tracing
+from st_james.metrics import Metrics
+
+
+class Site:
+    """One site a function posts to: its adapter, breaker and rate limit."""
+    def __init__(self, adapter, breaker, limiter):
+        self.name = adapter.site
+        self.adapter = adapter
+        self.breaker = breaker
+        self.limiter = limiter
+
+
+class Counts:
+    def __init__(self):
+        self.posted = self.failed = self.parked = self.deferred = 0
+
+    def __str__(self):
+        return (f"Posted {self.posted} events, failed to post {self.failed} events, parked {self.parked}, "
+                f"deferred {self.deferred}")
+
+
+class Poster:
+    def __init__(self, sites, status_url, results, metrics, status_api_key_secret=None):
+        self.sites = {site.name: site for site in sites}
+        self.status_url = status_url
+        # The status API takes the posters' API key (a secret's 'key'), read once per container
+        self.status_api_key_secret = status_api_key_secret
+        self.results = results
+        self.metrics = metrics
+        # Status API calls reuse their connections, within an invocation and across warm ones
+        self.status = requests.Session()
+        self.handler = metrics.handler(self.handle)
+
+    def handle(self, event, context):
+        # The schedule that publishes the digest's window when no posts come to do it
+        if event.get('detail-type') == 'Scheduled Event':
+            self.results.flush()
+            return {'statusCode': 200, 'body': json.dumps({'message': 'Flushed results digest'})}
+
+        counts = Counts()
+        # Per site, this invocation: logged in (True), or its work is to be parked (False)
+        ready = {}
+
+        try:
+            for record in event["Records"]:
+                # Retrieve info about event to post
+                item = json.loads(record["Sns"]["Message"])
+                print("Request:", json.dumps(item))
+
+                for name in item.get('post') or []:
+                    site = self.sites.get(name)
+                    if not site:
+                        continue
+                    # Continue the trace process_events started for this event
+                    with tracing.span(f"post_to_{name}", parent=tracing.sns_traceparent(record)):
+                        if name not in ready:
+                            ready[name] = self.start(site)
+                        if ready[name]:
+                            self.post(site, item, context, counts)
+                        else:
+                            # Posted when the breaker closes again
+                            site.breaker.park(item)
+                            counts.parked += 1
+
+            body = str(counts)
+            print(body)
+
+            return {
+                'statusCode': 200,
+                'body': json.dumps({ 'message': body })
+            }
+
+        except json.JSONDecodeError as e:
+            error_message = f"Error decoding JSON: {e}"
+            print(error_message)
+            self.record_all(error_message)
+            return {
+                'statusCode': 400,
+                'body': json.dumps({ 'error_message': 'Invalid JSON in event' })
+            }
+
+        except Exception as e:
+            error_message = f"Unexpected error: {e}"
+            print(error_message)
+            self.record_all(error_message)
+            return {
+                'statusCode': 500,
+                'body': json.dumps({ 'error_message': 'Internal error' })
+            }
+
+        finally:
+            # One results message per invocation (or per window) instead of one per event
+            with self.metrics.phase('sns_publish'):
+                self.results.publish()
+
+    def record(self, site, success, item, error_message=None):
+        self.results.record(success, item, error_message, website=site.name)
+
+    def record_all(self, error_message):
+        for site in self.sites.values():
+            self.record(site, False, None, error_message)
+
+    def start(self, site):
+        """Logs in to the site, unless its breaker is open; False: park its work."""
+        # The site keeps failing: don't call it, set the work aside (st_james.circuit)
+        if site.breaker.allow() == circuit.OPEN:
+            return False
+
+        with self.metrics.phase('login', site.name) as phase:
+            credentials = self.get_secret(site.adapter.secret_name, site.name) if site.adapter.secret_name else {}
+            success, error_message = site.adapter.login(credentials)
+            if not success:
+                phase.outcome = 'failure'
+        if not success:
+            print(error_message)
+            self.record(site, False, None, error_message)
+            site.breaker.failure(error_message)
+        return success
+
+    def post(self, site, item, context, counts):
+        # Wait for a slot in the site's rate limit, or leave the event for the next sweep
+        if not site.limiter.acquire(context):
+            site.limiter.defer(item)
+            counts.deferred += 1
+            return
+
+        # Set status to 'posting' to prevent duplicate posts
+        # Currrent status should be 'post' - returns False if it isn't
+        success, error_message = self.update_status(site, item, 'posting')
+        if not success:
+            counts.failed += 1
+            self.record(site, False, item, error_message)
+            return
+
+        success, error_message, external_id = self.post_to_website(site, item)
+        if success:
+            counts.posted += 1
+            print(f"Posted: { item['title'] }")
+
+            # Set status to 'posted'
+            self.update_status(site, item, 'posted', fingerprint.content_hash(site.name, item), external_id)
+            self.record(site, True, item)
+            site.breaker.success()
+
+        elif site.limiter.throttled:
+            # Turned away by the site's rate limit: not a failure, sent again by the next sweep
+            counts.deferred += 1
+            print(f"Deferred { item['title'] }: { error_message }")
+            self.update_status(site, item, 'post')
+
+        else:
+            counts.failed += 1
+            print(f"Failed to post { item['title'] }: { error_message }")
+
+            # Set status back to 'post', with the error: the sweep sends it again after a backoff, or
+            # it's given up on after a few attempts (st_james.retries). Not parked as well: the
+            # breaker parks only the work it keeps from the site
+            self.update_status(site, item, 'post', error=error_message)
+            self.record(site, False, item, error_message)
+            site.breaker.failure(error_message)
+
+    def post_to_website(self, site, item):
+        with self.metrics.phase('post', site.name) as phase:
+            try:
+                payload, error_message = site.adapter.build_payload(item)
+                if error_message:
+                    result = False, error_message, None
+                else:
+                    print(f"Payload: { payload }")
+                    if 'test' in item:
+                        print("Test mode - not posting")
+                        result = True, None, None
+                    else:
+                        result = site.adapter.submit(item, payload)
+            except Exception as e:
+                result = False, f"Error posting to website: {e}", None
+            if not result[0]:
+                phase.outcome = 'failure'
+        return result
+
+    def update_status(self, site, item, new_status, content_hash=None, external_id=None, error=None):
+        with self.metrics.phase('status_update', site.name) as phase:
+            success, error_message = self._update_status(site, item, new_status, content_hash, external_id, error)
+            if not success:
+                phase.outcome = 'failure'
+        return success, error_message
+
+    def _update_status(self, site, item, new_status, content_hash, external_id, error):
+        try:
+            print(f"Updating status of {item['title']} to {new_status}")
+            params = {
+                "sort-key": item["date_id"],
+                "new-status": new_status,
+                "website": site.name
+            }
+            if new_status == 'posting':
+                params["old-status"] = "post"
+
+            # What was sent, so an unchanged re-post can be skipped (st_james.fingerprint)
+            if content_hash:
+                params["content-hash"] = content_hash
+            if external_id:
+                params["external-id"] = str(external_id)
+            if error:
+                params["error"] = error[:retries.ERROR_LENGTH]
+
+            # Let process_status join the event's trace
+            traceparent = tracing.current_traceparent()
+            if traceparent:
+                params["traceparent"] = traceparent
+
+            if self.status_api_key_secret and 'x-api-key' not in self.status.headers:
+                self.status.headers['x-api-key'] = self.get_secret(self.status_api_key_secret)['key']
+
+            resp = self.status.post(self.status_url, params=params, timeout=10)
+
+            print(f"Status API responded: {resp.status_code} {resp.reason}")
+            print(f"Status API body: {resp.text}")
+
+            if resp.status_code == 200:
+                return True, None
+            else:
+                msg = f"Failed to update status: {resp.status_code} {resp.text}"
+                print(msg)
+                return False, msg
+
+        except Exception as e:
+            msg = f"Failed to update status: {e}"
+            print(msg)
+            return False, msg
+
+    def get_secret(self, secret_name, site=None):
+        with self.metrics.phase('secret', site):
+            response = clients.client('secretsmanager').get_secret_value(SecretId=secret_name)
+        return json.loads(response['SecretString'])
+
+
+def from_environment():
+    """The engine for a poster function, for the sites in SITES (comma-separated; see adapters.REGISTRY)."""
+    names = [name.strip() for name in os.environ['SITES'].split(',') if name.strip()]
+    environ = dict(os.environ)
+    sns = clients.client('sns')
+
+    sites = []
+    for name in names:
+        limiter = ratelimit.from_environment(name)
+        adapter = adapters.REGISTRY[name](environ, limiter)
+        sites.append(Site(adapter, circuit.from_environment(name), limiter))
+    results = digest.from_environment(','.join(names), sns)
+
+    # One site: metrics by site, as when each had its own function. Several: the function's own
+    # phases (SNS publish, the invocation) without one, each site's phases by site
+    if len(names) == 1:
+        metrics = Metrics(f"post_to_{names[0]}", site=names[0])
+    else:
+        metrics = Metrics('post_to_sites')
+    return Poster(sites, os.environ['STATUS_URL'], results, metrics, os.getenv('STATUS_API_KEY_SECRET'))
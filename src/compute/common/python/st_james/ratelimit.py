@@ -0,0 +1,162 @@
+"""
+An adaptive rate limit per site, learned from the site's answers and shared by every invocation
+of its poster through a state item in the events table (ratelimit#{site}).
+
+A site starts out unlimited. A 429 or 503 halves its rate (doubles interval_ms, the spacing
+between posts, to at least THROTTLE_FLOOR_MS) and, with a Retry-After, holds every post until
+then (blocked_until_ms); each post that goes through adds INCREASE_PER_S to the rate, until it's
+fast enough to count as unlimited again. Additive increase, multiplicative decrease, as TCP does.
+
+While a site is limited, each post reserves the next free slot (next_ms) with a conditional
+write, and waits for it, so concurrent invocations space their posts out between them. A post
+whose slot is more than MAX_WAIT_MS away (or past the time the invocation has left) isn't
+waited for: it's deferred, left on the post list and logged as a change (st_james.changes), for
+the scheduled sweep to send again. Neither a deferral nor a 429 counts as a failure.
+
+    limiter = ratelimit.from_environment(website)
+    if not limiter.acquire(context):
+        limiter.defer(item)
+    response = requests.post(...)
+    limiter.observe(response)        # then limiter.throttled: the site turned it away
+"""
+import email.utils
+import time
+
+from botocore.exceptions import ClientError
+from st_james import changes, clients
+from st_james.state import state_key
+
+LIMIT_PREFIX = 'ratelimit#'
+THROTTLED = (429, 503)
+
+THROTTLE_FLOOR_MS = 250        # the spacing after a first 429: at most 4 posts a second
+MAX_INTERVAL_MS = 60000
+INCREASE_PER_S = 0.25          # posts per second added by each post that goes through
+UNLIMITED_BELOW_MS = 50        # spacing this short is no limit at all
+MAX_WAIT_MS = 5000             # longest a post waits for its slot
+TIME_RESERVE_MS = 10000        # left for the post itself and the status updates
+MAX_ATTEMPTS = 5               # reservations lost to other invocations before deferring
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def retry_after_ms(value, now=None):
+    """A Retry-After header value (seconds, or an HTTP date) in milliseconds from now, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value) * 1000
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, int(when.timestamp() * 1000) - (now or now_ms()))
+
+
+class Limiter:
+    def __init__(self, table, site):
+        self.table = table
+        self.site = site
+        self.key = state_key(f"{LIMIT_PREFIX}{site}")
+        # As last read by acquire(), and what the last response said
+        self.interval = 0
+        self.throttled = False
+        self.wait_ms = 0
+
+    def _read(self):
+        item = self.table.get_item(Key=self.key, ConsistentRead=True).get('Item') or {}
+        return int(item.get('interval_ms', 0)), int(item.get('next_ms', 0)), int(item.get('blocked_until_ms', 0))
+
+    def acquire(self, context=None):
+        """Waits for the site's next free slot and takes it; False if it's too far off (defer the post)."""
+        self.throttled = False
+        budget = MAX_WAIT_MS
+        if context:
+            budget = min(budget, context.get_remaining_time_in_millis() - TIME_RESERVE_MS)
+
+        for _ in range(MAX_ATTEMPTS):
+            interval, next_ms, blocked_until = self._read()
+            self.interval = interval
+            now = now_ms()
+            slot = max(now, blocked_until)
+            if interval:
+                slot = max(slot, next_ms)
+            self.wait_ms = slot - now
+            if self.wait_ms > budget:
+                print(f"Rate limit for {self.site}: next slot in {self.wait_ms} ms")
+                return False
+            # Unlimited: nothing to reserve
+            if not interval:
+                break
+            try:
+                self.table.update_item(
+                    Key=self.key,
+                    UpdateExpression='SET next_ms = :next',
+                    ConditionExpression='attribute_not_exists(next_ms) OR next_ms = :seen',
+                    ExpressionAttributeValues={':next': slot + interval, ':seen': next_ms}
+                )
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Another invocation took that slot; look again
+        else:
+            print(f"Rate limit for {self.site}: no slot after {MAX_ATTEMPTS} attempts")
+            return False
+
+        if self.wait_ms > 0:
+            time.sleep(self.wait_ms / 1000)
+        return True
+
+    def observe(self, response):
+        """Learns from a response of the site's: slows down on a 429/503, speeds up on a success."""
+        self.throttled = response.status_code in THROTTLED
+        if self.throttled:
+            self.throttle(response.headers.get('Retry-After'))
+        elif response.status_code < 400:
+            self.speed_up()
+
+    def throttle(self, retry_after=None):
+        interval, _, _ = self._read()
+        interval = self.interval = min(MAX_INTERVAL_MS, max(THROTTLE_FLOOR_MS, interval * 2))
+        hold_ms = retry_after_ms(retry_after) or 0
+        self.table.update_item(
+            Key=self.key,
+            UpdateExpression='SET interval_ms = :interval, blocked_until_ms = :until, throttled_at = :now',
+            ExpressionAttributeValues={':interval': interval, ':until': now_ms() + hold_ms, ':now': int(time.time())}
+        )
+        print(f"Rate limited by {self.site}: {1000 / interval:.2f} posts/s from now, held {hold_ms} ms")
+
+    def speed_up(self):
+        # Unlimited when the slot was taken: nothing to speed up, and nothing to read
+        interval = self.interval
+        if not interval:
+            return
+        faster = int(1000 / (1000 / interval + INCREASE_PER_S))
+        if faster < UNLIMITED_BELOW_MS:
+            faster = 0
+        try:
+            self.table.update_item(
+                Key=self.key,
+                UpdateExpression='SET interval_ms = :interval',
+                # A 429 seen meanwhile wins
+                ConditionExpression='interval_ms = :seen',
+                ExpressionAttributeValues={':interval': faster, ':seen': interval}
+            )
+            self.interval = faster
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def defer(self, item):
+        """Leaves the event on the post list for the scheduled sweep to send again."""
+        changes.record(self.table, item.get('access', 'public'), item['date_id'])
+        print(f"Deferred {item['date_id']} for {self.site}")
+
+
+def from_environment(website):
+    """The Limiter for a poster, on the table in TABLE_NAME."""
+    return Limiter(clients.events_table(), website)
@@ -0,0 +1,37 @@
+"""
+How often a failed post is tried again, kept on the item next to the status lists:
+
+    item['attempts'] = {site: {'count': ..., 'retry_at': ..., 'error': ...}}
+
+A poster that fails to post sets the site back to post with the error; process_status counts the
+attempt and logs the change (st_james.changes) for retry_at, BASE_MS doubled for each attempt
+before it, so the scheduled sweep sends it again no sooner. After MAX_ATTEMPTS the site goes to
+the failed list instead and is left there: put it back on post (PUT /events, or src/tools/replay.py
+--status failed) to try again, which clears its attempts.
+"""
+ATTEMPTS = 'attempts'
+FAILED = 'failed'
+
+MAX_ATTEMPTS = 5
+BASE_MS = 60 * 1000
+MAX_DELAY_MS = 24 * 60 * 60 * 1000
+# Enough of the error to tell what went wrong
+ERROR_LENGTH = 500
+
+
+def attempts(item, site):
+    return (item.get(ATTEMPTS) or {}).get(site) or {}
+
+
+def next_attempt(item, site, error, now_ms):
+    """The site's attempts entry after another failure; its retry_at is None once it's given up on."""
+    count = int(attempts(item, site).get('count', 0)) + 1
+    entry = {'count': count, 'error': (error or '')[:ERROR_LENGTH]}
+    entry['retry_at'] = None if count >= MAX_ATTEMPTS else now_ms + min(BASE_MS * 2 ** (count - 1), MAX_DELAY_MS)
+    return entry
+
+
+def due(item, site, now_ms):
+    """False while the site's last failed post is backing off."""
+    retry_at = attempts(item, site).get('retry_at')
+    return retry_at is None or int(retry_at) <= now_ms
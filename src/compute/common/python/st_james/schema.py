@@ -0,0 +1,249 @@
+"""
+What the API accepts, in one place: JSON Schemas (draft 4, the version API Gateway models use)
+for the /events request bodies, their path parameters and the /status query string.
+
+StJamesApiResources turns the body schemas into the gateway's models, so a bad body is turned
+away before a function runs. The functions compile the schemas once, at import, and check what
+the gateway can't: path and query string values, and bodies in api_compression=lambda mode,
+which the gateway passes through as binary without validating them.
+
+    VALIDATE_BODY = schema.compile_schema(schema.EVENT_CREATE)
+    error = VALIDATE_BODY(body)      # None, or a message naming the first problem
+
+compile_schema() supports the keywords used here: type, enum, pattern, properties, required,
+additionalProperties (false), items, minItems, maxItems, uniqueItems and anyOf.
+"""
+import json
+import re
+
+from st_james.sites import SITES as SITE_CONFIG
+
+DRAFT4 = 'http://json-schema.org/draft-04/schema#'
+
+ACCESS = ['public', 'private']
+# Every site we post to, and the test poster
+SITES = sorted([*SITE_CONFIG, 'test'])
+# failed: given up on after retries.MAX_ATTEMPTS failed posts
+STATUS_KEYS = ['post', 'posting', 'posted', 'failed']
+
+DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}$'
+DATE_ID_PATTERN = r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$'
+
+_ACCESS = {'type': 'string', 'enum': ACCESS}
+_DATE_ID = {'type': 'string', 'pattern': DATE_ID_PATTERN, 'description': "'YYYY-MM-DD#GUID'"}
+_SITE_LIST = {'type': 'array', 'uniqueItems': True, 'items': {'type': 'string', 'enum': SITES}}
+
+# What PUT /events/{access}/{date_id} may change
+_EVENT_FIELDS = {
+    'title': {'type': 'string'},
+    'time': {'type': 'string'},
+    'description': {'type': 'string'},
+    **{key: _SITE_LIST for key in STATUS_KEYS}
+}
+
+# POST /events: either a date (we add the GUID) or a whole date_id
+EVENT_CREATE = {
+    '$schema': DRAFT4,
+    'title': 'EventCreate',
+    'type': 'object',
+    'additionalProperties': False,
+    'required': ['access', 'title'],
+    'properties': {
+        'access': _ACCESS,
+        'date': {'type': 'string', 'pattern': DATE_PATTERN, 'description': "'YYYY-MM-DD'"},
+        'date_id': _DATE_ID,
+        **_EVENT_FIELDS
+    },
+    'anyOf': [{'required': ['date']}, {'required': ['date_id']}]
+}
+
+EVENT_UPDATE = {
+    '$schema': DRAFT4,
+    'title': 'EventUpdate',
+    'type': 'object',
+    'additionalProperties': False,
+    'properties': _EVENT_FIELDS
+}
+
+# Path parameters of /events/{access} and /events/{access}/{date_id} (date_id unquoted)
+ACCESS_PATH = {'type': 'object', 'required': ['access'], 'properties': {'access': _ACCESS}}
+ITEM_PATH = {'type': 'object', 'required': ['access', 'date_id'], 'properties': {'access': _ACCESS, 'date_id': _DATE_ID}}
+
+# POST /events:batchGet: the keys of the events wanted, as many as a few BatchGetItem calls read
+MAX_BATCH_KEYS = 300
+EVENT_BATCH_GET = {
+    '$schema': DRAFT4,
+    'title': 'EventBatchGet',
+    'type': 'object',
+    'additionalProperties': False,
+    'required': ['keys'],
+    'properties': {
+        'keys': {
+            'type': 'array',
+            'minItems': 1,
+            'maxItems': MAX_BATCH_KEYS,
+            'items': {**ITEM_PATH, 'additionalProperties': False}
+        }
+    }
+}
+
+# POST /status query string
+STATUS_QUERY = {
+    'type': 'object',
+    'required': ['sort-key', 'new-status', 'website'],
+    'properties': {
+        'sort-key': _DATE_ID,
+        'new-status': {'type': 'string', 'enum': STATUS_KEYS},
+        'old-status': {'type': 'string', 'enum': STATUS_KEYS},
+        'website': {'type': 'string', 'enum': SITES},
+        'traceparent': {'type': 'string'},
+        # With 'posted': what was sent, and the site's ID for the event (st_james.fingerprint)
+        'content-hash': {'type': 'string', 'pattern': r'^[0-9a-f]{64}$'},
+        'external-id': {'type': 'string'},
+        # With 'post', from a poster whose post failed: counted towards giving up (st_james.retries)
+        'error': {'type': 'string'}
+    }
+}
+
+
+def overlapping_sites(payload):
+    """A site may be in only one of the status lists, which JSON Schema can't say."""
+    seen = set()
+    for key in STATUS_KEYS:
+        sites = set(payload.get(key) or [])
+        if sites & seen:
+            return "A value may not appear in more than one of post/posting/posted/failed."
+        seen |= sites
+    return None
+
+
+# Validation
+
+_TYPES = {
+    'string': lambda v: isinstance(v, str),
+    'array': lambda v: isinstance(v, list),
+    'object': lambda v: isinstance(v, dict),
+    'boolean': lambda v: isinstance(v, bool),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+
+def compile_schema(schema):
+    """A function of an instance returning None if the schema accepts it, else an error message."""
+    check = _compile(schema)
+
+    def validate(instance):
+        error = check(instance)
+        if error is None:
+            return None
+        path, message = error
+        name = ''.join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in path).lstrip('.')
+        return message.format(name or 'body')
+    return validate
+
+
+# A check returns None, or (path, message): the path to the bad value, as a list of property
+# names and indexes built up on the way out, and a message with {} where its name goes. The
+# names are only put together for a value that fails.
+
+def _compile(schema):
+    checks = []
+
+    if 'type' in schema:
+        is_type, kind = _TYPES[schema['type']], schema['type']
+        type_error = ([], f"{{}} must be of type {kind}")
+    else:
+        is_type = None
+
+    if 'enum' in schema:
+        allowed = list(schema['enum'])
+        enum_error = ([], f"{{}} must be one of {', '.join(repr(a) for a in allowed)}")
+        checks.append(lambda v: None if v in allowed else enum_error)
+
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+        pattern_error = ([], f"{{}} must match {schema.get('description', '/' + schema['pattern'] + '/')}")
+        checks.append(lambda v: None if not isinstance(v, str) or pattern.search(v) else pattern_error)
+
+    if 'required' in schema:
+        required = list(schema['required'])
+
+        def check_required(v):
+            if isinstance(v, dict):
+                missing = [name for name in required if name not in v]
+                if missing:
+                    return [], f"Missing required fields: {missing}"
+        checks.append(check_required)
+
+    properties = {name: _compile(sub) for name, sub in schema.get('properties', {}).items()}
+    if schema.get('additionalProperties') is False:
+        known = frozenset(properties)
+
+        def check_unknown(v):
+            if isinstance(v, dict) and not known.issuperset(v):
+                return [], f"Unknown fields: {sorted(set(v) - known)}"
+        checks.append(check_unknown)
+
+    if properties:
+        def check_properties(v):
+            if isinstance(v, dict):
+                for name, check in properties.items():
+                    if name in v:
+                        error = check(v[name])
+                        if error is not None:
+                            return [name, *error[0]], error[1]
+        checks.append(check_properties)
+
+    if 'items' in schema:
+        item_check = _compile(schema['items'])
+
+        def check_items(v):
+            if isinstance(v, list):
+                for idx, item in enumerate(v):
+                    error = item_check(item)
+                    if error is not None:
+                        return [idx, *error[0]], error[1]
+        checks.append(check_items)
+
+    if 'minItems' in schema or 'maxItems' in schema:
+        least, most = schema.get('minItems', 0), schema.get('maxItems')
+
+        def check_count(v):
+            if isinstance(v, list):
+                if len(v) < least:
+                    return [], f"{{}} needs at least {least} values"
+                if most is not None and len(v) > most:
+                    return [], f"{{}} may have at most {most} values"
+        checks.append(check_count)
+
+    if schema.get('uniqueItems'):
+        def check_unique(v):
+            if isinstance(v, list):
+                try:
+                    distinct = len(set(v))
+                except TypeError:  # objects or arrays
+                    distinct = len({json.dumps(item, sort_keys=True) for item in v})
+                if distinct != len(v):
+                    return [], "{} has duplicate values"
+        checks.append(check_unique)
+
+    if 'anyOf' in schema:
+        branches = [_compile(sub) for sub in schema['anyOf']]
+        if all(set(sub) == {'required'} for sub in schema['anyOf']):
+            alternatives = ' or '.join(repr(name) for sub in schema['anyOf'] for name in sub['required'])
+            any_error = ([], f"{{}} needs one of {alternatives}")
+        else:
+            any_error = ([], "{} doesn't match any of the allowed forms")
+        checks.append(lambda v: None if any(branch(v) is None for branch in branches) else any_error)
+
+    def check(value):
+        if is_type is not None and not is_type(value):
+            return type_error
+        for each in checks:
+            error = each(value)
+            if error is not None:
+                return error
+        return None
+    return check
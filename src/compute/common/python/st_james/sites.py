@@ -0,0 +1,60 @@
+# Static, per-site configuration used to build the payloads we post.
+# Anything that changes from event to event belongs in the item, not here.
+
+IMAGE_URL = "https://stjames-data-pm186.s3.amazonaws.com/SJL+logo.jpg"
+TIMEZONE = "America/New_York"
+SUBMITTER_NAME = "Phillip Martin"
+
+SITES = {
+    'moms': {
+        'place': "Church of St. James the Less",
+        'address': "10 Church Lane, Scarsdale, NY 10583, USA",
+        'location': {
+            "name": "10 Church Ln",
+            "place_id": "ChIJvX-hGnSTwokRK_iMMwfNni0",
+            "c_country": "United States",
+            "c_locality": "Scarsdale",
+            "c_postcode": "10583",
+            "c_region": "New York",
+            "c_street": "10 Church Lane",
+            "latitude": 40.9897687,
+            "longitude": -73.7999511
+        },
+        'image': {
+            "url": IMAGE_URL,
+            "name": "user-image: SJL logo",
+            "width": 485,
+            "height": 247,
+            "altText": ""
+        }
+    },
+    'patch': {
+        'patch_id': "37",
+        'event_type': "free",
+        'address': {
+            "country": "US",
+            "state": "NY",
+            "locality": "Scarsdale",
+            "postalCode": "10583",
+            "streetAddress": "10 Church Ln",
+            "premise": "",
+            "name": "The Church of St. James the Less"
+        },
+        'coordinates': [-73.8000084, 40.98955369999999],
+        'image_url': IMAGE_URL,
+        'image_filename': "SJL logo.jpg"
+    },
+    'sojourner': {
+        'place': "Church of St. James the Less",
+        'street': "10 Church Lane",
+        'city': "Scarsdale",
+        'state': "NY",
+        'ages': "All ages",
+        'category': "8"
+    },
+    'gov': {
+        'location': "Church of St. James the Less, 10 Church Lane, Scarsdale, NY",
+        'item_id': "117",
+        'category_ids': ["13"]
+    }
+}
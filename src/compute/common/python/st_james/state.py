@@ -0,0 +1,19 @@
+# Bookkeeping items (result digests and the like) live in the events table under their own
+# partition key, so they never show up in queries for 'public' or 'private' events.
+import time
+
+STATE_ACCESS = 'state'
+
+# The table's TTL attribute (st_james.archive). Bookkeeping that's done with (a finished job and
+# its checkpoints) is given one, so the table doesn't keep it for good
+EXPIRES_AT = 'expires_at'
+RETENTION_DAYS = 30
+
+
+def state_key(name):
+    return {'access': STATE_ACCESS, 'date_id': name}
+
+
+def expires_at(days=RETENTION_DAYS, now=None):
+    """Epoch seconds, `days` from now: when the table's TTL may delete a finished item."""
+    return int((now or time.time()) + days * 24 * 60 * 60)
@@ -0,0 +1,152 @@
+"""
+Lightweight distributed tracing for the posting pipeline.
+
+A trace ID is created when an event is inserted and stored on the item as trace_id. Each hop
+continues the trace: process_events publishes to the events topic with a W3C `traceparent`
+message attribute, the posters pass it on to the status API as a `traceparent` query string
+parameter, and process_status picks it up from there.
+
+Spans are opened with span(); the phases timed by st_james.metrics become child spans of
+whatever span is active. Finished spans are buffered and exported, in OTLP/JSON form, when
+the handler returns. TRACE_EXPORTER selects the exporter:
+
+    none    drop spans (the default)
+    stdout  print one OTLP/JSON document per invocation to the log
+    file    append one OTLP/JSON document per line to TRACE_EXPORT_FILE (used by tests)
+    otlp    POST to OTEL_EXPORTER_OTLP_ENDPOINT/v1/traces (any OpenTelemetry collector)
+"""
+import json
+import os
+import secrets
+import time
+import urllib.request
+
+from contextlib import contextmanager
+
+_active = []
+_finished = []
+
+
+class SpanContext:
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value):
+    """Returns the SpanContext in a W3C traceparent header value, or None if it isn't one."""
+    parts = (value or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+
+def sns_traceparent(record):
+    """Returns the traceparent message attribute of an SNS record delivered to a Lambda, if any."""
+    attributes = record.get('Sns', {}).get('MessageAttributes') or {}
+    return (attributes.get('traceparent') or {}).get('Value')
+
+
+def current():
+    return _active[-1] if _active else None
+
+
+def current_traceparent():
+    context = current()
+    return context.traceparent if context else None
+
+
+def _finish(name, context, parent_id, start_ns, end_ns, outcome, attributes):
+    _finished.append({
+        'traceId': context.trace_id,
+        'spanId': context.span_id,
+        'parentSpanId': parent_id or '',
+        'name': name,
+        'kind': 1,  # SPAN_KIND_INTERNAL
+        'startTimeUnixNano': str(start_ns),
+        'endTimeUnixNano': str(end_ns),
+        'attributes': [{'key': k, 'value': {'stringValue': str(v)}} for k, v in (attributes or {}).items()],
+        'status': {'code': 2 if outcome == 'error' else 1}  # STATUS_CODE_ERROR / STATUS_CODE_OK
+    })
+
+
+@contextmanager
+def span(name, parent=None, trace_id=None, attributes=None):
+    """
+    Opens a span and makes it the active one. `parent` is a traceparent string or SpanContext;
+    without one the span is a child of the active span, or the root of trace `trace_id`.
+    With no parent, active span or trace ID there is nothing to attach to, and it yields None.
+    """
+    if isinstance(parent, str):
+        parent = parse_traceparent(parent)
+    parent = parent or current()
+    if parent is None and trace_id is None:
+        yield None
+        return
+
+    context = SpanContext(parent.trace_id if parent else trace_id, new_span_id())
+    _active.append(context)
+    start_ns = time.time_ns()
+    outcome = 'ok'
+    try:
+        yield context
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        _active.remove(context)
+        _finish(name, context, parent.span_id if parent else None, start_ns, time.time_ns(), outcome, attributes)
+
+
+def record_span(name, start_ns, end_ns, outcome, attributes=None):
+    """Records an already-finished child of the active span; does nothing outside a trace."""
+    parent = current()
+    if parent is None:
+        return
+    context = SpanContext(parent.trace_id, new_span_id())
+    _finish(name, context, parent.span_id, start_ns, end_ns, outcome, attributes)
+
+
+def flush(service):
+    """Exports the spans finished so far, as one OTLP/JSON document. Never raises."""
+    global _finished
+    spans, _finished = _finished, []
+    exporter = os.getenv('TRACE_EXPORTER', 'none')
+    if not spans or exporter == 'none':
+        return
+
+    document = {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+            'scopeSpans': [{'scope': {'name': 'st_james'}, 'spans': spans}]
+        }]
+    }
+    try:
+        if exporter == 'stdout':
+            print(json.dumps(document))
+        elif exporter == 'file':
+            with open(os.environ['TRACE_EXPORT_FILE'], 'a') as f:
+                f.write(json.dumps(document) + '\n')
+        elif exporter == 'otlp':
+            endpoint = os.environ['OTEL_EXPORTER_OTLP_ENDPOINT'].rstrip('/') + '/v1/traces'
+            request = urllib.request.Request(
+                endpoint, data=json.dumps(document).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}, method='POST'
+            )
+            urllib.request.urlopen(request, timeout=2).close()
+        else:
+            print(f"Unknown TRACE_EXPORTER: {exporter}")
+    except Exception as e:
+        print(f"Failed to export spans: {e}")
@@ -0,0 +1,33 @@
+"""
+All the /events methods in one function: the merged layout (context merge_events_api=true).
+
+The function's code is src/compute itself, so each handler is imported from its own directory
+unchanged. They share one container, so one cold start warms every route, and they share the
+events table client (st_james.clients). Each still emits its own metrics under its own name.
+"""
+import json
+
+from events_batch_get import index as events_batch_get
+from events_create import index as events_create
+from events_delete import index as events_delete
+from events_get import index as events_get
+from events_list import index as events_list
+from events_update import index as events_update
+
+# (httpMethod, resource) from the API Gateway proxy event -> handler
+ROUTES = {
+    ('POST', '/events'): events_create.handler,
+    ('POST', '/events:batchGet'): events_batch_get.handler,
+    ('GET', '/events/{access}'): events_list.handler,
+    ('GET', '/events/{access}/{date_id}'): events_get.handler,
+    ('PUT', '/events/{access}/{date_id}'): events_update.handler,
+    ('DELETE', '/events/{access}/{date_id}'): events_delete.handler,
+}
+
+
+def handler(event, context):
+    route = ROUTES.get((event.get('httpMethod'), event.get('resource')))
+    if route is None:
+        print(f"No route for {event.get('httpMethod')} {event.get('resource')}")
+        return {"statusCode": 404, "body": json.dumps({"message": "Not found"})}
+    return route(event, context)
@@ -0,0 +1,81 @@
+import os, json, random, time
+from collections import deque
+from st_james import api, clients, schema
+from st_james.metrics import Metrics
+
+# POST /events:batchGet {"keys": [{"access": ..., "date_id": ...}, ...]}
+#   -> {"items": [...found, in the order asked for], "missing": [keys], "unprocessed": [keys]}
+# "unprocessed" keys couldn't be read (throttled) after MAX_ATTEMPTS calls; ask for them again
+
+TABLE = clients.events_table()
+DYNAMODB = clients.resource('dynamodb')
+metrics = Metrics('events_batch_get')
+VALIDATE_BODY = schema.compile_schema(schema.EVENT_BATCH_GET)
+COMPRESSION = os.getenv('RESPONSE_COMPRESSION') == 'lambda'
+
+CHUNK_SIZE = 100        # keys per BatchGetItem call, its limit
+MAX_ATTEMPTS = 5        # calls in a row that leave keys unprocessed before we give up
+BASE_DELAY_S = 0.05     # backoff before the nth retry: up to BASE_DELAY_S * 2**n, full jitter
+
+def bad(status, msg):
+    return {"statusCode": status, "body": json.dumps({"message": msg})}
+
+def ok(document, event):
+    return api.respond(200, document, event, compression=COMPRESSION)
+
+def key_of(item):
+    return (item['access'], item['date_id'])
+
+def batch_get(keys):
+    """
+    Reads keys in chunks of CHUNK_SIZE. Keys a call leaves unprocessed go to the front of the
+    next call, after a backoff. Returns (items, keys still unprocessed).
+    """
+    pending = deque(keys)
+    found = []
+    failures = 0
+    while pending:
+        chunk = [pending.popleft() for _ in range(min(CHUNK_SIZE, len(pending)))]
+        with metrics.phase('batch_get_item'):
+            response = DYNAMODB.batch_get_item(RequestItems={TABLE.name: {'Keys': chunk, 'ConsistentRead': True}})
+        found.extend(response.get('Responses', {}).get(TABLE.name, []))
+
+        left = response.get('UnprocessedKeys', {}).get(TABLE.name, {}).get('Keys', [])
+        if not left:
+            failures = 0
+            continue
+        failures += 1
+        if failures >= MAX_ATTEMPTS:
+            print(f"Giving up on {len(left) + len(pending)} keys after {failures} calls with unprocessed keys")
+            return found, left + list(pending)
+        print(f"{len(left)} of {len(chunk)} keys unprocessed, retrying (attempt {failures + 1})")
+        pending.extendleft(reversed(left))
+        time.sleep(random.uniform(0, BASE_DELAY_S * 2 ** failures))
+    return found, []
+
+@metrics.handler
+def handler(event, context):
+    try:
+        body = json.loads(api.request_body(event) or '{}')
+    except Exception:
+        return bad(400, "Invalid JSON body")
+
+    err = VALIDATE_BODY(body)
+    if err:
+        return bad(422, err)
+
+    # BatchGetItem rejects repeated keys; each is answered once
+    keys = list({key_of(k): {'access': k['access'], 'date_id': k['date_id']} for k in body['keys']}.values())
+
+    try:
+        found, unprocessed = batch_get(keys)
+    except Exception as e:
+        return bad(500, f"Batch get failed: {e}")
+
+    by_key = {key_of(item): item for item in found}
+    unread = {key_of(k) for k in unprocessed}
+    return ok({
+        "items": [by_key[key_of(k)] for k in keys if key_of(k) in by_key],
+        "missing": [k for k in keys if key_of(k) not in by_key and key_of(k) not in unread],
+        "unprocessed": unprocessed
+    }, event)
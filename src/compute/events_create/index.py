@@ -1,23 +1,13 @@
-import os, json, re, uuid
-import boto3
+import os, json, uuid
 from botocore.exceptions import ClientError
-from decimal import Decimal
+from st_james import api, archive, clients, event_times, schema, tracing
+from st_james.metrics import Metrics
 
-def jsonify(obj):
-    if isinstance(obj, list):
-        return [jsonify(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: jsonify(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
-TABLE = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-ACCESS_ENUM = {'public', 'private'}
-LIST_ENUM = {'moms', 'sojourner', 'patch', 'test'}
-
-DATE_RE    = re.compile(r'^\d{4}-\d{2}-\d{2}$')
-DATE_ID_RE = re.compile(r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$')
+TABLE = clients.events_table()
+metrics = Metrics('events_create')
+VALIDATE_BODY = schema.compile_schema(schema.EVENT_CREATE)
+# Past events expire from the table this many days after their date (0: never; see st_james.archive)
+EXPIRE_AFTER_DAYS = int(os.getenv('EXPIRE_AFTER_DAYS', '0'))
 
 def bad(status, msg):
     # include CORS for good measure (proxy integration will pass these through)
@@ -55,58 +45,47 @@ def ok_created(item, event):
     }
 from urllib.parse import quote
 
-def validate_lists(item):
-    buckets = {k: set(item.get(k, []) or []) for k in ('post','posting','posted')}
-    # allowed values
-    for k, vals in buckets.items():
-        if not vals.issubset(LIST_ENUM):
-            return f"{k} contains invalid values; allowed={sorted(LIST_ENUM)}"
-    # exclusivity across lists
-    if (buckets['post'] & buckets['posting']) or (buckets['post'] & buckets['posted']) or (buckets['posting'] & buckets['posted']):
-        return "A value may not appear in more than one of post/posting/posted."
-    return None
-
+@metrics.handler
 def handler(event, context):
     try:
-        body = json.loads(event.get('body') or '{}')
+        body = json.loads(api.request_body(event) or '{}')
     except Exception:
         return bad(400, "Invalid JSON body")
 
-    access = body.get('access')
-    if access not in ACCESS_ENUM:
-        return bad(422, "access must be 'public' or 'private'")
+    # The gateway checks the body against the same schema, unless it passes bodies through as binary
+    err = VALIDATE_BODY(body) or schema.overlapping_sites(body)
+    if err:
+        return bad(422, err)
 
-    date_id = body.get('date_id')
-    date    = body.get('date')
+    access = body['access']
 
     # Accept either date_id or date
-    if isinstance(date_id, str) and DATE_ID_RE.match(date_id):
-        pass  # already valid
-    elif isinstance(date, str) and DATE_RE.match(date):
-        date_id = f"{date}#{uuid.uuid4()}"
-    else:
-        return bad(422, "Provide either 'date_id' as 'YYYY-MM-DD#GUID' or 'date' as 'YYYY-MM-DD'.")
+    date_id = body.get('date_id') or f"{body['date']}#{uuid.uuid4()}"
 
     # Build item
     item = {
         'access': access,
         'date_id': date_id,
+        'trace_id': tracing.new_trace_id(),  # follows the event through posting
     }
-    for f in ('title','time','description','post','posting','posted'):
+    for f in ('title','time','description','post','posting','posted','failed'):
         if f in body:
             item[f] = body[f]
+    archive.set_expiry(item, EXPIRE_AFTER_DAYS)
 
-    # Validate lists
-    err = validate_lists(item)
-    if err:
-        return bad(422, err)
+    # Normalize the time once, here, so the posters don't have to parse it
+    try:
+        event_times.normalize(item)
+    except ValueError as e:
+        return bad(422, f"Invalid time: {e}")
 
     # Create with no-overwrite condition
     try:
-        TABLE.put_item(
-            Item=item,
-            ConditionExpression='attribute_not_exists(access) AND attribute_not_exists(date_id)'
-        )
+        with tracing.span('events_create', trace_id=item['trace_id']), metrics.phase('put_item'):
+            TABLE.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(access) AND attribute_not_exists(date_id)'
+            )
         return ok_created(item, event)
     except ClientError as e:
         if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
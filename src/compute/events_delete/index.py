@@ -1,11 +1,12 @@
-import os, json, re
-import boto3
+import json
 from botocore.exceptions import ClientError
 from urllib.parse import unquote
+from st_james import clients, schema
+from st_james.metrics import Metrics
 
-TABLE = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-ACCESS_ENUM = {'public', 'private'}
-DATE_ID_RE = re.compile(r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$')
+TABLE = clients.events_table()
+metrics = Metrics('events_delete')
+VALIDATE_PATH = schema.compile_schema(schema.ITEM_PATH)
 
 def normalize_path_ids(p):
     access = (p or {}).get('access')
@@ -19,19 +20,20 @@ def bad(status, msg):
 def ok():
     return {"statusCode": 204, "body": ""}
 
+@metrics.handler
 def handler(event, context):
     access, date_id = normalize_path_ids(event.get('pathParameters'))
 
-    if access not in ACCESS_ENUM:
-        return bad(422, "access must be 'public' or 'private'")
-    if not isinstance(date_id, str) or not DATE_ID_RE.match(date_id):
-        return bad(422, "date_id must match 'YYYY-MM-DD#GUID'")
+    err = VALIDATE_PATH({'access': access, 'date_id': date_id})
+    if err:
+        return bad(422, err)
 
     try:
-        TABLE.delete_item(
-            Key={'access': access, 'date_id': date_id},
-            ConditionExpression='attribute_exists(access) AND attribute_exists(date_id)'
-        )
+        with metrics.phase('delete_item'):
+            TABLE.delete_item(
+                Key={'access': access, 'date_id': date_id},
+                ConditionExpression='attribute_exists(access) AND attribute_exists(date_id)'
+            )
         return ok()
     except ClientError as e:
         code = e.response['Error']['Code']
@@ -1,11 +1,15 @@
-import os, json, re
-import boto3
-from decimal import Decimal
+import os, json
 from urllib.parse import unquote
+from st_james import api, archive, clients, schema
+from st_james.metrics import Metrics
 
-TABLE = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-ACCESS_ENUM = {'public', 'private'}
-DATE_ID_RE = re.compile(r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$')
+TABLE = clients.events_table()
+metrics = Metrics('events_get')
+VALIDATE_PATH = schema.compile_schema(schema.ITEM_PATH)
+COMPRESSION = os.getenv('RESPONSE_COMPRESSION') == 'lambda'
+# An event this many days past its date may have expired to the archive (st_james.archive)
+EXPIRE_AFTER_DAYS = int(os.getenv('EXPIRE_AFTER_DAYS', '0'))
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', archive.PREFIX)
 
 def normalize_path_ids(p):
     access = (p or {}).get('access')
@@ -13,34 +17,31 @@ def normalize_path_ids(p):
     date_id = unquote(date_id_raw)  # turns %23 back into '#'
     return access, date_id
 
-def jsonify(obj):
-    if isinstance(obj, list):
-        return [jsonify(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: jsonify(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
 def bad(status, msg):
     return {"statusCode": status, "body": json.dumps({"message": msg})}
 
-def ok(item):
-    return {"statusCode": 200, "body": json.dumps(jsonify(item))}
+def ok(item, event):
+    return api.respond(200, item, event, compression=COMPRESSION)
 
+@metrics.handler
 def handler(event, context):
     access, date_id = normalize_path_ids(event.get('pathParameters'))
 
-    if access not in ACCESS_ENUM:
-        return bad(422, "access must be 'public' or 'private'")
-    if not isinstance(date_id, str) or not DATE_ID_RE.match(date_id):
-        return bad(422, "date_id must match 'YYYY-MM-DD#GUID'")
+    err = VALIDATE_PATH({'access': access, 'date_id': date_id})
+    if err:
+        return bad(422, err)
 
     try:
-        resp = TABLE.get_item(Key={'access': access, 'date_id': date_id}, ConsistentRead=True)
+        with metrics.phase('get_item'):
+            resp = TABLE.get_item(Key={'access': access, 'date_id': date_id}, ConsistentRead=True)
         item = resp.get('Item')
+        if not item and archive.may_be_archived(date_id, EXPIRE_AFTER_DAYS):
+            with metrics.phase('archive_read'):
+                item = archive.find(clients.client('s3'), os.environ['BUCKET_NAME'], access, date_id, ARCHIVE_PREFIX)
+            if item:
+                item['archived'] = True
         if not item:
             return bad(404, "Not found")
-        return ok(item)
+        return ok(item, event)
     except Exception as e:
         return bad(500, f"Get failed: {e}")
@@ -1,46 +1,117 @@
-import os, json
-import boto3
+import os, json, re, time
 from boto3.dynamodb.conditions import Key
-from decimal import Decimal
+from botocore.exceptions import ClientError
+from st_james import api, archive, clients, schema, search
+from st_james.metrics import Metrics
 
-TABLE = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-ACCESS_ENUM = {'public', 'private'}
+TABLE = clients.events_table()
+metrics = Metrics('events_list')
+VALIDATE_PATH = schema.compile_schema(schema.ACCESS_PATH)
+
+# ?q= searches the index publish_calendar keeps in the data bucket; a container checks it for
+# changes (a conditional GET) at most this often
+SEARCH_PREFIX = os.getenv('SEARCH_PREFIX', search.PREFIX)
+SEARCH_REFRESH_SECONDS = 30
+DEFAULT_LIMIT, MAX_LIMIT = 20, 100
+_indexes = {}  # access -> (etag, checked at, SearchIndex)
+
+# ?archived=YYYY-MM lists a month of the events that expired from the table (st_james.archive)
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', archive.PREFIX)
+MONTH_RE = re.compile(r'^\d{4}-\d{2}$')
+
+# StJamesApi's api_compression=lambda: we compress, to what the client accepts
+COMPRESSION = os.getenv('RESPONSE_COMPRESSION') == 'lambda'
 
 def bad(status, msg):
     return {"statusCode": status, "body": json.dumps({"message": msg})}
 
-def jsonify(obj):
-    """Recursively convert Decimal -> int/float so json.dumps works."""
-    if isinstance(obj, list):
-        return [jsonify(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: jsonify(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        # keep integers as int, others as float
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
-def ok(items):
-    items = jsonify(items)
-    return {"statusCode": 200, "body": json.dumps({"items": items})}
+def ok(document, event):
+    # Decimals are converted as the document is encoded
+    return api.respond(200, document, event, compression=COMPRESSION)
+
+def load_index(access):
+    cached = _indexes.get(access)
+    now = time.monotonic()
+    if cached and now - cached[1] < SEARCH_REFRESH_SECONDS:
+        return cached[2]
+
+    try:
+        with metrics.phase('s3_get'):
+            response = clients.client('s3').get_object(
+                Bucket=os.environ['BUCKET_NAME'],
+                Key=search.index_key(access, SEARCH_PREFIX),
+                **({'IfNoneMatch': cached[0]} if cached else {})
+            )
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code == '304' and cached:
+            _indexes[access] = (cached[0], now, cached[2])
+            return cached[2]
+        if code in ('NoSuchKey', '404'):
+            # Nothing indexed yet
+            return search.SearchIndex()
+        raise
+
+    with metrics.phase('search_load'):
+        index = search.SearchIndex.from_gzip(response['Body'].read())
+    _indexes[access] = (response['ETag'], now, index)
+    return index
+
+def search_events(access, params, event):
+    try:
+        limit = min(max(int(params.get('limit') or DEFAULT_LIMIT), 1), MAX_LIMIT)
+    except ValueError:
+        return bad(422, "limit must be a number")
+
+    try:
+        index = load_index(access)
+        with metrics.phase('search'):
+            results = index.search(params['q'], limit)
+    except Exception as e:
+        return bad(500, f"Search failed: {e}")
+    return ok({
+        "q": params['q'],
+        "results": [{"date_id": date_id, "score": score} for date_id, score in results]
+    }, event)
 
+def archived_events(access, month, event):
+    if not MONTH_RE.match(month):
+        return bad(422, "archived must be a month, 'YYYY-MM'")
+    try:
+        with metrics.phase('archive_read'):
+            items = archive.read_month(clients.client('s3'), os.environ['BUCKET_NAME'], access, month, ARCHIVE_PREFIX)
+    except Exception as e:
+        return bad(500, f"Archive read failed: {e}")
+    return ok({"archived": month, "items": items}, event)
+
+@metrics.handler
 def handler(event, context):
     path_params = (event.get('pathParameters') or {})
     access = path_params.get('access')
-    if access not in ACCESS_ENUM:
-        return bad(422, "access must be 'public' or 'private'")
+    err = VALIDATE_PATH({'access': access})
+    if err:
+        return bad(422, err)
+
+    # GET /events/{access}?q=...: ranked date_ids from the search index, not a query
+    params = event.get('queryStringParameters') or {}
+    if params.get('q'):
+        return search_events(access, params, event)
+    if params.get('archived'):
+        return archived_events(access, params['archived'], event)
 
     try:
-        resp = TABLE.query(
-            KeyConditionExpression=Key('access').eq(access),
-            ScanIndexForward=False,  # newest first
-            Limit=100
-        )
+        with metrics.phase('query'):
+            resp = TABLE.query(
+                KeyConditionExpression=Key('access').eq(access),
+                ScanIndexForward=False,  # newest first
+                Limit=100
+            )
         items = resp.get('Items', [])
         # derive client-friendly "date" (won't error if missing)
         for it in items:
             did = it.get('date_id') or ''
             it['date'] = did.split('#')[0] if isinstance(did, str) else ''
-        return ok(items)
+        with metrics.phase('serialize'):
+            return ok({"items": items}, event)
     except Exception as e:
         return bad(500, f"Query failed: {e}")
@@ -1,13 +1,15 @@
-import os, json, re
-import boto3
+import os, json
 from botocore.exceptions import ClientError
-from decimal import Decimal
 from urllib.parse import unquote
+from st_james import api, archive, changes, clients, event_times, retries, schema
+from st_james.metrics import Metrics
 
-TABLE = boto3.resource('dynamodb').Table(os.environ['TABLE_NAME'])
-ACCESS_ENUM = {'public', 'private'}
-LIST_ENUM = {'moms','sojourner','patch','test'}
-DATE_ID_RE = re.compile(r'^\d{4}-\d{2}-\d{2}#[0-9a-fA-F-]{36}$')
+TABLE = clients.events_table()
+metrics = Metrics('events_update')
+VALIDATE_PATH = schema.compile_schema(schema.ITEM_PATH)
+VALIDATE_BODY = schema.compile_schema(schema.EVENT_UPDATE)
+EXPIRE_AFTER_DAYS = int(os.getenv('EXPIRE_AFTER_DAYS', '0'))
+COMPRESSION = os.getenv('RESPONSE_COMPRESSION') == 'lambda'
 
 def normalize_path_ids(p):
     access = (p or {}).get('access')
@@ -15,60 +17,34 @@ def normalize_path_ids(p):
     date_id = unquote(date_id_raw)  # turns %23 back into '#'
     return access, date_id
 
-def jsonify(obj):
-    if isinstance(obj, list):
-        return [jsonify(x) for x in obj]
-    if isinstance(obj, dict):
-        return {k: jsonify(v) for k, v in obj.items()}
-    if isinstance(obj, Decimal):
-        return int(obj) if obj % 1 == 0 else float(obj)
-    return obj
-
 def bad(status, msg):
     return {"statusCode": status, "body": json.dumps({"message": msg})}
 
-def ok(item):
-    return {"statusCode": 200, "body": json.dumps({"message": "Updated", "item": jsonify(item)})}
-
-def validate_lists(payload):
-    buckets = {k: set(payload.get(k, []) or []) for k in ('post','posting','posted')}
-    # Validate allowed
-    for k, vals in buckets.items():
-        if not vals.issubset(LIST_ENUM):
-            return f"{k} contains invalid values; allowed={sorted(LIST_ENUM)}"
-    # Cross-list exclusivity
-    if (buckets['post'] & buckets['posting']) or (buckets['post'] & buckets['posted']) or (buckets['posting'] & buckets['posted']):
-        return "A value may not appear in more than one of post/posting/posted."
-    return None
+def ok(item, event):
+    return api.respond(200, {"message": "Updated", "item": item}, event, compression=COMPRESSION)
 
+@metrics.handler
 def handler(event, context):
     access, date_id = normalize_path_ids(event.get('pathParameters'))
 
-    if access not in ACCESS_ENUM:
-        return bad(422, "access must be 'public' or 'private'")
-    if not isinstance(date_id, str) or not DATE_ID_RE.match(date_id):
-        return bad(422, "date_id must match 'YYYY-MM-DD#GUID'")
+    err = VALIDATE_PATH({'access': access, 'date_id': date_id})
+    if err:
+        return bad(422, err)
 
     try:
-        body = json.loads(event.get('body') or '{}')
+        body = json.loads(api.request_body(event) or '{}')
     except Exception:
         return bad(400, "Invalid JSON body")
 
-    # Only allow these fields to be updated
-    allowed_fields = {'title','time','description','post','posting','posted'}
-    unknown = set(body.keys()) - allowed_fields
-    if unknown:
-        return bad(422, f"Unknown fields: {sorted(unknown)}")
-
-    # Validate list constraints if any lists provided
-    if any(k in body for k in ('post','posting','posted')):
-        err = validate_lists(body)
-        if err:
-            return bad(422, err)
+    # Only title, time, description and the status lists may be updated
+    err = VALIDATE_BODY(body) or schema.overlapping_sites(body)
+    if err:
+        return bad(422, err)
 
     # Read existing to merge (we keep simple for clarity)
     try:
-        existing = TABLE.get_item(Key={'access': access, 'date_id': date_id}, ConsistentRead=True).get('Item')
+        with metrics.phase('get_item'):
+            existing = TABLE.get_item(Key={'access': access, 'date_id': date_id}, ConsistentRead=True).get('Item')
         if not existing:
             return bad(404, "Not found")
     except Exception as e:
@@ -78,13 +54,31 @@ def handler(event, context):
     new_item = dict(existing)
     for k, v in body.items():
         new_item[k] = v
+    # Sites put back on post by hand start their attempts again (st_james.retries)
+    if body.get('post') and new_item.get(retries.ATTEMPTS):
+        new_item[retries.ATTEMPTS] = {site: entry for site, entry in new_item[retries.ATTEMPTS].items() if site not in body['post']}
+    # Events from before expiry was turned on get theirs when they're next changed
+    if archive.ATTRIBUTE not in new_item:
+        archive.set_expiry(new_item, EXPIRE_AFTER_DAYS)
+
+    # Re-normalize the time if it changed, so the posters don't have to parse it
+    if 'time' in body:
+        try:
+            event_times.normalize(new_item)
+        except ValueError as e:
+            return bad(422, f"Invalid time: {e}")
 
     try:
-        TABLE.put_item(
-            Item=new_item,
-            ConditionExpression='attribute_exists(access) AND attribute_exists(date_id)'
-        )
-        return ok(new_item)
+        with metrics.phase('put_item'):
+            TABLE.put_item(
+                Item=new_item,
+                ConditionExpression='attribute_exists(access) AND attribute_exists(date_id)'
+            )
+        # Sites added to post are picked up by the next scheduled sweep
+        if access == 'public' and body.get('post'):
+            with metrics.phase('record_change'):
+                changes.record(TABLE, access, date_id)
+        return ok(new_item, event)
     except ClientError as e:
         code = e.response['Error']['Code']
         if code == 'ConditionalCheckFailedException':
@@ -0,0 +1,358 @@
+"""
+Full exports of the events table to the data bucket, as gzipped NDJSON in DynamoDB's own export
+format (one {"Item": {...}} per line, attribute values typed, as ImportTable reads them).
+
+    POST /exports                 starts an export: 202, {"job", "location"}; {"segments": N} optional
+    POST /exports {"job": id}     resumes one that failed, or stalled (not updated for STALLED_SECONDS)
+    GET  /exports/{job}           progress, per segment
+
+The export runs in the background, in invocations of this function by itself. Each invocation
+scans the table as a parallel scan of TotalSegments segments, one thread per segment. A segment
+is written as a series of parts, each a complete gzip member:
+
+    exports/{job}/data/segment-{n}-part-{m}.ndjson.gz
+    exports/{job}/manifest.json   (last: the parts, the item count)
+
+A worker keeps at most one part in memory, so memory doesn't grow with the table. After each
+part it checkpoints the segment (its scan position and part count) in the table's state
+partition. An invocation running out of time writes what it has, checkpoints, and hands on to
+the next one, which picks every segment up where it stopped.
+"""
+import json
+import os
+import time
+import uuid
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from st_james import api, clients
+from st_james.metrics import Metrics
+from st_james.state import EXPIRES_AT, STATE_ACCESS, expires_at, state_key
+
+metrics = Metrics('export_events')
+
+# The job, from the invocation's own thread only: boto3 resources aren't thread-safe
+TABLE = clients.events_table()
+# Low-level clients: thread-safe, so the segment workers scan and checkpoint with them; and the
+# scan returns items typed, as the export format wants
+DYNAMODB = clients.client('dynamodb')
+SERIALIZER = TypeSerializer()
+S3 = clients.client('s3')
+BUCKET = os.environ['BUCKET_NAME']
+EXPORT_PREFIX = os.getenv('EXPORT_PREFIX', 'exports/')
+
+JOB_PREFIX = 'export#'
+DEFAULT_SEGMENTS = 8
+MAX_SEGMENTS = 32
+PAGE_ITEMS = 1000              # items per Scan call
+PART_BYTES = 8 * 1024 * 1024   # compressed bytes before a part is written
+TIME_RESERVE_MS = 20000        # a page and a part upload, with room to spare
+# Every invocation updates the job when it starts, so one not updated for longer than an invocation
+# can run (15 minutes) has no invocation working on it
+STALLED_SECONDS = 20 * 60
+# A job that's completed or failed, and its checkpoints, expire after st_james.state.RETENTION_DAYS;
+# resuming a failed one takes the expiry off again
+FINAL_STATUSES = ('completed', 'failed')
+
+
+def respond(status, body, headers=None):
+    return {
+        'statusCode': status,
+        'headers': headers or {},
+        'body': json.dumps(body, default=str)
+    }
+
+
+@metrics.handler
+def handler(event, context):
+    # Called by itself, to run an export in the background
+    if 'export' in event:
+        print(f"Running export {event['export']}")
+        return run_export(event['export'], context)
+
+    # GET /exports/{job}
+    if event.get('httpMethod') == 'GET':
+        return get_export((event.get('pathParameters') or {}).get('job'))
+
+    # POST /exports (base64-encoded when the gateway passes bodies through as binary)
+    try:
+        body = json.loads(api.request_body(event) or '{}')
+    except (ValueError, UnicodeDecodeError):
+        return respond(400, {'message': 'Invalid JSON body'})
+    return start_export(event, body)
+
+
+# Jobs
+
+def job_key(job_id):
+    return state_key(JOB_PREFIX + job_id)
+
+
+def segment_key(job_id, segment):
+    return state_key(f"{JOB_PREFIX}{job_id}#segment#{segment:03d}")
+
+
+def start_export(event, body):
+    job_id = body.get('job')
+    if job_id:
+        with metrics.phase('get_job'):
+            job = TABLE.get_item(Key=job_key(job_id), ConsistentRead=True).get('Item')
+        if not job:
+            return respond(404, {'message': 'Export not found'})
+        if job['status'] == 'completed':
+            return respond(409, {'message': 'Export already completed'})
+        if job['status'] != 'failed' and int(job['updated_at']) > time.time() - STALLED_SECONDS:
+            return respond(409, {'message': f"Export is {job['status']}"})
+        # Two requests to resume it: only one starts it again
+        if not claim_job(job_id, job):
+            return respond(409, {'message': 'Export was resumed by another request'})
+        segments = int(job['segments'])
+    else:
+        segments = body.get('segments', DEFAULT_SEGMENTS)
+        if not isinstance(segments, int) or not 1 <= segments <= MAX_SEGMENTS:
+            return respond(422, {'message': f"segments must be a number from 1 to {MAX_SEGMENTS}"})
+        job_id = str(uuid.uuid4())
+        now = int(time.time())
+        with metrics.phase('put_job'):
+            TABLE.put_item(Item={
+                **job_key(job_id),
+                'status': 'queued',
+                'segments': segments,
+                'prefix': f"{EXPORT_PREFIX}{job_id}/",
+                'created_at': now,
+                'updated_at': now
+            })
+
+    invoke_export(job_id)
+
+    rc = event.get('requestContext') or {}
+    stage = rc.get('stage') or ''
+    location = f"https://{rc.get('domainName') or ''}{f'/{stage}' if stage else ''}/exports/{job_id}"
+    print(f"Started export {job_id} with {segments} segments")
+    return respond(202, {'job': job_id, 'status': 'queued', 'segments': segments, 'location': location},
+                   {'Location': location})
+
+
+@metrics.timed('invoke_export')
+def invoke_export(job_id):
+    clients.client('lambda').invoke(
+        FunctionName=os.environ['AWS_LAMBDA_FUNCTION_NAME'],
+        InvocationType='Event',
+        Payload=json.dumps({'export': job_id})
+    )
+
+
+def update_job(job_id, **fields):
+    if fields.get('status') in FINAL_STATUSES:
+        fields[EXPIRES_AT] = expires_at()
+    names = {f"#{name}": name for name in ('updated_at', *fields)}
+    values = {':updated_at': int(time.time()), **{f":{name}": value for name, value in fields.items()}}
+    with metrics.phase('update_job'):
+        TABLE.update_item(
+            Key=job_key(job_id),
+            UpdateExpression='SET ' + ', '.join(f"#{name} = :{name}" for name in ('updated_at', *fields)),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    if EXPIRES_AT in fields:
+        expire_segments(job_id, fields[EXPIRES_AT])
+
+
+def claim_job(job_id, job):
+    """Queues a failed or stalled job again, if it's still as read; False if someone else got there first."""
+    try:
+        with metrics.phase('claim_job'):
+            TABLE.update_item(
+                Key=job_key(job_id),
+                UpdateExpression='SET #status = :queued, #updated_at = :now REMOVE #expires_at',
+                ConditionExpression='#status = :status AND #updated_at = :updated_at',
+                ExpressionAttributeNames={'#status': 'status', '#updated_at': 'updated_at', '#expires_at': EXPIRES_AT},
+                ExpressionAttributeValues={':queued': 'queued', ':now': int(time.time()),
+                                           ':status': job['status'], ':updated_at': job['updated_at']}
+            )
+        expire_segments(job_id, None)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def expire_segments(job_id, expiry):
+    """Gives the job's checkpoints the job's expiry, or (None) takes it off them."""
+    for segment in segment_states(job_id):
+        with metrics.phase('expire_segment'):
+            TABLE.update_item(
+                Key=segment_key(job_id, segment),
+                UpdateExpression='SET #expires_at = :expires_at' if expiry else 'REMOVE #expires_at',
+                ExpressionAttributeNames={'#expires_at': EXPIRES_AT},
+                **({'ExpressionAttributeValues': {':expires_at': expiry}} if expiry else {})
+            )
+
+
+def segment_states(job_id):
+    """{segment: its checkpoint}"""
+    states = {}
+    kwargs = {'KeyConditionExpression': Key('access').eq(STATE_ACCESS) &
+              Key('date_id').begins_with(f"{JOB_PREFIX}{job_id}#segment#")}
+    while True:
+        with metrics.phase('query_segments'):
+            response = TABLE.query(ConsistentRead=True, **kwargs)
+        for item in response.get('Items', []):
+            states[int(item['segment'])] = item
+        if 'LastEvaluatedKey' not in response:
+            return states
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_export(job_id):
+    if not job_id:
+        return respond(400, {'message': 'job is required'})
+    with metrics.phase('get_job'):
+        job = TABLE.get_item(Key=job_key(job_id), ConsistentRead=True).get('Item')
+    if not job:
+        return respond(404, {'message': 'Export not found'})
+
+    states = segment_states(job_id)
+    segments = [{
+        'segment': n,
+        'items': int(states[n]['items']) if n in states else 0,
+        'parts': int(states[n]['parts']) if n in states else 0,
+        'done': bool(states[n]['done']) if n in states else False
+    } for n in range(int(job['segments']))]
+    summary = {k: v for k, v in job.items() if k not in ('access', 'date_id')}
+    return respond(200, {
+        'job': job_id, **summary,
+        'items': sum(s['items'] for s in segments),
+        'segments_done': sum(s['done'] for s in segments),
+        'segment_progress': segments
+    })
+
+
+# The export
+
+def part_key(prefix, segment, part):
+    return f"{prefix}data/segment-{segment:03d}-part-{part:05d}.ndjson.gz"
+
+
+def run_export(job_id, context):
+    try:
+        with metrics.phase('get_job'):
+            job = TABLE.get_item(Key=job_key(job_id), ConsistentRead=True).get('Item')
+        total, prefix = int(job['segments']), job['prefix']
+        update_job(job_id, status='running')
+
+        states = segment_states(job_id)
+        with ThreadPoolExecutor(max_workers=total) as executor:
+            finished = list(executor.map(
+                lambda segment: export_segment(job_id, prefix, segment, total, states.get(segment), context),
+                range(total)
+            ))
+
+        if not all(finished):
+            print(f"Export {job_id}: {finished.count(False)} segments continue in the next invocation")
+            invoke_export(job_id)
+            return {'job': job_id, 'status': 'running'}
+
+        items = write_manifest(job_id, prefix, segment_states(job_id))
+        update_job(job_id, status='completed', items=items)
+        print(f"Export {job_id} completed: {items} items")
+        return {'job': job_id, 'status': 'completed', 'items': items}
+
+    except Exception as e:
+        # The checkpoints stay: POST /exports {"job": ...} resumes from them
+        print(f"Export {job_id} failed: {e}")
+        update_job(job_id, status='failed', error=str(e)[:500])
+        return {'job': job_id, 'status': 'failed'}
+
+
+def export_segment(job_id, prefix, segment, total, state, context):
+    """Scans one segment from its checkpoint on. True when it's done, False if it ran out of time."""
+    state = state or {}
+    if state.get('done'):
+        return True
+    last_key = json.loads(state['last_key']) if state.get('last_key') else None
+    parts, items = int(state.get('parts', 0)), int(state.get('items', 0))
+
+    # The part being built: a gzip member (wbits 31), compressed as the items come in
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    chunks, size, pending = [], 0, 0
+
+    def checkpoint(done):
+        nonlocal compressor, chunks, size, pending, parts, items
+        if pending:
+            chunks.append(compressor.flush())
+            with metrics.phase('s3_put_part'):
+                S3.put_object(Bucket=BUCKET, Key=part_key(prefix, segment, parts), Body=b''.join(chunks),
+                              ContentType='application/gzip')
+            parts += 1
+            items += pending
+        checkpoint_item = {
+            **segment_key(job_id, segment),
+            'segment': segment,
+            'last_key': json.dumps(last_key) if last_key else '',
+            'parts': parts,
+            'items': items,
+            'done': done,
+            'updated_at': int(time.time())
+        }
+        with metrics.phase('put_checkpoint'):
+            DYNAMODB.put_item(TableName=TABLE.name,
+                              Item={name: SERIALIZER.serialize(value) for name, value in checkpoint_item.items()})
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        chunks, size, pending = [], 0, 0
+
+    while True:
+        kwargs = {'TableName': TABLE.name, 'Segment': segment, 'TotalSegments': total, 'Limit': PAGE_ITEMS}
+        if last_key:
+            kwargs['ExclusiveStartKey'] = last_key
+        with metrics.phase('scan'):
+            response = DYNAMODB.scan(**kwargs)
+
+        for item in response.get('Items', []):
+            # Events only: not the bookkeeping in the 'state' partition (this export's checkpoints among it)
+            if item['access']['S'] == STATE_ACCESS:
+                continue
+            data = compressor.compress(json.dumps({'Item': item}, separators=(',', ':')).encode('utf-8') + b'\n')
+            pending += 1
+            if data:
+                chunks.append(data)
+                size += len(data)
+        last_key = response.get('LastEvaluatedKey')
+
+        if not last_key:
+            checkpoint(done=True)
+            return True
+        # Out of time: keep what's been scanned for the next invocation
+        if context and context.get_remaining_time_in_millis() < TIME_RESERVE_MS:
+            checkpoint(done=False)
+            return False
+        # Parts end on page boundaries, so the checkpoint's scan position matches what's written
+        if size >= PART_BYTES:
+            checkpoint(done=False)
+
+
+def write_manifest(job_id, prefix, states):
+    segments = [{
+        'segment': n,
+        'items': int(state['items']),
+        'parts': [part_key(prefix, n, part) for part in range(int(state['parts']))]
+    } for n, state in sorted(states.items())]
+    items = sum(s['items'] for s in segments)
+    manifest = {
+        'job': job_id,
+        'table': TABLE.name,
+        'format': 'DYNAMODB_JSON',
+        'compression': 'GZIP',
+        'items': items,
+        'completed_at': int(time.time()),
+        'segments': segments
+    }
+    with metrics.phase('s3_put_manifest'):
+        S3.put_object(Bucket=BUCKET, Key=f"{prefix}manifest.json", Body=json.dumps(manifest, indent=1),
+                      ContentType='application/json')
+    return items
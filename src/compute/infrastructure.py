@@ -1,6 +1,8 @@
 import os
 
 from aws_cdk import (
+    aws_events as events,
+    aws_events_targets as targets,
     aws_iam as iam,
     aws_lambda as lambda_,
     aws_lambda_event_sources as lambda_event_sources,
@@ -11,6 +13,51 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+# The sites we post to: StJamesCompute makes their posters from this. settings reach the site's
+# adapter (st_james.adapters) as {SITE}_{NAME} environment variables; secret is the name (with
+# its suffix) of the Secrets Manager secret holding its credentials.
+SITE_REGISTRY = {
+    'patch': {
+        'settings': {
+            'LOGIN_URL': "https://pep.patchapi.io/api/authn/token",
+            'POST_URL': "https://api.patch.com/calendar/write-api/event",
+            # Changes to an event posted before (st_james.adapters.Patch)
+            'UPDATE_URL': "https://api.patch.com/calendar/write-api/event/{event_id}",
+            'SECRET_NAME': 'PatchCredentials'
+        },
+        'secret': 'PatchCredentials-T8SdBn'
+    },
+    'moms': {
+        'settings': {
+            'URL': "https://tockify.com/api/interim/submitEvent/94489701c7c811e5ba094b4c274892ab",
+            'SECRET_NAME': 'MomsCredentials'
+        },
+        'secret': 'MomsCredentials-7DRJB1'
+    },
+    'sojourner': {
+        'settings': {
+            'URL': "https://sojourner.helpspot.com/index.php?pg=request",
+            'SECRET_NAME': 'SojournerCredentials'
+        },
+        'secret': 'SojournerCredentials-vxNcsc'
+    },
+    # gov site was discontinued
+    'gov': {
+        'enabled': False,
+        'settings': {
+            'LOGIN_URL': 'https://events.westchestergov.com/event-calendar-sign-in',
+            'POST_URL': 'https://events.westchestergov.com/event-submission',
+            'SECRET_NAME': 'GovCredentials'
+        },
+        'secret': 'GovCredentials-GolrOX'
+    },
+    # Posts nowhere, for testing
+    'test': {
+        'settings': {},
+        'timeout_seconds': 10
+    }
+}
+
 
 class StJamesCompute(Construct):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
@@ -26,6 +73,26 @@ class StJamesCompute(Construct):
         initial_events = kwargs['initial_events']
         api = kwargs['api']
 
+        # Posting Lambdas publish one results digest per invocation; set a window (in seconds)
+        # to combine the results of several invocations into one digest, flushed on a schedule
+        digest_window_seconds = str(self.node.try_get_context('digest_window_seconds') or 0)
+
+        # Days after their date that past events expire from the table (0: never); see StJamesDatabase
+        expire_after_days = str(int(self.node.try_get_context('expire_after_days') or 0))
+
+        # Where the Lambda functions export trace spans (see st_james.tracing): none (the default,
+        # as in the module), stdout (the log), file (TRACE_EXPORT_FILE) or otlp (OTEL_EXPORTER_OTLP_ENDPOINT)
+        trace_exporter = self.node.try_get_context('trace_exporter') or 'none'
+
+        # Create a layer with the code shared by the Lambda functions (src/compute/common/python/st_james)
+        self.common_layer = lambda_.LayerVersion(
+            self, 'CommonLayer',
+            layer_version_name='StJames-common',
+            code=lambda_.Code.from_asset('src/compute/common'),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_9],
+            description='Code shared by the St. James Lambda functions'
+        )
+
        # Create a Lambda function to initialize the Events Table if it is empty
         self.initialize_events = lambda_.Function(
             self, 'InitializeEventsLambda',
@@ -33,6 +100,7 @@ class StJamesCompute(Construct):
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='index.handler',
             code=lambda_.Code.from_asset('src/compute/initialize_events'),
+            layers=[self.common_layer],
             environment={
                 'TABLE_NAME': events_table.table_name,
                 'BUCKET_NAME': data_bucket.bucket_name,
@@ -53,6 +121,7 @@ class StJamesCompute(Construct):
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='index.handler',
             code=lambda_.Code.from_asset('src/compute/process_events'),
+            layers=[self.common_layer],
             environment={
                 'TABLE_NAME': events_table.table_name,
                 'TOPIC_ARN': events_topic.topic_arn
@@ -65,206 +134,189 @@ class StJamesCompute(Construct):
                 events_table,
                 starting_position=lambda_.StartingPosition.LATEST,
                 filters=[
+                    # Only new events; skip bookkeeping items in the 'state' partition
                     lambda_.FilterCriteria.filter({
-                        "eventName": lambda_.FilterRule.is_equal("INSERT")
+                        "eventName": lambda_.FilterRule.is_equal("INSERT"),
+                        "dynamodb": {
+                            "Keys": {
+                                "access": {"S": lambda_.FilterRule.or_("public", "private")}
+                            }
+                        }
                     })
                 ]            
             )
         )
 
-        # Grant the Lambda function necessary permissions
-        events_table.grant_read_data(self.process_events)
+        # Grant the Lambda function necessary permissions (it writes job progress to the table)
+        events_table.grant_read_write_data(self.process_events)
         events_topic.grant_publish(self.process_events)
 
-        # Create a Lambda function to post to the patch site
-        self.post_to_patch = lambda_.Function(
-            self, 'PostToPatchLambda',
-            function_name='StJames-post-to-patch',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/post_to_patch'),
-            environment={
-                'STATUS_URL': api.events_api.url_for_path("/status"),
-                'LOGIN_URL': "https://pep.patchapi.io/api/authn/token",
-                'POST_URL': "https://api.patch.com/calendar/write-api/event",
-                'SECRET_NAME': 'PatchCredentials',
-                'REGION_NAME': aws_region,
-                'TOPIC_ARN': post_results_topic.topic_arn
-            },
-            timeout=Duration.seconds(30),
-        )
-
-        patch_secret_access_policy = iam.PolicyStatement(
-            actions=['secretsmanager:GetSecretValue'],
-            resources=['arn:aws:secretsmanager:' + aws_region + ':' + aws_account + ':secret:PatchCredentials-T8SdBn']
-        )
-        self.post_to_patch.add_to_role_policy(patch_secret_access_policy)
-
-        # Subscribe the post_to_patch Lambda to the events_topic
-        events_topic.add_subscription(
-            subscriptions.LambdaSubscription(
-                self.post_to_patch,
-                filter_policy_with_message_body={
-                    'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
-                        allowlist=['patch']
-                    ))
-                }            
+        # POST /post-events jobs run in the background, in invocations of this function by itself.
+        # The ARN is built from the name: referencing the function here would be a circular dependency
+        self.process_events.add_to_role_policy(iam.PolicyStatement(
+            actions=['lambda:InvokeFunction'],
+            resources=[f"arn:aws:lambda:{aws_region}:{aws_account}:function:StJames-process-events"]
+        ))
+
+        # Post what changed since the last run on a schedule (see run_scheduled_sweep); minutes
+        # between runs from context sweep_schedule_minutes, 0 for no schedule
+        sweep_schedule_minutes = self.node.try_get_context('sweep_schedule_minutes')
+        sweep_schedule_minutes = 15 if sweep_schedule_minutes is None else int(sweep_schedule_minutes)
+        if sweep_schedule_minutes > 0:
+            events.Rule(
+                self, 'ScheduledSweepRule',
+                rule_name='StJames-scheduled-sweep',
+                schedule=events.Schedule.rate(Duration.minutes(sweep_schedule_minutes)),
+                targets=[targets.LambdaFunction(self.process_events, retry_attempts=0)]
             )
-        )
 
-        # Grant the Lambda function necessary permissions
-        events_table.grant_read_write_data(self.post_to_patch)
-        post_results_topic.grant_publish(self.post_to_patch)
-
-        # Create a Lambda function to post to the moms site
-        self.post_to_moms = lambda_.Function(
-            self, 'PostToMomsLambda',
-            function_name='StJames-post-to-moms',
+        # Keep the public calendar as static monthly shards in the data bucket (st_james.calendar),
+        # rewritten from the stream when a month's public events change, and the search index
+        # of each partition (st_james.search)
+        self.publish_calendar = lambda_.Function(
+            self, 'PublishCalendarLambda',
+            function_name='StJames-publish-calendar',
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/post_to_moms'),
+            code=lambda_.Code.from_asset('src/compute/publish_calendar'),
+            layers=[self.common_layer],
             environment={
-                'STATUS_URL': api.events_api.url_for_path("/status"),
-                'SECRET_NAME': 'MomsCredentials',
-                'REGION_NAME': aws_region,
-                'URL': "https://tockify.com/api/interim/submitEvent/94489701c7c811e5ba094b4c274892ab",
-                'TOPIC_ARN': post_results_topic.topic_arn
+                'TABLE_NAME': events_table.table_name,
+                'BUCKET_NAME': data_bucket.bucket_name,
+                'CALENDAR_PREFIX': 'calendar/public/',
+                'SEARCH_PREFIX': 'search/',
+                'ARCHIVE_PREFIX': 'archive/'
             },
             timeout=Duration.seconds(30),
         )
 
-        moms_secret_access_policy = iam.PolicyStatement(
-            actions=['secretsmanager:GetSecretValue'],
-            resources=['arn:aws:secretsmanager:' + aws_region + ':' + aws_account + ':secret:MomsCredentials-7DRJB1']
-        )
-        self.post_to_moms.add_to_role_policy(moms_secret_access_policy)       
-
-        # Subscribe the post_to_moms Lambda to the events_topic
-        events_topic.add_subscription(
-            subscriptions.LambdaSubscription(
-                self.post_to_moms,
-                filter_policy_with_message_body={
-                    'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
-                        allowlist=['moms']
-                    ))
-                }            
+        self.publish_calendar.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                events_table,
+                starting_position=lambda_.StartingPosition.LATEST,
+                # Changes that come together (a bulk load, a burst of edits) rewrite each month once
+                batch_size=100,
+                max_batching_window=Duration.seconds(10),
+                retry_attempts=3,
+                filters=[
+                    lambda_.FilterCriteria.filter({
+                        "dynamodb": {
+                            "Keys": {
+                                "access": {"S": lambda_.FilterRule.or_("public", "private")}
+                            }
+                        }
+                    })
+                ]
             )
         )
 
-        # Grant the Lambda function necessary permissions
-        events_table.grant_read_write_data(self.post_to_moms)
-        post_results_topic.grant_publish(self.post_to_moms)
+        events_table.grant_read_data(self.publish_calendar)
+        data_bucket.grant_read_write(self.publish_calendar, 'calendar/public/*')
+        data_bucket.grant_delete(self.publish_calendar, 'calendar/public/*')
+        data_bucket.grant_read_write(self.publish_calendar, 'search/*')
+        data_bucket.grant_put(self.publish_calendar, 'archive/*')
+        # Listing the shards for the index
+        self.publish_calendar.add_to_role_policy(iam.PolicyStatement(
+            actions=['s3:ListBucket'],
+            resources=[data_bucket.bucket_arn]
+        ))
+
+        # On the first of the month, write every month's shard from this one on from the table
+        # (the stream starts at LATEST, so it brings only the months that change) and the index,
+        # so last month drops off it even when no shard changes
+        events.Rule(
+            self, 'CalendarIndexRule',
+            rule_name='StJames-calendar-index',
+            schedule=events.Schedule.cron(day='1', hour='0', minute='5'),
+            targets=[targets.LambdaFunction(self.publish_calendar, retry_attempts=2)]
+        )
 
-        # Create a Lambda function to post to the sojourner site
-        self.post_to_sojourner = lambda_.Function(
-            self, 'PostToSojournerLambda',
-            function_name='StJames-post-to-sojourner',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/post_to_sojourner'),
-            environment={
+        # Posters: a function per site in SITE_REGISTRY, or with context merge_posters=true one for
+        # them all (one cold start and one connection pool for every site), each subscribed to the
+        # events topic for its sites. They all run src/compute/post_to_site: the poster engine
+        # (st_james.poster) with the sites' adapters (st_james.adapters)
+        merge_posters = self.node.try_get_context('merge_posters') in (True, 'true')
+        sites = [site for site, config in SITE_REGISTRY.items() if config.get('enabled', True)]
+        groups = [('sites', sites)] if merge_posters else [(site, [site]) for site in sites]
+
+        # Posters stop calling a site after breaker_threshold failures in a row (0: never) and park
+        # its work for breaker_open_seconds before trying it again (st_james.circuit)
+        breaker_threshold = self.node.try_get_context('breaker_threshold')
+        breaker_open_seconds = self.node.try_get_context('breaker_open_seconds')
+
+        # Site -> the function that posts to it
+        self.posters = {}
+        for name, group in groups:
+            environment = {
+                'SITES': ','.join(group),
                 'STATUS_URL': api.events_api.url_for_path("/status"),
-                'URL': "https://sojourner.helpspot.com/index.php?pg=request",
-                'SECRET_NAME': 'SojournerCredentials',
+                'STATUS_API_KEY_SECRET': api.poster_key_secret.secret_name,
                 'REGION_NAME': aws_region,
-                'TOPIC_ARN': post_results_topic.topic_arn           
-            },
-            timeout=Duration.seconds(30),
-        )
+                'TOPIC_ARN': post_results_topic.topic_arn,
+                'TABLE_NAME': events_table.table_name,
+                'DIGEST_WINDOW_SECONDS': digest_window_seconds,
+                'BREAKER_THRESHOLD': str(5 if breaker_threshold is None else int(breaker_threshold)),
+                'BREAKER_OPEN_SECONDS': str(int(breaker_open_seconds or 300))
+            }
+            # Each adapter reads its settings as {SITE}_{NAME}, so they can share a function
+            for site in group:
+                for setting, value in SITE_REGISTRY[site]['settings'].items():
+                    environment[f"{site.upper()}_{setting}"] = value
+
+            poster = lambda_.Function(
+                self, f"PostTo{name.capitalize()}Lambda",
+                function_name=f"StJames-post-to-{name}",
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/post_to_site'),
+                layers=[self.common_layer],
+                environment=environment,
+                timeout=Duration.seconds(max(SITE_REGISTRY[site].get('timeout_seconds', 30) for site in group)),
+            )
 
-        sojourner_secret_access_policy = iam.PolicyStatement(
-            actions=['secretsmanager:GetSecretValue'],
-            resources=['arn:aws:secretsmanager:' + aws_region + ':' + aws_account + ':secret:SojournerCredentials-vxNcsc']
-        )
-        self.post_to_sojourner.add_to_role_policy(sojourner_secret_access_policy)
-
-        # Subscribe the post_to_sojourner Lambda to the events_topic
-        events_topic.add_subscription(
-            subscriptions.LambdaSubscription(
-                self.post_to_sojourner,
-                filter_policy_with_message_body={
-                    'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
-                        allowlist=['sojourner']
-                    ))
-                }            
+            secrets = [
+                f"arn:aws:secretsmanager:{aws_region}:{aws_account}:secret:{SITE_REGISTRY[site]['secret']}"
+                for site in group if 'secret' in SITE_REGISTRY[site]
+            ]
+            if secrets:
+                poster.add_to_role_policy(iam.PolicyStatement(
+                    actions=['secretsmanager:GetSecretValue'],
+                    resources=secrets
+                ))
+
+            # The events it gets: those to be posted to any of its sites
+            events_topic.add_subscription(
+                subscriptions.LambdaSubscription(
+                    poster,
+                    filter_policy_with_message_body={
+                        'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
+                            allowlist=group
+                        ))
+                    }
+                )
             )
-        )
 
-        # Grant the Lambda function necessary permissions
-        events_table.grant_read_write_data(self.post_to_sojourner)
-        post_results_topic.grant_publish(self.post_to_sojourner)
-
-        # gov site was discontinued
-
-        # Create a Lambda function to post to the gov site
-        # self.post_to_gov = lambda_.Function(
-        #     self, 'PostToGovLambda',
-        #     function_name='StJames-post-to-gov',
-        #     runtime=lambda_.Runtime.PYTHON_3_9,
-        #     handler='index.handler',
-        #     code=lambda_.Code.from_asset('src/compute/post_to_gov'),
-        #     environment={
-        #         'STATUS_URL': api.events_api.url_for_path("/status"),
-        #         'LOGIN_URL': 'https://events.westchestergov.com/event-calendar-sign-in', 
-        #         'POST_URL': 'https://events.westchestergov.com/event-submission',    
-        #         'SECRET_NAME': 'GovCredentials',
-        #         'TOPIC_ARN': post_results_topic.topic_arn
-        #     },
-        #     timeout=Duration.seconds(30),
-        # )
-
-        # gov_secret_access_policy = iam.PolicyStatement(
-        #     actions=['secretsmanager:GetSecretValue'],
-        #     resources=['arn:aws:secretsmanager:' + aws_region + ':' + aws_account + ':secret:GovCredentials-GolrOX']
-        # )
-        # self.post_to_gov.add_to_role_policy(gov_secret_access_policy)
-
-        # # Subscribe the post_to_gov Lambda to the events_topic
-        # events_topic.add_subscription(
-        #     subscriptions.LambdaSubscription(
-        #         self.post_to_gov,
-        #         filter_policy_with_message_body={
-        #             'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
-        #                 allowlist=['gov']
-        #             ))
-        #         }            
-        #     )
-        # )        
-
-        # # Grant the Lambda function necessary permissions
-        # events_table.grant_read_write_data(self.post_to_gov)
-        # post_results_topic.grant_publish(self.post_to_gov)
-
-        # Create a Lambda function for testing
-        self.post_to_test = lambda_.Function(
-            self, 'PostToTestLambda',
-            function_name='StJames-post-to-test',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/post_to_test'),
-            environment={
-                'TABLE_NAME': events_table.table_name,
-                'TOPIC_ARN': post_results_topic.topic_arn,
-                'STATUS_URL': api.events_api.url_for_path("/status")
-            },
-            timeout=Duration.seconds(10),
-        )
+            # The key for the status API
+            api.poster_key_secret.grant_read(poster)
 
-        # Subscribe the post_to_test Lambda to the events_topic
-        events_topic.add_subscription(
-            subscriptions.LambdaSubscription(
-                self.post_to_test,
-                filter_policy_with_message_body={
-                    'post': sns.FilterOrPolicy.filter(sns.SubscriptionFilter.string_filter(
-                        allowlist=['test']
-                    ))
-                }            
-            )
-        )        
+            # The table for the breakers, rate limits and parked and deferred work
+            events_table.grant_read_write_data(poster)
+            post_results_topic.grant_publish(poster)
 
-        # Grant the Lambda function necessary permissions
-        events_table.grant_read_write_data(self.post_to_test)
-        post_results_topic.grant_publish(self.post_to_test)  
+            # Publish the results digest's window even when no posts come in to do it
+            if int(digest_window_seconds) > 0:
+                events.Rule(
+                    self, f"FlushDigestTo{name.capitalize()}Rule",
+                    rule_name=f"StJames-flush-digest-{name}",
+                    schedule=events.Schedule.rate(Duration.minutes(max(1, int(digest_window_seconds) // 60))),
+                    targets=[targets.LambdaFunction(poster, retry_attempts=0)]
+                )
+
+            for site in group:
+                self.posters[site] = poster
+
+        # The posting sweep plans batches only for the sites that have a poster
+        self.process_events.add_environment('POSTER_SITES', ','.join(sites))
 
         # Create a Lambda function to update the status of an event
         self.process_status = lambda_.Function(
@@ -273,6 +325,7 @@ class StJamesCompute(Construct):
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='index.handler',
             code=lambda_.Code.from_asset('src/compute/process_status'),
+            layers=[self.common_layer],
             environment={
                 'TABLE_NAME': events_table.table_name,
             },
@@ -287,74 +340,174 @@ class StJamesCompute(Construct):
         # NEW: /events Lambda functions
         # ------------------------------
 
-        # POST /events  -> create
-        self.events_create = lambda_.Function(
-            self, 'EventsCreateLambda',
-            function_name='StJames-events-create',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/events_create'),
-            environment={
-                'TABLE_NAME': events_table.table_name,
-            },
-            timeout=Duration.seconds(15),
-        )
-        events_table.grant_read_write_data(self.events_create)
-
-        # GET /events/{access}  -> list by partition key
-        self.events_list = lambda_.Function(
-            self, 'EventsListLambda',
-            function_name='StJames-events-list',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/events_list'),
-            environment={
-                'TABLE_NAME': events_table.table_name,
-            },
-            timeout=Duration.seconds(15),
-        )
-        events_table.grant_read_data(self.events_list)
-
-        # GET /events/{access}/{date_id} -> get item
-        self.events_get = lambda_.Function(
-            self, 'EventsGetLambda',
-            function_name='StJames-events-get',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/events_get'),
-            environment={
-                'TABLE_NAME': events_table.table_name,
-            },
-            timeout=Duration.seconds(10),
-        )
-        events_table.grant_read_data(self.events_get)
-
-        # PUT /events/{access}/{date_id} -> update item
-        self.events_update = lambda_.Function(
-            self, 'EventsUpdateLambda',
-            function_name='StJames-events-update',
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/events_update'),
-            environment={
-                'TABLE_NAME': events_table.table_name,
-            },
-            timeout=Duration.seconds(20),
-        )
-        events_table.grant_read_write_data(self.events_update)
+        # Set context merge_events_api=true to serve all the /events methods from one function
+        # (fewer cold starts under light, spiky traffic); by default each has its own
+        merge_events_api = self.node.try_get_context('merge_events_api') in (True, 'true')
+
+        if merge_events_api:
+            # All of /events -> one function routing on method and resource (src/compute/events_api)
+            self.events_api = lambda_.Function(
+                self, 'EventsApiLambda',
+                function_name='StJames-events-api',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='events_api/index.handler',
+                code=lambda_.Code.from_asset('src/compute', exclude=[
+                    'infrastructure.py', '__pycache__', 'common', 'export_*', 'initialize_events', 'post_to_*', 'process_*',
+                    'publish_*'
+                ]),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                    'BUCKET_NAME': data_bucket.bucket_name,
+                    'SEARCH_PREFIX': 'search/',
+                    'ARCHIVE_PREFIX': 'archive/'
+                },
+                timeout=Duration.seconds(20),
+            )
+            events_table.grant_read_write_data(self.events_api)
+            data_bucket.grant_read(self.events_api, 'search/*')
+            data_bucket.grant_read(self.events_api, 'archive/*')
+
+            self.events_create = self.events_list = self.events_get = self.events_api
+            self.events_update = self.events_delete = self.events_batch_get = self.events_api
+
+        else:
+            # POST /events  -> create
+            self.events_create = lambda_.Function(
+                self, 'EventsCreateLambda',
+                function_name='StJames-events-create',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_create'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                },
+                timeout=Duration.seconds(15),
+            )
+            events_table.grant_read_write_data(self.events_create)
+
+            # GET /events/{access}  -> list by partition key, or search (?q=)
+            self.events_list = lambda_.Function(
+                self, 'EventsListLambda',
+                function_name='StJames-events-list',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_list'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                    'BUCKET_NAME': data_bucket.bucket_name,
+                    'SEARCH_PREFIX': 'search/',
+                    'ARCHIVE_PREFIX': 'archive/'
+                },
+                timeout=Duration.seconds(15),
+            )
+            events_table.grant_read_data(self.events_list)
+            data_bucket.grant_read(self.events_list, 'search/*')
+            data_bucket.grant_read(self.events_list, 'archive/*')
+
+            # GET /events/{access}/{date_id} -> get item
+            self.events_get = lambda_.Function(
+                self, 'EventsGetLambda',
+                function_name='StJames-events-get',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_get'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                    'BUCKET_NAME': data_bucket.bucket_name,
+                    'ARCHIVE_PREFIX': 'archive/'
+                },
+                timeout=Duration.seconds(10),
+            )
+            events_table.grant_read_data(self.events_get)
+            data_bucket.grant_read(self.events_get, 'archive/*')
+
+            # PUT /events/{access}/{date_id} -> update item
+            self.events_update = lambda_.Function(
+                self, 'EventsUpdateLambda',
+                function_name='StJames-events-update',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_update'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                },
+                timeout=Duration.seconds(20),
+            )
+            events_table.grant_read_write_data(self.events_update)
+
+            # DELETE /events/{access}/{date_id} -> delete item
+            self.events_delete = lambda_.Function(
+                self, 'EventsDeleteLambda',
+                function_name='StJames-events-delete',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_delete'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                },
+                timeout=Duration.seconds(10),
+            )
+            events_table.grant_read_write_data(self.events_delete)
+
+            # POST /events:batchGet -> many items in one request (BatchGetItem)
+            self.events_batch_get = lambda_.Function(
+                self, 'EventsBatchGetLambda',
+                function_name='StJames-events-batch-get',
+                runtime=lambda_.Runtime.PYTHON_3_9,
+                handler='index.handler',
+                code=lambda_.Code.from_asset('src/compute/events_batch_get'),
+                layers=[self.common_layer],
+                environment={
+                    'TABLE_NAME': events_table.table_name,
+                },
+                timeout=Duration.seconds(15),
+            )
+            events_table.grant_read_data(self.events_batch_get)
 
-        # DELETE /events/{access}/{date_id} -> delete item
-        self.events_delete = lambda_.Function(
-            self, 'EventsDeleteLambda',
-            function_name='StJames-events-delete',
+        # POST /exports, GET /exports/{job}: the whole table to the data bucket as gzipped NDJSON,
+        # by a parallel scan in the background (src/compute/export_events)
+        self.export_events = lambda_.Function(
+            self, 'ExportEventsLambda',
+            function_name='StJames-export-events',
             runtime=lambda_.Runtime.PYTHON_3_9,
             handler='index.handler',
-            code=lambda_.Code.from_asset('src/compute/events_delete'),
+            code=lambda_.Code.from_asset('src/compute/export_events'),
+            layers=[self.common_layer],
             environment={
                 'TABLE_NAME': events_table.table_name,
+                'BUCKET_NAME': data_bucket.bucket_name,
+                'EXPORT_PREFIX': 'exports/'
             },
-            timeout=Duration.seconds(10),
+            memory_size=1024,
+            timeout=Duration.minutes(15),
         )
-        events_table.grant_read_write_data(self.events_delete)
-
-        
\ No newline at end of file
+        # The table: the scan, and the job and its segment checkpoints in the 'state' partition
+        events_table.grant_read_write_data(self.export_events)
+        data_bucket.grant_put(self.export_events, 'exports/*')
+        # It runs on in invocations of itself; the ARN is built from the name, as for process_events
+        self.export_events.add_to_role_policy(iam.PolicyStatement(
+            actions=['lambda:InvokeFunction'],
+            resources=[f"arn:aws:lambda:{aws_region}:{aws_account}:function:StJames-export-events"]
+        ))
+
+        # The functions that write events give them their expiry; events_get looks for expired
+        # ones in the archive
+        if expire_after_days != '0':
+            for function in {self.initialize_events, self.events_create, self.events_update, self.events_get}:
+                function.add_environment('EXPIRE_AFTER_DAYS', expire_after_days)
+
+        # The /events functions compress their own responses (see StJamesApi)
+        if api.compression == 'lambda':
+            for function in {self.events_list, self.events_get, self.events_update, self.events_batch_get}:
+                function.add_environment('RESPONSE_COMPRESSION', 'lambda')
+
+        # Every function exports its trace spans the same way
+        for child in self.node.children:
+            if isinstance(child, lambda_.Function):
+                child.add_environment('TRACE_EXPORTER', trace_exporter)
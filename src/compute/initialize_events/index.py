@@ -3,13 +3,21 @@ import boto3
 import os
 import uuid
 
+from st_james import archive, event_times, tracing
+from st_james.metrics import Metrics
+
+metrics = Metrics('initialize_events')
+EXPIRE_AFTER_DAYS = int(os.getenv('EXPIRE_AFTER_DAYS', '0'))
+
 def is_table_empty(table):
-    response = table.scan(
-        Select='COUNT',
-        Limit=1
-    )
+    with metrics.phase('scan'):
+        response = table.scan(
+            Select='COUNT',
+            Limit=1
+        )
     return response['Count'] == 0
 
+@metrics.handler
 def handler(event, context):
     dynamodb = boto3.resource('dynamodb')
     s3 = boto3.client('s3')
@@ -22,8 +30,9 @@ def handler(event, context):
     if is_table_empty(table):
         print(f"Table is empty. Fetching data from S3 bucket {bucket_name}, file {file_key}")
         try:
-            response = s3.get_object(Bucket=bucket_name, Key=file_key)
-            calendar_data = json.loads(response['Body'].read().decode('utf-8'))
+            with metrics.phase('s3_get'):
+                response = s3.get_object(Bucket=bucket_name, Key=file_key)
+                calendar_data = json.loads(response['Body'].read().decode('utf-8'))
             print(f"Successfully fetched data from S3. Number of items: {len(calendar_data)}")
         except Exception as e:
             print(f"Error fetching data from S3: {str(e)}")
@@ -34,16 +43,28 @@ def handler(event, context):
 
         print("Inserting data into DynamoDB table")
         try:
-            with table.batch_writer() as batch:
-                for index, item in enumerate(calendar_data):
+            inserted = 0
+            with metrics.phase('batch_write'), table.batch_writer() as batch:
+                for item in calendar_data:
                     item['date_id'] = f"{item['date']}#{str(uuid.uuid4())}"
+                    item['trace_id'] = tracing.new_trace_id()
                     del item['date']
+                    archive.set_expiry(item, EXPIRE_AFTER_DAYS)
                     if item.get('access') == 'public':
                         item['post'] = ['gov', 'moms', 'sojourner', 'patch']
+
+                    # Normalize the time once, here, so the posters don't have to parse it
+                    try:
+                        event_times.normalize(item)
+                    except ValueError as e:
+                        print(f"Skipping {item.get('title')}: invalid time: {e}")
+                        continue
+
                     batch.put_item(Item=item)
-                    if (index + 1) % 100 == 0:
-                        print(f"Inserted {index + 1} items")
-            print(f"Successfully inserted {len(calendar_data)} items into DynamoDB")
+                    inserted += 1
+                    if inserted % 100 == 0:
+                        print(f"Inserted {inserted} items")
+            print(f"Successfully inserted {inserted} of {len(calendar_data)} items into DynamoDB")
         except Exception as e:
             print(f"Error inserting data into DynamoDB: {str(e)}")
             return {
@@ -0,0 +1,9 @@
+"""
+Posts events to the sites in SITES: the poster engine (st_james.poster) with each site's adapter
+(st_james.adapters). StJamesCompute deploys this code as a function per site in its registry, or
+as one function for all of them (context merge_posters=true).
+"""
+from st_james import poster
+
+engine = poster.from_environment()
+handler = engine.handler
@@ -1,12 +1,42 @@
 import boto3
 import datetime
 import json
-import os, time, random
+import os, time, random, uuid
 
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
+from decimal import Decimal
+from st_james import changes, circuit, clients, fingerprint, retries, schema, tracing
+from st_james.metrics import Metrics
+from st_james.state import EXPIRES_AT, expires_at, state_key
 
+metrics = Metrics('process_events')
 
+TABLE = clients.events_table()
+
+# POST /post-events starts a job that runs in the background; GET /post-events/{job} reports on it.
+# A job that's finished can still be read for st_james.state.RETENTION_DAYS, then expires
+JOB_PREFIX = 'job#'
+FINAL_STATUSES = ('completed', 'failed')
+
+# When a job has less time than this left, it hands the rest of the sweep to a new invocation
+TIME_RESERVE_MS = 5000
+
+# The scheduled sweep posts what changed since the last run: the change log (st_james.changes)
+# up to its watermark has been handled. Changes from the last few seconds are left for the next
+# run, so a write that's logged late doesn't land behind the watermark.
+WATERMARK = 'watermark#scheduled-sweep'
+SETTLE_MS = 5000
+
+# The posting sweep state machine (src/orchestration) plans a page of items at a time and has
+# this function post them in batches of one site's items; a batch must finish well inside the
+# timeout, with the delay between items. A page's plan (its date_ids, once per site) is passed
+# inline between states, which Step Functions limits to 256 KB
+SWEEP_PAGE_SIZE = 100
+SWEEP_BATCH_SIZE = 10
+
+
+@metrics.timed('delay')
 def inter_item_delay():
     """
     Sleep a small amount between items to reduce write contention.
@@ -20,17 +50,43 @@ def inter_item_delay():
     time.sleep(sleep_ms / 1000.0)
 
 
+def decimal_default(obj):
+    # Items read from the table carry numbers (e.g. start_epoch_ms) as Decimal
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+@metrics.handler
 def handler(event, context):
+    # Called by the posting sweep state machine: errors are raised, for it to retry
+    if 'sweep' in event:
+        return run_sweep_step(event)
+
     try:
         # Called by DynamoDB stream
         if 'Records' in event:
             print("Processing DynamoDB stream")
             process_dynamodb_stream(event)
 
-        # Called by API Gateway
+        # Called by the EventBridge schedule
+        elif event.get('detail-type') == 'Scheduled Event':
+            print("Running scheduled sweep")
+            run_scheduled_sweep(context)
+
+        # Called by itself, to run a job in the background
+        elif 'job' in event:
+            print(f"Running job {event['job']}")
+            run_job(event['job'], event.get('start_after'), context)
+
+        # GET /post-events/{job}
+        elif event.get('httpMethod') == 'GET':
+            return get_job((event.get('pathParameters') or {}).get('job'))
+
+        # POST /post-events
         else:
             print("Processing API call")
-            process_api_call(event)
+            return start_job(event)
     
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON: {e}")
@@ -70,6 +126,10 @@ def process_dynamodb_stream(event):
     for record in event['Records']:
         if record['eventName'] == 'INSERT':
             item = convert_dynamodb_item(record['dynamodb']['NewImage'])
+
+            # Private events have nothing to post; don't let them abort the rest of the batch
+            if not item.get('post'):
+                continue
             print(f"Processing: {item['title']}: post={item['post']}")
 
             if post_to_sns(item):
@@ -96,41 +156,363 @@ def convert_dynamodb_item(item):
     return {k: convert_value(v) for k, v in item.items()}
 
 
-def process_api_call(event):
+def respond(status, body, headers=None):
+    return {
+        'statusCode': status,
+        'headers': headers or {},
+        'body': json.dumps(body, default=decimal_default)
+    }
+
+
+def create_job(job_id, status):
+    now = int(time.time())
     try:
-        dynamodb = boto3.resource('dynamodb')
-        table = dynamodb.Table(os.environ['TABLE_NAME'])
+        with metrics.phase('put_job'):
+            TABLE.put_item(
+                Item={
+                    **state_key(JOB_PREFIX + job_id),
+                    'status': status,
+                    'queued': 0,
+                    'published': 0,
+                    'failed': 0,
+                    'created_at': now,
+                    'updated_at': now
+                },
+                # A retried step mustn't reset the counts
+                ConditionExpression='attribute_not_exists(date_id)'
+            )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def start_job(event):
+    job_id = str(uuid.uuid4())
+    create_job(job_id, 'queued')
+    invoke_job(job_id)
+
+    # Absolute URL of the job: https://{domain}/{stage}/post-events/{job}
+    rc = event.get('requestContext') or {}
+    stage = rc.get('stage') or ''
+    location = f"https://{rc.get('domainName') or ''}{f'/{stage}' if stage else ''}/post-events/{job_id}"
+
+    print(f"Started job {job_id}")
+    return respond(202, {'job': job_id, 'status': 'queued', 'location': location}, {'Location': location})
+
 
-        today = datetime.date.today().isoformat()
+@metrics.timed('invoke_job')
+def invoke_job(job_id, start_after=None):
+    payload = {'job': job_id}
+    if start_after:
+        payload['start_after'] = start_after
+    clients.client('lambda').invoke(
+        FunctionName=os.environ['AWS_LAMBDA_FUNCTION_NAME'],
+        InvocationType='Event',
+        Payload=json.dumps(payload)
+    )
 
-        response = table.query(
-            KeyConditionExpression=Key('access').eq('public') & Key('date_id').gt(today)
+
+def get_job(job_id):
+    if not job_id:
+        return respond(400, {'message': 'job is required'})
+
+    with metrics.phase('get_job'):
+        item = TABLE.get_item(Key=state_key(JOB_PREFIX + job_id), ConsistentRead=True).get('Item')
+    if not item:
+        return respond(404, {'message': 'Job not found'})
+
+    job = {k: v for k, v in item.items() if k not in ('access', 'date_id')}
+    return respond(200, {'job': job_id, **job})
+
+
+def update_job(job_id, queued=0, published=0, failed=0, **fields):
+    # Counters are added to, so a job split across invocations (or batches) keeps counting
+    if fields.get('status') in FINAL_STATUSES:
+        fields[EXPIRES_AT] = expires_at()
+    names = {'#updated_at': 'updated_at'}
+    values = {':now': int(time.time())}
+    expression = 'SET #updated_at = :now'
+    for name, value in fields.items():
+        names[f"#{name}"] = name
+        values[f":{name}"] = value
+        expression += f", #{name} = :{name}"
+
+    counters = {name: value for name, value in (('queued', queued), ('published', published), ('failed', failed)) if value}
+    for name, value in counters.items():
+        names[f"#{name}"] = name
+        values[f":{name}"] = value
+    if counters:
+        expression += ' ADD ' + ', '.join(f"#{name} :{name}" for name in counters)
+
+    with metrics.phase('update_job'):
+        TABLE.update_item(
+            Key=state_key(JOB_PREFIX + job_id),
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
         )
 
-        processed_count = 0
-        items = response.get('Items', [])
 
+def pending_items(start_after=None, limit=None):
+    """Future public events that still have sites to post to, in date_id order, after start_after if given."""
+    after = max(datetime.date.today().isoformat(), start_after or '')
+
+    items = []
+    kwargs = {'KeyConditionExpression': Key('access').eq('public') & Key('date_id').gt(after)}
+    while True:
+        with metrics.phase('query'):
+            response = TABLE.query(**kwargs)
+        items.extend(i for i in response.get('Items', []) if isinstance(i.get('post'), list) and i['post'])
+        if 'LastEvaluatedKey' not in response or (limit and len(items) >= limit):
+            return items[:limit] if limit else items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def run_job(job_id, start_after, context):
+    try:
+        items = pending_items(start_after)
+        if start_after is None:
+            update_job(job_id, status='running', queued=len(items))
+
+        # Time one more item needs, including the delay after it
+        needed_ms = TIME_RESERVE_MS + int(os.getenv("DELAY_MS", "1000")) + int(os.getenv("JITTER_MS", "150"))
+
+        last = start_after
         for idx, item in enumerate(items, start=1):
-            if 'post' in item and isinstance(item['post'], list) and item['post']:
-                print(f"Processing: {item['title']}: post={item['post']}")
+            # Out of time: hand the rest to a new invocation, so any backlog can be worked off
+            # (every invocation gets through at least one item)
+            if idx > 1 and context and context.get_remaining_time_in_millis() < needed_ms:
+                print(f"Job {job_id} continues after {last}")
+                invoke_job(job_id, last)
+                return
+
+            print(f"Processing: {item['title']}: post={item['post']}")
+            if post_to_sns(item):
+                update_job(job_id, published=1)
+            else:
+                update_job(job_id, failed=1)
+            last = item['date_id']
+
+            # optional: skip the sleep after the last item to shave a little time
+            if idx < len(items):
+                inter_item_delay()
+
+        update_job(job_id, status='completed')
+        print(f"Job {job_id} completed")
+
+    except Exception as e:
+        # Don't raise: a failed async invocation is retried, and would publish everything again
+        print(f"Job {job_id} failed: {e}")
+        update_job(job_id, status='failed', error=str(e)[:500])
+
+def run_scheduled_sweep(context):
+    with metrics.phase('get_watermark'):
+        watermark = TABLE.get_item(Key=state_key(WATERMARK), ConsistentRead=True).get('Item', {}).get('change')
+    now_ms = int(time.time() * 1000)
+    until_ms = now_ms - SETTLE_MS
+    needed_ms = TIME_RESERVE_MS + int(os.getenv("DELAY_MS", "1000")) + int(os.getenv("JITTER_MS", "150"))
 
-                if post_to_sns(item):
-                    processed_count += 1
-                    # optional: skip the sleep after the last item to shave a little time
-                    if idx < len(items):
-                        inter_item_delay()
+    with metrics.phase('query_changes'):
+        entries = list(changes.since(TABLE, watermark, until_ms))
 
-        print(f"Processed {processed_count} items")
+    # An event changed several times since the last run is posted once
+    seen, published, handled = set(), 0, []
+    for entry in entries:
+        # Out of time: the rest waits for the next run
+        if handled and context and context.get_remaining_time_in_millis() < needed_ms:
+            break
 
+        key = (entry['event_access'], entry['event_date_id'])
+        if key not in seen:
+            seen.add(key)
+            with metrics.phase('get_item'):
+                item = TABLE.get_item(Key={'access': key[0], 'date_id': key[1]}).get('Item')
+
+            # Deleted, past, or posted since; a site whose last post failed waits for its retry_at,
+            # when process_status logged the change again (st_james.retries)
+            sites = [site for site in item.get('post') or [] if retries.due(item, site, now_ms)] if item else []
+            if sites and item['date_id'] > datetime.date.today().isoformat():
+                if published:
+                    inter_item_delay()
+                print(f"Processing: {item['title']}: post={sites}")
+                if post_to_sns(item, sites):
+                    published += 1
+        handled.append(entry)
+
+    if handled:
+        with metrics.phase('put_watermark'):
+            TABLE.put_item(Item={**state_key(WATERMARK), 'change': handled[-1]['date_id'], 'updated_at': int(time.time())})
+        # The log behind the watermark is no longer needed
+        with metrics.phase('delete_changes'), TABLE.batch_writer() as batch:
+            for entry in handled:
+                batch.delete_item(Key=state_key(entry['date_id']))
+
+    # A site whose breaker is open gets no new work to probe it with; send it one parked event
+    probes = 0
+    for site, entry in circuit.probes_due(TABLE):
+        with metrics.phase('get_item'):
+            item = TABLE.get_item(Key={'access': entry['event_access'], 'date_id': entry['event_date_id']}).get('Item')
+        if item and item['date_id'] > datetime.date.today().isoformat() and site in (item.get('post') or []):
+            print(f"Probing {site} with {item['date_id']}")
+            probes += post_to_sns(item, [site])
+        else:
+            # Deleted, past, or posted some other way, since it was parked
+            TABLE.delete_item(Key={'access': entry['access'], 'date_id': entry['date_id']})
+
+    print(f"Scheduled sweep: {len(handled)} changes, {len(seen)} events, {published} published, {probes} probes")
+
+
+def run_sweep_step(event):
+    step, job_id = event['sweep'], event['job']
+    if step == 'plan':
+        return plan_sweep(job_id, event.get('start_after') or None)
+    if step == 'batch':
+        return run_sweep_batch(job_id, event['site'], event['keys'])
+    if step == 'batch_failed':
+        return record_failed_batch(job_id, event['site'], event['keys'], event.get('error'))
+    if step == 'summarize':
+        return summarize_sweep(job_id, event.get('error'))
+    raise ValueError(f"Unknown sweep step: {step}")
+
+
+def plan_sweep(job_id, start_after):
+    """
+    The next page of pending items, as batches of date_ids per site:
+    {'job', 'start_after', 'more', 'sites': [{'site', 'batches': [[date_id, ...], ...]}, ...]}
+    """
+    if start_after is None:
+        create_job(job_id, 'running')
+
+    items = pending_items(start_after, SWEEP_PAGE_SIZE + 1)
+    page = items[:SWEEP_PAGE_SIZE]
+
+    # Sites without a poster (not enabled in the site registry) would only get batches that publish
+    # to no one
+    posted = poster_sites()
+    by_site = {}
+    for item in page:
+        for site in item['post']:
+            if posted is None or site in posted:
+                by_site.setdefault(site, []).append(item['date_id'])
+    sites = [
+        {'site': site, 'batches': [keys[i:i + SWEEP_BATCH_SIZE] for i in range(0, len(keys), SWEEP_BATCH_SIZE)]}
+        for site, keys in sorted(by_site.items())
+    ]
+
+    queued = sum(len(keys) for keys in by_site.values())
+    if queued:
+        update_job(job_id, queued=queued)
+    print(f"Sweep {job_id}: planned {len(page)} items, {queued} posts")
+
+    return {
+        'job': job_id,
+        'start_after': page[-1]['date_id'] if page else (start_after or ''),
+        'more': len(items) > SWEEP_PAGE_SIZE,
+        'sites': sites
+    }
+
+
+def poster_sites():
+    """The sites with a poster, from POSTER_SITES (comma-separated); None: all of them."""
+    sites = os.getenv('POSTER_SITES')
+    return None if sites is None else {site.strip() for site in sites.split(',') if site.strip()}
+
+
+def run_sweep_batch(job_id, site, keys):
+    """Publishes the items with these date_ids for one site (the posters' filter policies match on post)."""
+    published = failed = skipped = 0
+    for idx, date_id in enumerate(keys, start=1):
+        with metrics.phase('get_item'):
+            item = TABLE.get_item(Key={'access': 'public', 'date_id': date_id}).get('Item')
+
+        # Deleted, no longer to be posted there, or backing off after a failed post, since the page was planned
+        if not item or site not in (item.get('post') or []) or not retries.due(item, site, int(time.time() * 1000)):
+            skipped += 1
+            continue
+
+        if post_to_sns(item, [site]):
+            published += 1
+        else:
+            failed += 1
+
+        if idx < len(keys):
+            inter_item_delay()
+
+    update_job(job_id, published=published, failed=failed)
+    return {'site': site, 'published': published, 'failed': failed, 'skipped': skipped}
+
+
+def record_failed_batch(job_id, site, keys, error):
+    """A batch that failed after its retries: counted as failed, and the sweep goes on."""
+    print(f"Sweep {job_id}: batch of {len(keys)} {site} posts failed: {error}")
+    update_job(job_id, failed=len(keys), last_error=str(error or '')[:500])
+    return {'site': site, 'published': 0, 'failed': len(keys), 'skipped': 0}
+
+
+def summarize_sweep(job_id, error=None):
+    # A sweep that stopped (a page that couldn't be planned, or too many sites failing) is failed
+    if error:
+        update_job(job_id, status='failed', error=str(error)[:500])
+    else:
+        update_job(job_id, status='completed')
+    with metrics.phase('get_job'):
+        item = TABLE.get_item(Key=state_key(JOB_PREFIX + job_id), ConsistentRead=True)['Item']
+    job = {k: v for k, v in item.items() if k not in ('access', 'date_id')}
+    print(f"Sweep {job_id} completed: {job}")
+    # The state machine's result: plain JSON
+    return json.loads(json.dumps({'job': job_id, **job}, default=decimal_default))
+
+
+def skip_unchanged(item, sites):
+    """
+    Marks the sites we already sent this content to (st_james.fingerprint) posted, in one conditional
+    write on the status lists as read; returns the sites that still need it.
+    """
+    unchanged = [site for site in sites if fingerprint.unchanged(item, site)]
+    if not unchanged:
+        return sites
+
+    names = {f"#{key}": key for key in schema.STATUS_KEYS}
+    conditions, values, updates = [], {}, []
+    for key in schema.STATUS_KEYS:
+        if key in item:
+            conditions.append(f"#{key} = :old_{key}")
+            values[f":old_{key}"] = item[key]
+        else:
+            conditions.append(f"attribute_not_exists(#{key})")
+        listed = [s for s in (item.get(key) or []) if s not in unchanged] + (unchanged if key == 'posted' else [])
+        if key in item or listed:
+            updates.append(f"#{key} = :{key}")
+            values[f":{key}"] = listed
+    try:
+        with metrics.phase('skip_unchanged'):
+            TABLE.update_item(
+                Key={'access': item.get('access', 'public'), 'date_id': item['date_id']},
+                UpdateExpression='SET ' + ', '.join(updates),
+                ConditionExpression=' AND '.join(conditions),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
     except ClientError as e:
-        print(f"DynamoDB error: {e.response['Error']['Code']} - {e.response['Error']['Message']}")
-        raise
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # Changed since we read it: publish, and let the posters sort it out
+        return sites
 
-    except KeyError as e:
-        print(f"Missing environment variable: {e}")
-        raise  
+    print(f"Unchanged since last sent to {', '.join(unchanged)}: marked posted")
+    return [site for site in sites if site not in unchanged]
 
-def post_to_sns(item):
+
+def post_to_sns(item, sites=None):
+    """Publishes the item for the posters of sites (default: its post list) it's changed for since they last sent it."""
+    sites = skip_unchanged(item, list(sites or item.get('post') or []))
+    if not sites:
+        return True
+    return publish(item if sites == item.get('post') else {**item, 'post': sites})
+
+
+@metrics.timed('sns_publish')
+def publish(item):
     # Initialize SNS client
     sns = boto3.client('sns')
     
@@ -141,15 +523,21 @@ def post_to_sns(item):
     if 'version' in item:
         del item['version']
         
-    message = json.dumps(item)
+    message = json.dumps(item, default=decimal_default)
     subject = f"New post: {item.get('title', 'Untitled')}"[:100]
     
     try:
-        response = sns.publish(
-            TopicArn=topic_arn,
-            Message=message,
-            Subject=subject
-        )
+        # Continue the trace started when the item was inserted (older items start a new one)
+        # and hand it to the posters in the traceparent message attribute
+        with tracing.span('process_events', trace_id=item.get('trace_id') or tracing.new_trace_id()) as span:
+            response = sns.publish(
+                TopicArn=topic_arn,
+                Message=message,
+                Subject=subject,
+                MessageAttributes={
+                    'traceparent': {'DataType': 'String', 'StringValue': span.traceparent}
+                }
+            )
         print(f"Message published to SNS. MessageId: {response['MessageId']}")
         return True
 
@@ -1,39 +1,75 @@
 import boto3
 import json
 import os
+import time
 
 from botocore.exceptions import ClientError
- 
+from st_james import changes, fingerprint, retries, schema, tracing
+from st_james.metrics import Metrics
 
+metrics = Metrics('process_status')
+
+STATUS_KEYS = schema.STATUS_KEYS
+VALIDATE_QUERY = schema.compile_schema(schema.STATUS_QUERY)
+# Reads and conditional writes of an item whose status lists keep changing under us (not the
+# attempts at a failed post: those are retries.MAX_ATTEMPTS)
+WRITE_ATTEMPTS = 3
+CONFLICT = 'Status changed while updating'
+
+
+@metrics.handler
 def handler(event, context):
+    # Join the trace of the event being posted, if the poster passed one along
+    params = event.get('queryStringParameters') or {}
+    with tracing.span('process_status', parent=params.get('traceparent')):
+        return process_request(event)
 
+def process_request(event):
     try:
         print(f"Request parameters: {event['queryStringParameters']}")
 
         sort_key = event['queryStringParameters'].get('sort-key')
         new_status = event['queryStringParameters'].get('new-status')
         website = event['queryStringParameters'].get('website')
-        error_message = None
-
-        if (not new_status) or  (not sort_key) or (not website):
-            error_message = 'key, new-status, and website parameters are required'
+        # The gateway only checks that the required parameters are there
+        error_message = VALIDATE_QUERY(event['queryStringParameters'])
 
         if not error_message:
             old_status = event['queryStringParameters'].get('old-status')
+            sent = sent_record(event['queryStringParameters']) if new_status == 'posted' else None
+            error = event['queryStringParameters'].get('error') if new_status == 'post' else None
 
             # Initialize DynamoDB client
             dynamodb = boto3.resource('dynamodb')
             table = dynamodb.Table(os.environ['TABLE_NAME'])
 
-            # Get the item and make sure current status is correct
-            item, current_status, error_message = get_item_and_status(table, sort_key, website)
-        
-        if not error_message:           
-            if old_status and current_status != old_status:
-                error_message = f"Current status is not {old_status}"
+            # The posters for other sites update the same item concurrently;
+            # if one writes between our read and our write, read it again
+            for _ in range(WRITE_ATTEMPTS):
+                # Get the item and make sure current status is correct
+                item, current_status, error_message = get_item_and_status(table, sort_key, website)
+
+                if not error_message:
+                    if old_status and current_status != old_status:
+                        error_message = f"Current status is not {old_status}"
+
+                attempt = None
+                if not error_message and error:
+                    # A failed post: tried again after a backoff, or given up on (st_james.retries)
+                    attempt = retries.next_attempt(item, website, error, int(time.time() * 1000))
+                    new_status = 'post' if attempt['retry_at'] else retries.FAILED
+
+                if not error_message:
+                    error_message = update_status(table, item, website, new_status, sent, attempt,
+                                                  clear_attempts=new_status == 'posted' or current_status == retries.FAILED)
+
+                if error_message != CONFLICT:
+                    break
 
-        if not error_message:    
-            error_message = update_status(table, item, website, new_status)
+            # A site back on post is retried by the scheduled sweep; after a failed post, not before its retry_at
+            if not error_message and new_status == 'post':
+                with metrics.phase('record_change'):
+                    changes.record(table, 'public', sort_key, at_ms=attempt and attempt['retry_at'])
 
         if error_message:
             print(error_message)
@@ -55,6 +91,7 @@ def handler(event, context):
             'body': json.dumps({'message': 'Internal server error', 'error': str(e)})
         }
         
+@metrics.timed('get_item')
 def get_item_and_status(table, sort_key, website):
     try:
         response = table.get_item(
@@ -68,14 +105,10 @@ def get_item_and_status(table, sort_key, website):
         # get item
         item = response.get('Item', None)
         if not item:
-            return None, f"No item found for { sort_key }"
+            return None, None, f"No item found for { sort_key }"
         
         # get current status
-        status_mapping = {
-            'post': item.get('post', []),
-            'posting': item.get('posting', []),
-            'posted': item.get('posted', [])
-        }
+        status_mapping = {key: item.get(key, []) for key in STATUS_KEYS}
 
         current_status = next((status for status, websites in status_mapping.items() if website in websites), None)      
         return item, current_status, None
@@ -86,27 +119,83 @@ def get_item_and_status(table, sort_key, website):
     except Exception as e:
         return None, None, f"Error getting item and status: {e}"
 
+def sent_record(params):
+    """The item's sent entry for the site, from a 'posted' update's content-hash and external-id."""
+    if not params.get('content-hash'):
+        return None
+    sent = {'hash': params['content-hash'], 'sent_at': int(time.time())}
+    if params.get('external-id'):
+        sent['external_id'] = params['external-id']
+    return sent
+
 # Update DynamoDB record status
-def update_status(table, item, website, new_status): 
-    try:      
-        # clear status
-        status_keys = ['post', 'posting', 'posted']
-        for key in status_keys:
-            if key in item and isinstance(item[key], list):
-                item[key] = [w for w in item[key] if w != website]
-
-        # add the new status
-        if new_status not in item:
-            item[new_status] = []
-        item[new_status].append(website) 
-
-        table.put_item(Item={
-                **item
-            }
-         ) 
+@metrics.timed('update_item')
+def update_status(table, item, website, new_status, sent=None, attempt=None, clear_attempts=False):
+    try:
+        # Only the status lists (and the site's sent and attempts entries) are written, so an edit to the
+        # event made since we read it is kept; and only if no one has changed the status
+        # lists since we read them
+        names = {'#access': 'access'}
+        values = {}
+        conditions = ['attribute_exists(#access)']
+        updates = []
+        for key in STATUS_KEYS:
+            names[f"#{key}"] = key
+            if key in item:
+                conditions.append(f"#{key} = :old_{key}")
+                values[f":old_{key}"] = item[key]
+
+            # clear status, and add the new one
+            websites = [w for w in item.get(key, []) if w != website]
+            if key == new_status:
+                websites.append(website)
+            if websites or key in item:
+                updates.append(f"#{key} = :{key}")
+                values[f":{key}"] = websites
+            if key not in item:
+                conditions.append(f"attribute_not_exists(#{key})")
+
+        # What the poster sent, so an unchanged re-post can be skipped
+        if sent:
+            set_site_entry(item, website, fingerprint.SENT, sent, names, values, conditions, updates)
+
+        # How many times posting has failed, and when to try again
+        removes = []
+        if attempt:
+            set_site_entry(item, website, retries.ATTEMPTS, attempt, names, values, conditions, updates)
+        elif clear_attempts and retries.attempts(item, website):
+            names['#attempts'] = retries.ATTEMPTS
+            names['#website'] = website
+            removes.append('#attempts.#website')
+
+        table.update_item(
+            Key={
+                'access': item['access'],
+                'date_id': item['date_id']
+            },
+            UpdateExpression='SET ' + ', '.join(updates) + (' REMOVE ' + ', '.join(removes) if removes else ''),
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
 
     except ClientError as e:
-        return None, None, f"DynamoDB error: {e.response['Error']['Code']} - {e.response['Error']['Message']}"
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return CONFLICT
+        return f"DynamoDB error: {e.response['Error']['Code']} - {e.response['Error']['Message']}"
 
     except Exception as e:
-        return None, None, f"Error getting item and status: {e}"
+        return f"Error updating status: {e}"
+
+def set_site_entry(item, website, attribute, entry, names, values, conditions, updates):
+    """Adds setting the site's entry in a map attribute ('sent', 'attempts') to the update."""
+    names[f"#{attribute}"] = attribute
+    names['#website'] = website
+    if attribute in item:
+        updates.append(f"#{attribute}.#website = :{attribute}")
+        values[f":{attribute}"] = entry
+    else:
+        # The first site's entry creates the map; another site's meanwhile is a conflict
+        conditions.append(f"attribute_not_exists(#{attribute})")
+        updates.append(f"#{attribute} = :{attribute}")
+        values[f":{attribute}"] = {website: entry}
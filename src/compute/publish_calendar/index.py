@@ -0,0 +1,366 @@
+import datetime
+import functools
+import os
+import re
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from st_james import archive, calendar, clients, ics, search
+from st_james.metrics import Metrics
+
+metrics = Metrics('publish_calendar')
+
+TABLE = clients.events_table()
+S3 = clients.client('s3')
+BUCKET = os.environ['BUCKET_NAME']
+PREFIX = os.getenv('CALENDAR_PREFIX', calendar.PREFIX)
+
+# Readers may cache a shard this long (seconds)
+MAX_AGE = int(os.getenv('CALENDAR_MAX_AGE', '300'))
+
+NOT_FOUND = ('404', 'NoSuchKey', 'NotFound')
+# Invocations run concurrently (a stream shard each): every object is read, changed and written
+# back only if it's still as read (If-Match its ETag), else read and changed again, this often
+WRITE_ATTEMPTS = 3
+LOST_RACE = ('PreconditionFailed', 'ConditionalRequestConflict') + NOT_FOUND
+SHARD_RE = re.compile(r'^\d{4}-\d{2}\.json$')
+
+# The iCalendar feed of all public events, next to the shards
+FEED_KEY = PREFIX + 'events.ics'
+
+# The search index of each access partition (st_james.search)
+SEARCH_PREFIX = os.getenv('SEARCH_PREFIX', search.PREFIX)
+SEARCHED_FIELDS = ('title', 'description')
+_indexes = {}  # access -> (etag, SearchIndex) as this container last read or wrote it
+
+# Events the table's TTL deletes are archived here (st_james.archive)
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', archive.PREFIX)
+
+deserializer = TypeDeserializer()
+
+
+class LostRace(Exception):
+    """Another invocation wrote the object since it was read."""
+
+
+@metrics.handler
+def handler(event, context):
+    if event.get('detail-type') == 'Scheduled Event':
+        # The first of the month: every month from this one on is written from the table (the
+        # stream only brings months that change), and last month drops off the index
+        rewritten = backfill()
+        return {'rewritten': rewritten, 'index_written': write_index(changed=bool(rewritten))}
+
+    # The table's second (and last) stream consumer: it keeps every read model built from the table
+    changed = changed_events(event['Records'])
+    months = sorted({calendar.month_of(date_id) for date_id in changed})
+    print(f"{len(event['Records'])} records, months changed: {months}")
+
+    rewritten = [month for month in months if write_shard(month)]
+    # No index yet (first run after a deploy): the months with events from before it have no
+    # shards either
+    no_index = current(PREFIX + calendar.INDEX)[0] is None
+    if no_index:
+        rewritten = sorted(set(rewritten) | set(backfill()))
+    write_index(changed=bool(rewritten) or no_index)
+    feed_updated = bool(changed) and update_feed(changed)
+
+    searched = changed_texts(event['Records'])
+    for access, changes in searched.items():
+        update_search(access, changes)
+
+    archived = archive_expired(event['Records'])
+
+    print(f"Rewrote shards: {rewritten}, feed: {feed_updated}, search: {sorted(searched)}, archived: {archived}")
+    return {'months': months, 'rewritten': rewritten, 'feed_updated': feed_updated, 'searched': sorted(searched),
+            'archived': archived}
+
+
+def changed_events(records):
+    """
+    {date_id: the event as now published, None if gone} for the changes the public would see:
+    not e.g. a post moving from posting to posted. The last record for an event wins.
+    """
+    changed = {}
+    for record in records:
+        images = record['dynamodb']
+        if images['Keys']['access'].get('S') != 'public':
+            continue
+        old = calendar.public_event(from_image(images.get('OldImage')))
+        new = calendar.public_event(from_image(images.get('NewImage')))
+        if old != new:
+            changed[(new or old)['date_id']] = new
+    return changed
+
+
+def changed_texts(records):
+    """{access: {date_id: (old, new)}} for the events whose searched fields changed (None: no item)."""
+    changed = {}
+    for record in records:
+        images = record['dynamodb']
+        old, new = from_image(images.get('OldImage')), from_image(images.get('NewImage'))
+        texts = [tuple((image or {}).get(f) for f in SEARCHED_FIELDS) if image else None for image in (old, new)]
+        if texts[0] == texts[1]:
+            continue
+        access = images['Keys']['access']['S']
+        date_id = images['Keys']['date_id']['S']
+        changes = changed.setdefault(access, {})
+        # Several changes in a batch: from the first old image to the last new one
+        first_old = changes[date_id][0] if date_id in changes else old
+        changes[date_id] = (first_old, new)
+    return changed
+
+
+def archive_expired(records):
+    """
+    Writes the events the table's TTL deleted to the archive, one object per access and month
+    in the batch, named for the batch so a retry overwrites it. Returns the keys written.
+    """
+    expired = [record for record in records if archive.is_expiry(record)]
+    if not expired:
+        return []
+    batch_id = expired[0]['dynamodb']['SequenceNumber']
+
+    groups = {}
+    for record in expired:
+        item = from_image(record['dynamodb']['OldImage'])
+        groups.setdefault((item['access'], item['date_id'][:7]), []).append(item)
+
+    keys = []
+    for (access, month), items in sorted(groups.items()):
+        key = archive.object_key(access, month, batch_id, ARCHIVE_PREFIX)
+        with metrics.phase('s3_put'):
+            S3.put_object(Bucket=BUCKET, Key=key, Body=archive.to_ndjson_gz(items),
+                          ContentType='application/gzip')
+        keys.append(key)
+    return keys
+
+
+def from_image(image):
+    # Stream images are in the DynamoDB wire format
+    if not image:
+        return None
+    return {k: deserializer.deserialize(v) for k, v in image.items()}
+
+
+def query_events(access, month=None):
+    """The partition's events (a month of them, if given), with the fields the public sees."""
+    condition = Key('access').eq(access)
+    if month:
+        condition = condition & Key('date_id').begins_with(month)
+    kwargs = {'KeyConditionExpression': condition}
+    events = []
+    while True:
+        with metrics.phase('query'):
+            response = TABLE.query(**kwargs)
+        events.extend(calendar.public_event(item) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return events
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def retried_on_lost_race(write):
+    """Runs a read-change-write again from the read when another invocation wrote the object first."""
+    @functools.wraps(write)
+    def retried(*args, **kwargs):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                return write(*args, **kwargs)
+            except LostRace as e:
+                if attempt == WRITE_ATTEMPTS:
+                    raise
+                print(f"{write.__name__}: {e}, attempt {attempt} of {WRITE_ATTEMPTS}")
+    return retried
+
+
+def backfill():
+    """Writes the shard of every month from this one on with public events; returns the months rewritten."""
+    this_month = datetime.date.today().isoformat()[:7]
+    kwargs = {'KeyConditionExpression': Key('access').eq('public') & Key('date_id').gte(this_month),
+              'ProjectionExpression': 'date_id'}
+    months = set()
+    while True:
+        with metrics.phase('query'):
+            response = TABLE.query(**kwargs)
+        months.update(calendar.month_of(item['date_id']) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return [month for month in sorted(months) if write_shard(month)]
+
+
+def current(key):
+    """(ETag, metadata) of the object, (None, {}) if there's none."""
+    try:
+        with metrics.phase('s3_head'):
+            response = S3.head_object(Bucket=BUCKET, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in NOT_FOUND:
+            return None, {}
+        raise
+    return response['ETag'], response.get('Metadata', {})
+
+
+def put_if_unchanged(key, etag, **kwargs):
+    """Puts the object if it still has the ETag read (None: if there's still none); returns its new ETag."""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        with metrics.phase('s3_put'):
+            return S3.put_object(Bucket=BUCKET, Key=key, **condition, **kwargs)['ETag']
+    except ClientError as e:
+        if e.response['Error']['Code'] in LOST_RACE:
+            raise LostRace(f"{key} changed since it was read")
+        raise
+
+
+@retried_on_lost_race
+def write_shard(month):
+    """Rewrites a month's shard if its content changed (deletes it if the month is now empty). True if it did."""
+    key = calendar.shard_key(month, PREFIX)
+    # Read before the query: a write from an older query then loses to one from a newer
+    etag, metadata = current(key)
+    events = query_events('public', month)
+
+    if not events:
+        if etag is None:
+            return False
+        try:
+            with metrics.phase('s3_delete'):
+                S3.delete_object(Bucket=BUCKET, Key=key, IfMatch=etag)
+        except ClientError as e:
+            if e.response['Error']['Code'] in LOST_RACE:
+                raise LostRace(f"{key} changed since it was read")
+            raise
+        return True
+
+    body, sha = calendar.render({'month': month, 'events': events})
+    if sha == metadata.get('sha256'):
+        return False
+    put_if_unchanged(
+        key, etag, Body=body,
+        ContentType='application/json',
+        CacheControl=f"public, max-age={MAX_AGE}",
+        Metadata={'sha256': sha}
+    )
+    return True
+
+
+@retried_on_lost_race
+def write_index(changed=True):
+    """
+    Lists the shards from this month on; readers fetch it first and then the months they need.
+    Rewritten when a shard was (changed), or when it was written in an earlier month, so past
+    months drop off it. True if it was.
+    """
+    key = PREFIX + calendar.INDEX
+    this_month = datetime.date.today().isoformat()[:7]
+    etag, metadata = current(key)
+    if not changed and (etag is None or metadata.get('month') == this_month):
+        return False
+
+    months = []
+    kwargs = {'Bucket': BUCKET, 'Prefix': PREFIX}
+    while True:
+        with metrics.phase('s3_list'):
+            response = S3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            name = obj['Key'][len(PREFIX):]
+            if SHARD_RE.match(name) and name[:7] >= this_month:
+                months.append({'month': name[:7], 'key': obj['Key'], 'etag': obj.get('ETag', '').strip('"')})
+        if not response.get('IsTruncated'):
+            break
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    body, sha = calendar.render({'months': months})
+    if sha == metadata.get('sha256') and metadata.get('month') == this_month:
+        return False
+    put_if_unchanged(
+        key, etag, Body=body,
+        ContentType='application/json',
+        # Short: it points at the shards
+        CacheControl='public, max-age=60',
+        Metadata={'sha256': sha, 'month': this_month}
+    )
+    return True
+
+
+@retried_on_lost_race
+def update_feed(changed):
+    """
+    Patches the VEVENTs of the changed events into the feed (built from the table the first
+    time). True if the feed changed. S3's ETag for it is the MD5 of its content, so subscribers'
+    conditional GETs (If-None-Match) cost a 304 until something actually changes.
+    """
+    try:
+        with metrics.phase('s3_get'):
+            response = S3.get_object(Bucket=BUCKET, Key=FEED_KEY)
+        feed, etag = response['Body'].read().decode('utf-8'), response['ETag']
+    except ClientError as e:
+        if e.response['Error']['Code'] not in NOT_FOUND:
+            raise
+        feed, etag = None, None
+
+    if feed is None:
+        blocks = {ics.uid(event['date_id']): ics.vevent(event) for event in query_events('public')}
+    else:
+        blocks = ics.parse_feed(feed)
+        for date_id, event in changed.items():
+            if event is None:
+                blocks.pop(ics.uid(date_id), None)
+            else:
+                blocks[ics.uid(date_id)] = ics.vevent(event)
+
+    body = ics.render_feed(blocks)
+    if body == feed:
+        return False
+    put_if_unchanged(
+        FEED_KEY, etag, Body=body.encode('utf-8'),
+        ContentType='text/calendar; charset=utf-8',
+        CacheControl=f"public, max-age={MAX_AGE}"
+    )
+    return True
+
+
+def load_search(access, key):
+    """
+    The partition's search index and its ETag: this container's copy while it's still the one in
+    the bucket (a conditional GET, 304 if so), (None, None) if there's none yet.
+    """
+    # Taken out of the cache while it's changed: it's put back once it's written
+    cached = _indexes.pop(access, None)
+    try:
+        with metrics.phase('s3_get'):
+            response = S3.get_object(Bucket=BUCKET, Key=key, **({'IfNoneMatch': cached[0]} if cached else {}))
+    except ClientError as e:
+        code = e.response['Error']['Code']
+        if code == '304' and cached:
+            return cached[1], cached[0]
+        if code in NOT_FOUND:
+            return None, None
+        raise
+    with metrics.phase('search_load'):
+        return search.SearchIndex.from_gzip(response['Body'].read()), response['ETag']
+
+
+@retried_on_lost_race
+def update_search(access, changes):
+    """Applies the changes to the access partition's search index (built from the table the first time)."""
+    key = search.index_key(access, SEARCH_PREFIX)
+    index, etag = load_search(access, key)
+    if index is None:
+        index = search.SearchIndex()
+        with metrics.phase('search_build'):
+            for item in query_events(access):
+                index.add(item['date_id'], item)
+    else:
+        with metrics.phase('search_update'):
+            for date_id, (old, new) in changes.items():
+                index.update(date_id, old, new)
+
+    etag = put_if_unchanged(
+        key, etag, Body=index.to_gzip(),
+        ContentType='application/json',
+        ContentEncoding='gzip'
+    )
+    _indexes[access] = (etag, index)
@@ -1,6 +1,7 @@
 from aws_cdk import (
     RemovalPolicy,
-    aws_dynamodb as db
+    aws_dynamodb as db,
+    custom_resources as cr
 )
 from constructs import Construct
 
@@ -26,4 +27,25 @@ class StJamesDatabase(Construct):
             table_name="StJamesEvents",
             table_stream_arn="arn:aws:dynamodb:us-east-1:995535711304:table/StJamesEvents/stream/2024-09-28T15:49:29.413"
         )
+
+        # The table's TTL deletes items once their expires_at is past: finished jobs and their
+        # checkpoints in the state partition (st_james.state), and with context expire_after_days,
+        # past events that many days after their date (the functions set expires_at;
+        # publish_calendar archives them to S3). The table is imported, so its TTL is turned on
+        # with an API call.
+        cr.AwsCustomResource(
+            self, 'EventsTableTtl',
+            on_create=cr.AwsSdkCall(
+                service='DynamoDB',
+                action='updateTimeToLive',
+                parameters={
+                    'TableName': 'StJamesEvents',
+                    'TimeToLiveSpecification': {'AttributeName': 'expires_at', 'Enabled': True}
+                },
+                physical_resource_id=cr.PhysicalResourceId.of('StJamesEvents-ttl'),
+                # Already on
+                ignore_error_codes_matching='ValidationException'
+            ),
+            policy=cr.AwsCustomResourcePolicy.from_sdk_calls(resources=[self.events_table.table_arn])
+        )
    
\ No newline at end of file
@@ -0,0 +1,143 @@
+from aws_cdk import (
+    aws_stepfunctions as sfn,
+    aws_stepfunctions_tasks as tasks,
+    Duration
+)
+from constructs import Construct
+
+# Errors from the Lambda service itself (throttling included): the batch didn't run, so it's safe to retry
+LAMBDA_SERVICE_ERRORS = [
+    'Lambda.ServiceException',
+    'Lambda.AWSLambdaException',
+    'Lambda.SdkClientException',
+    'Lambda.TooManyRequestsException'
+]
+
+# Anything else a step raises (process_events raises its errors for the state machine to retry):
+# a few more tries, further apart, and then the sweep goes on without it
+TASK_FAILED_ATTEMPTS = 2
+
+
+class StJamesOrchestration(Construct):
+    def __init__(self, scope: Construct, id: str, **kwargs) -> None:
+        super().__init__(scope, id)
+
+        process_events = kwargs['process_events']
+
+        # How many batches of one site's posts are published at a time; the sites run side by side
+        site_concurrency = int(self.node.try_get_context('sweep_site_concurrency') or 2)
+        # The share of a page's sites that may fail before the sweep stops
+        tolerated_failure_percentage = int(self.node.try_get_context('sweep_tolerated_failure_percentage') or 25)
+
+        def process_events_step(name, payload):
+            # One step of the sweep, run by process_events (see run_sweep_step there)
+            step = tasks.LambdaInvoke(
+                self, name,
+                lambda_function=process_events,
+                payload=sfn.TaskInput.from_object(payload),
+                payload_response_only=True,
+                retry_on_service_exceptions=False
+            )
+            step.add_retry(
+                errors=LAMBDA_SERVICE_ERRORS,
+                interval=Duration.seconds(2),
+                backoff_rate=2,
+                max_attempts=6
+            )
+            step.add_retry(
+                errors=[sfn.Errors.TASKS_FAILED],
+                interval=Duration.seconds(10),
+                backoff_rate=2,
+                max_attempts=TASK_FAILED_ATTEMPTS
+            )
+            return step
+
+        # The execution name is the job id: GET /post-events/{job} reports on a sweep too
+        start = sfn.Pass(
+            self, 'Start',
+            parameters={'job': sfn.JsonPath.string_at('$$.Execution.Name'), 'start_after': ''}
+        )
+
+        # A page of pending items, as batches of date_ids per site
+        plan = process_events_step('PlanPage', {
+            'sweep': 'plan',
+            'job': sfn.JsonPath.string_at('$.job'),
+            'start_after': sfn.JsonPath.string_at('$.start_after')
+        })
+
+        post_batch = process_events_step('PostBatch', {
+            'sweep': 'batch',
+            'job': sfn.JsonPath.string_at('$.job'),
+            'site': sfn.JsonPath.string_at('$.site'),
+            'keys': sfn.JsonPath.list_at('$.keys')
+        })
+        # A batch that still fails is counted as failed in the job, and the site's other batches go on
+        record_failed_batch = process_events_step('RecordFailedBatch', {
+            'sweep': 'batch_failed',
+            'job': sfn.JsonPath.string_at('$.job'),
+            'site': sfn.JsonPath.string_at('$.site'),
+            'keys': sfn.JsonPath.list_at('$.keys'),
+            'error': sfn.JsonPath.string_at('$.failure.Cause')
+        })
+        post_batch.add_catch(record_failed_batch, errors=[sfn.Errors.ALL], result_path='$.failure')
+
+        # One site's batches, a few at a time
+        post_site_batches = sfn.Map(
+            self, 'PostSiteBatches',
+            items_path='$.batches',
+            item_selector={
+                'job': sfn.JsonPath.string_at('$.job'),
+                'site': sfn.JsonPath.string_at('$.site'),
+                # (string_at only renders the path; the item here is a list)
+                'keys': sfn.JsonPath.string_at('$$.Map.Item.Value')
+            },
+            max_concurrency=site_concurrency
+        )
+        post_site_batches.item_processor(post_batch)
+
+        # Every site at once, each in a child execution of its own
+        post_sites = sfn.DistributedMap(
+            self, 'PostSites',
+            items_path='$.sites',
+            item_selector={
+                'job': sfn.JsonPath.string_at('$.job'),
+                'site': sfn.JsonPath.string_at('$$.Map.Item.Value.site'),
+                'batches': sfn.JsonPath.string_at('$$.Map.Item.Value.batches')
+            },
+            result_path=sfn.JsonPath.DISCARD,
+            tolerated_failure_percentage=tolerated_failure_percentage
+        )
+        post_sites.item_processor(post_site_batches)
+
+        next_page = sfn.Pass(
+            self, 'NextPage',
+            parameters={'job': sfn.JsonPath.string_at('$.job'), 'start_after': sfn.JsonPath.string_at('$.start_after')}
+        )
+
+        # The job's counts, which the batches added to
+        summarize = process_events_step('Summarize', {
+            'sweep': 'summarize',
+            'job': sfn.JsonPath.string_at('$.job')
+        })
+        # A page that couldn't be planned, or more sites failing than tolerated, stops the sweep;
+        # the job is summarized as failed, with the error
+        summarize_failure = process_events_step('SummarizeFailure', {
+            'sweep': 'summarize',
+            'job': sfn.JsonPath.string_at('$.job'),
+            'error': sfn.JsonPath.string_at('$.failure.Cause')
+        })
+        plan.add_catch(summarize_failure, errors=[sfn.Errors.ALL], result_path='$.failure')
+        post_sites.add_catch(summarize_failure, errors=[sfn.Errors.ALL], result_path='$.failure')
+
+        definition = start.next(plan).next(post_sites).next(
+            sfn.Choice(self, 'MorePages')
+                .when(sfn.Condition.boolean_equals('$.more', True), next_page.next(plan))
+                .otherwise(summarize)
+        )
+
+        self.posting_sweep = sfn.StateMachine(
+            self, 'PostingSweep',
+            state_machine_name='StJames-posting-sweep',
+            definition_body=sfn.DefinitionBody.from_chainable(definition),
+            timeout=Duration.hours(6)
+        )
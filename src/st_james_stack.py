@@ -7,6 +7,7 @@ from src.api.infrastructure import StJamesApi, StJamesApiResources
 from src.database.infrastructure import StJamesDatabase
 from src.compute.infrastructure import StJamesCompute
 from src.messaging.infrastructure import StJamesMessaging
+from src.orchestration.infrastructure import StJamesOrchestration
 from src.storage.infrastructure import StJamesStorage
 
 class StJamesStack(Stack):
@@ -39,6 +40,12 @@ class StJamesStack(Stack):
             initial_events = "initialData/events.json",
             api = api)
 
+        # Set context posting_sweep=true for a state machine that posts large backlogs in parallel
+        # batches, a few at a time per site (process_events does the work)
+        if self.node.try_get_context('posting_sweep') in (True, 'true'):
+            StJamesOrchestration(self, "StJamesOrchestration",
+                process_events = compute.process_events)
+
         # Attach the Lambda functions to the API Gateway
         # StJamesApiResources(self, "StJamesApiResources",
         #     api = api,
@@ -53,5 +60,7 @@ class StJamesStack(Stack):
             events_list=compute.events_list,
             events_get=compute.events_get,
             events_update=compute.events_update,
-            events_delete=compute.events_delete)
+            events_delete=compute.events_delete,
+            events_batch_get=compute.events_batch_get,
+            export_handler=compute.export_events)
 
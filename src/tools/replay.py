@@ -0,0 +1,192 @@
+"""
+Re-posts selected events to one site, at a set rate: the way to recover from a site's outage
+without editing post lists by hand or re-sweeping everything with /post-events.
+
+    python -m src.tools.replay --site patch --from 2026-05-01 --to 2026-05-31 --status posting --dry-run
+    python -m src.tools.replay --site patch --from 2026-05-01 --to 2026-05-31 --status posting --rate 0.5
+
+It queries the public events dated --from to --to (inclusive) that have the site in one of the
+--status lists. For each, in date order, it puts the site back on the event's post list (if it
+isn't there) and publishes the event to the events topic with post=[site], which only that
+site's poster is subscribed to, as process_events does for a sweep batch. The poster then moves
+it through posting to posted. Nothing else is written: no other event, site, or change log entry
+(so the scheduled sweep doesn't post it a second time).
+
+The status lists are written only if they're still as they were read, as process_status does;
+an event whose lists changed in between is skipped and reported. --dry-run lists the selection
+and what would be done, and writes nothing.
+
+Uses the AWS credentials and region of the environment, like the AWS CLI.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+# The table helpers and site list are in the common layer (on the path: see src/__init__.py)
+from st_james import api, clients, retries, schema, tracing
+
+DEFAULT_TABLE = 'StJamesEvents'
+TOPIC_NAME = 'StJames-events-topic'
+ACCESS = 'public'
+CHANGED = 'status changed since it was read'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--site', required=True, choices=schema.SITES)
+    parser.add_argument('--from', dest='start', required=True, type=datetime.date.fromisoformat, help='YYYY-MM-DD')
+    parser.add_argument('--to', dest='end', required=True, type=datetime.date.fromisoformat, help='YYYY-MM-DD, inclusive')
+    parser.add_argument('--status', nargs='+', choices=schema.STATUS_KEYS, default=['posting'],
+                        help="the lists the site must be in (default: posting, stuck mid-post)")
+    parser.add_argument('--rate', type=float, default=1.0, help='events per second (default 1)')
+    parser.add_argument('--table', default=os.getenv('TABLE_NAME', DEFAULT_TABLE))
+    parser.add_argument('--topic-arn', default=os.getenv('TOPIC_ARN'),
+                        help=f"the events topic (default: TOPIC_ARN, else {TOPIC_NAME} in this account and region)")
+    parser.add_argument('--dry-run', action='store_true', help='list what would be replayed, and write nothing')
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error('--to is before --from')
+    if args.rate <= 0:
+        parser.error('--rate must be more than 0')
+    return args
+
+
+def status_of(item, site):
+    return next((key for key in schema.STATUS_KEYS if site in (item.get(key) or [])), None)
+
+
+def select(table, site, start, end, statuses):
+    """The public events dated start to end with the site in one of the statuses, in date order."""
+    kwargs = {'KeyConditionExpression': Key('access').eq(ACCESS) &
+              Key('date_id').between(start.isoformat(), f"{end.isoformat()}#~")}
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            if status_of(item, site) in statuses:
+                yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def back_to_post(table, item, site):
+    """
+    Moves the site to the item's post list, if the status lists are as read.
+    Returns (success, error message).
+    """
+    names = {f"#{key}": key for key in schema.STATUS_KEYS}
+    conditions, values, updates = [], {}, []
+    for key in schema.STATUS_KEYS:
+        if key in item:
+            conditions.append(f"#{key} = :old_{key}")
+            values[f":old_{key}"] = item[key]
+        else:
+            conditions.append(f"attribute_not_exists(#{key})")
+        sites = [s for s in (item.get(key) or []) if s != site] + ([site] if key == 'post' else [])
+        if key in item or sites:
+            updates.append(f"#{key} = :{key}")
+            values[f":{key}"] = sites
+    # Put back by hand: its failed attempts start again (st_james.retries)
+    removes = []
+    if retries.attempts(item, site):
+        names.update({'#attempts': retries.ATTEMPTS, '#site': site})
+        removes.append('#attempts.#site')
+    try:
+        table.update_item(
+            Key={'access': item['access'], 'date_id': item['date_id']},
+            UpdateExpression='SET ' + ', '.join(updates) + (' REMOVE ' + ', '.join(removes) if removes else ''),
+            ConditionExpression=' AND '.join(conditions),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        return True, None
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False, CHANGED
+        return False, f"DynamoDB error: {e.response['Error']['Code']} - {e.response['Error']['Message']}"
+
+
+def publish(sns, topic_arn, item, site):
+    """Publishes the item for the one site; returns (success, error message)."""
+    message = {k: v for k, v in item.items() if k != 'version'}
+    message['post'] = [site]
+    # Continue the event's trace, as process_events does
+    parent = tracing.SpanContext(item.get('trace_id') or tracing.new_trace_id(), tracing.new_span_id())
+    try:
+        response = sns.publish(
+            TopicArn=topic_arn,
+            Message=api.dumps(message).decode('utf-8'),
+            Subject=f"New post: {item.get('title', 'Untitled')}"[:100],
+            MessageAttributes={'traceparent': {'DataType': 'String', 'StringValue': parent.traceparent}}
+        )
+        return True, response['MessageId']
+    except ClientError as e:
+        return False, f"SNS error: {e.response['Error']['Code']} - {e.response['Error']['Message']}"
+
+
+def default_topic_arn():
+    session = clients.client('sts').get_caller_identity()
+    region = clients.client('sns').meta.region_name
+    return f"arn:aws:sns:{region}:{session['Account']}:{TOPIC_NAME}"
+
+
+def replay(args):
+    """Returns the counts: {'selected', 'published', 'skipped', 'failed'}."""
+    table = clients.table(args.table)
+    items = list(select(table, args.site, args.start, args.end, set(args.status)))
+    counts = {'selected': len(items), 'published': 0, 'skipped': 0, 'failed': 0}
+    mode = 'Dry run: would replay' if args.dry_run else 'Replaying'
+    print(f"{mode} {len(items)} events to {args.site} ({', '.join(args.status)}, "
+          f"{args.start} to {args.end}) at {args.rate:g}/s")
+    if not items:
+        return counts
+
+    if args.dry_run:
+        for idx, item in enumerate(items, start=1):
+            status = status_of(item, args.site)
+            action = 'publish' if status == 'post' else f"move from {status} to post, publish"
+            print(f"  [{idx}/{len(items)}] {item['date_id']} {item.get('title', '')}: {action}")
+        return counts
+
+    sns = clients.client('sns')
+    topic_arn = args.topic_arn or default_topic_arn()
+    interval = 1 / args.rate
+    started = next_at = time.monotonic()
+    for idx, item in enumerate(items, start=1):
+        # Paced from the start, so a slow call doesn't push every later one back
+        wait = next_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        next_at += interval
+
+        status = status_of(item, args.site)
+        ok, detail = (True, None) if status == 'post' else back_to_post(table, item, args.site)
+        if ok:
+            ok, detail = publish(sns, topic_arn, item, args.site)
+            counts['published' if ok else 'failed'] += 1
+            result = f"published ({detail})" if ok else f"failed: {detail}"
+        elif detail == CHANGED:
+            counts['skipped'] += 1
+            result = f"skipped: {detail}"
+        else:
+            counts['failed'] += 1
+            result = f"failed: {detail}"
+        elapsed = time.monotonic() - started
+        print(f"  [{idx}/{len(items)} {elapsed:.1f}s] {item['date_id']} {item.get('title', '')}: {result}")
+
+    print(f"Done: {counts['published']} published, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {time.monotonic() - started:.1f}s")
+    return counts
+
+
+def main(argv=None):
+    counts = replay(parse_args(argv))
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Benchmarks exercise the shared layer code directly, the way the Lambda runtime sees it
+LAYER_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'compute', 'common', 'python')
+sys.path.insert(0, os.path.abspath(LAYER_PATH))
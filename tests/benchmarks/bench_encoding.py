@@ -0,0 +1,91 @@
+"""
+Serialization time and payload size of API responses (st_james.api) at page sizes.
+
+For each size: the time to encode a page of event items as events_list returns them, the way
+the functions used to (jsonify, then json.dumps), in one pass with the stdlib encoder, and with
+orjson when it's installed; then the size of the body as sent, gzipped, and brotli-compressed
+(when brotli is installed), and the time to compress it.
+
+Items come from tests.benchmarks.bench_helpers.make_items: numbers as Decimal, as the table
+returns them.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_encoding [--sizes 100,1000,10000] [--repeat N]
+"""
+import argparse
+import json
+import timeit
+
+from decimal import Decimal
+
+from st_james import api
+from tests.benchmarks.bench_helpers import make_items
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+
+def legacy_dumps(document):
+    # What events_list did before: a walk converting Decimals, then the default encoder
+    def jsonify(obj):
+        if isinstance(obj, list):
+            return [jsonify(x) for x in obj]
+        if isinstance(obj, dict):
+            return {k: jsonify(v) for k, v in obj.items()}
+        if isinstance(obj, Decimal):
+            return int(obj) if obj % 1 == 0 else float(obj)
+        return obj
+    return json.dumps(jsonify(document)).encode('utf-8')
+
+
+def stdlib_dumps(document):
+    return json.dumps(document, default=api.decimal_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encoders():
+    result = {'jsonify+dumps': legacy_dumps, 'one pass': stdlib_dumps}
+    if api.orjson is not None:
+        result['orjson'] = api.dumps
+    return result
+
+
+def best_ms(function, repeat):
+    number = 5
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1000
+
+
+def measure(size, repeat):
+    document = {'items': make_items(size)}
+    result = {'items': size}
+    for name, dumps in encoders().items():
+        result[f"{name} ms"] = best_ms(lambda: dumps(document), repeat)
+
+    body = api.dumps(document)
+    result['body KB'] = len(body) / 1024
+    for encoding in ('gzip', 'br'):
+        if encoding == 'br' and api.brotli is None:
+            continue
+        result[f"{encoding} KB"] = len(api.compress(body, encoding)) / 1024
+        result[f"{encoding} ms"] = best_ms(lambda: api.compress(body, encoding), repeat)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma-separated numbers of items')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if api.orjson is None:
+        print("  (orjson isn't installed: no orjson column)")
+    if api.brotli is None:
+        print("  (brotli isn't installed: no br columns)")
+
+    rows = [measure(int(s), args.repeat) for s in args.sizes.split(',')]
+    columns = list(rows[0])
+    print('  ' + ' '.join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print('  ' + ' '.join(f"{row[c]:>14.2f}" if isinstance(row[c], float) else f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Compares cold-start rate and latency of the split and merged /events layouts.
+
+Three steps:
+  1. init cost: how long importing each function takes in a fresh interpreter, with real boto3
+     (creating the DynamoDB resource is most of it); the merged function imports all five
+  2. warm cost: each route's handler latency, in-process against the in-memory table
+  3. replay: a seeded day of light, spiky traffic over the five routes, against a simple model of
+     Lambda containers (one request at a time each; reclaimed after --keep-alive-minutes idle).
+     A request that finds no idle container pays a cold start: init cost plus a warm sample.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_events_api [--hours H] [--keep-alive-minutes M]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+from tests.harness.pipeline import load_events, percentile
+
+LAYER_PATH = os.path.abspath(os.path.join(lambdas.COMPUTE_PATH, 'common', 'python'))
+FUNCTIONS = ('events_create', 'events_list', 'events_get', 'events_update', 'events_delete')
+
+# Share of requests per route: the site mostly lists and reads
+ROUTE_MIX = {'events_list': 0.55, 'events_get': 0.25, 'events_create': 0.08, 'events_update': 0.08, 'events_delete': 0.04}
+
+INIT_SCRIPT = """
+import importlib, os, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(time.perf_counter() - start)
+"""
+
+
+def measure_init(function, samples):
+    """Median seconds to import a function's module in a fresh interpreter."""
+    if function == 'events_api':
+        paths, module = [LAYER_PATH, lambdas.COMPUTE_PATH], 'events_api.index'
+    else:
+        paths, module = [LAYER_PATH, os.path.join(lambdas.COMPUTE_PATH, function)], 'index'
+    environment = {**os.environ, 'TABLE_NAME': 'StJamesEvents', 'AWS_DEFAULT_REGION': 'us-east-1'}
+
+    times = []
+    for _ in range(samples):
+        output = subprocess.run([sys.executable, '-c', INIT_SCRIPT.format(paths=paths, module=module)],
+                                env=environment, capture_output=True, text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+
+def measure_warm(samples, seed=0):
+    """{layout: {route: [seconds]}} of handler latency for each route, split and merged."""
+    rng = random.Random(seed)
+    events = load_events(200)
+    warm = {'split': {}, 'merged': {}}
+    with Aws().installed(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        handlers = {name: lambdas.load(name, {'TABLE_NAME': 'StJamesEvents'}) for name in FUNCTIONS}
+        merged = lambdas.load('events_api', {'TABLE_NAME': 'StJamesEvents'})
+
+        date_ids = []
+        for event in events:
+            body = {k: event[k] for k in ('access', 'date', 'title', 'time', 'description')}
+            response = handlers['events_create']({'httpMethod': 'POST', 'resource': '/events', 'body': json.dumps(body), 'requestContext': {}})
+            date_ids.append((event['access'], json.loads(response['body'])['item']['date_id']))
+
+        def request(route):
+            access, date_id = rng.choice(date_ids)
+            if route == 'events_create':
+                event = rng.choice(events)
+                body = {k: event[k] for k in ('access', 'date', 'title', 'time', 'description')}
+                return {'httpMethod': 'POST', 'resource': '/events', 'body': json.dumps(body), 'requestContext': {}}
+            if route == 'events_list':
+                return {'httpMethod': 'GET', 'resource': '/events/{access}', 'pathParameters': {'access': access}}
+            method = {'events_get': 'GET', 'events_update': 'PUT', 'events_delete': 'DELETE'}[route]
+            body = json.dumps({'description': 'Updated'}) if route == 'events_update' else None
+            return {'httpMethod': method, 'resource': '/events/{access}/{date_id}', 'body': body,
+                    'pathParameters': {'access': access, 'date_id': date_id.replace('#', '%23')}}
+
+        for route in FUNCTIONS:
+            for layout, function in (('split', handlers[route]), ('merged', merged)):
+                times = warm[layout].setdefault(route, [])
+                for _ in range(samples):
+                    event = request(route)
+                    start = time.perf_counter()
+                    function(event)
+                    times.append(time.perf_counter() - start)
+    return warm
+
+
+def traffic(hours, bursts_per_hour, seed=0):
+    """[(seconds, route)]: bursts at random times, each a handful of requests a few seconds apart."""
+    rng = random.Random(seed)
+    requests, t = [], 0.0
+    end = hours * 3600
+    while True:
+        t += rng.expovariate(bursts_per_hour / 3600)
+        if t >= end:
+            return requests
+        at = t
+        for _ in range(1 + int(rng.expovariate(1 / 4))):
+            at += rng.expovariate(1 / 3)
+            requests.append((at, rng.choices(list(ROUTE_MIX), weights=ROUTE_MIX.values())[0]))
+
+
+def replay(requests, layout, init, warm, keep_alive, seed=0):
+    rng = random.Random(seed)
+    containers = {}
+    latencies, cold = [], 0
+    for at, route in sorted(requests):
+        function = 'events_api' if layout == 'merged' else route
+        pool = containers.setdefault(function, [])
+        # reclaim containers idle longer than the keep-alive
+        pool[:] = [c for c in pool if at - c['idle_since'] < keep_alive or c['busy_until'] > at]
+        idle = [c for c in pool if c['busy_until'] <= at]
+
+        latency = rng.choice(warm[layout][route])
+        if idle:
+            container = max(idle, key=lambda c: c['idle_since'])
+        else:
+            container = {}
+            pool.append(container)
+            latency += init[function]
+            cold += 1
+        container['busy_until'] = container['idle_since'] = at + latency
+        latencies.append(latency)
+
+    return {
+        'requests': len(latencies),
+        'cold_starts': cold,
+        'cold_start_rate': cold / len(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def run(hours=24, bursts_per_hour=3, keep_alive_minutes=7, init_samples=5, warm_samples=200, seed=0):
+    init = {function: measure_init(function, init_samples) for function in FUNCTIONS + ('events_api',)}
+    warm = measure_warm(warm_samples, seed)
+    requests = traffic(hours, bursts_per_hour, seed)
+    return init, {layout: replay(requests, layout, init, warm, keep_alive_minutes * 60, seed) for layout in ('split', 'merged')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=24, help='hours of traffic to replay')
+    parser.add_argument('--bursts-per-hour', type=float, default=3, help='how often a burst of requests arrives')
+    parser.add_argument('--keep-alive-minutes', type=float, default=7, help='how long an idle container stays warm')
+    parser.add_argument('--init-samples', type=int, default=5, help='fresh interpreters per function for the init cost')
+    parser.add_argument('--warm-samples', type=int, default=200, help='warm invocations per route and layout')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    init, results = run(args.hours, args.bursts_per_hour, args.keep_alive_minutes, args.init_samples, args.warm_samples, args.seed)
+    print("Init (import) cost, median of fresh interpreters")
+    for function, seconds in init.items():
+        print(f"  {function:<14} {seconds * 1000:8.1f} ms")
+    print(f"{args.hours:g}h of traffic, {args.bursts_per_hour:g} bursts/h, {args.keep_alive_minutes:g} min keep-alive")
+    print(f"  {'layout':<8} {'requests':>9} {'cold':>6} {'cold %':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for layout, r in results.items():
+        print(f"  {layout:<8} {r['requests']:>9} {r['cold_starts']:>6} {r['cold_start_rate'] * 100:>6.1f}% "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
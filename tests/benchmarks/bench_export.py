@@ -0,0 +1,103 @@
+"""
+Wall-clock time and peak memory of a full-table export (src/compute/export_events) by number of
+segments.
+
+The export runs against the AWS stand-ins, except for its Scan calls: the items are split into
+segments and pages up front, in the wire format, and each page costs --page-ms (what a 1 MB page
+takes DynamoDB to read and send). So the time is the scan's waits, which segments overlap, and
+the export's own encoding and compression, which share the one interpreter. Peak memory comes
+from a second run under tracemalloc (which slows it down) and should follow the number of
+segments, a page and a part each, not the table size; the parts are counted, not kept, so the
+S3 stand-in doesn't hold the table either.
+
+Items come from tests.benchmarks.bench_helpers.make_items.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_export [--items 20000,80000] [--segments 1,2,4,8,16] [--page-ms 20]
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+import tracemalloc
+import zlib
+
+from tests.benchmarks.bench_helpers import make_items
+from tests.harness import lambdas
+from tests.harness.aws import Aws, to_dynamodb
+
+BUCKET = 'stjames-data-pm186'
+
+
+class PagedScan:
+    """Scan with Segment/TotalSegments over fixed items: pages by position, a fixed wait each."""
+    def __init__(self, items, page_ms):
+        self.items = [to_dynamodb(item) for item in items]
+        self.page_ms = page_ms
+        self.segments = {}
+
+    def __call__(self, TableName, Segment, TotalSegments, Limit, ExclusiveStartKey=None, **kwargs):
+        if TotalSegments not in self.segments:
+            split = [[] for _ in range(TotalSegments)]
+            for item in self.items:
+                split[zlib.crc32(item['date_id']['S'].encode()) % TotalSegments].append(item)
+            self.segments[TotalSegments] = split
+        items = self.segments[TotalSegments][Segment]
+        start = int(ExclusiveStartKey['position']['N']) if ExclusiveStartKey else 0
+        time.sleep(self.page_ms / 1000)
+        response = {'Items': items[start:start + Limit]}
+        if start + Limit < len(items):
+            response['LastEvaluatedKey'] = {'position': {'N': str(start + Limit)}}
+        return response
+
+
+def export_once(aws, export, segments):
+    # The functions' log lines and metrics go nowhere
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': segments})})
+        aws.lambda_.wait(timeout=900)
+        job_id = json.loads(response['body'])['job']
+        job = json.loads(export.invoke({'httpMethod': 'GET', 'pathParameters': {'job': job_id}})['body'])
+    assert job['status'] == 'completed', job
+    return job['items']
+
+
+def measure(aws, export, segments):
+    start = time.perf_counter()
+    items = export_once(aws, export, segments)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        export_once(aws, export, segments)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'items': items, 'seconds': seconds, 'peak MB': peak / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', default='20000,80000', help='comma-separated table sizes')
+    parser.add_argument('--segments', default='1,2,4,8,16', help='comma-separated TotalSegments values')
+    parser.add_argument('--page-ms', type=float, default=20, help='simulated time per Scan page')
+    args = parser.parse_args()
+
+    print(f"  {'items':>8} {'segments':>9} {'seconds':>9} {'items/s':>9} {'peak MB':>9}")
+    for count in map(int, args.items.split(',')):
+        aws = Aws()
+        with aws.installed():
+            export = lambdas.load('export_events', {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET},
+                                  timeout_seconds=900)
+            export.module.DYNAMODB.scan = PagedScan(make_items(count), args.page_ms)
+            aws.lambda_.register(export.function_name, export.invoke)
+            aws.s3.put_object = lambda Bucket, Key, Body=b'', **kwargs: {'ETag': f'"{len(Body)}"'}
+            for segments in map(int, args.segments.split(',')):
+                row = measure(aws, export, segments)
+                print(f"  {row['items']:>8} {segments:>9} {row['seconds']:>9.2f} {row['items'] / row['seconds']:>9.0f} "
+                      f"{row['peak MB']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks for the pure helpers on the hot paths of the Lambdas.
+
+Each case runs a helper over N generated inputs (the same inputs every run, from a fixed seed)
+and reports items/sec, best of --repeat runs, and the peak memory allocated per item while
+running, from tracemalloc. Results can be saved and compared with an earlier run:
+
+    python -m tests.benchmarks.bench_helpers --save before
+    ... change a helper ...
+    python -m tests.benchmarks.bench_helpers --compare before
+
+Run from the repository root. Saved results go to tests/benchmarks/results/<name>.json.
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+import tracemalloc
+import uuid
+
+from decimal import Decimal
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws, to_dynamodb
+from tests.harness.pipeline import load_events
+
+from st_james import adapters, api, event_times, payloads, schema
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+DEFAULT_SIZES = (10, 1000, 100000)
+SITES = ['gov', 'moms', 'patch', 'sojourner', 'test']
+
+
+def load_functions():
+    """Imports the Lambdas the helpers live in, with the AWS stand-ins in place of boto3."""
+    functions = {}
+    with Aws().installed(), contextlib.redirect_stdout(io.StringIO()):
+        for name in ('events_create', 'events_update', 'events_get', 'events_list', 'process_events'):
+            environment = {'TABLE_NAME': 'StJamesEvents', 'TOPIC_ARN': 'arn:aws:sns:us-east-1:123456789012:topic',
+                           'STATUS_URL': 'http://localhost/status'}
+            functions[name] = lambdas.load(name, environment).module
+    return functions
+
+
+# Inputs
+
+def make_items(count, seed=0):
+    """Event items the way the table returns them: numbers as Decimal, times normalized."""
+    rng = random.Random(seed)
+    events = load_events(count)
+    items = []
+    for event in events:
+        item = {
+            'access': event['access'],
+            'date_id': f"{event['date']}#{uuid.UUID(int=rng.getrandbits(128))}",
+            'title': event['title'],
+            'time': event['time'],
+            'description': event['description'],
+            'post': rng.sample(SITES, 2),
+            'posted': [],
+            'trace_id': f"{rng.getrandbits(128):032x}"
+        }
+        event_times.normalize(item)
+        item['start_epoch_ms'] = Decimal(item['start_epoch_ms'])
+        item['end_epoch_ms'] = Decimal(item['end_epoch_ms'])
+        item['version'] = Decimal(rng.randint(1, 9))
+        item['score'] = Decimal(str(round(rng.random(), 3)))
+        items.append(item)
+    return items
+
+
+def make_images(count, seed=0):
+    """Stream NewImages (DynamoDB JSON) for process_events."""
+    return [to_dynamodb(item) for item in make_items(count, seed)]
+
+
+def make_list_payloads(count, seed=0):
+    # Mostly valid, with some invalid values and some conflicts, like real requests
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        sites = rng.sample(SITES[1:], 3)
+        payload = {'post': sites[:1], 'posting': sites[1:2], 'posted': sites[2:]}
+        roll = rng.random()
+        if roll < 0.1:
+            payload['post'].append('nowhere')
+        elif roll < 0.2:
+            payload['posted'].append(sites[0])
+        result.append(payload)
+    return result
+
+
+def make_messages(count, normalized=True, seed=0):
+    items = make_items(count, seed)
+    if not normalized:
+        for item in items:
+            for field in event_times.NORMALIZED_FIELDS:
+                item.pop(field, None)
+    return items
+
+
+def make_dates(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime.date(2024, 1, 1)
+    return [(start + datetime.timedelta(days=rng.randrange(3 * 365))).isoformat() for _ in range(count)]
+
+
+def make_time_strings(count, seed=0):
+    # Distinct (date, time) pairs, so the memoized parser has to work for each one
+    rng = random.Random(seed)
+    dates = make_dates(count, seed)
+    times = ['7-10 pm', '10 am', '10:30 am', '3 pm', 'noon', '10 am - 4 pm', '5:30-7 pm', '9:15 am']
+    return [(day, rng.choice(times)) for day in dates]
+
+
+def make_captchas(count, seed=0):
+    rng = random.Random(seed)
+    return [''.join(f"{rng.randrange(47, 122):02x}" for _ in range(rng.randint(4, 8))) for _ in range(count)]
+
+
+# Cases: name -> (make inputs, run over inputs)
+
+def cases(functions):
+    def over(function):
+        return lambda inputs: [function(x) for x in inputs]
+
+    def parse_uncached(pairs):
+        event_times.parse.cache_clear()
+        return [event_times.parse(day, time) for day, time in pairs]
+
+    result = {
+        # The per-function jsonify walks were replaced by encoding in one pass (bench_encoding
+        # compares the two); a page of events_list results at once
+        'api.dumps': (make_items, api.dumps),
+        # What replaced the functions' validate_lists: the compiled schema, then the overlap check
+        'validate[EVENT_UPDATE]': (make_list_payloads, over(lambda payload: functions['events_update'].VALIDATE_BODY(payload)
+                                                            or schema.overlapping_sites(payload))),
+        'convert_dynamodb_item': (make_images, over(functions['process_events'].convert_dynamodb_item)),
+        'get_times[normalized]': (make_messages, over(adapters.get_times)),
+        'get_times[parsed]': (lambda n: make_messages(n, normalized=False), over(adapters.get_times)),
+        # eastern_to_epoch was replaced by the shared parser; these measure what the posters call now
+        'event_times.parse[uncached]': (make_time_strings, parse_uncached),
+        'event_times.epochs_ms': (make_messages, over(event_times.epochs_ms)),
+        'calculate_week_and_julian': (make_dates, over(payloads.calculate_week_and_julian)),
+        'decode_captcha': (make_captchas, over(adapters.decode_captcha)),
+    }
+    return result
+
+
+def measure(make, run, size, repeat):
+    inputs = make(size)
+    # Fewer runs for the big sizes, so the suite stays quick
+    repeat = max(1, repeat if size <= 10000 else repeat // 2)
+    number = max(1, 10000 // size)
+    best = min(timeit.repeat(lambda: run(inputs), number=number, repeat=repeat)) / number
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = run(inputs)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    del result
+
+    return {'items_per_second': size / best, 'usec_per_item': best / size * 1e6, 'peak_bytes_per_item': peak / size}
+
+
+def run(sizes=DEFAULT_SIZES, repeat=5, only=None):
+    functions = load_functions()
+    results = {}
+    for name, (make, function) in cases(functions).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        for size in sizes:
+            results[f"{name}/{size}"] = measure(make, function, size, repeat)
+    return results
+
+
+def save(name, results):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    document = {
+        'saved': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results
+    }
+    path = os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def load(name):
+    with open(os.path.join(RESULTS_DIR, f"{name}.json")) as f:
+        return json.load(f)['results']
+
+
+def format_results(results, baseline=None):
+    lines = [f"  {'case':<44} {'items/s':>12} {'us/item':>9} {'bytes/item':>11}" + ('   vs baseline' if baseline else '')]
+    for key, r in results.items():
+        line = f"  {key:<44} {r['items_per_second']:>12,.0f} {r['usec_per_item']:>9.3f} {r['peak_bytes_per_item']:>11.1f}"
+        if baseline and key in baseline:
+            before = baseline[key]
+            speedup = r['items_per_second'] / before['items_per_second']
+            memory = r['peak_bytes_per_item'] - before['peak_bytes_per_item']
+            line += f"   {speedup:5.2f}x {memory:+9.1f} B"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma-separated input sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs; the best is reported')
+    parser.add_argument('--only', help='comma-separated substrings; run only the cases that match one')
+    parser.add_argument('--save', metavar='NAME', help='save the results as NAME')
+    parser.add_argument('--compare', metavar='NAME', help='compare with the results saved as NAME')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.repeat, args.only.split(',') if args.only else None)
+    baseline = load(args.compare) if args.compare else None
+
+    print(f"Helper micro-benchmarks, best of {args.repeat} runs")
+    print(format_results(results, baseline))
+    if args.save:
+        print(f"Saved to {save(args.save, results)}")
+
+
+if __name__ == '__main__':
+    main()
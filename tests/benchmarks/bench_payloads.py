@@ -0,0 +1,77 @@
+"""
+Measures the cost of building one site payload per event.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_payloads [--events N]
+"""
+import argparse
+import json
+import os
+import timeit
+
+from st_james import payloads
+
+EVENTS_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'events.json')
+
+FORM_VALUES = {
+    '_token': 'token',
+    'captcha_value': 'captcha',
+    'hs_fv_hash': 'hash',
+    'hs_fv_ip': 'ip',
+    'hs_fv_timestamp': 'timestamp'
+}
+
+
+def load_messages(count):
+    with open(EVENTS_FILE) as f:
+        events = json.load(f)
+
+    messages = []
+    for index in range(count):
+        event = events[index % len(events)]
+        messages.append({
+            'access': event['access'],
+            'date_id': f"{event['date']}#00000000-0000-0000-0000-{index:012d}",
+            'title': event['title'],
+            'time': event['time'],
+            'description': event['description']
+        })
+    return messages
+
+
+def builders():
+    return {
+        'moms': lambda m: payloads.build_moms_payload(m, 1727640000000, 1727643600000, 'me@example.com'),
+        'patch': lambda m: payloads.build_patch_payload(m, 1727640000),
+        'sojourner': lambda m: payloads.build_sojourner_payload(m, m['date_id'][:10] + ' ' + m['time'], FORM_VALUES, 'me@example.com'),
+        'gov': lambda m: payloads.build_gov_payload(m, '03:00', '04:00', '15:00', '16:00')
+    }
+
+
+def run(count, repeat):
+    messages = load_messages(count)
+    results = {}
+    for site, build in builders().items():
+        def build_all():
+            for message in messages:
+                build(message)
+
+        best = min(timeit.repeat(build_all, number=1, repeat=repeat))
+        results[site] = best / count * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=10000, help='number of events to build payloads for')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs; the best is reported')
+    args = parser.parse_args()
+
+    results = run(args.events, args.repeat)
+    print(f"Payload construction, best of {args.repeat} runs over {args.events} events")
+    for site, usec in results.items():
+        print(f"  {site:<10} {usec:8.2f} us/event")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Replays data/events.json, scaled up, through the whole posting pipeline offline.
+
+Every Lambda runs in-process against in-memory DynamoDB/SNS/S3/Secrets Manager, and the sites
+are a local HTTP server (see tests/harness). Reports throughput and p50/p95/p99 per stage.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_pipeline [--events N] [--latency-ms MS] [--error-rate R]
+"""
+import argparse
+import json
+
+from tests.harness.pipeline import Pipeline, load_events
+from tests.harness.websites import SITES, Behavior
+
+
+def run(count, source='api', latency_ms=0, jitter_ms=0, error_rate=0.0, create_concurrency=4, sites=SITES):
+    behaviors = {site: Behavior(latency_ms, jitter_ms, error_rate) for site in sites}
+    with Pipeline(sites, behaviors, create_concurrency=create_concurrency) as pipeline:
+        return pipeline.run(load_events(count), source=source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=1000, help='number of events to replay')
+    parser.add_argument('--source', choices=('api', 's3'), default='api',
+                        help='create events through events_create, or load them with initialize_events')
+    parser.add_argument('--sites', default=','.join(SITES), help='comma-separated sites to post to')
+    parser.add_argument('--latency-ms', type=float, default=20, help='site response latency')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='random extra site latency, up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of posts the sites fail')
+    parser.add_argument('--create-concurrency', type=int, default=4, help='concurrent events_create calls')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    report = run(args.events, args.source, args.latency_ms, args.jitter_ms, args.error_rate,
+                 args.create_concurrency, args.sites.split(','))
+    print(report.format())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.as_dict(), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Build time, size and query latency of the search index (st_james.search) at calendar scale.
+
+For each size: the time to build the index from scratch (what publish_calendar does the first
+time), its stored size, the time to load it (what a cold events_list container does on its
+first ?q=), the time to apply a batch of stream changes, and query latency for a mix of common,
+rare, multi-word and prefix queries.
+
+Events come from data/events.json, scaled with tests.harness.pipeline.load_events; that repeats
+a few dozen descriptions, so each also gets a few words drawn (Zipf-like, fixed seed) from a
+synthetic vocabulary, to give the index a realistic number of distinct terms.
+
+Run from the repository root:
+    python -m tests.benchmarks.bench_search [--sizes 10000,100000] [--queries N]
+"""
+import argparse
+import random
+import time
+
+from st_james.search import SearchIndex
+from tests.harness.pipeline import load_events, percentile
+
+DEFAULT_SIZES = (10000, 100000)
+VOCABULARY = 20000
+WORDS_PER_EVENT = 8
+CHANGES = 100
+
+
+def synthetic_word(n):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    word = ''
+    n += 26 * 27
+    while n:
+        n, r = divmod(n, 26)
+        word = letters[r] + word
+    return word
+
+
+def make_items(count, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY)]
+    words = [synthetic_word(n) for n in range(VOCABULARY)]
+    items = {}
+    for n, event in enumerate(load_events(count)):
+        extra = ' '.join(rng.choices(words, weights=weights, k=WORDS_PER_EVENT))
+        date_id = f"{event['date']}#{n:08d}"
+        items[date_id] = {'title': event['title'], 'description': f"{event.get('description', '')} {extra}"}
+    return items, words
+
+
+def make_queries(count, items, words, seed=0):
+    rng = random.Random(seed)
+    titles = [item['title'].split() for item in items.values()]
+    queries = []
+    for n in range(count):
+        kind = n % 4
+        if kind == 0:
+            queries.append(rng.choice(words[:50]))                  # common
+        elif kind == 1:
+            queries.append(rng.choice(words[5000:]))                # rare
+        elif kind == 2:
+            queries.append(' '.join(rng.sample(rng.choice(titles), min(2, len(rng.choice(titles))))))
+        else:
+            queries.append(rng.choice(words[100:2000])[:3])         # a word being typed
+    return queries
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def measure(size, query_count, seed=0):
+    items, words = make_items(size, seed)
+
+    def build():
+        index = SearchIndex()
+        for date_id, item in items.items():
+            index.add(date_id, item)
+        return index
+    index, build_seconds = timed(build)
+
+    stored, dump_seconds = timed(index.to_gzip)
+    _, load_seconds = timed(lambda: SearchIndex.from_gzip(stored))
+
+    # A batch of stream changes: retitled events
+    rng = random.Random(seed)
+    changed = rng.sample(list(items), CHANGES)
+    def apply():
+        for date_id in changed:
+            index.update(date_id, items[date_id], {**items[date_id], 'title': items[date_id]['title'] + ' Rescheduled'})
+    _, update_seconds = timed(apply)
+
+    latencies = []
+    for query in make_queries(query_count, items, words, seed):
+        _, seconds = timed(lambda: index.search(query))
+        latencies.append(seconds)
+
+    return {
+        'events': size,
+        'terms': len(index.postings),
+        'build_s': build_seconds,
+        'stored_kb': len(stored) / 1024,
+        'dump_s': dump_seconds,
+        'load_s': load_seconds,
+        'update_ms_per_change': update_seconds / CHANGES * 1000,
+        'query_p50_ms': percentile(latencies, 50) * 1000,
+        'query_p95_ms': percentile(latencies, 95) * 1000,
+        'query_p99_ms': percentile(latencies, 99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='comma-separated numbers of events')
+    parser.add_argument('--queries', type=int, default=400, help='queries timed per size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"  {'events':>8} {'terms':>7} {'build s':>8} {'stored KB':>10} {'dump s':>7} {'load s':>7} "
+          f"{'upd ms':>7} {'q p50 ms':>9} {'q p95 ms':>9} {'q p99 ms':>9}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        r = measure(size, args.queries, args.seed)
+        print(f"  {r['events']:>8} {r['terms']:>7} {r['build_s']:>8.2f} {r['stored_kb']:>10.0f} {r['dump_s']:>7.2f} "
+              f"{r['load_s']:>7.2f} {r['update_ms_per_change']:>7.3f} {r['query_p50_ms']:>9.3f} "
+              f"{r['query_p95_ms']:>9.3f} {r['query_p99_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The Lambdas import the shared code from the common layer, the way the Lambda runtime sees it
+LAYER_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'compute', 'common', 'python')
+if os.path.abspath(LAYER_PATH) not in sys.path:
+    sys.path.insert(0, os.path.abspath(LAYER_PATH))
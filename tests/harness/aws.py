@@ -0,0 +1,524 @@
+"""
+In-memory stand-ins for the AWS services our Lambdas call: DynamoDB (resource Table API plus a
+stream), SNS (with message-body filter policies), S3, Secrets Manager and Lambda Invoke.
+
+    aws = Aws()
+    with aws.installed():
+        ...  # boto3.client(...) / boto3.resource(...) now return the stand-ins
+
+Items go through boto3's own type serializer on the way in, so they come back the way DynamoDB
+returns them (numbers as Decimal, floats rejected), and every write to a table is appended to
+its stream in the shape a DynamoDB stream event source delivers.
+"""
+import base64
+import copy
+import io
+import itertools
+import json
+import threading
+import uuid
+import zlib
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from unittest import mock
+
+import boto3
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from st_james import clients
+
+from tests.harness import expressions
+
+REGION = 'us-east-1'
+ACCOUNT = '123456789012'
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def to_dynamodb(item):
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def from_dynamodb(image):
+    return {k: _deserializer.deserialize(v) for k, v in image.items()}
+
+
+def _stored(item):
+    # Round trip through the wire format: validates types and copies, the way DynamoDB would
+    return from_dynamodb(to_dynamodb(item))
+
+
+class Table:
+    def __init__(self, name, hash_key='access', range_key='date_id'):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.items = {}
+        self.stream = []
+        self.lock = threading.RLock()
+        self._sequence = itertools.count(1)
+        self.calls = {}
+
+    # Helpers
+
+    def _key(self, key):
+        try:
+            return key[self.hash_key], key[self.range_key]
+        except KeyError as e:
+            raise client_error('ValidationException', f"Missing key attribute {e}", 'GetItem')
+
+    def _count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _check(self, operation, current, condition, names, values):
+        if condition is None:
+            return
+        if not expressions.evaluate_condition(condition, current or {}, names, values):
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def _record(self, old, new, user_identity=None):
+        if old is None and new is None:
+            return
+        name = 'INSERT' if old is None else 'REMOVE' if new is None else 'MODIFY'
+        image = new if new is not None else old
+        record = {
+            'eventID': uuid.uuid4().hex,
+            'eventName': name,
+            'eventSource': 'aws:dynamodb',
+            'awsRegion': REGION,
+            'dynamodb': {
+                'ApproximateCreationDateTime': datetime.now(timezone.utc).timestamp(),
+                'Keys': to_dynamodb({self.hash_key: image[self.hash_key], self.range_key: image[self.range_key]}),
+                'SequenceNumber': str(next(self._sequence)),
+                'StreamViewType': 'NEW_AND_OLD_IMAGES'
+            }
+        }
+        if new is not None:
+            record['dynamodb']['NewImage'] = to_dynamodb(new)
+        if old is not None:
+            record['dynamodb']['OldImage'] = to_dynamodb(old)
+        if user_identity is not None:
+            record['userIdentity'] = user_identity
+        self.stream.append(record)
+
+    def _write(self, key, new):
+        old = self.items.get(key)
+        if new is None:
+            self.items.pop(key, None)
+        else:
+            self.items[key] = new
+        self._record(old, new)
+        return old
+
+    @staticmethod
+    def _returned(return_values, old, new):
+        if return_values == 'ALL_OLD' and old is not None:
+            return {'Attributes': copy.deepcopy(old)}
+        if return_values in ('ALL_NEW', 'UPDATED_NEW') and new is not None:
+            return {'Attributes': copy.deepcopy(new)}
+        return {}
+
+    def expire(self, now, attribute='expires_at'):
+        """Deletes the items whose TTL attribute is at or before `now` (epoch seconds), as the table's TTL would."""
+        with self.lock:
+            expired = [key for key, item in self.items.items() if attribute in item and item[attribute] <= now]
+            for key in expired:
+                old = self.items.pop(key)
+                self._record(old, None, {'type': 'Service', 'principalId': 'dynamodb.amazonaws.com'})
+            return len(expired)
+
+    def take_stream(self, limit=None):
+        """Removes and returns up to `limit` of the oldest stream records."""
+        with self.lock:
+            count = len(self.stream) if limit is None else min(limit, len(self.stream))
+            records, self.stream = self.stream[:count], self.stream[count:]
+            return records
+
+    # Table API
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        item = _stored(Item)
+        key = self._key(item)
+        with self.lock:
+            self._count('PutItem')
+            self._check('PutItem', self.items.get(key), ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            old = self._write(key, item)
+            return self._returned(ReturnValues, old, None)
+
+    def get_item(self, Key, **kwargs):
+        with self.lock:
+            self._count('GetItem')
+            item = self.items.get(self._key(Key))
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        key = self._key(Key)
+        with self.lock:
+            self._count('DeleteItem')
+            self._check('DeleteItem', self.items.get(key), ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            old = self._write(key, None)
+            return self._returned(ReturnValues, old, None)
+
+    def update_item(self, Key, UpdateExpression=None, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        key = self._key(Key)
+        values = _stored(ExpressionAttributeValues or {})
+        with self.lock:
+            self._count('UpdateItem')
+            current = self.items.get(key)
+            self._check('UpdateItem', current, ConditionExpression, ExpressionAttributeNames, values)
+            new = copy.deepcopy(current) if current is not None else dict(Key)
+            if UpdateExpression:
+                expressions.apply_update(new, UpdateExpression, ExpressionAttributeNames, values)
+            new = _stored(new)
+            old = self._write(key, new)
+            return self._returned(ReturnValues, old, new)
+
+    def _select(self, candidates, FilterExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                Limit=None, ExclusiveStartKey=None, Select=None, ScanIndexForward=True, **kwargs):
+        candidates = sorted(candidates, key=lambda kv: kv[0], reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start = self._key(ExclusiveStartKey)
+            candidates = [kv for kv in candidates if (kv[0] > start if ScanIndexForward else kv[0] < start)]
+
+        # Limit counts items evaluated, before the filter, as DynamoDB does
+        evaluated = candidates[:Limit] if Limit else candidates
+        last_key = None
+        if Limit and len(candidates) > Limit:
+            last_key = {self.hash_key: evaluated[-1][0][0], self.range_key: evaluated[-1][0][1]}
+
+        items = [item for _, item in evaluated]
+        if FilterExpression is not None:
+            predicate = expressions.compile_condition(*expressions.build(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues))
+            items = [item for item in items if predicate(item)]
+
+        response = {'Count': len(items), 'ScannedCount': len(evaluated)}
+        if Select != 'COUNT':
+            response['Items'] = copy.deepcopy(items)
+        if last_key:
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    def query(self, KeyConditionExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        expression, names, values = expressions.build(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, is_key_condition=True)
+        predicate = expressions.compile_condition(expression, names, values)
+        with self.lock:
+            self._count('Query')
+            candidates = [(key, item) for key, item in self.items.items() if predicate(item)]
+            # names/values may be shared with a FilterExpression
+            return self._select(candidates, ExpressionAttributeNames=names, ExpressionAttributeValues=values, **kwargs)
+
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        with self.lock:
+            self._count('Scan')
+            candidates = list(self.items.items())
+            if TotalSegments:
+                candidates = [(key, item) for key, item in candidates
+                              if zlib.crc32(json.dumps(key, default=str).encode()) % TotalSegments == Segment]
+            return self._select(candidates, **kwargs)
+
+    @contextmanager
+    def batch_writer(self, overwrite_by_pkeys=None):
+        yield _BatchWriter(self)
+
+
+class _BatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def put_item(self, Item):
+        self.table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self.table.delete_item(Key=Key)
+
+
+class DynamoDB:
+    """
+    boto3.resource('dynamodb') stand-in, and enough of boto3.client('dynamodb') for scans and puts; tables
+    are created on first use.
+
+    Set batch_get_capacity to have each BatchGetItem call read at most that many keys and
+    return the rest as UnprocessedKeys, as DynamoDB does when a call hits the 16 MB response
+    limit or the table's throughput.
+    """
+    BATCH_GET_MAX_KEYS = 100
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.batch_get_capacity = None
+
+    def Table(self, name):
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = Table(name)
+            return self.tables[name]
+
+    def scan(self, TableName, ExclusiveStartKey=None, **kwargs):
+        """boto3.client('dynamodb').scan: items and keys in the wire format."""
+        if ExclusiveStartKey:
+            kwargs['ExclusiveStartKey'] = from_dynamodb(ExclusiveStartKey)
+        response = self.Table(TableName).scan(**kwargs)
+        if 'Items' in response:
+            response['Items'] = [to_dynamodb(item) for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = to_dynamodb(response['LastEvaluatedKey'])
+        return response
+
+    def put_item(self, TableName, Item, **kwargs):
+        """boto3.client('dynamodb').put_item: the item (and any expression values) in the wire format."""
+        if 'ExpressionAttributeValues' in kwargs:
+            kwargs['ExpressionAttributeValues'] = from_dynamodb(kwargs['ExpressionAttributeValues'])
+        self.Table(TableName).put_item(Item=from_dynamodb(Item), **kwargs)
+        return {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        if sum(len(request['Keys']) for request in RequestItems.values()) > self.BATCH_GET_MAX_KEYS:
+            raise client_error('ValidationException', 'Too many items requested for the BatchGetItem call', 'BatchGetItem')
+
+        capacity = self.batch_get_capacity
+        responses, unprocessed = {}, {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            keys = [table._key(key) for key in request['Keys']]
+            if len(set(keys)) != len(keys):
+                raise client_error('ValidationException', 'Provided list of item keys contains duplicates', 'BatchGetItem')
+
+            read = request['Keys'] if capacity is None else request['Keys'][:capacity]
+            with table.lock:
+                table._count('BatchGetItem')
+                found = [table.items.get(table._key(key)) for key in read]
+            responses[name] = [copy.deepcopy(item) for item in found if item is not None]
+            if len(read) < len(request['Keys']):
+                unprocessed[name] = {**request, 'Keys': request['Keys'][len(read):]}
+            if capacity is not None:
+                capacity -= len(read)
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+
+def _matches_filter_policy(policy, body):
+    # Enough of SNS filter policies for string allowlists on message body attributes
+    for attribute, allowed in policy.items():
+        value = body.get(attribute)
+        values = value if isinstance(value, list) else [value]
+        if not any(v in allowed for v in values if v is not None):
+            return False
+    return True
+
+
+class Sns:
+    def __init__(self):
+        self.messages = []
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, topic_arn, deliver, filter_policy_with_message_body=None):
+        """Calls deliver(record) with an SNS Lambda event record for every matching message."""
+        self.subscriptions.setdefault(topic_arn, []).append((deliver, filter_policy_with_message_body))
+
+    def publish(self, TopicArn, Message, Subject=None, MessageAttributes=None, **kwargs):
+        message_id = str(uuid.uuid4())
+        with self.lock:
+            self.messages.append({'TopicArn': TopicArn, 'Message': Message, 'Subject': Subject,
+                                  'MessageAttributes': MessageAttributes or {}, 'MessageId': message_id})
+
+        record = {
+            'EventSource': 'aws:sns',
+            'Sns': {
+                'Type': 'Notification',
+                'MessageId': message_id,
+                'TopicArn': TopicArn,
+                'Subject': Subject,
+                'Message': Message,
+                'Timestamp': datetime.now(timezone.utc).isoformat(),
+                'MessageAttributes': {
+                    name: {'Type': a['DataType'], 'Value': a.get('StringValue')}
+                    for name, a in (MessageAttributes or {}).items()
+                }
+            }
+        }
+        body = None
+        for deliver, policy in self.subscriptions.get(TopicArn, []):
+            if policy:
+                body = body if body is not None else json.loads(Message)
+                if not _matches_filter_policy(policy, body):
+                    continue
+            deliver(copy.deepcopy(record))
+        return {'MessageId': message_id}
+
+    def published(self, topic_arn):
+        return [m for m in self.messages if m['TopicArn'] == topic_arn]
+
+
+class S3:
+    def __init__(self):
+        self.objects = {}
+        self.calls = {}
+
+    def _check(self, Bucket, Key, operation, IfMatch=None, IfNoneMatch=None):
+        # Conditional writes: If-Match an ETag, or If-None-Match '*' for only if there's none
+        stored = self.objects.get((Bucket, Key))
+        if IfMatch is not None and (stored is None or stored['ETag'] != IfMatch):
+            raise client_error('PreconditionFailed' if stored else 'NoSuchKey', 'At least one of the pre-conditions you specified did not hold', operation)
+        if IfNoneMatch == '*' and stored is not None:
+            raise client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', operation)
+
+    def put_object(self, Bucket, Key, Body=b'', IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._check(Bucket, Key, 'PutObject', IfMatch, IfNoneMatch)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        etag = f'"{zlib.crc32(Body):08x}"'
+        self.objects[(Bucket, Key)] = {'Body': bytes(Body), 'ETag': etag, **{k: v for k, v in kwargs.items() if k in ('ContentType', 'ContentEncoding', 'CacheControl', 'Metadata')}}
+        self.calls[('PutObject', Key)] = self.calls.get(('PutObject', Key), 0) + 1
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise client_error('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        if IfNoneMatch is not None and IfNoneMatch == stored['ETag']:
+            raise client_error('304', 'Not Modified', 'GetObject')
+        return {**{k: v for k, v in stored.items() if k != 'Body'}, 'Body': io.BytesIO(stored['Body']), 'ContentLength': len(stored['Body'])}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            # HEAD responses have no body, so S3 can only say 404
+            raise client_error('404', 'Not Found', 'HeadObject')
+        response = self.get_object(Bucket, Key)
+        response.pop('Body')
+        return response
+
+    def delete_object(self, Bucket, Key, IfMatch=None, **kwargs):
+        self._check(Bucket, Key, 'DeleteObject', IfMatch)
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(base64.b64decode(ContinuationToken)) if ContinuationToken else 0
+        page = keys[start:start + MaxKeys]
+        response = {'KeyCount': len(page), 'Contents': [{'Key': k, 'Size': len(self.objects[(Bucket, k)]['Body']), 'ETag': self.objects[(Bucket, k)]['ETag']} for k in page]}
+        if start + MaxKeys < len(keys):
+            response['IsTruncated'] = True
+            response['NextContinuationToken'] = base64.b64encode(str(start + MaxKeys).encode()).decode()
+        else:
+            response['IsTruncated'] = False
+        return response
+
+
+class LambdaService:
+    """Lambda Invoke: functions are registered by name; 'Event' invocations run on their own thread."""
+    def __init__(self):
+        self.functions = {}
+        self.invocations = []
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def register(self, name, function):
+        """function(event) -> result"""
+        self.functions[name] = function
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b'{}', **kwargs):
+        if FunctionName not in self.functions:
+            raise client_error('ResourceNotFoundException', f"Function not found: {FunctionName}", 'Invoke')
+        event = json.loads(Payload)
+        function = self.functions[FunctionName]
+        with self.lock:
+            self.invocations.append({'FunctionName': FunctionName, 'InvocationType': InvocationType, 'Payload': event})
+
+        if InvocationType == 'Event':
+            thread = threading.Thread(target=function, args=(event,), daemon=True)
+            with self.lock:
+                self.threads.append(thread)
+            thread.start()
+            return {'StatusCode': 202}
+        result = function(event)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result, default=str).encode('utf-8'))}
+
+    def wait(self, timeout=30):
+        """Waits for the asynchronous invocations, including any they start."""
+        while True:
+            with self.lock:
+                running = [t for t in self.threads if t.is_alive()]
+            if not running:
+                return
+            for thread in running:
+                thread.join(timeout)
+
+
+class SecretsManager:
+    def __init__(self, secrets=None):
+        self.secrets = dict(secrets or {})
+
+    def get_secret_value(self, SecretId, **kwargs):
+        if SecretId not in self.secrets:
+            raise client_error('ResourceNotFoundException', f"Secrets Manager can't find the specified secret: {SecretId}", 'GetSecretValue')
+        return {'Name': SecretId, 'SecretString': json.dumps(self.secrets[SecretId])}
+
+
+class Aws:
+    """One set of stand-ins; installed() routes boto3.client/resource/Session to them."""
+    def __init__(self, secrets=None):
+        self.dynamodb = DynamoDB()
+        self.sns = Sns()
+        self.s3 = S3()
+        self.secretsmanager = SecretsManager(secrets)
+        self.lambda_ = LambdaService()
+        self.extra_clients = {}
+
+    def client(self, service_name, *args, **kwargs):
+        if service_name in self.extra_clients:
+            return self.extra_clients[service_name]
+        if service_name == 'dynamodb':
+            return self.dynamodb
+        if service_name == 'lambda':
+            return self.lambda_
+        try:
+            return getattr(self, service_name)
+        except AttributeError:
+            raise NotImplementedError(f"No stand-in for {service_name}")
+
+    def resource(self, service_name, *args, **kwargs):
+        if service_name != 'dynamodb':
+            raise NotImplementedError(f"No resource stand-in for {service_name}")
+        return self.dynamodb
+
+    def topic_arn(self, name):
+        return f"arn:aws:sns:{REGION}:{ACCOUNT}:{name}"
+
+    @contextmanager
+    def installed(self):
+        aws = self
+
+        class Session:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def client(self, service_name, *args, **kwargs):
+                return aws.client(service_name)
+
+            def resource(self, service_name, *args, **kwargs):
+                return aws.resource(service_name)
+
+        # The layer caches what boto3 gives it; start and end with nothing cached
+        clients.reset()
+        try:
+            with mock.patch.object(boto3, 'client', self.client), \
+                    mock.patch.object(boto3, 'resource', self.resource), \
+                    mock.patch.object(boto3.session, 'Session', Session):
+                yield self
+        finally:
+            clients.reset()
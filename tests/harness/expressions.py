@@ -0,0 +1,366 @@
+"""
+Evaluates the DynamoDB expression language against plain item dicts, for the in-memory table.
+
+Covers what our Lambdas use and a bit more: condition/filter/key-condition expressions
+(comparisons, BETWEEN, IN, AND/OR/NOT, attribute_exists, attribute_not_exists, attribute_type,
+begins_with, contains, size) and update expressions (SET with + - list_append if_not_exists,
+REMOVE, ADD, DELETE). boto3 condition objects (Key/Attr) are accepted too; they are turned into
+expression strings by boto3's own builder first.
+"""
+import re
+
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<number>\d+)|(?P<op><>|<=|>=|=|<|>|\(|\)|,|\.|\[|\]|\+|-)|(?P<word>[#:]?[A-Za-z_][A-Za-z0-9_]*))')
+COMPARATORS = {'=', '<>', '<', '<=', '>', '>='}
+MISSING = object()
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if not match or match.end() == position:
+            raise ExpressionError(f"Can't parse expression at {expression[position:]!r}")
+        tokens.append(match.group(match.lastgroup))
+        position = match.end()
+    return tokens
+
+
+def build(condition, names=None, values=None, is_key_condition=False):
+    """Returns (expression, names, values) for a condition given as a string or a boto3 condition object."""
+    names, values = dict(names or {}), dict(values or {})
+    if isinstance(condition, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(condition, is_key_condition=is_key_condition)
+        names.update(built.attribute_name_placeholders)
+        values.update(built.attribute_value_placeholders)
+        condition = built.condition_expression
+    return condition, names, values
+
+
+class _Parser:
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected.upper()):
+            raise ExpressionError(f"Expected {expected or 'more'}, found {token!r}")
+        self.position += 1
+        return token
+
+    def at(self, *words):
+        token = self.peek()
+        return token is not None and token.upper() in {w.upper() for w in words}
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # Paths and operands return functions of the item, so a parsed expression can be reused
+
+    def path(self):
+        parts = [self._name(self.take())]
+        while self.at('.', '['):
+            if self.take() == '.':
+                parts.append(self._name(self.take()))
+            else:
+                parts.append(int(self.take()))
+                self.take(']')
+        return parts
+
+    def _name(self, token):
+        if token.startswith('#'):
+            if token not in self.names:
+                raise ExpressionError(f"Undefined attribute name {token}")
+            return self.names[token]
+        return token
+
+    def value(self, token):
+        if token not in self.values:
+            raise ExpressionError(f"Undefined attribute value {token}")
+        return self.values[token]
+
+    def operand(self):
+        token = self.peek()
+        if token.startswith(':'):
+            value = self.value(self.take())
+            return lambda item: value
+        if token.lower() == 'size':
+            self.take()
+            self.take('(')
+            path = self.path()
+            self.take(')')
+            return lambda item: _size(get_path(item, path))
+        path = self.path()
+        return lambda item: get_path(item, path)
+
+    # Conditions
+
+    def condition(self):
+        left = self.conjunction()
+        while self.at('OR'):
+            self.take()
+            right = self.conjunction()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def conjunction(self):
+        left = self.negation()
+        while self.at('AND'):
+            self.take()
+            right = self.negation()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def negation(self):
+        if self.at('NOT'):
+            self.take()
+            inner = self.negation()
+            return lambda item: not inner(item)
+        return self.primary()
+
+    def primary(self):
+        if self.at('('):
+            self.take()
+            inner = self.condition()
+            self.take(')')
+            return inner
+
+        function = (self.peek() or '').lower()
+        if self.peek(1) == '(' and function in CONDITION_FUNCTIONS:
+            self.take()
+            self.take('(')
+            path = self.path()
+            argument = None
+            if self.at(','):
+                self.take()
+                argument = self.operand()
+            self.take(')')
+            return CONDITION_FUNCTIONS[function](path, argument)
+
+        left = self.operand()
+        if self.at('BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _compare(low(item), '<=', left(item)) and _compare(left(item), '<=', high(item))
+        if self.at('IN'):
+            self.take()
+            self.take('(')
+            choices = [self.operand()]
+            while self.at(','):
+                self.take()
+                choices.append(self.operand())
+            self.take(')')
+            return lambda item: any(_compare(left(item), '=', choice(item)) for choice in choices)
+
+        comparator = self.take()
+        if comparator not in COMPARATORS:
+            raise ExpressionError(f"Expected a comparator, found {comparator!r}")
+        right = self.operand()
+        return lambda item: _compare(left(item), comparator, right(item))
+
+
+def _size(value):
+    if value is MISSING:
+        return MISSING
+    return len(value.value if hasattr(value, 'value') and isinstance(value.value, bytes) else value)
+
+
+def _compare(left, comparator, right):
+    if left is MISSING or right is MISSING:
+        return comparator == '<>' and not (left is MISSING and right is MISSING)
+    if comparator == '=':
+        return left == right
+    if comparator == '<>':
+        return left != right
+    try:
+        if comparator == '<':
+            return left < right
+        if comparator == '<=':
+            return left <= right
+        if comparator == '>':
+            return left > right
+        return left >= right
+    except TypeError:
+        return False
+
+
+def _attribute_type(value):
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, (int, float, Decimal)):
+        return 'N'
+    if isinstance(value, list):
+        return 'L'
+    if isinstance(value, dict):
+        return 'M'
+    if value is None:
+        return 'NULL'
+    if isinstance(value, set):
+        sample = next(iter(value), '')
+        return 'SS' if isinstance(sample, str) else 'NS'
+    return 'B'
+
+
+def _contains(value, operand):
+    if value is MISSING or operand is MISSING:
+        return False
+    if isinstance(value, str):
+        return isinstance(operand, str) and operand in value
+    return operand in value
+
+
+CONDITION_FUNCTIONS = {
+    'attribute_exists': lambda path, _: lambda item: get_path(item, path) is not MISSING,
+    'attribute_not_exists': lambda path, _: lambda item: get_path(item, path) is MISSING,
+    'attribute_type': lambda path, t: lambda item: _attribute_type(get_path(item, path)) == t(item),
+    'begins_with': lambda path, prefix: lambda item: isinstance(get_path(item, path), str) and get_path(item, path).startswith(prefix(item)),
+    'contains': lambda path, operand: lambda item: _contains(get_path(item, path), operand(item)),
+}
+
+
+def get_path(item, path):
+    value = item
+    for part in path:
+        try:
+            value = value[part]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+    return value
+
+
+def set_path(item, path, value):
+    target = item
+    for part in path[:-1]:
+        target = target[part]
+    if isinstance(path[-1], int) and path[-1] >= len(target):
+        target.append(value)
+    else:
+        target[path[-1]] = value
+
+
+def remove_path(item, path):
+    target = get_path(item, path[:-1]) if len(path) > 1 else item
+    if target is MISSING:
+        return
+    try:
+        del target[path[-1]]
+    except (KeyError, IndexError):
+        pass
+
+
+def compile_condition(expression, names=None, values=None):
+    """Returns a predicate item -> bool for a condition expression string."""
+    parser = _Parser(expression, names, values)
+    predicate = parser.condition()
+    if not parser.done():
+        raise ExpressionError(f"Unexpected {parser.peek()!r} in {expression!r}")
+    return predicate
+
+
+def evaluate_condition(condition, item, names=None, values=None, is_key_condition=False):
+    expression, names, values = build(condition, names, values, is_key_condition)
+    return compile_condition(expression, names, values)(item)
+
+
+class _UpdateParser(_Parser):
+    def set_value(self):
+        left = self.set_operand()
+        if self.at('+', '-'):
+            operator = self.take()
+            right = self.set_operand()
+            if operator == '+':
+                return lambda item: left(item) + right(item)
+            return lambda item: left(item) - right(item)
+        return left
+
+    def set_operand(self):
+        function = (self.peek() or '').lower()
+        if self.peek(1) == '(' and function in ('list_append', 'if_not_exists'):
+            self.take()
+            self.take('(')
+            first = self.set_value() if function == 'list_append' else self.path()
+            self.take(',')
+            second = self.set_value()
+            self.take(')')
+            if function == 'list_append':
+                return lambda item: list(first(item)) + list(second(item))
+            return lambda item: _default(get_path(item, first), second(item))
+        operand = self.operand()
+        return lambda item: _required(operand(item))
+
+    def actions(self):
+        actions = []
+        while not self.done():
+            clause = self.take().upper()
+            while True:
+                path = self.path()
+                if clause == 'SET':
+                    self.take('=')
+                    actions.append((clause, path, self.set_value()))
+                elif clause == 'REMOVE':
+                    actions.append((clause, path, None))
+                elif clause in ('ADD', 'DELETE'):
+                    actions.append((clause, path, self.operand()))
+                else:
+                    raise ExpressionError(f"Unknown update clause {clause}")
+                if not self.at(','):
+                    break
+                self.take()
+        return actions
+
+
+def _default(value, default):
+    return default if value is MISSING else value
+
+
+def _required(value):
+    if value is MISSING:
+        raise ExpressionError("The provided expression refers to an attribute that does not exist in the item")
+    return value
+
+
+def apply_update(item, expression, names=None, values=None):
+    """Applies an update expression to item in place. Every value is computed before any is written."""
+    actions = _UpdateParser(expression, names, values).actions()
+    computed = [(clause, path, value(item) if value else None) for clause, path, value in actions]
+    for clause, path, value in computed:
+        if clause == 'SET':
+            set_path(item, path, value)
+        elif clause == 'REMOVE':
+            remove_path(item, path)
+        elif clause == 'ADD':
+            current = get_path(item, path)
+            if current is MISSING:
+                set_path(item, path, value)
+            elif isinstance(current, set):
+                set_path(item, path, current | value)
+            else:
+                set_path(item, path, current + value)
+        elif clause == 'DELETE':
+            current = get_path(item, path)
+            if current is not MISSING:
+                remaining = current - value
+                if remaining:
+                    set_path(item, path, remaining)
+                else:
+                    remove_path(item, path)
+    return item
@@ -0,0 +1,91 @@
+"""
+Loads the Lambda functions under src/compute in-process, each as its own module with its own
+environment, the way each would see it in its own container.
+
+Every function is src/compute/<name>/index.py with a handler(event, context); src/compute is on
+the path while it loads, as the merged events_api function's code root is. Module-level code
+(boto3 clients, URLs read from the environment) runs at import time, so load them with the AWS
+stand-ins installed and the environment they'd be deployed with.
+"""
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+from unittest import mock
+
+COMPUTE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'compute'))
+
+_import_lock = threading.Lock()
+
+
+class _OsView:
+    """The os module as one function sees it: the shared process plus that function's environment."""
+    def __init__(self, environ):
+        self.environ = environ
+
+    def getenv(self, key, default=None):
+        return self.environ.get(key, default)
+
+    def __getattr__(self, name):
+        return getattr(os, name)
+
+
+class Context:
+    """The parts of the Lambda context object our handlers use."""
+    def __init__(self, function_name, timeout_seconds):
+        self.function_name = function_name
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+class Lambda:
+    def __init__(self, name, module, stats=None, timeout_seconds=30):
+        self.name = name
+        self.function_name = function_name(name)
+        self.module = module
+        self.stats = stats
+        self.timeout_seconds = timeout_seconds
+
+    def invoke(self, event, stage=None):
+        """Calls the handler; the duration is recorded under `stage` (default: the function name)."""
+        start = time.perf_counter()
+        try:
+            return self.module.handler(event, Context(self.function_name, self.timeout_seconds))
+        finally:
+            if self.stats is not None:
+                self.stats.record(stage or self.name, time.perf_counter() - start)
+
+    __call__ = invoke
+
+
+def function_name(name):
+    # As StJamesCompute names them: events_create -> StJames-events-create
+    return 'StJames-' + name.replace('_', '-')
+
+
+def _forget_function_modules():
+    # A function that imports others (events_api) should get fresh copies, as a new container would
+    functions = set(os.listdir(COMPUTE_PATH)) - {'common'}
+    for module_name in list(sys.modules):
+        if module_name.split('.')[0] in functions:
+            del sys.modules[module_name]
+
+
+def load(name, environment=None, stats=None, timeout_seconds=30, code=None):
+    """Loads function `name` from src/compute/<code or name>/index.py (the posters share one directory)."""
+    environment = {'AWS_LAMBDA_FUNCTION_NAME': function_name(name), **{k: str(v) for k, v in (environment or {}).items()}}
+    path = os.path.join(COMPUTE_PATH, code or name, 'index.py')
+    spec = importlib.util.spec_from_file_location(f"lambda_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+
+    # The process environment is shared, so imports are serialized while it's patched
+    with _import_lock, mock.patch.dict(os.environ, environment), mock.patch.object(sys, 'path', [COMPUTE_PATH] + sys.path):
+        _forget_function_modules()
+        spec.loader.exec_module(module)
+        environ = dict(os.environ)
+    module.os = _OsView(environ)
+    return Lambda(name, module, stats, timeout_seconds)
@@ -0,0 +1,334 @@
+"""
+Runs the whole posting pipeline in-process: create -> stream -> fan-out -> post -> status.
+
+    with Pipeline(behaviors={'patch': Behavior(latency_ms=50)}) as pipeline:
+        report = pipeline.run(load_events(1000))
+
+Events are created through the events_create Lambda (or loaded from S3 by initialize_events),
+table inserts are delivered from the stream to process_events in batches, SNS fans each message
+out to one worker per site, which invokes that site's poster, and the posters update status
+through the local status API (process_status). Each site's poster runs one invocation at a
+time, like a function with reserved concurrency of one.
+"""
+import contextlib
+import datetime
+import json
+import math
+import os
+import queue
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+from tests.harness.websites import SITES, Websites
+
+from st_james import schema
+
+EVENTS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'events.json'))
+TABLE_NAME = 'StJamesEvents'
+BUCKET_NAME = 'stjames-data'
+FILE_KEY = 'events.json'
+STREAM_BATCH_SIZE = 100
+# The posters' key for the status API, and the secret they read it from
+STATUS_API_KEY_SECRET = 'StJamesPosterApiKey'
+STATUS_API_KEY = 'poster-api-key'
+
+# What events_create accepts in the post list
+CREATABLE_SITES = set(schema.SITES)
+
+# What EventBridge sends a function it runs on a schedule
+SCHEDULED_EVENT = {'source': 'aws.events', 'detail-type': 'Scheduled Event', 'detail': {}}
+
+
+def load_events(count=None, path=EVENTS_FILE):
+    """
+    Returns `count` events from data/events.json (all of them by default). Past the end of the file
+    the events repeat, a week later each time round, with the copy number added to the title.
+    """
+    with open(path) as f:
+        events = json.load(f)
+    count = len(events) if count is None else count
+
+    scaled = []
+    for index in range(count):
+        event = dict(events[index % len(events)])
+        weeks = index // len(events)
+        if weeks:
+            day = datetime.date.fromisoformat(event['date']) + datetime.timedelta(weeks=weeks)
+            event['date'] = day.isoformat()
+            event['title'] = f"{event['title']} ({weeks + 1})"
+        scaled.append(event)
+    return scaled
+
+
+def upcoming(events, start=None):
+    """
+    The events moved to dates from `start` on (tomorrow by default), the same days apart: the
+    file's dates are past, and the scheduled sweep only posts upcoming events.
+    """
+    start = start or datetime.date.today() + datetime.timedelta(days=1)
+    shift = start - min(datetime.date.fromisoformat(event['date']) for event in events)
+    return [{**event, 'date': (datetime.date.fromisoformat(event['date']) + shift).isoformat()} for event in events]
+
+
+def percentile(values, p):
+    # Nearest rank
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self, elapsed):
+        """{stage: {count, per_second, p50_ms, p95_ms, p99_ms, max_ms}} for a run that took `elapsed` seconds."""
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        return {
+            stage: {
+                'count': len(values),
+                'per_second': len(values) / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000
+            }
+            for stage, values in samples.items()
+        }
+
+
+class Report:
+    def __init__(self, events, elapsed, stages, outcomes, site_posts):
+        self.events = events
+        self.elapsed = elapsed
+        self.stages = stages
+        self.outcomes = outcomes
+        self.site_posts = site_posts
+
+    @property
+    def throughput(self):
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {'events': self.events, 'elapsed_s': self.elapsed, 'events_per_second': self.throughput,
+                'stages': self.stages, 'outcomes': self.outcomes, 'site_posts': self.site_posts}
+
+    def format(self):
+        lines = [f"{self.events} events in {self.elapsed:.2f}s ({self.throughput:.1f} events/s)",
+                 f"  {'stage':<18} {'count':>7} {'per sec':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+        for stage, s in sorted(self.stages.items()):
+            lines.append(f"  {stage:<18} {s['count']:>7} {s['per_second']:>9.1f} {s['p50_ms']:>9.2f} "
+                         f"{s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+        for site, counts in sorted(self.outcomes.items()):
+            lines.append(f"  {site:<18} posted={counts['posted']} post={counts['post']} posting={counts['posting']}")
+        return '\n'.join(lines)
+
+
+def _stream_filter(record):
+    # Same filter as the process_events event source in StJamesCompute
+    access = record['dynamodb']['Keys'].get('access', {}).get('S')
+    return record['eventName'] == 'INSERT' and access in ('public', 'private')
+
+
+class Pipeline:
+    def __init__(self, sites=SITES, behaviors=None, create_concurrency=4, stream_batch_size=STREAM_BATCH_SIZE,
+                 quiet=True, seed=0):
+        self.sites = tuple(sites)
+        self.behaviors = behaviors or {}
+        self.create_concurrency = create_concurrency
+        self.stream_batch_size = stream_batch_size
+        self.quiet = quiet
+        self.seed = seed
+        self.stats = Stats()
+        self.credentials = {'username': 'poster@example.com', 'password': 'secret'}
+        self.aws = Aws({**{name: self.credentials for name in
+                           ('PatchCredentials', 'MomsCredentials', 'SojournerCredentials', 'GovCredentials')},
+                        STATUS_API_KEY_SECRET: {'key': STATUS_API_KEY}})
+        self.events_topic = self.aws.topic_arn('StJamesEvents')
+        self.results_topic = self.aws.topic_arn('StJamesResults')
+        self.table = self.aws.dynamodb.Table(TABLE_NAME)
+        self._exit = contextlib.ExitStack()
+
+    # Setup
+
+    def __enter__(self):
+        stack = self._exit
+        stack.enter_context(self.aws.installed())
+        stack.enter_context(mock.patch.dict(os.environ, {
+            'AWS_DEFAULT_REGION': 'us-east-1',
+            'TRACE_EXPORTER': 'none'
+        }))
+        if self.quiet:
+            # The Lambdas log every request and payload
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+
+        common = {'TABLE_NAME': TABLE_NAME, 'REGION_NAME': 'us-east-1'}
+        self.status = lambdas.load('process_status', common, self.stats)
+        self.websites = stack.enter_context(Websites(self.behaviors, status_handler=lambda e, c: self.status.invoke(e, 'status'), seed=self.seed,
+                                                        status_api_key=STATUS_API_KEY))
+        status_url = self.websites.url('status')
+
+        self.create = lambdas.load('events_create', common, self.stats)
+        self.initialize = lambdas.load('initialize_events', {**common, 'BUCKET_NAME': BUCKET_NAME, 'FILE_KEY': FILE_KEY}, self.stats)
+        self.process = lambdas.load('process_events', {**common, 'TOPIC_ARN': self.events_topic, 'DELAY_MS': 0, 'JITTER_MS': 0}, self.stats)
+
+        poster = {**common, 'TOPIC_ARN': self.results_topic, 'STATUS_URL': status_url, 'STATUS_API_KEY_SECRET': STATUS_API_KEY_SECRET}
+        environments = {
+            'patch': {'PATCH_LOGIN_URL': self.websites.url('patch', 'login'), 'PATCH_POST_URL': self.websites.url('patch', 'event'), 'PATCH_SECRET_NAME': 'PatchCredentials'},
+            'moms': {'MOMS_URL': self.websites.url('moms', 'event'), 'MOMS_SECRET_NAME': 'MomsCredentials'},
+            'sojourner': {'SOJOURNER_URL': self.websites.url('sojourner'), 'SOJOURNER_SECRET_NAME': 'SojournerCredentials'},
+            'gov': {'GOV_LOGIN_URL': self.websites.url('gov', 'login'), 'GOV_POST_URL': self.websites.url('gov', 'submit'), 'GOV_SECRET_NAME': 'GovCredentials'},
+            'test': {}
+        }
+        # One function per site, each running the poster engine with its site's adapter
+        self.posters = {site: lambdas.load(f"post_to_{site}", {**poster, **environments[site], 'SITES': site}, self.stats, code='post_to_site')
+                        for site in self.sites}
+        return self
+
+    def __exit__(self, *exc):
+        self._exit.close()
+
+    # Running
+
+    def run(self, events, source='api'):
+        """
+        Replays events through the pipeline and returns a Report. source='api' creates each event with
+        events_create (public events are posted to the sites events_create accepts); source='s3' puts them
+        in the bucket and runs initialize_events, which posts public events to patch, moms, sojourner and gov.
+        """
+        self.stats = Stats()
+        for function in (self.status, self.create, self.initialize, self.process, *self.posters.values()):
+            function.stats = self.stats
+
+        started_at = {}
+        finished_at = {}
+        queues = {site: queue.Queue() for site in self.posters}
+        stop = threading.Event()
+        stream_idle = threading.Event()
+
+        def deliver(site):
+            def put(record):
+                queues[site].put((record, time.perf_counter()))
+            return put
+
+        self.aws.sns.subscriptions.pop(self.events_topic, None)
+        for site in self.posters:
+            self.aws.sns.subscribe(self.events_topic, deliver(site), {'post': [site]})
+
+        def poll_stream():
+            while not stop.is_set():
+                records = [r for r in self.table.take_stream(self.stream_batch_size) if _stream_filter(r)]
+                if records:
+                    stream_idle.clear()
+                    self.process.invoke({'Records': records}, 'stream')
+                else:
+                    stream_idle.set()
+                    time.sleep(0.002)
+
+        def post(site):
+            while True:
+                record, queued = queues[site].get()
+                if record is None:
+                    return
+                self.stats.record('fanout_wait', time.perf_counter() - queued)
+                self.posters[site].invoke({'Records': [record]}, f"post:{site}")
+                date_id = json.loads(record['Sns']['Message'])['date_id']
+                finished_at.setdefault(date_id, {})[site] = time.perf_counter()
+                queues[site].task_done()
+
+        threads = [threading.Thread(target=poll_stream, daemon=True)]
+        threads += [threading.Thread(target=post, args=(site,), daemon=True) for site in self.posters]
+        for thread in threads:
+            thread.start()
+
+        start = time.perf_counter()
+        if source == 's3':
+            self._load_from_s3(events, started_at)
+        else:
+            self._create(events, started_at)
+
+        # Drain: stream empty and idle, every site queue worked off, then once more for the status writes
+        for _ in range(2):
+            self._wait_for_stream(stream_idle)
+            for site_queue in queues.values():
+                site_queue.join()
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        for site_queue in queues.values():
+            site_queue.put((None, None))
+        for thread in threads:
+            thread.join(timeout=5)
+
+        for date_id, sites in finished_at.items():
+            if date_id in started_at:
+                self.stats.record('end_to_end', max(sites.values()) - started_at[date_id])
+
+        return Report(len(events), elapsed, self.stats.summary(elapsed), self.outcomes(),
+                      {site: len(posts) for site, posts in self.websites.posts.items()})
+
+    def _wait_for_stream(self, stream_idle):
+        while True:
+            stream_idle.clear()
+            stream_idle.wait()
+            with self.table.lock:
+                if not self.table.stream:
+                    return
+
+    def _create(self, events, started_at):
+        def create(event):
+            body = {k: event[k] for k in ('access', 'date', 'title', 'time', 'description') if k in event}
+            if event.get('access') == 'public':
+                body['post'] = [site for site in self.sites if site in CREATABLE_SITES]
+            begun = time.perf_counter()
+            response = self.create.invoke({'body': json.dumps(body), 'requestContext': {}}, 'create')
+            if response['statusCode'] == 201:
+                started_at[json.loads(response['body'])['item']['date_id']] = begun
+
+        with ThreadPoolExecutor(self.create_concurrency) as executor:
+            list(executor.map(create, events))
+
+    def _load_from_s3(self, events, started_at):
+        self.aws.s3.put_object(Bucket=BUCKET_NAME, Key=FILE_KEY, Body=json.dumps(events))
+        begun = time.perf_counter()
+        self.initialize.invoke({}, 'create')
+        for item in self.table.scan()['Items']:
+            started_at[item['date_id']] = begun
+
+    def sweep(self, deliver=True):
+        """Runs the scheduled sweep and returns the messages it published, delivered to the posters unless deliver=False."""
+        published = len(self.aws.sns.published(self.events_topic))
+        self.process.invoke(SCHEDULED_EVENT)
+        messages = self.aws.sns.published(self.events_topic)[published:]
+        if deliver:
+            self.deliver(messages)
+        return messages
+
+    def deliver(self, messages):
+        """Hands each message from the events topic to the poster of each site on its post list, one at a time."""
+        for message in messages:
+            for site in json.loads(message['Message'])['post']:
+                if site in self.posters:
+                    self.posters[site].invoke({'Records': [{'Sns': {'Message': message['Message'], 'MessageAttributes': {}}}]})
+
+    def outcomes(self):
+        """Per site, how many public events ended in each status."""
+        counts = {site: {'post': 0, 'posting': 0, 'posted': 0} for site in self.posters}
+        for item in self.table.query(KeyConditionExpression='access = :public', ExpressionAttributeValues={':public': 'public'})['Items']:
+            for status in ('post', 'posting', 'posted'):
+                for site in item.get(status, []):
+                    if site in counts:
+                        counts[site][status] += 1
+        return counts
@@ -0,0 +1,253 @@
+"""
+A local stand-in for Step Functions: runs a state machine's Amazon States Language definition
+in-process, with its Lambda tasks calling functions loaded by tests.harness.lambdas.
+
+    definition = definition_from_template(template, 'StJames-posting-sweep')
+    machine = StateMachine(definition, {'StJames-process-events': process_events.invoke})
+    output = machine.execute({}, name='sweep-1')
+
+Supports what our state machines use: Pass, Task (a Lambda function as the resource), Map
+(inline and distributed, with MaxConcurrency and ToleratedFailurePercentage/Count), Choice,
+Succeed and Fail; Parameters/ItemSelector, InputPath/ResultPath/OutputPath, Retry with backoff
+(the waits are scaled by time_scale, 0 by default) and Catch. Map iterations run on threads, as
+many at a time as MaxConcurrency allows.
+"""
+import copy
+import json
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.harness.aws import ACCOUNT, REGION
+
+
+class StatesError(Exception):
+    """A task failure as Step Functions names it (e.g. Lambda.TooManyRequestsException)."""
+    def __init__(self, error, cause=''):
+        super().__init__(f"{error}: {cause}" if cause else error)
+        self.error = error
+        self.cause = cause
+
+
+def definition_from_template(template, state_machine_name):
+    """The definition of the named state machine in a synthesized template, with function ARNs resolved."""
+    resources = template['Resources']
+
+    def resolve(value):
+        if isinstance(value, str):
+            return value
+        if 'Fn::Join' in value:
+            separator, parts = value['Fn::Join']
+            return separator.join(resolve(part) for part in parts)
+        if 'Fn::GetAtt' in value:
+            properties = resources[value['Fn::GetAtt'][0]]['Properties']
+            return f"arn:aws:lambda:{REGION}:{ACCOUNT}:function:{properties['FunctionName']}"
+        if 'Ref' in value:
+            return {'AWS::Partition': 'aws', 'AWS::Region': REGION, 'AWS::AccountId': ACCOUNT}[value['Ref']]
+        raise ValueError(f"Can't resolve {value}")
+
+    for resource in resources.values():
+        properties = resource.get('Properties', {})
+        if resource['Type'] == 'AWS::StepFunctions::StateMachine' and properties.get('StateMachineName') == state_machine_name:
+            return json.loads(resolve(properties['DefinitionString']))
+    raise KeyError(state_machine_name)
+
+
+def _get(path, data, context):
+    if path.startswith('$$'):
+        data, path = context, path[1:]
+    for part in path[2:].split('.') if path != '$' else []:
+        if not isinstance(data, dict) or part not in data:
+            raise StatesError('States.Runtime', f"Invalid path {path}")
+        data = data[part]
+    return data
+
+
+def _put(path, data, value):
+    if path is None:
+        return data
+    if path == '$':
+        return value
+    data = copy.deepcopy(data)
+    target = data
+    parts = path[2:].split('.')
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = value
+    return data
+
+
+def _resolve(template, data, context):
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith('.$'):
+                resolved[key[:-2]] = copy.deepcopy(_get(value, data, context))
+            else:
+                resolved[key] = _resolve(value, data, context)
+        return resolved
+    if isinstance(template, list):
+        return [_resolve(value, data, context) for value in template]
+    return template
+
+
+def _matches(error_equals, error):
+    return 'States.ALL' in error_equals or error in error_equals or \
+        ('States.TaskFailed' in error_equals and error != 'States.Timeout')
+
+
+def _condition(rule, data, context):
+    if 'And' in rule:
+        return all(_condition(r, data, context) for r in rule['And'])
+    if 'Or' in rule:
+        return any(_condition(r, data, context) for r in rule['Or'])
+    if 'Not' in rule:
+        return not _condition(rule['Not'], data, context)
+    if 'IsPresent' in rule:
+        try:
+            _get(rule['Variable'], data, context)
+            return rule['IsPresent']
+        except StatesError:
+            return not rule['IsPresent']
+
+    value = _get(rule['Variable'], data, context)
+    for test in ('BooleanEquals', 'StringEquals', 'NumericEquals'):
+        if test in rule:
+            return value == rule[test]
+    if 'NumericGreaterThan' in rule:
+        return value > rule['NumericGreaterThan']
+    if 'NumericLessThan' in rule:
+        return value < rule['NumericLessThan']
+    raise ValueError(f"Unsupported Choice rule: {rule}")
+
+
+class StateMachine:
+    def __init__(self, definition, functions, time_scale=0.0):
+        """functions: {function name: callable(event) -> result}"""
+        self.definition = definition
+        self.functions = functions
+        self.time_scale = time_scale
+        self.retries = 0
+        # The errors Catch handled, in the order they were caught
+        self.caught = []
+        self.lock = threading.Lock()
+
+    def execute(self, input=None, name=None):
+        context = {'Execution': {'Name': name or str(uuid.uuid4()), 'Input': input or {}}}
+        return self._run(self.definition, input or {}, context)
+
+    def _run(self, machine, data, context):
+        name = machine['StartAt']
+        while True:
+            state = machine['States'][name]
+            kind = state['Type']
+            effective = data if state.get('InputPath', '$') is None else _get(state.get('InputPath', '$'), data, context)
+
+            if kind == 'Choice':
+                name = next((rule['Next'] for rule in state['Choices'] if _condition(rule, effective, context)), None) \
+                    or state.get('Default')
+                if name is None:
+                    raise StatesError('States.NoChoiceMatched', state.get('Comment', ''))
+                data = effective
+                continue
+            if kind == 'Succeed':
+                return effective
+            if kind == 'Fail':
+                raise StatesError(state.get('Error', 'States.Fail'), state.get('Cause', ''))
+
+            try:
+                if kind == 'Pass':
+                    result = _resolve(state['Parameters'], effective, context) if 'Parameters' in state \
+                        else state.get('Result', effective)
+                elif kind == 'Task':
+                    parameters = _resolve(state['Parameters'], effective, context) if 'Parameters' in state else effective
+                    result = self._with_retries(state, lambda: self._invoke(state['Resource'], parameters))
+                elif kind == 'Map':
+                    result = self._map(state, effective, context)
+                else:
+                    raise ValueError(f"Unsupported state type: {kind}")
+            except StatesError as e:
+                catcher = next((c for c in state.get('Catch', []) if _matches(c['ErrorEquals'], e.error)), None)
+                if catcher is None:
+                    raise
+                with self.lock:
+                    self.caught.append(e.error)
+                data = _put(catcher.get('ResultPath', '$'), effective, {'Error': e.error, 'Cause': e.cause})
+                name = catcher['Next']
+                continue
+
+            if 'ResultSelector' in state:
+                result = _resolve(state['ResultSelector'], result, context)
+            data = _put(state.get('ResultPath', '$'), effective, result)
+            output_path = state.get('OutputPath', '$')
+            data = {} if output_path is None else _get(output_path, data, context)
+
+            if state.get('End'):
+                return data
+            name = state['Next']
+
+    def _invoke(self, resource, payload):
+        function_name = resource.split(':function:')[-1]
+        try:
+            return self.functions[function_name](copy.deepcopy(payload))
+        except StatesError:
+            raise
+        except Exception as e:
+            # An unhandled error in a Lambda function fails the task with the exception's type as the error
+            raise StatesError(type(e).__name__, str(e))
+
+    def _with_retries(self, state, call):
+        attempts = {}
+        while True:
+            try:
+                return call()
+            except StatesError as e:
+                for idx, retrier in enumerate(state.get('Retry', [])):
+                    if _matches(retrier['ErrorEquals'], e.error):
+                        attempt = attempts.get(idx, 0)
+                        if attempt >= retrier.get('MaxAttempts', 3):
+                            raise
+                        attempts[idx] = attempt + 1
+                        with self.lock:
+                            self.retries += 1
+                        interval = retrier.get('IntervalSeconds', 1) * retrier.get('BackoffRate', 2.0) ** attempt
+                        time.sleep(interval * self.time_scale)
+                        break
+                else:
+                    raise
+
+    def _map(self, state, data, context):
+        items = _get(state.get('ItemsPath', '$'), data, context)
+        processor = state.get('ItemProcessor') or state['Iterator']
+        selector = state.get('ItemSelector') or state.get('Parameters')
+
+        tolerated = 'ToleratedFailurePercentage' in state or 'ToleratedFailureCount' in state
+        failures = []
+
+        def iteration(index):
+            item_context = {**context, 'Map': {'Item': {'Index': index, 'Value': items[index]}}}
+            item_input = _resolve(selector, data, item_context) if selector else items[index]
+            if not tolerated:
+                return self._run(processor, item_input, context)
+            try:
+                return self._run(processor, item_input, context)
+            except StatesError as e:
+                with self.lock:
+                    failures.append(e)
+                return None
+
+        if not items:
+            return []
+        workers = state.get('MaxConcurrency') or len(items)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(iteration, range(len(items))))
+
+        # Either threshold given being exceeded fails the map
+        if failures and ('ToleratedFailureCount' in state and len(failures) > state['ToleratedFailureCount'] or
+                         'ToleratedFailurePercentage' in state and
+                         100 * len(failures) > state['ToleratedFailurePercentage'] * len(items)):
+            raise StatesError('States.ExceedToleratedFailureThreshold',
+                              f"{len(failures)} of {len(items)} iterations failed: {failures[0]}")
+        return results
@@ -0,0 +1,248 @@
+"""
+A local HTTP server that stands in for the sites we post to, and for the status API.
+
+Each site answers the requests its poster makes (patch: token login + JSON post; moms: JSON post;
+sojourner: form page with hidden fields and an obfuscated captcha, then a form post; gov: a Joomla
+login page with a CSRF token, a login that sets session cookies, then a form post) after a
+configurable latency, and fails a configurable fraction of posts with a 500. A site with a
+limit_per_s turns away posts that come faster than that with a 429 and a Retry-After header.
+patch and gov give each new event an ID, and take changes to it: patch with a PUT to event/{id},
+gov with a submit that carries its evid.
+
+    server = Websites({'patch': Behavior(latency_ms=80, error_rate=0.02)}, status_handler=...)
+    server.start()
+    server.url('patch', 'event')   # http://127.0.0.1:<port>/patch/event
+"""
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+SITES = ('patch', 'moms', 'sojourner', 'gov')
+
+SOJOURNER_CAPTCHA = 'St. James'
+
+SOJOURNER_FORM = """<html><body>
+<form method="post">
+<input type="hidden" name="_token" value="sojourner-token">
+<input type="hidden" name="hs_fv_hash" value="hash">
+<input type="hidden" name="hs_fv_ip" value="127.0.0.1">
+<input type="hidden" name="hs_fv_timestamp" value="{timestamp}">
+</form>
+<script>hsCaptcha('{captcha}');</script>
+</body></html>"""
+
+GOV_LOGIN = """<html><head>
+<script type="application/json" class="joomla-script-options new">{{"csrf.token": "{token}"}}</script>
+</head><body><form method="post"></form></body></html>"""
+
+GOV_SUBMITTED = ('<html><body><div class="alert-message">Event submitted for review</div>'
+                 '<a href="/index.php?option=com_jevents&task=icalevent.edit&evid={evid}">Edit</a></body></html>')
+
+
+def encode_captcha(text):
+    # The inverse of the sojourner poster's decode_captcha
+    return ''.join(f"{ord(c) - 1:02x}" for c in text)
+
+
+class Behavior:
+    """
+    How a site responds: latency_ms (+ up to jitter_ms) on every request, error_rate of posts fail,
+    and posts sooner than 1/limit_per_s after the last one get a 429 (Retry-After: retry_after seconds).
+    """
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, limit_per_s=0, retry_after=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.limit_per_s = limit_per_s
+        self.retry_after = retry_after
+
+
+class Websites:
+    def __init__(self, behaviors=None, status_handler=None, seed=0, status_api_key=None):
+        self.behaviors = {site: (behaviors or {}).get(site) or Behavior() for site in SITES}
+        self.status_handler = status_handler
+        # The key the status API requires, as API Gateway checks it (None: none)
+        self.status_api_key = status_api_key
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.posts = {site: [] for site in SITES}
+        self.updates = {site: [] for site in SITES}
+        self.requests = {}
+        self.throttled = {site: 0 for site in SITES}
+        self.last_post = {}
+        self.server = None
+
+    def url(self, site, path=''):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/{site}" + (f"/{path}" if path else '')
+
+    def start(self):
+        websites = self
+
+        class Handler(_Handler):
+            owner = websites
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self, site):
+        behavior = self.behaviors[site]
+        with self.lock:
+            jitter = self.random.uniform(0, behavior.jitter_ms) if behavior.jitter_ms else 0
+        if behavior.latency_ms or jitter:
+            time.sleep((behavior.latency_ms + jitter) / 1000)
+
+    def _fails(self, site):
+        with self.lock:
+            return self.random.random() < self.behaviors[site].error_rate
+
+    def _limited(self, site):
+        limit = self.behaviors[site].limit_per_s
+        if not limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_post.get(site, float('-inf')) < 1 / limit:
+                self.throttled[site] += 1
+                return True
+            self.last_post[site] = now
+            return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    owner = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body='', content_type='text/html', cookies=(), headers=None):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        for cookie in cookies:
+            self.send_header('Set-Cookie', f"{cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, status, body, **kwargs):
+        self._send(status, json.dumps(body), 'application/json', **kwargs)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def _dispatch(self, method):
+        parts = urlsplit(self.path)
+        segments = [s for s in parts.path.split('/') if s]
+        site, page, self.event_id = (segments + ['', '', ''])[:3]
+        body = self._body()
+        owner = self.owner
+        with owner.lock:
+            owner.requests[(method, site, page)] = owner.requests.get((method, site, page), 0) + 1
+
+        if site == 'status':
+            return self._status(dict(parse_qsl(parts.query)))
+        if site not in owner.behaviors:
+            return self._send(404, 'Not found')
+
+        owner._delay(site)
+        route = getattr(self, f"_{site}", None)
+        return route(method, page, body)
+
+    def _post_result(self, site, body, success_status=200, success_body='{}', content_type='application/json', event_id=None):
+        """A post (or, with the event_id of an earlier one, an update); success_body may take the event's ID."""
+        if self.owner._limited(site):
+            retry_after = str(self.owner.behaviors[site].retry_after)
+            return self._send(429, 'Too Many Requests', 'text/plain', headers={'Retry-After': retry_after})
+        if self.owner._fails(site):
+            return self._send(500, 'Internal Server Error', 'text/plain')
+        with self.owner.lock:
+            if event_id:
+                if not 0 < int(event_id) <= len(self.owner.posts[site]):
+                    return self._send(404, 'Not found', 'text/plain')
+                self.owner.updates[site].append((int(event_id), body))
+            else:
+                self.owner.posts[site].append(body)
+                event_id = len(self.owner.posts[site])
+        if callable(success_body):
+            success_body = success_body(event_id)
+        return self._send(success_status, success_body, content_type)
+
+    def _status(self, params):
+        if self.owner.status_api_key and self.headers.get('x-api-key') != self.owner.status_api_key:
+            return self._json(403, {'message': 'Forbidden'})
+        # API Gateway proxy event -> process_status
+        response = self.owner.status_handler({'queryStringParameters': params}, None)
+        self._send(int(response['statusCode']), response.get('body') or '', 'application/json')
+
+    def _patch(self, method, page, body):
+        if method == 'POST' and page == 'login':
+            return self._json(200, {'data': {'access_token': 'patch-token'}})
+        if (method == 'POST' and page == 'event') or (method == 'PUT' and page == 'event' and self.event_id):
+            if self.headers.get('Patch-Authorization') != 'Bearer patch-token':
+                return self._json(401, {'message': 'Unauthorized'})
+            return self._post_result('patch', json.loads(body or b'{}'), event_id=self.event_id or None,
+                                     success_body=lambda event_id: json.dumps({'data': {'id': event_id}}))
+        return self._send(404, 'Not found')
+
+    def _moms(self, method, page, body):
+        if method == 'POST':
+            return self._post_result('moms', json.loads(body or b'{}'))
+        return self._send(404, 'Not found')
+
+    def _sojourner(self, method, page, body):
+        if method == 'GET':
+            form = SOJOURNER_FORM.format(timestamp=int(time.time()), captcha=encode_captcha(SOJOURNER_CAPTCHA))
+            return self._send(200, form, cookies=['helpspot=sojourner-session'])
+        fields = dict(parse_qsl(body.decode('utf-8')))
+        if 'helpspot=sojourner-session' not in (self.headers.get('Cookie') or ''):
+            return self._send(403, 'Session expired', 'text/plain')
+        return self._post_result('sojourner', fields, content_type='text/html', success_body='<html>Thanks</html>')
+
+    def _gov(self, method, page, body):
+        if page == 'login' and method == 'GET':
+            return self._send(200, GOV_LOGIN.format(token='gov-csrf'), cookies=['joomla_session=anonymous'])
+        if page == 'login' and method == 'POST':
+            fields = dict(parse_qsl(body.decode('utf-8')))
+            if fields.get('gov-csrf') != '1':
+                return self._send(403, 'Invalid token', 'text/plain')
+            return self._send(200, '<html>Welcome</html>', cookies=['joomla_session=user', 'joomla_user_state=logged_in'])
+        if page == 'submit' and method == 'POST':
+            if 'joomla_user_state=logged_in' not in (self.headers.get('Cookie') or ''):
+                return self._send(403, 'Please log in', 'text/plain')
+            fields = dict(parse_qsl(body.decode('utf-8')))
+            # evid 0 adds an event
+            event_id = fields.get('evid') if fields.get('evid', '0') != '0' else None
+            return self._post_result('gov', fields, content_type='text/html', event_id=event_id,
+                                     success_body=lambda event_id: GOV_SUBMITTED.format(evid=event_id))
+        return self._send(404, 'Not found')
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Lambda functions import the shared code from the common layer; make it importable in tests
+LAYER_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'compute', 'common', 'python')
+sys.path.insert(0, os.path.abspath(LAYER_PATH))
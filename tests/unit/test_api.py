@@ -0,0 +1,64 @@
+import base64
+import gzip
+import json
+
+from decimal import Decimal
+
+from st_james import api
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+ITEM = {'access': 'public', 'date_id': '2026-05-01#0f8fad5b-d9cb-469f-a165-70867728950e', 'title': 'Café Night',
+        'start_epoch_ms': Decimal('1777672800000'), 'score': Decimal('0.25'), 'post': ['moms']}
+
+
+def test_dumps_converts_decimals():
+    assert json.loads(api.dumps({'items': [ITEM]})) == {'items': [{
+        **ITEM, 'start_epoch_ms': 1777672800000, 'score': 0.25
+    }]}
+    # With and without orjson, the same document
+    assert api.dumps(ITEM) == json.dumps(ITEM, default=api.decimal_default, separators=(',', ':'),
+                                         ensure_ascii=False).encode('utf-8')
+
+
+def test_accepted_encoding():
+    def accepted(value):
+        return api.accepted_encoding({'headers': {'Accept-Encoding': value}})
+
+    assert accepted('gzip, deflate') == 'gzip'
+    assert accepted('gzip;q=0, deflate') is None
+    assert accepted('identity') is None
+    assert accepted('*') == ('br' if api.brotli else 'gzip')
+    assert accepted('br;q=1.0, gzip;q=0.8') == ('br' if api.brotli else 'gzip')
+    assert api.accepted_encoding({'headers': None}) is None
+
+
+def test_compressed_response():
+    items = [dict(ITEM, date_id=f"2026-05-{n % 28 + 1:02d}#{n:036d}") for n in range(50)]
+    event = {'headers': {'accept-encoding': 'gzip'}}
+
+    plain = api.respond(200, {'items': items}, event)
+    assert 'isBase64Encoded' not in plain
+
+    response = api.respond(200, {'items': items}, event, compression=True)
+    assert response['isBase64Encoded'] and response['headers']['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(base64.b64decode(response['body'])).decode('utf-8') == plain['body']
+
+    # Small bodies aren't worth it
+    small = api.respond(200, {'items': items[:1]}, event, compression=True)
+    assert 'Content-Encoding' not in small['headers']
+
+
+def test_events_list_compresses_when_configured():
+    aws = Aws()
+    with aws.installed():
+        table = aws.dynamodb.Table('StJamesEvents')
+        for n in range(30):
+            table.put_item(Item=dict(ITEM, date_id=f"2026-05-01#{n:036d}"))
+        events_list = lambdas.load('events_list', {'TABLE_NAME': 'StJamesEvents', 'RESPONSE_COMPRESSION': 'lambda'})
+        response = events_list.invoke({'pathParameters': {'access': 'public'}, 'headers': {'Accept-Encoding': 'gzip'}})
+
+    assert response['statusCode'] == 200
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    items = json.loads(gzip.decompress(base64.b64decode(response['body'])))['items']
+    assert len(items) == 30 and items[0]['start_epoch_ms'] == 1777672800000
@@ -0,0 +1,53 @@
+import datetime
+import json
+
+from st_james import archive
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+BUCKET = 'stjames-data-pm186'
+
+
+def test_expires_at():
+    assert archive.expires_at('2026-05-01#a', 30) == int(datetime.datetime(2026, 5, 31, tzinfo=datetime.timezone.utc).timestamp())
+    assert archive.expires_at('2026-05-01#a', 0) is None
+    assert archive.may_be_archived('2026-05-01#a', 30, today=datetime.date(2026, 5, 31))
+    assert not archive.may_be_archived('2026-05-01#a', 30, today=datetime.date(2026, 5, 30))
+    assert archive.object_key('public', '2026-05', '42') == 'archive/public/2026/05/42.ndjson.gz'
+
+
+def test_expired_events_are_archived_and_still_readable():
+    aws = Aws()
+    environment = {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET, 'EXPIRE_AFTER_DAYS': 30}
+    with aws.installed():
+        table = aws.dynamodb.Table('StJamesEvents')
+        create = lambdas.load('events_create', environment)
+        publish = lambdas.load('publish_calendar', environment)
+        get = lambdas.load('events_get', environment)
+        events_list = lambdas.load('events_list', environment)
+
+        date_ids = []
+        for date in ('2024-03-05', '2024-03-20', '2024-04-01', '2099-01-01'):
+            response = create({'body': json.dumps({'access': 'public', 'date': date, 'title': f"Event {date}", 'time': '3 pm'}),
+                               'requestContext': {}})
+            date_ids.append(json.loads(response['body'])['item']['date_id'])
+        assert table.items[('public', date_ids[0])]['expires_at'] == archive.expires_at(date_ids[0], 30)
+        publish({'Records': table.take_stream()})
+
+        # Deleted by us: gone, not archived
+        table.delete_item(Key={'access': 'public', 'date_id': date_ids[2]})
+        # Deleted by the TTL: archived
+        assert table.expire(datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc).timestamp()) == 2
+        records = table.take_stream()
+        result = publish({'Records': records})
+
+        # One object for the month, named for the batch
+        assert result['archived'] == [f"archive/public/2024/03/{records[1]['dynamodb']['SequenceNumber']}.ndjson.gz"]
+
+        listed = events_list({'pathParameters': {'access': 'public'}, 'queryStringParameters': {'archived': '2024-03'}})
+        assert [item['date_id'] for item in json.loads(listed['body'])['items']] == date_ids[:2]
+        assert ('public', date_ids[3]) in table.items
+
+        got = get({'pathParameters': {'access': 'public', 'date_id': date_ids[1]}})
+        assert got['statusCode'] == 200 and json.loads(got['body'])['archived'] is True
+        assert get({'pathParameters': {'access': 'public', 'date_id': date_ids[2]}})['statusCode'] == 404
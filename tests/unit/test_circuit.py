@@ -0,0 +1,49 @@
+import time
+
+from unittest import mock
+
+from st_james import circuit, retries
+from tests.harness.pipeline import Pipeline, load_events, upcoming
+from tests.harness.websites import Behavior
+
+
+def test_breaker_parks_work_while_a_site_is_down_and_probes_it_back():
+    with Pipeline(sites=('patch',), behaviors={'patch': Behavior(error_rate=1.0)}) as pipeline:
+        report = pipeline.run(upcoming(load_events(15)))
+        # The sweep leaves changes from the last few seconds for its next run; here there's no next run
+        pipeline.process.module.SETTLE_MS = 0
+
+        # Five failed posts open the breaker, and back off (st_james.retries); the other nine are
+        # parked without calling the site
+        assert pipeline.websites.requests[('POST', 'patch', 'event')] == circuit.THRESHOLD
+        assert pipeline.websites.requests[('POST', 'patch', 'login')] == circuit.THRESHOLD
+        assert report.outcomes['patch'] == {'post': 14, 'posting': 0, 'posted': 0}
+        breaker = circuit.Breaker(pipeline.table, 'patch')
+        assert pipeline.table.items[('state', 'breaker#patch')]['state'] == circuit.OPEN
+        assert len(list(breaker.parked())) == 14 - circuit.THRESHOLD
+        backing_off = [date_id for (access, date_id), item in pipeline.table.items.items()
+                       if access == 'public' and 'patch' in item.get('attempts', {})]
+        assert len(backing_off) == circuit.THRESHOLD
+
+        # Still open: the sweep sends no probe
+        assert pipeline.sweep() == []
+
+        # The site is back and the breaker's time is up: the sweep sends one parked event as the probe
+        pipeline.websites.behaviors['patch'] = Behavior()
+        pipeline.table.items[('state', 'breaker#patch')]['open_until'] = 0
+        assert len(pipeline.sweep()) == 1
+
+        # Closed, and the parked events are released to the next sweep, which posts them; those whose
+        # posts failed wait out their backoff
+        assert pipeline.table.items[('state', 'breaker#patch')]['state'] == circuit.CLOSED
+        assert list(breaker.parked()) == []
+        pipeline.sweep()
+        assert pipeline.outcomes()['patch'] == {'post': circuit.THRESHOLD, 'posting': 0, 'posted': 14 - circuit.THRESHOLD}
+        assert all('patch' in pipeline.table.items[('public', date_id)]['post'] for date_id in backing_off)
+
+        later = time.time() + retries.BASE_MS / 1000 + 60
+        with mock.patch('time.time', return_value=later):
+            messages = pipeline.sweep(deliver=False)
+        pipeline.deliver(messages)
+        assert pipeline.outcomes()['patch'] == {'post': 0, 'posting': 0, 'posted': 14}
+        assert len(pipeline.websites.posts['patch']) == 14
@@ -0,0 +1,128 @@
+import json
+
+from st_james import digest
+from tests.harness.aws import Table
+
+
+class FakeSns:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, **kwargs):
+        self.messages.append(kwargs)
+        return {'MessageId': str(len(self.messages))}
+
+
+ITEM = {'date_id': '2024-10-05#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'title': 'Choral Evensong'}
+
+
+def test_one_digest_per_invocation():
+    sns = FakeSns()
+    results = digest.Digest('patch', 'arn:topic', sns)
+
+    for _ in range(3):
+        results.record(True, ITEM)
+    results.record(False, ITEM, 'Post failed with status code 500')
+    results.publish()
+
+    assert len(sns.messages) == 1
+    message = sns.messages[0]
+    assert message['Subject'] == 'Post to patch: 3 succeeded, 1 failed'
+    body = json.loads(message['Message'])
+    assert body['sites'] == {'patch': {'succeeded': 3, 'failed': 1}}
+    assert body['failures'][0]['error'] == 'Post failed with status code 500'
+    assert body['failures'][0]['date_id'] == ITEM['date_id']
+
+
+def test_nothing_recorded_publishes_nothing():
+    sns = FakeSns()
+    results = digest.Digest('patch', 'arn:topic', sns)
+
+    results.publish()
+
+    assert sns.messages == []
+
+
+def test_window_buffers_until_elapsed(monkeypatch):
+    sns = FakeSns()
+    table = Table('StJamesEvents')
+    now = [1000.0]
+    monkeypatch.setattr(digest.time, 'time', lambda: now[0])
+    results = digest.Digest('moms', 'arn:topic', sns, table=table, window_seconds=300)
+
+    results.record(True, ITEM)
+    results.publish()
+    now[0] += 100
+    results.record(False, None, 'Unable to login')
+    results.publish()
+
+    assert sns.messages == []
+    # Counts, not the outcomes: the buffer doesn't grow with the posts
+    window = table.items[('state', 'digest#moms')]
+    assert (window['succeeded_moms'], window['failed_moms'], window['last_error_moms']) == (1, 1, 'Unable to login')
+
+    now[0] += 300
+    results.record(True, ITEM)
+    results.publish()
+
+    assert len(sns.messages) == 1
+    body = json.loads(sns.messages[0]['Message'])
+    assert (body['succeeded'], body['failed']) == (2, 1)
+    assert body['last_errors'] == {'moms': 'Unable to login'}
+    assert table.items == {}
+
+
+def test_flush_publishes_a_window_after_the_posts_stop(monkeypatch):
+    sns = FakeSns()
+    table = Table('StJamesEvents')
+    now = [1000.0]
+    monkeypatch.setattr(digest.time, 'time', lambda: now[0])
+    results = digest.Digest('patch,moms', 'arn:topic', sns, table=table, window_seconds=300)
+
+    results.record(True, ITEM, website='patch')
+    results.record(False, ITEM, 'Post failed with status code 500', website='moms')
+    results.publish()
+    results.flush()
+    assert sns.messages == []
+
+    now[0] += 300
+    results.flush()
+    results.flush()
+
+    assert len(sns.messages) == 1
+    assert sns.messages[0]['Subject'] == 'Post to patch,moms: 1 succeeded, 1 failed'
+    body = json.loads(sns.messages[0]['Message'])
+    assert body['sites'] == {'patch': {'succeeded': 1, 'failed': 0}, 'moms': {'succeeded': 0, 'failed': 1}}
+    assert table.items == {}
+
+
+def test_a_window_that_fails_to_publish_is_kept(monkeypatch):
+    sns = FakeSns()
+    table = Table('StJamesEvents')
+    now = [1000.0]
+    monkeypatch.setattr(digest.time, 'time', lambda: now[0])
+    results = digest.Digest('patch', 'arn:topic', sns, table=table, window_seconds=300)
+    results.record(False, ITEM, 'Post failed with status code 500')
+    results.publish()
+
+    # SNS is down when the window is due: claimed, not sent, and put back
+    def unavailable(**kwargs):
+        raise RuntimeError('SNS unavailable')
+
+    monkeypatch.setattr(sns, 'publish', unavailable)
+    now[0] += 300
+    results.flush()
+    window = table.items[('state', 'digest#patch')]
+    assert (int(window['window_start']), int(window['failed_patch'])) == (1000, 1)
+
+    # Posts since add to it; the next flush publishes the lot
+    monkeypatch.undo()
+    monkeypatch.setattr(digest.time, 'time', lambda: now[0])
+    results.record(True, ITEM)
+    results.publish()
+    assert len(sns.messages) == 1
+    body = json.loads(sns.messages[0]['Message'])
+    assert body['sites'] == {'patch': {'succeeded': 1, 'failed': 1}}
+    assert body['window_start'].startswith('1970-01-01T00:16:40')
+    assert body['last_errors'] == {'patch': 'Post failed with status code 500'}
+    assert table.items == {}
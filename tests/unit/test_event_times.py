@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+from st_james import event_times
+
+EVENTS_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'events.json')
+
+
+@pytest.mark.parametrize('time_str, start, end', [
+    ('3 pm', '15:00', '16:00'),
+    ('10:30 am', '10:30', '11:30'),
+    ('7-10 pm', '19:00', '22:00'),
+    ('10 am - 4 pm', '10:00', '16:00'),
+    ('11-1 pm', '11:00', '13:00'),
+    ('7 pm - 9:30', '19:00', '21:30'),
+    ('noon', '12:00', '13:00'),
+    ('noon - 2 pm', '12:00', '14:00'),
+    ('7:30 P.M.', '19:30', '20:30'),
+    ('9:30 to 11 AM', '09:30', '11:00'),
+    ('15:00', '15:00', '16:00'),
+])
+def test_parse_time_formats(time_str, start, end):
+    times = event_times.parse('2024-09-28', time_str)
+
+    assert times.start.strftime('%H:%M') == start
+    assert times.end.strftime('%H:%M') == end
+
+
+def test_parse_returns_eastern_epochs():
+    times = event_times.parse('2024-12-01', '7-10 pm')
+
+    assert times.start.isoformat() == '2024-12-01T19:00:00-05:00'
+    assert times.start_epoch == 1733097600
+    assert times.end_epoch_ms == 1733108400000
+
+
+def test_range_past_midnight_ends_next_day():
+    times = event_times.parse('2024-09-28', '10 pm - 1 am')
+
+    assert times.end.isoformat() == '2024-09-29T01:00:00-04:00'
+
+
+def test_endtime_overrides_range_end():
+    times = event_times.parse('2024-09-28', '7-10 pm', '11 pm')
+
+    assert times.end.strftime('%H:%M') == '23:00'
+
+
+@pytest.mark.parametrize('time_str', ['', 'TBD', '10', '7-10', '13 pm'])
+def test_parse_rejects_unusable_times(time_str):
+    with pytest.raises(ValueError):
+        event_times.parse('2024-09-28', time_str)
+
+
+def test_every_sample_event_parses():
+    with open(EVENTS_FILE) as f:
+        events = json.load(f)
+
+    for event in events:
+        times = event_times.parse(event['date'], event['time'])
+        assert times.start < times.end
+
+
+def test_for_item_is_memoized():
+    item = {'date_id': '2030-01-02#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'time': '5 pm'}
+
+    first = event_times.for_item(item)
+    hits = event_times.parse.cache_info().hits
+    second = event_times.for_item(item)
+
+    assert second is first
+    assert event_times.parse.cache_info().hits == hits + 1
+
+
+def test_normalize_stores_epochs_and_iso():
+    item = {'date_id': '2024-12-01#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'time': '7-10 pm'}
+
+    event_times.normalize(item)
+
+    assert item['start_epoch_ms'] == 1733097600000
+    assert item['end_epoch_ms'] == 1733108400000
+    assert item['start_iso'] == '2024-12-01T19:00:00-05:00'
+    assert item['end_iso'] == '2024-12-01T22:00:00-05:00'
+
+
+def test_normalize_replaces_stale_fields():
+    item = {'date_id': '2024-12-01#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'time': '3 pm',
+            'start_epoch_ms': 1, 'end_epoch_ms': 2, 'start_iso': 'x', 'end_iso': 'y'}
+
+    event_times.normalize(item)
+
+    assert item['start_iso'] == '2024-12-01T15:00:00-05:00'
+
+    del item['time']
+    event_times.normalize(item)
+
+    assert not set(event_times.NORMALIZED_FIELDS) & set(item)
+
+
+def test_normalize_rejects_unparseable_time():
+    with pytest.raises(ValueError):
+        event_times.normalize({'date_id': '2024-12-01#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'time': 'after lunch'})
+
+
+def test_normalized_items_are_read_without_parsing():
+    # the time is deliberately unparseable; the stored numbers win
+    item = {'date_id': '2024-12-01#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f', 'time': 'after lunch',
+            'start_epoch_ms': 1733097600000, 'end_epoch_ms': 1733108400000}
+
+    assert event_times.epochs_ms(item) == (1733097600000, 1733108400000)
+    assert event_times.for_item(item).start.isoformat() == '2024-12-01T19:00:00-05:00'
@@ -0,0 +1,36 @@
+import json
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+
+def request(method, resource, access=None, date_id=None, body=None):
+    path_parameters = {k: v for k, v in (('access', access), ('date_id', date_id)) if v}
+    return {'httpMethod': method, 'resource': resource, 'pathParameters': path_parameters or None,
+            'body': json.dumps(body) if body is not None else None, 'requestContext': {}}
+
+
+def test_routes_every_method_through_one_function():
+    aws = Aws()
+    with aws.installed():
+        api = lambdas.load('events_api', {'TABLE_NAME': 'StJamesEvents'})
+
+        created = api(request('POST', '/events', body={'access': 'public', 'date': '2024-10-05', 'title': 'Evensong', 'time': '4 pm'}))
+        assert created['statusCode'] == 201
+        date_id = json.loads(created['body'])['item']['date_id']
+
+        listed = api(request('GET', '/events/{access}', access='public'))
+        assert [i['date_id'] for i in json.loads(listed['body'])['items']] == [date_id]
+
+        updated = api(request('PUT', '/events/{access}/{date_id}', 'public', date_id, {'title': 'Choral Evensong'}))
+        assert json.loads(updated['body'])['item']['title'] == 'Choral Evensong'
+
+        got = api(request('GET', '/events/{access}/{date_id}', 'public', date_id))
+        assert json.loads(got['body'])['title'] == 'Choral Evensong'
+
+        assert api(request('DELETE', '/events/{access}/{date_id}', 'public', date_id))['statusCode'] == 204
+        assert api(request('PATCH', '/events/{access}/{date_id}', 'public', date_id))['statusCode'] == 404
+
+    # One DynamoDB resource shared by all five handlers
+    assert len(aws.dynamodb.tables) == 1
+    assert aws.dynamodb.tables['StJamesEvents'].calls == {'PutItem': 2, 'Query': 1, 'GetItem': 2, 'DeleteItem': 1}
@@ -0,0 +1,52 @@
+import json
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+
+def date_id(n):
+    return f"2026-05-{n % 28 + 1:02d}#{n:08d}-0000-4000-8000-000000000000"
+
+
+def batch_get(function, keys):
+    response = function({'body': json.dumps({'keys': keys}), 'requestContext': {}})
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_batch_get_chunks_and_retries_unprocessed_keys():
+    aws = Aws()
+    with aws.installed():
+        table = aws.dynamodb.Table('StJamesEvents')
+        for n in range(250):
+            table.put_item(Item={'access': 'public', 'date_id': date_id(n), 'title': f"Event {n}"})
+        function = lambdas.load('events_batch_get', {'TABLE_NAME': 'StJamesEvents'})
+        function.module.BASE_DELAY_S = 0
+
+        # Every call reads only 60 keys and leaves the rest unprocessed
+        aws.dynamodb.batch_get_capacity = 60
+        keys = [{'access': 'public', 'date_id': date_id(n)} for n in range(290)]
+        status, body = batch_get(function, keys + keys[:5])
+
+    assert status == 200
+    assert [item['date_id'] for item in body['items']] == [date_id(n) for n in range(250)]
+    assert body['missing'] == keys[250:]
+    assert body['unprocessed'] == []
+    assert table.calls['BatchGetItem'] == 5 and 'GetItem' not in table.calls
+
+
+def test_batch_get_gives_up_on_keys_it_cant_read():
+    aws = Aws()
+    with aws.installed():
+        table = aws.dynamodb.Table('StJamesEvents')
+        table.put_item(Item={'access': 'private', 'date_id': date_id(1), 'title': 'Vestry'})
+        function = lambdas.load('events_batch_get', {'TABLE_NAME': 'StJamesEvents'})
+        function.module.BASE_DELAY_S = 0
+
+        aws.dynamodb.batch_get_capacity = 0
+        keys = [{'access': 'private', 'date_id': date_id(1)}]
+        status, body = batch_get(function, keys)
+        assert (status, body) == (200, {'items': [], 'missing': [], 'unprocessed': keys})
+        assert table.calls['BatchGetItem'] == function.module.MAX_ATTEMPTS
+
+        status, body = batch_get(function, [{'access': 'private', 'date_id': 'nope'}])
+        assert status == 422 and body['message'] == "keys[0].date_id must match 'YYYY-MM-DD#GUID'"
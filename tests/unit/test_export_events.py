@@ -0,0 +1,164 @@
+import base64
+import gzip
+import json
+import time
+
+from unittest import mock
+
+import pytest
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws, from_dynamodb
+
+BUCKET = 'stjames-data-pm186'
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def export(aws):
+    export = lambdas.load('export_events', {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET})
+    aws.lambda_.register(export.function_name, export.invoke)
+
+    table = aws.dynamodb.Table('StJamesEvents')
+    for n in range(200):
+        table.put_item(Item={'access': ('public', 'private')[n % 2], 'date_id': f"2026-05-{n % 28 + 1:02d}#{n:036d}",
+                             'title': f"Event {n}", 'post': ['patch'], 'attendees': n})
+    table.put_item(Item={'access': 'state', 'date_id': 'sweep#cursor', 'cursor': 'x'})
+    return export
+
+
+def exported_items(aws, manifest):
+    items = []
+    for segment in manifest['segments']:
+        for key in segment['parts']:
+            body = gzip.decompress(aws.s3.objects[(BUCKET, key)]['Body'])
+            items.extend(from_dynamodb(json.loads(line)['Item']) for line in body.splitlines())
+    return items
+
+
+def get_export(export, job_id):
+    response = export.invoke({'httpMethod': 'GET', 'pathParameters': {'job': job_id}})
+    return json.loads(response['body'])
+
+
+def test_export_writes_every_event_once(aws, export):
+    response = export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 4}),
+                              'requestContext': {'domainName': 'api.example.com', 'stage': 'prod'}})
+    assert response['statusCode'] == 202
+    job_id = json.loads(response['body'])['job']
+    assert response['headers']['Location'] == f"https://api.example.com/prod/exports/{job_id}"
+
+    aws.lambda_.wait()
+    job = get_export(export, job_id)
+    assert (job['status'], job['items'], job['segments_done']) == ('completed', 200, 4)
+
+    manifest = json.loads(aws.s3.objects[(BUCKET, f"exports/{job_id}/manifest.json")]['Body'])
+    items = exported_items(aws, manifest)
+    assert sorted(item['date_id'] for item in items) == sorted(f"2026-05-{n % 28 + 1:02d}#{n:036d}" for n in range(200))
+    assert {item['attendees'] for item in items} == set(range(200))
+    # One Scan a segment: the pages are bigger than the table
+    assert aws.dynamodb.Table('StJamesEvents').calls['Scan'] == 4
+
+
+def test_export_resumes_from_segment_checkpoints(aws, export):
+    # Small pages and parts, and never enough time: each invocation gets one page a segment further
+    export.module.PAGE_ITEMS = 10
+    export.module.PART_BYTES = 1
+    export.module.TIME_RESERVE_MS = 10 ** 9
+
+    job_id = json.loads(export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 3})})['body'])['job']
+    aws.lambda_.wait()
+
+    job = get_export(export, job_id)
+    assert (job['status'], job['items']) == ('completed', 200)
+    assert len(aws.lambda_.invocations) > 5
+
+    manifest = json.loads(aws.s3.objects[(BUCKET, f"exports/{job_id}/manifest.json")]['Body'])
+    items = exported_items(aws, manifest)
+    assert len(items) == len({(item['access'], item['date_id']) for item in items}) == 200
+    assert sum(len(segment['parts']) for segment in manifest['segments']) > 20
+
+    # Done is done
+    response = export.invoke({'httpMethod': 'POST', 'body': json.dumps({'job': job_id})})
+    assert response['statusCode'] == 409
+    assert export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 99})})['statusCode'] == 422
+
+
+def test_only_a_failed_or_stalled_export_is_resumed(aws, export):
+    table = aws.dynamodb.Table('StJamesEvents')
+    job_id = json.loads(export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 2})})['body'])['job']
+    job = table.items[('state', f"export#{job_id}")]
+    resume = {'httpMethod': 'POST', 'body': json.dumps({'job': job_id})}
+
+    # Queued (its invocation not run yet) or running: left alone
+    assert export.invoke(resume)['statusCode'] == 409
+    job['status'] = 'running'
+    assert export.invoke(resume)['statusCode'] == 409
+    assert len(aws.lambda_.invocations) == 1
+
+    # Running, but not updated for longer than an invocation lasts: stalled
+    job['updated_at'] -= export.module.STALLED_SECONDS + 1
+    assert export.invoke(resume)['statusCode'] == 202
+    # The first request claimed it; another finds it queued again
+    assert export.invoke(resume)['statusCode'] == 409
+
+    aws.lambda_.wait()
+    assert get_export(export, job_id)['status'] == 'completed'
+
+
+def test_finished_exports_expire_unless_resumed(aws, export):
+    table = aws.dynamodb.Table('StJamesEvents')
+    job_id = json.loads(export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 2})})['body'])['job']
+    aws.lambda_.wait()
+
+    def expiries():
+        return [item.get('expires_at') for (access, date_id), item in sorted(table.items.items())
+                if access == 'state' and date_id.startswith(f"export#{job_id}")]
+
+    # The job and its two checkpoints
+    assert len(expiries()) == 3
+    assert all(time.time() + 29 * 86400 < expiry < time.time() + 31 * 86400 for expiry in expiries())
+
+    # A failed one that's resumed keeps its checkpoints for good again, until it finishes
+    table.items[('state', f"export#{job_id}")]['status'] = 'failed'
+    for item in table.items.values():
+        if item['date_id'].startswith(f"export#{job_id}#segment#"):
+            item['done'] = False
+    assert export.invoke({'httpMethod': 'POST', 'body': json.dumps({'job': job_id})})['statusCode'] == 202
+    assert expiries() == [None, None, None]
+    aws.lambda_.wait()
+    assert all(expiries())
+
+
+def test_an_export_is_claimed_by_one_resume(aws, export):
+    table = aws.dynamodb.Table('StJamesEvents')
+    job_id = json.loads(export.invoke({'httpMethod': 'POST', 'body': json.dumps({'segments': 2})})['body'])['job']
+    aws.lambda_.wait()
+    job = table.items[('state', f"export#{job_id}")]
+    job['status'] = 'failed'
+
+    # Another request resumes it between this one's read and its claim
+    read = export.module.TABLE.get_item
+    def read_then_resume(**kwargs):
+        response = read(**kwargs)
+        table.items[('state', f"export#{job_id}")].update(status='queued', updated_at=job['updated_at'] + 1)
+        return response
+    with mock.patch.object(export.module.TABLE, 'get_item', read_then_resume):
+        response = export.invoke({'httpMethod': 'POST', 'body': json.dumps({'job': job_id})})
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['message'] == 'Export was resumed by another request'
+
+
+def test_a_base64_encoded_body_is_read(aws, export):
+    # With api_compression=lambda the gateway passes every body through as binary
+    body = base64.b64encode(json.dumps({'segments': 2}).encode()).decode()
+    response = export.invoke({'httpMethod': 'POST', 'body': body, 'isBase64Encoded': True})
+    assert response['statusCode'] == 202
+    assert json.loads(response['body'])['segments'] == 2
+    assert export.invoke({'httpMethod': 'POST', 'body': 'bm90IGpzb24=', 'isBase64Encoded': True})['statusCode'] == 400
@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from st_james import changes, fingerprint
+from tests.harness.pipeline import Pipeline, load_events, upcoming
+
+ITEM = {
+    'access': 'public',
+    'date_id': '2030-10-05#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f',
+    'title': 'Blessing of the Animals',
+    'time': '3 pm',
+    'description': 'Bring your pets.'
+}
+
+
+def test_content_hash_changes_only_with_what_the_site_shows():
+    for site in ('patch', 'moms', 'sojourner', 'gov', 'test'):
+        sent = fingerprint.content_hash(site, ITEM)
+        # Read back from the table, with bookkeeping added
+        assert fingerprint.content_hash(site, {**ITEM, 'version': Decimal(3), 'posted': [site]}) == sent
+        assert fingerprint.content_hash(site, {**ITEM, 'title': 'Blessing of the Pets'}) != sent
+
+    assert not fingerprint.unchanged(ITEM, 'patch')
+    sent = {**ITEM, 'sent': {'patch': {'hash': fingerprint.content_hash('patch', ITEM), 'external_id': '7'}}}
+    assert fingerprint.unchanged(sent, 'patch')
+    assert fingerprint.external_id(sent, 'patch') == '7'
+    assert not fingerprint.unchanged({**sent, 'time': '4 pm'}, 'patch')
+
+
+def requeue(pipeline, date_id, **fields):
+    """Puts patch and gov back on the event's post list, as an edit through the API would."""
+    item = pipeline.table.items[('public', date_id)]
+    item.update(fields, post=['patch', 'gov'], posted=[])
+    changes.record(pipeline.table, 'public', date_id)
+
+
+def test_unchanged_reposts_are_skipped_and_changed_ones_update_the_site():
+    with Pipeline(sites=('patch', 'gov')) as pipeline:
+        pipeline.run(upcoming([event for event in load_events(6) if event.get('access') == 'public']))
+        pipeline.process.module.SETTLE_MS = 0
+
+        items = [item for (access, _), item in pipeline.table.items.items() if access == 'public']
+        for item in items:
+            assert set(item['sent']) == {'patch', 'gov'}
+            assert item['sent']['patch']['external_id'] and item['sent']['gov']['external_id']
+        requests = dict(pipeline.websites.requests)
+
+        # Sent back to post unchanged: marked posted without a publish, or a call to either site
+        for item in items:
+            requeue(pipeline, item['date_id'])
+        assert pipeline.sweep() == []
+        assert pipeline.websites.requests == requests
+        assert pipeline.outcomes()['patch'] == {'post': 0, 'posting': 0, 'posted': len(items)}
+        assert pipeline.outcomes()['gov'] == {'post': 0, 'posting': 0, 'posted': len(items)}
+
+        # One edited: both sites get it, as a change to the event they already have
+        edited = items[0]
+        requeue(pipeline, edited['date_id'], title='Moved indoors')
+        assert len(pipeline.sweep()) == 1
+        assert len(pipeline.websites.posts['patch']) == len(pipeline.websites.posts['gov']) == len(items)
+        assert [(event_id, body['title']) for event_id, body in pipeline.websites.updates['patch']] == \
+            [(int(edited['sent']['patch']['external_id']), 'Moved indoors')]
+        assert [(event_id, body['title']) for event_id, body in pipeline.websites.updates['gov']] == \
+            [(int(edited['sent']['gov']['external_id']), 'Moved indoors')]
+        assert pipeline.outcomes()['patch']['posted'] == pipeline.outcomes()['gov']['posted'] == len(items)
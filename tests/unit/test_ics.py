@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+
+from st_james import ics
+
+STAMP = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+def test_vevent_uses_the_normalized_times():
+    block = ics.vevent({'date_id': '2026-07-04#abc', 'title': 'Picnic', 'time': '3 pm', 'description': 'Line one\nLine two'}, STAMP)
+    lines = block.split('\r\n')
+    assert lines[:5] == ['BEGIN:VEVENT', 'UID:2026-07-04-abc@events.stjamestheless', 'DTSTAMP:20260102T030405Z',
+                         'DTSTART:20260704T190000Z', 'DTEND:20260704T200000Z']
+    assert 'DESCRIPTION:Line one\\nLine two' in lines
+
+
+def test_event_without_a_time_is_all_day():
+    block = ics.vevent({'date_id': '2026-12-24#abc', 'title': 'Christmas Eve'}, STAMP)
+    assert 'DTSTART;VALUE=DATE:20261224' in block.split('\r\n')
+
+
+def test_long_lines_fold_at_75_octets():
+    line = 'DESCRIPTION:' + 'é' * 100
+    folded = ics.fold(line).split('\r\n')
+    assert all(len(part.encode('utf-8')) <= 75 for part in folded)
+    assert ''.join(part[1:] if i else part for i, part in enumerate(folded)) == line
+
+
+def test_feed_round_trips():
+    blocks = {ics.uid(f"2026-07-0{n}#x"): ics.vevent({'date_id': f"2026-07-0{n}#x", 'title': f"Event {n}"}, STAMP) for n in (2, 1)}
+    text = ics.render_feed(blocks)
+    assert text.startswith('BEGIN:VCALENDAR\r\n') and text.endswith('END:VCALENDAR\r\n')
+    assert ics.parse_feed(text) == blocks
+    assert text.index('Event 1') < text.index('Event 2')
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from st_james import metrics as metrics_module
+from st_james.metrics import Metrics
+
+
+def emitted(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+
+def test_handler_emits_phase_and_invocation_metrics(capsys):
+    metrics = Metrics('post_to_patch', site='patch')
+
+    @metrics.timed('post')
+    def post(ok):
+        return ok, None if ok else 'Post failed'
+
+    @metrics.handler
+    def handler(event, context):
+        post(True)
+        post(False)
+        with metrics.phase('sns_publish'):
+            pass
+        return {'statusCode': 200}
+
+    handler({'Records': [{}, {}, {}]}, None)
+    docs = emitted(capsys)
+
+    phases = {(d['Phase'], d['Outcome']): d for d in docs if 'Phase' in d}
+    assert set(phases) == {('post', 'success'), ('post', 'failure'), ('sns_publish', 'success')}
+    post_doc = phases[('post', 'success')]
+    assert post_doc['Site'] == 'patch'
+    assert post_doc['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'StJames'
+    assert ['Function', 'Site', 'Phase', 'Outcome'] in post_doc['_aws']['CloudWatchMetrics'][0]['Dimensions']
+    assert len(post_doc['Duration']) == 1
+
+    invocation = [d for d in docs if 'InvocationDuration' in d][0]
+    assert invocation['RecordCount'] == '2-10'
+    assert invocation['Records'] == 3
+    assert invocation['Outcome'] == 'success'
+
+
+def test_cold_start_only_on_first_invocation(capsys, monkeypatch):
+    monkeypatch.setattr(metrics_module, '_cold_start', True)
+    metrics = Metrics('events_get')
+    handler = metrics.handler(lambda event, context: {'statusCode': 404})
+
+    handler({}, None)
+    handler({}, None)
+    invocations = [d for d in emitted(capsys) if 'InvocationDuration' in d]
+
+    assert [d['ColdStart'] for d in invocations] == ['true', 'false']
+    assert invocations[0]['Outcome'] == 'failure'
+
+
+def test_exceptions_are_recorded_as_errors(capsys):
+    metrics = Metrics('events_create')
+
+    @metrics.handler
+    def handler(event, context):
+        with metrics.phase('put_item'):
+            raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        handler({}, None)
+    docs = emitted(capsys)
+
+    assert [d['Outcome'] for d in docs if d.get('Phase') == 'put_item'] == ['error']
+    assert [d['Outcome'] for d in docs if 'InvocationDuration' in d] == ['error']
@@ -0,0 +1,81 @@
+import copy
+from datetime import date
+
+from st_james import payloads
+
+
+MESSAGE = {
+    'access': 'public',
+    'date_id': '2024-10-05#0f0e9d2c-1b1a-4c3d-8e7f-6a5b4c3d2e1f',
+    'title': 'Blessing of the Animals',
+    'time': '3 pm',
+    'description': 'Bring your pets.'
+}
+
+FORM_VALUES = {
+    '_token': 'token',
+    'captcha_value': 'captcha',
+    'hs_fv_hash': 'hash',
+    'hs_fv_ip': 'ip',
+    'hs_fv_timestamp': 'timestamp'
+}
+
+
+def test_moms_payload_fills_event_fields():
+    payload = payloads.build_moms_payload(MESSAGE, 1000, 2000, 'me@example.com')
+
+    assert payload['event']['what']['summary'] == MESSAGE['title']
+    assert payload['event']['what']['description'] == '<p>Bring your pets.</p>'
+    assert payload['event']['what']['image']['url'] == 'https://stjames-data-pm186.s3.amazonaws.com/SJL+logo.jpg'
+    assert payload['event']['when']['start'] == {'millis': 1000, 'tzid': 'America/New_York'}
+    assert payload['event']['when']['end'] == {'millis': 2000, 'tzid': 'America/New_York'}
+    assert payload['event']['where']['location']['latitude'] == 40.9897687
+    assert payload['submitter'] == {'name': 'Phillip Martin', 'email': 'me@example.com', 'notes': ''}
+
+
+def test_patch_payload_fills_event_fields():
+    payload = payloads.build_patch_payload(MESSAGE, 1728154800)
+
+    assert payload['eventDateEpoch'] == 1728154800
+    assert payload['title'] == MESSAGE['title']
+    assert payload['contentHtml'] == '<p>Bring your pets.</p>'
+    assert payload['patchId'] == '37'
+    assert payload['eventLocation']['coordinates'] == [-73.8000084, 40.98955369999999]
+
+
+def test_sojourner_payload_fills_event_fields():
+    payload = payloads.build_sojourner_payload(MESSAGE, '2024-10-05 3 pm', FORM_VALUES, 'me@example.com')
+
+    assert payload['Custom3'] == MESSAGE['title']
+    assert payload['Custom5'] == '2024-10-05 3 pm'
+    assert payload['Custom16'] == '10 Church Lane'
+    assert payload['captcha'] == 'captcha'
+    assert payload['sEmail'] == 'me@example.com'
+    assert None not in payload.values()
+
+
+def test_gov_payload_fills_event_and_submission_fields():
+    payload = payloads.build_gov_payload(MESSAGE, '03:00', '04:00', '15:00', '16:00', today=date(2024, 9, 20))
+
+    assert payload['byyearday'] == '279'
+    assert payload['publish_up'] == '10/05/2024'
+    assert payload['publish_up2'] == '2024-10-5'
+    assert payload['bymonth'] == '9'
+    assert payload['byweekno'] == '38'
+    assert payload['until'] == '09/20/2024'
+    assert payload['start_time'] == '15:00'
+    assert payload['location'] == 'Church of St. James the Less, 10 Church Lane, Scarsdale, NY'
+    assert len(payload) == 46
+
+
+def test_building_payloads_leaves_templates_untouched():
+    templates = copy.deepcopy([payloads.MOMS_TEMPLATE, payloads.PATCH_TEMPLATE,
+                               payloads.SOJOURNER_TEMPLATE, payloads.GOV_TEMPLATE])
+
+    payloads.build_moms_payload(MESSAGE, 1000, 2000, 'me@example.com')
+    payloads.build_patch_payload(MESSAGE, 1728154800)
+    payloads.build_sojourner_payload(MESSAGE, '2024-10-05 3 pm', FORM_VALUES, 'me@example.com')
+    payloads.build_gov_payload(MESSAGE, '03:00', '04:00', '15:00', '16:00')
+
+    assert templates == [payloads.MOMS_TEMPLATE, payloads.PATCH_TEMPLATE,
+                         payloads.SOJOURNER_TEMPLATE, payloads.GOV_TEMPLATE]
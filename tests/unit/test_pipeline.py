@@ -0,0 +1,56 @@
+from unittest import mock
+
+from tests.harness.pipeline import Pipeline, load_events
+from tests.harness.websites import Behavior
+
+
+def test_load_events_scales_past_the_file():
+    events = load_events(20)
+    assert len(events) == 20
+    assert events[15]['title'].endswith('(2)')
+    assert events[15]['date'] > events[0]['date']
+
+
+def test_events_created_through_the_api_are_posted():
+    with Pipeline(sites=('patch', 'moms', 'sojourner')) as pipeline:
+        report = pipeline.run(load_events(15))
+
+    # 14 of the 15 events are public
+    for site in ('patch', 'moms', 'sojourner'):
+        assert report.outcomes[site] == {'post': 0, 'posting': 0, 'posted': 14}
+        assert report.site_posts[site] == 14
+    assert report.stages['create']['count'] == 15
+    assert report.stages['end_to_end']['count'] == 14
+    assert report.stages['status']['count'] == 14 * 3 * 2
+
+
+def test_failed_posts_go_back_to_post():
+    with Pipeline(sites=('gov',), behaviors={'gov': Behavior(error_rate=1.0)}) as pipeline:
+        report = pipeline.run(load_events(15), source='s3')
+
+    assert report.outcomes['gov'] == {'post': 14, 'posting': 0, 'posted': 0}
+    assert report.site_posts['gov'] == 0
+
+
+def test_status_updates_keep_an_edit_made_since_the_read():
+    with Pipeline(sites=('patch',)) as pipeline:
+        pipeline.run(load_events(2))
+        (_, date_id), item = next((key, item) for key, item in pipeline.table.items.items() if key[0] == 'public')
+        item.update(post=['patch'], posted=[])
+
+        # The event is edited between process_status's read and its write
+        module = pipeline.status.module
+        read = module.get_item_and_status
+        def read_then_edit(*args):
+            result = read(*args)
+            pipeline.table.items[('public', date_id)]['title'] = 'Moved indoors'
+            return result
+
+        with mock.patch.object(module, 'get_item_and_status', read_then_edit):
+            response = pipeline.status.invoke({'queryStringParameters': {
+                'sort-key': date_id, 'new-status': 'posting', 'old-status': 'post', 'website': 'patch'}})
+
+        assert response['statusCode'] == 200
+        stored = pipeline.table.items[('public', date_id)]
+        assert stored['title'] == 'Moved indoors'
+        assert stored['posting'] == ['patch'] and stored['post'] == []
@@ -0,0 +1,73 @@
+import datetime
+import json
+import time
+
+import pytest
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:StJamesEvents'
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def process_events(aws):
+    process = lambdas.load('process_events', {'TABLE_NAME': 'StJamesEvents', 'TOPIC_ARN': TOPIC_ARN, 'DELAY_MS': 0, 'JITTER_MS': 0})
+    aws.lambda_.register(process.function_name, process.invoke)
+
+    table = aws.dynamodb.Table('StJamesEvents')
+    today = datetime.date.today()
+    for days, access, post in ((3, 'public', ['patch']), (4, 'public', ['moms', 'patch']), (5, 'public', ['moms']),
+                               (6, 'public', []), (6, 'private', None), (-2, 'public', ['patch'])):
+        day = (today + datetime.timedelta(days=days)).isoformat()
+        item = {'access': access, 'date_id': f"{day}#00000000-0000-0000-0000-00000000000{days % 10}", 'title': f"Event {days}"}
+        if post is not None:
+            item['post'] = post
+        table.put_item(Item=item)
+    return process
+
+
+def get_job(process, job_id):
+    response = process.invoke({'httpMethod': 'GET', 'pathParameters': {'job': job_id}})
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_post_events_returns_202_and_runs_in_background(aws, process_events):
+    response = process_events.invoke({'httpMethod': 'POST', 'requestContext': {'domainName': 'api.example.com', 'stage': 'prod'}})
+
+    assert response['statusCode'] == 202
+    job_id = json.loads(response['body'])['job']
+    assert response['headers']['Location'] == f"https://api.example.com/prod/post-events/{job_id}"
+
+    aws.lambda_.wait()
+    status, job = get_job(process_events, job_id)
+    assert status == 200
+    assert (job['status'], job['queued'], job['published'], job['failed']) == ('completed', 3, 3, 0)
+    assert len(aws.sns.published(TOPIC_ARN)) == 3
+    # Finished: the table's TTL deletes it after a while
+    assert time.time() + 29 * 86400 < job['expires_at'] < time.time() + 31 * 86400
+
+
+def test_long_job_continues_in_new_invocations(aws, process_events):
+    # Never enough time left: each invocation gets through one item and hands on the rest
+    process_events.module.TIME_RESERVE_MS = 10 ** 9
+
+    job_id = json.loads(process_events.invoke({'httpMethod': 'POST'})['body'])['job']
+    aws.lambda_.wait()
+
+    status, job = get_job(process_events, job_id)
+    assert (job['status'], job['queued'], job['published']) == ('completed', 3, 3)
+    assert [i['Payload'].get('start_after', '')[:10] for i in aws.lambda_.invocations] == [
+        '', (datetime.date.today() + datetime.timedelta(days=3)).isoformat(), (datetime.date.today() + datetime.timedelta(days=4)).isoformat()
+    ]
+
+
+def test_unknown_job(process_events):
+    assert get_job(process_events, 'no-such-job')[0] == 404
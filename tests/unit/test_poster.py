@@ -0,0 +1,101 @@
+import json
+
+import requests
+
+from types import SimpleNamespace
+
+from bs4 import BeautifulSoup
+from st_james import adapters
+from tests.harness import lambdas
+from tests.harness.pipeline import STATUS_API_KEY_SECRET, TABLE_NAME, Pipeline, load_events
+
+
+def test_adapters_cover_every_site():
+    assert set(adapters.REGISTRY) == {'patch', 'moms', 'sojourner', 'gov', 'test'}
+    for site, adapter in adapters.REGISTRY.items():
+        assert adapter({f"{site.upper()}_SECRET_NAME": 'Credentials'}).secret_name == 'Credentials'
+        assert adapter({}).secret_name is None
+
+
+def test_gov_takes_the_evid_of_the_event_it_saved():
+    gov = adapters.Gov({})
+
+    def saved(html, url='https://gov.example/index.php', history=()):
+        return gov.saved_event_id(SimpleNamespace(url=url, history=list(history)), BeautifulSoup(html, 'html.parser'))
+
+    # Other events' links on the page (the upcoming events module) don't count
+    page = ('<a href="/index.php?option=com_jevents&task=icalrepeat.detail&evid=9">Vespers</a>'
+            '<div class="alert-message">Event submitted</div>'
+            '<a href="/index.php?option=com_jevents&task=icalevent.edit&evid=123">Edit</a>')
+    assert saved(page) == '123'
+    # The same event's edit link twice is still one event
+    assert saved(page + '<a href="/index.php?task=icalevent.edit&amp;evid=123">Edit again</a>') == '123'
+    # Edit links for two events: no telling which was saved
+    assert saved(page + '<a href="/index.php?task=icalevent.edit&evid=124">Edit</a>') is None
+    assert saved('<div class="alert-message">Event submitted</div>') is None
+    # Redirected to the saved event
+    assert saved(page, url='https://gov.example/index.php?task=icalrepeat.detail&evid=77', history=['302']) == '77'
+    # Not redirected: the URL is the one posted to
+    assert saved('', url='https://gov.example/index.php?evid=5') is None
+
+
+def test_one_function_posts_to_every_site_on_the_event():
+    with Pipeline(sites=('patch', 'moms')) as pipeline:
+        # What StJamesCompute deploys with context merge_posters=true
+        merged = lambdas.load('post_to_sites', {
+            'SITES': 'patch,moms',
+            'TABLE_NAME': TABLE_NAME,
+            'TOPIC_ARN': pipeline.results_topic,
+            'STATUS_URL': pipeline.websites.url('status'),
+            'STATUS_API_KEY_SECRET': STATUS_API_KEY_SECRET,
+            'PATCH_LOGIN_URL': pipeline.websites.url('patch', 'login'),
+            'PATCH_POST_URL': pipeline.websites.url('patch', 'event'),
+            'PATCH_SECRET_NAME': 'PatchCredentials',
+            'MOMS_URL': pipeline.websites.url('moms', 'event'),
+            'MOMS_SECRET_NAME': 'MomsCredentials'
+        }, code='post_to_site')
+
+        event = next(event for event in load_events(5) if event.get('access') == 'public')
+        body = {k: event[k] for k in ('access', 'date', 'title', 'time', 'description') if k in event}
+        response = pipeline.create.invoke({'body': json.dumps(body), 'requestContext': {}})
+        item = {**json.loads(response['body'])['item'], 'post': ['patch', 'moms']}
+        pipeline.table.items[('public', item['date_id'])]['post'] = ['patch', 'moms']
+
+        # The EMF documents the invocation emits
+        emitted = []
+        metrics = merged.module.engine.metrics
+        emit = metrics._emit
+
+        def spy(timestamp, dimensions, metric, value, properties):
+            emitted.append(properties)
+            emit(timestamp, dimensions, metric, value, properties)
+
+        metrics._emit = spy
+        response = merged.invoke({'Records': [{'Sns': {'Message': json.dumps(item), 'MessageAttributes': {}}}]})
+
+        assert json.loads(response['body'])['message'] == 'Posted 2 events, failed to post 0 events, parked 0, deferred 0'
+        assert len(pipeline.websites.posts['patch']) == len(pipeline.websites.posts['moms']) == 1
+        stored = pipeline.table.items[('public', item['date_id'])]
+        assert sorted(stored['posted']) == ['moms', 'patch']
+        assert set(stored['sent']) == {'moms', 'patch'}
+        # One digest, with counts per site
+        results = [json.loads(m['Message']) for m in pipeline.aws.sns.published(pipeline.results_topic)]
+        assert len(results) == 1
+        assert results[0]['sites'] == {'patch': {'succeeded': 1, 'failed': 0}, 'moms': {'succeeded': 1, 'failed': 0}}
+
+        # Each site's phases by site, as when each had its own function
+        assert {p.get('Site') for p in emitted if p.get('Phase') == 'post'} == {'patch', 'moms'}
+        assert {p.get('Site') for p in emitted if p.get('Phase') == 'sns_publish'} == {None}
+
+
+def test_the_status_api_takes_the_posters_key():
+    with Pipeline(sites=('moms',)) as pipeline:
+        event = next(event for event in load_events(5) if event.get('access') == 'public')
+        pipeline.run([event])
+        assert pipeline.outcomes()['moms']['posted'] == 1
+
+        # Without it, the gateway turns the call away before process_status sees it
+        response = requests.post(pipeline.websites.url('status'), timeout=5, params={
+            'sort-key': next(key for access, key in pipeline.table.items if access == 'public'),
+            'new-status': 'posted', 'website': 'moms', 'content-hash': '0' * 64})
+        assert response.status_code == 403
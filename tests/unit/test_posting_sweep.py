@@ -0,0 +1,145 @@
+import collections
+import datetime
+import json
+import threading
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from src.st_james_stack import StJamesStack
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+from tests.harness.stepfunctions import StateMachine, StatesError, definition_from_template
+
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:StJamesEvents'
+SITES = ('moms', 'patch', 'sojourner')
+
+
+@pytest.fixture(scope='module')
+def definition():
+    app = core.App(context={'posting_sweep': 'true', 'sweep_site_concurrency': '2'})
+    template = assertions.Template.from_stack(StJamesStack(app, "st-james")).to_json()
+    return definition_from_template(template, 'StJames-posting-sweep')
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def process_events(aws, request):
+    environment = {'TABLE_NAME': 'StJamesEvents', 'TOPIC_ARN': TOPIC_ARN, 'DELAY_MS': 5, 'JITTER_MS': 0}
+    # As StJamesCompute sets it: the sites with a poster
+    environment.update(getattr(request, 'param', {}))
+    process = lambdas.load('process_events', environment)
+    # Small pages and batches, to exercise the paging and the per-site limit
+    process.module.SWEEP_PAGE_SIZE = 8
+    process.module.SWEEP_BATCH_SIZE = 2
+
+    table = aws.dynamodb.Table('StJamesEvents')
+    start = datetime.date.today() + datetime.timedelta(days=1)
+    for n in range(20):
+        day = (start + datetime.timedelta(days=n)).isoformat()
+        table.put_item(Item={'access': 'public', 'date_id': f"{day}#{n:04d}", 'title': f"Event {n}", 'post': list(SITES[:1 + n % 3])})
+    return process
+
+
+class Tracker:
+    """Wraps process_events, counting the batches in flight per site; a broken site's steps raise."""
+    def __init__(self, process, throttle_first=0, broken=None, steps=('batch',)):
+        self.process = process
+        self.throttle_first = throttle_first
+        self.broken = broken
+        self.steps = steps
+        self.calls = collections.Counter()
+        self.in_flight = collections.Counter()
+        self.most = collections.Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.calls[event.get('sweep')] += 1
+        if event.get('site') == self.broken and event.get('sweep') in self.steps:
+            raise RuntimeError(f"{self.broken} is broken")
+        if event.get('sweep') != 'batch':
+            return self.process.invoke(event)
+        with self.lock:
+            if self.throttle_first:
+                self.throttle_first -= 1
+                raise StatesError('Lambda.TooManyRequestsException', 'Rate Exceeded.')
+            self.in_flight[event['site']] += 1
+            self.most[event['site']] = max(self.most[event['site']], self.in_flight[event['site']])
+        try:
+            return self.process.invoke(event)
+        finally:
+            with self.lock:
+                self.in_flight[event['site']] -= 1
+
+
+def test_sweep_posts_everything_within_the_per_site_limit(aws, process_events, definition):
+    tracker = Tracker(process_events)
+    machine = StateMachine(definition, {'StJames-process-events': tracker})
+
+    result = machine.execute({}, name='sweep-1')
+
+    # 20 items posting to 1, 2 or 3 sites
+    assert (result['job'], result['status'], result['queued'], result['published'], result['failed']) == \
+        ('sweep-1', 'completed', 39, 39, 0)
+    posts = collections.Counter(site for m in aws.sns.published(TOPIC_ARN) for site in json.loads(m['Message'])['post'])
+    assert posts == {'moms': 20, 'patch': 13, 'sojourner': 6}
+    assert max(tracker.most.values()) == 2
+
+    # The job reads back like a POST /post-events job
+    response = process_events.invoke({'httpMethod': 'GET', 'pathParameters': {'job': 'sweep-1'}})
+    assert json.loads(response['body'])['published'] == 39
+
+
+def test_throttled_batches_are_retried(aws, process_events, definition):
+    machine = StateMachine(definition, {'StJames-process-events': Tracker(process_events, throttle_first=3)})
+
+    result = machine.execute({}, name='sweep-2')
+
+    assert machine.retries == 3
+    assert (result['queued'], result['published']) == (39, 39)
+    assert len(aws.sns.published(TOPIC_ARN)) == 39
+
+
+def test_a_failing_batch_is_retried_then_counted_as_failed(aws, process_events, definition):
+    tracker = Tracker(process_events, broken='patch')
+    machine = StateMachine(definition, {'StJames-process-events': tracker})
+
+    result = machine.execute({}, name='sweep-3')
+
+    # patch's 13 posts failed, in 8 batches over the 3 pages, each tried 1 + 2 times; the other sites were posted
+    assert machine.retries == 8 * 2
+    assert tracker.calls['batch_failed'] == machine.caught.count('RuntimeError') == 8
+    assert (result['status'], result['queued'], result['published'], result['failed']) == ('completed', 39, 26, 13)
+    assert result['last_error'] == 'patch is broken'
+
+
+def test_a_sweep_with_too_many_sites_failing_is_summarized_as_failed(aws, process_events, definition):
+    tracker = Tracker(process_events, broken='patch', steps=('batch', 'batch_failed'))
+    machine = StateMachine(definition, {'StJames-process-events': tracker})
+
+    result = machine.execute({}, name='sweep-4')
+
+    # One of three sites failing is more than the 25% tolerated
+    assert 'States.ExceedToleratedFailureThreshold' in machine.caught
+    assert result['status'] == 'failed'
+    assert 'iterations failed' in result['error']
+
+
+@pytest.mark.parametrize('process_events', [{'POSTER_SITES': 'moms,patch'}], indirect=True)
+def test_sites_without_a_poster_get_no_batches(aws, process_events, definition):
+    tracker = Tracker(process_events)
+    machine = StateMachine(definition, {'StJames-process-events': tracker})
+
+    result = machine.execute({}, name='sweep-5')
+
+    assert (result['queued'], result['published']) == (33, 33)
+    posts = collections.Counter(site for m in aws.sns.published(TOPIC_ARN) for site in json.loads(m['Message'])['post'])
+    assert posts == {'moms': 20, 'patch': 13}
@@ -0,0 +1,154 @@
+import datetime
+import json
+
+import pytest
+
+from st_james import ics
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+from tests.harness.pipeline import SCHEDULED_EVENT
+
+BUCKET = 'stjames-data-pm186'
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def publish(aws):
+    return lambdas.load('publish_calendar', {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET})
+
+
+def month(offset):
+    today = datetime.date.today().replace(day=1)
+    return (today + datetime.timedelta(days=32 * offset)).isoformat()[:7]
+
+
+def shard(aws, month):
+    stored = aws.s3.objects.get((BUCKET, f"calendar/public/{month}.json"))
+    return json.loads(stored['Body']) if stored else None
+
+
+def feed(aws):
+    return ics.parse_feed(aws.s3.objects[(BUCKET, 'calendar/public/events.ics')]['Body'].decode('utf-8'))
+
+
+def test_shards_follow_the_stream(aws, publish):
+    table = aws.dynamodb.Table('StJamesEvents')
+    this_month, next_month = month(0), month(1)
+    for n, m in enumerate((this_month, this_month, next_month)):
+        table.put_item(Item={'access': 'public', 'date_id': f"{m}-20#0000000{n}", 'title': f"Event {n}", 'time': '3 pm', 'post': ['moms']})
+    table.put_item(Item={'access': 'private', 'date_id': f"{this_month}-21#00000009", 'title': 'Vestry'})
+
+    publish.invoke({'Records': table.take_stream()})
+
+    assert [e['title'] for e in shard(aws, this_month)['events']] == ['Event 0', 'Event 1']
+    assert 'post' not in shard(aws, this_month)['events'][0]
+    index = json.loads(aws.s3.objects[(BUCKET, 'calendar/public/index.json')]['Body'])
+    assert [m['month'] for m in index['months']] == [this_month, next_month]
+
+    # A posting status change is invisible to the public: nothing is rewritten
+    puts = dict(aws.s3.calls)
+    table.update_item(Key={'access': 'public', 'date_id': f"{next_month}-20#00000002"}, UpdateExpression='SET posted = :p', ExpressionAttributeValues={':p': ['moms']})
+    assert publish.invoke({'Records': table.take_stream()})['months'] == []
+    assert aws.s3.calls == puts
+
+    # A title change rewrites that month only; an emptied month goes away
+    table.update_item(Key={'access': 'public', 'date_id': f"{this_month}-20#00000001"}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Renamed'})
+    table.delete_item(Key={'access': 'public', 'date_id': f"{next_month}-20#00000002"})
+    assert publish.invoke({'Records': table.take_stream()})['rewritten'] == [this_month, next_month]
+    assert shard(aws, this_month)['events'][1]['title'] == 'Renamed'
+    assert shard(aws, next_month) is None
+
+
+def test_feed_patches_only_changed_events(aws, publish):
+    table = aws.dynamodb.Table('StJamesEvents')
+    day = month(1) + '-05'
+    for n in range(3):
+        table.put_item(Item={'access': 'public', 'date_id': f"{day}#0000000{n}", 'title': f"Event {n}", 'time': '10:30 am'})
+    publish.invoke({'Records': table.take_stream()})
+    before = feed(aws)
+    assert len(before) == 3
+
+    table.update_item(Key={'access': 'public', 'date_id': f"{day}#00000001"}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Choir, rehearsal; new'})
+    table.delete_item(Key={'access': 'public', 'date_id': f"{day}#00000002"})
+    assert publish.invoke({'Records': table.take_stream()})['feed_updated']
+
+    after = feed(aws)
+    uids = [ics.uid(f"{day}#0000000{n}") for n in range(3)]
+    assert after[uids[0]] == before[uids[0]]
+    assert 'SUMMARY:Choir\\, rehearsal\\; new' in after[uids[1]]
+    assert uids[2] not in after
+
+
+def test_a_feed_write_that_loses_a_race_is_redone(aws, publish):
+    table = aws.dynamodb.Table('StJamesEvents')
+    day = month(1) + '-05'
+    table.put_item(Item={'access': 'public', 'date_id': f"{day}#00000000", 'title': 'Event 0'})
+    publish.invoke({'Records': table.take_stream()})
+
+    # Another invocation patches its event into the feed between this one's read and its write
+    other = f"{day}#00000009"
+    put = aws.s3.put_object
+    raced = []
+
+    def racing_put(**kwargs):
+        if kwargs['Key'].endswith('events.ics') and not raced:
+            raced.append(kwargs['Key'])
+            blocks = {**feed(aws), ics.uid(other): ics.vevent({'date_id': other, 'title': 'Other'})}
+            put(Bucket=BUCKET, Key=kwargs['Key'], Body=ics.render_feed(blocks))
+        return put(**kwargs)
+
+    aws.s3.put_object = racing_put
+    table.update_item(Key={'access': 'public', 'date_id': f"{day}#00000000"}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Renamed'})
+    assert publish.invoke({'Records': table.take_stream()})['feed_updated']
+
+    # Re-read and patched again: neither change is lost
+    after = feed(aws)
+    assert 'SUMMARY:Renamed' in after[ics.uid(f"{day}#00000000")]
+    assert ics.uid(other) in after
+
+
+def test_past_months_drop_off_the_index(aws, publish):
+    table = aws.dynamodb.Table('StJamesEvents')
+    table.put_item(Item={'access': 'public', 'date_id': f"{month(0)}-20#00000000", 'title': 'Event 0'})
+    publish.invoke({'Records': table.take_stream()})
+    # Nothing changes this month: the monthly schedule leaves it
+    assert publish.invoke(SCHEDULED_EVENT) == {'rewritten': [], 'index_written': False}
+
+    # As written last month, when last month's shard was listed
+    last_month = month(-1)
+    index = aws.s3.objects[(BUCKET, 'calendar/public/index.json')]
+    body = json.loads(index['Body'])
+    body['months'].insert(0, {'month': last_month, 'key': f"calendar/public/{last_month}.json", 'etag': ''})
+    aws.s3.put_object(Bucket=BUCKET, Key='calendar/public/index.json', Body=json.dumps(body),
+                      Metadata={**index['Metadata'], 'month': last_month})
+
+    assert publish.invoke(SCHEDULED_EVENT) == {'rewritten': [], 'index_written': True}
+    index = json.loads(aws.s3.objects[(BUCKET, 'calendar/public/index.json')]['Body'])
+    assert [m['month'] for m in index['months']] == [month(0)]
+
+
+def test_months_with_events_from_before_the_stream_are_backfilled(aws, publish):
+    # In the table before the function's stream source started: no records for them
+    table = aws.dynamodb.Table('StJamesEvents')
+    for n, m in enumerate((month(-1), month(0), month(1), month(3))):
+        table.put_item(Item={'access': 'public', 'date_id': f"{m}-10#0000000{n}", 'title': f"Event {n}"})
+    table.take_stream()
+
+    # The first change to come through writes the index, and every month from this one on
+    table.put_item(Item={'access': 'public', 'date_id': f"{month(2)}-10#00000009", 'title': 'New'})
+    assert publish.invoke({'Records': table.take_stream()})['rewritten'] == [month(0), month(1), month(2), month(3)]
+    index = json.loads(aws.s3.objects[(BUCKET, 'calendar/public/index.json')]['Body'])
+    assert [m['month'] for m in index['months']] == [month(0), month(1), month(2), month(3)]
+    assert shard(aws, month(-1)) is None
+
+    # Lost since (deleted by hand, say): the monthly run writes it again, as it was, so the index
+    # still stands
+    del aws.s3.objects[(BUCKET, f"calendar/public/{month(3)}.json")]
+    assert publish.invoke(SCHEDULED_EVENT) == {'rewritten': [month(3)], 'index_written': False}
+    assert [e['title'] for e in shard(aws, month(3))['events']] == ['Event 3']
@@ -0,0 +1,34 @@
+from st_james import ratelimit
+from tests.harness.pipeline import Pipeline, load_events, upcoming
+from tests.harness.websites import Behavior
+
+
+def test_retry_after_in_seconds_or_as_a_date():
+    assert ratelimit.retry_after_ms('3') == 3000
+    assert ratelimit.retry_after_ms(' 0 ') == 0
+    assert ratelimit.retry_after_ms('Wed, 21 Oct 2015 07:28:05 GMT', now=1445412480000) == 5000
+    assert ratelimit.retry_after_ms('soon') is None
+    assert ratelimit.retry_after_ms(None) is None
+
+
+def test_limiter_learns_a_sites_rate_and_defers_instead_of_failing():
+    with Pipeline(sites=('patch',), behaviors={'patch': Behavior(limit_per_s=5, retry_after=1)}) as pipeline:
+        events = upcoming(load_events(12))
+        pipeline.run(events)
+        pipeline.process.module.SETTLE_MS = 0
+
+        # Turned-away posts went back to post, for the sweep; none counted against the breaker
+        assert pipeline.websites.throttled['patch'] > 0
+        limit = pipeline.table.items[('state', 'ratelimit#patch')]
+        assert int(limit['interval_ms']) >= ratelimit.THROTTLE_FLOOR_MS
+        assert pipeline.table.items.get(('state', 'breaker#patch'), {}).get('state', 'closed') == 'closed'
+
+        # The sweep sends the rest again, now spaced out by the learned interval
+        for _ in range(10):
+            if pipeline.outcomes()['patch']['post'] == 0:
+                break
+            pipeline.sweep()
+
+        public = sum(1 for event in events if event.get('access') == 'public')
+        assert pipeline.outcomes()['patch'] == {'post': 0, 'posting': 0, 'posted': public}
+        assert len(pipeline.websites.posts['patch']) == public
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from src.tools import replay
+from tests.harness.aws import Aws
+
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:StJames-events-topic'
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        table = aws.dynamodb.Table('StJamesEvents')
+        for day, status in ((1, {'posting': ['patch'], 'posted': ['moms']}), (2, {'posted': ['patch', 'moms']}),
+                            (3, {'post': ['patch']}), (4, {'posting': ['patch']}), (9, {'posting': ['patch']})):
+            table.put_item(Item={'access': 'public', 'date_id': f"2026-05-0{day}#{day:036d}", 'title': f"Event {day}",
+                                 'version': 3, **status})
+        table.put_item(Item={'access': 'private', 'date_id': f"2026-05-01#{0:036d}", 'title': 'Private', 'posting': ['patch']})
+        yield aws
+
+
+def run(*argv):
+    return replay.replay(replay.parse_args(['--site', 'patch', '--from', '2026-05-01', '--to', '2026-05-04',
+                                            '--rate', '1000', '--topic-arn', TOPIC_ARN, *argv]))
+
+
+def test_dry_run_writes_nothing(aws, capsys):
+    table = aws.dynamodb.Table('StJamesEvents')
+    before = {key: dict(item) for key, item in table.items.items()}
+
+    counts = run('--status', 'posting', 'posted', '--dry-run')
+
+    assert counts == {'selected': 3, 'published': 0, 'skipped': 0, 'failed': 0}
+    assert table.items == before and aws.sns.messages == []
+    out = capsys.readouterr().out
+    assert 'Dry run: would replay 3 events to patch' in out
+    assert '[2/3] 2026-05-02' in out and 'move from posted to post, publish' in out
+
+
+def test_replays_only_the_selected_events_for_the_site(aws):
+    table = aws.dynamodb.Table('StJamesEvents')
+
+    counts = run('--status', 'posting')
+
+    # Days 1 and 4: not 2 (posted), 3 (post), 9 (after --to), or the private one
+    assert counts == {'selected': 2, 'published': 2, 'skipped': 0, 'failed': 0}
+    messages = [json.loads(m['Message']) for m in aws.sns.messages]
+    assert [m['date_id'][:10] for m in messages] == ['2026-05-01', '2026-05-04']
+    assert all(m['post'] == ['patch'] and 'version' not in m for m in messages)
+
+    first = table.items[('public', f"2026-05-01#{1:036d}")]
+    assert (first['post'], first['posting'], first['posted']) == (['patch'], [], ['moms'])
+    assert table.items[('public', f"2026-05-09#{9:036d}")]['posting'] == ['patch']
+    assert table.items[('private', f"2026-05-01#{0:036d}")]['posting'] == ['patch']
+    # Not logged as a change: the scheduled sweep doesn't post them again
+    assert not [key for key in table.items if key[1].startswith('change#')]
@@ -0,0 +1,60 @@
+import json
+import time
+
+from unittest import mock
+
+from st_james import retries
+from tests.harness.pipeline import Pipeline, load_events, upcoming
+from tests.harness.websites import Behavior
+
+
+def test_backoff_doubles_until_the_site_is_given_up_on():
+    item = {}
+    for count in range(1, retries.MAX_ATTEMPTS):
+        attempt = retries.next_attempt(item, 'moms', 'Failed to post: 500', 1000)
+        assert attempt['count'] == count
+        assert attempt['retry_at'] == 1000 + retries.BASE_MS * 2 ** (count - 1)
+        item = {retries.ATTEMPTS: {'moms': attempt}}
+        assert not retries.due(item, 'moms', 1000)
+        assert retries.due(item, 'moms', attempt['retry_at'])
+        assert retries.due(item, 'patch', 1000)
+
+    attempt = retries.next_attempt(item, 'moms', 'x' * 1000, 1000)
+    assert attempt['count'] == retries.MAX_ATTEMPTS and attempt['retry_at'] is None
+    assert len(attempt['error']) == retries.ERROR_LENGTH
+
+
+def test_a_site_that_keeps_failing_an_event_ends_up_failed():
+    with Pipeline(sites=('moms',), behaviors={'moms': Behavior(error_rate=1.0)}) as pipeline:
+        event = next(event for event in load_events(5) if event.get('access') == 'public')
+        pipeline.run(upcoming([event]))
+        pipeline.process.module.SETTLE_MS = 0
+        (_, date_id), item = next((key, item) for key, item in pipeline.table.items.items() if key[0] == 'public')
+        assert item['attempts']['moms']['count'] == 1
+
+        # Not due yet: the sweep leaves it
+        assert pipeline.sweep() == []
+
+        # Each sweep past its retry_at sends it again, until the last attempt
+        now = time.time()
+        for count in range(2, retries.MAX_ATTEMPTS + 1):
+            now = int(item['attempts']['moms']['retry_at']) / 1000 + 1
+            with mock.patch('time.time', return_value=now):
+                assert len(pipeline.sweep()) == 1
+            item = pipeline.table.items[('public', date_id)]
+            assert item['attempts']['moms']['count'] == count
+
+        assert item['failed'] == ['moms'] and item['post'] == []
+        assert '500' in item['attempts']['moms']['error']
+        assert len(pipeline.websites.posts['moms']) == 0
+
+        # Left there: no more sweeps send it
+        with mock.patch('time.time', return_value=now + 365 * 24 * 3600):
+            assert pipeline.sweep() == []
+
+        # Put back on post by hand: its attempts start again
+        response = pipeline.status.invoke({'queryStringParameters': {
+            'sort-key': date_id, 'new-status': 'post', 'old-status': 'failed', 'website': 'moms'}})
+        assert json.loads(response['body'])['message'].endswith('from failed to post for moms')
+        item = pipeline.table.items[('public', date_id)]
+        assert item['post'] == ['moms'] and 'moms' not in item['attempts']
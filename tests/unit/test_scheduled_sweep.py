@@ -0,0 +1,60 @@
+import datetime
+import json
+
+import pytest
+
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+from tests.harness.pipeline import SCHEDULED_EVENT
+
+TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:StJamesEvents'
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+@pytest.fixture
+def functions(aws):
+    environment = {'TABLE_NAME': 'StJamesEvents', 'TOPIC_ARN': TOPIC_ARN, 'DELAY_MS': 0, 'JITTER_MS': 0}
+    functions = {name: lambdas.load(name, environment) for name in ('process_events', 'events_update', 'process_status')}
+    # Nothing to wait for: the writes above happen in this thread
+    functions['process_events'].module.SETTLE_MS = 0
+
+    table = aws.dynamodb.Table('StJamesEvents')
+    for n in range(50):
+        table.put_item(Item={'access': 'public', 'date_id': date_id(n),
+                             'title': f"Event {n}", 'post': [], 'posting': ['patch'], 'posted': ['moms']})
+    return functions
+
+
+def date_id(n):
+    day = (datetime.date.today() + datetime.timedelta(days=7)).isoformat()
+    return f"{day}#00000000-0000-0000-0000-{n:012d}"
+
+
+def test_sweep_posts_only_what_changed(aws, functions):
+    # A site added to one event, a failed post put back on another (twice: posted once)
+    functions['events_update'].invoke({'httpMethod': 'PUT', 'body': json.dumps({'post': ['sojourner']}),
+                                       'pathParameters': {'access': 'public', 'date_id': date_id(3).replace('#', '%23')}})
+    for _ in range(2):
+        functions['process_status'].invoke({'queryStringParameters': {'sort-key': date_id(8), 'website': 'patch', 'new-status': 'post'}})
+        functions['process_status'].invoke({'queryStringParameters': {'sort-key': date_id(8), 'website': 'patch', 'new-status': 'posting'}})
+    functions['process_status'].invoke({'queryStringParameters': {'sort-key': date_id(8), 'website': 'patch', 'new-status': 'post'}})
+
+    table = aws.dynamodb.tables['StJamesEvents']
+    table.calls.clear()
+    functions['process_events'].invoke(SCHEDULED_EVENT)
+
+    posted = [json.loads(m['Message']) for m in aws.sns.published(TOPIC_ARN)]
+    assert sorted((m['date_id'], m['post']) for m in posted) == [(date_id(3), ['sojourner']), (date_id(8), ['patch'])]
+    # Proportional to the changes, not the 50 events (the queries: the change log, the site breakers)
+    assert table.calls.get('Query') == 2 and table.calls.get('GetItem') == 3
+
+    # The log is consumed, and the next run has nothing to do
+    assert not [k for k in table.items if k[1].startswith('change#')]
+    functions['process_events'].invoke(SCHEDULED_EVENT)
+    assert len(aws.sns.published(TOPIC_ARN)) == 2
@@ -0,0 +1,65 @@
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+
+from st_james import schema
+from src.st_james_stack import StJamesStack
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+DATE_ID = '2026-05-01#0f8fad5b-d9cb-469f-a165-70867728950e'
+
+
+def test_validate_event_create():
+    validate = schema.compile_schema(schema.EVENT_CREATE)
+
+    assert validate({'access': 'public', 'title': 'Evensong', 'date': '2026-05-01', 'post': ['gov', 'moms']}) is None
+    assert validate({'access': 'private', 'title': 'Vestry', 'date_id': DATE_ID}) is None
+
+    assert validate([]) == "body must be of type object"
+    assert validate({'access': 'public', 'date': '2026-05-01'}) == "Missing required fields: ['title']"
+    assert validate({'access': 'public', 'title': 'Evensong'}) == "body needs one of 'date' or 'date_id'"
+    assert validate({'access': 'public', 'title': 'Evensong', 'date': '5/1/2026'}) == "date must match 'YYYY-MM-DD'"
+    assert validate({'access': 'public', 'title': 7, 'date': '2026-05-01'}) == "title must be of type string"
+    assert validate({'access': 'public', 'title': 'Evensong', 'date': '2026-05-01', 'post': ['moms', 'nowhere']}) == \
+        "post[1] must be one of 'gov', 'moms', 'patch', 'sojourner', 'test'"
+    assert validate({'access': 'public', 'title': 'Evensong', 'date': '2026-05-01', 'post': ['moms', 'moms']}) == \
+        "post has duplicate values"
+    assert validate({'access': 'public', 'title': 'Evensong', 'date': '2026-05-01', 'color': 'red'}) == \
+        "Unknown fields: ['color']"
+
+    assert schema.overlapping_sites({'post': ['gov'], 'posted': ['moms']}) is None
+    assert schema.overlapping_sites({'post': ['gov'], 'posted': ['gov']}) is not None
+
+
+def test_functions_share_the_schema():
+    aws = Aws()
+    with aws.installed():
+        create = lambdas.load('events_create', {'TABLE_NAME': 'StJamesEvents'})
+        status = lambdas.load('process_status', {'TABLE_NAME': 'StJamesEvents'})
+
+        # gov is a site like any other
+        created = create({'body': json.dumps({'access': 'public', 'date': '2026-05-01', 'title': 'Evensong', 'post': ['gov']}),
+                          'requestContext': {}})
+        assert created['statusCode'] == 201
+        date_id = json.loads(created['body'])['item']['date_id']
+
+        rejected = create({'body': json.dumps({'access': 'public', 'date': '2026-05-01', 'title': 'Evensong',
+                                               'post': ['gov'], 'posted': ['gov']}), 'requestContext': {}})
+        assert rejected['statusCode'] == 422
+
+        params = {'sort-key': date_id, 'new-status': 'posting', 'website': 'gov'}
+        assert status({'queryStringParameters': params})['statusCode'] == 200
+        assert status({'queryStringParameters': {**params, 'new-status': 'gone'}})['statusCode'] == 400
+        assert status({'queryStringParameters': {**params, 'website': 'nowhere'}})['statusCode'] == 400
+
+
+def test_gateway_models_come_from_the_schema():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+
+    models = {m['Properties']['Name']: m['Properties']['Schema'] for m in template.find_resources('AWS::ApiGateway::Model').values()}
+    create = models['EventCreate']
+    assert create['properties']['post']['items']['enum'] == schema.SITES
+    assert create['anyOf'] == [{'required': ['date']}, {'required': ['date_id']}]
+    assert set(models['EventUpdate']['properties']) == {'title', 'time', 'description', 'post', 'posting', 'posted', 'failed'}
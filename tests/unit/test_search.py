@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from st_james.search import SearchIndex, tokenize
+from tests.harness import lambdas
+from tests.harness.aws import Aws
+
+BUCKET = 'stjames-data-pm186'
+
+EVENTS = {
+    '2026-05-01#a': {'title': 'Choir Rehearsal', 'description': 'Weekly rehearsal for the adult choir.'},
+    '2026-05-02#b': {'title': 'Spring Fair', 'description': 'Games, food and a performance by the choir.'},
+    '2026-05-03#c': {'title': 'Café Night', 'description': 'Coffee and conversation.'},
+}
+
+
+def build():
+    index = SearchIndex()
+    for date_id, item in EVENTS.items():
+        index.add(date_id, item)
+    return index
+
+
+def test_tokenize_folds_case_accents_and_stopwords():
+    assert tokenize('The Café, and the CHOIR!') == ['cafe', 'choir']
+
+
+def test_title_matches_rank_first():
+    assert [d for d, _ in build().search('choir')] == ['2026-05-01#a', '2026-05-02#b']
+
+
+def test_last_word_matches_as_a_prefix():
+    index = build()
+    assert [d for d, _ in index.search('rehea')] == ['2026-05-01#a']
+    assert index.search('cof') == index.search('coffee')
+
+
+def test_changes_and_round_trip():
+    index = build()
+    index.update('2026-05-01#a', EVENTS['2026-05-01#a'], {'title': 'Organ Recital', 'description': ''})
+    index.update('2026-05-03#c', EVENTS['2026-05-03#c'], None)
+    index.add('2026-05-04#d', {'title': 'Choir Picnic'})
+
+    loaded = SearchIndex.loads(index.dumps())
+    for query in ('choir', 'organ', 'cafe', 'picnic fair'):
+        assert loaded.search(query) == index.search(query)
+    assert [d for d, _ in loaded.search('choir')] == ['2026-05-04#d', '2026-05-02#b']
+    assert loaded.search('coffee') == []
+    # the removed document's number is reused
+    assert len(loaded.doc_ids) == 3
+
+
+@pytest.fixture
+def aws():
+    aws = Aws()
+    with aws.installed():
+        yield aws
+
+
+def test_search_endpoint_follows_the_stream(aws):
+    environment = {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET}
+    publish = lambdas.load('publish_calendar', environment)
+    events_list = lambdas.load('events_list', environment)
+    table = aws.dynamodb.Table('StJamesEvents')
+
+    def search(access, q):
+        response = events_list.invoke({'pathParameters': {'access': access}, 'queryStringParameters': {'q': q}})
+        return [r['date_id'] for r in json.loads(response['body'])['results']]
+
+    for date_id, item in EVENTS.items():
+        table.put_item(Item={'access': 'public', 'date_id': date_id, **item})
+    table.put_item(Item={'access': 'private', 'date_id': '2026-05-05#e', 'title': 'Vestry Meeting'})
+    publish.invoke({'Records': table.take_stream()})
+
+    assert search('public', 'choir') == ['2026-05-01#a', '2026-05-02#b']
+    assert search('private', 'vestry') == ['2026-05-05#e']
+    assert search('public', 'vestry') == []
+
+    # A status change isn't a text change: the index isn't rewritten
+    table.update_item(Key={'access': 'public', 'date_id': '2026-05-03#c'}, UpdateExpression='SET posted = :p', ExpressionAttributeValues={':p': ['moms']})
+    assert publish.invoke({'Records': table.take_stream()})['searched'] == []
+
+    table.update_item(Key={'access': 'public', 'date_id': '2026-05-03#c'}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Choir Café'})
+    publish.invoke({'Records': table.take_stream()})
+    events_list.module.SEARCH_REFRESH_SECONDS = 0
+    assert search('public', 'cafe choir')[0] == '2026-05-03#c'
+
+
+def test_publish_keeps_the_index_between_invocations(aws):
+    publish = lambdas.load('publish_calendar', {'TABLE_NAME': 'StJamesEvents', 'BUCKET_NAME': BUCKET})
+    table = aws.dynamodb.Table('StJamesEvents')
+    key = (BUCKET, 'search/public.json.gz')
+    for date_id, item in EVENTS.items():
+        table.put_item(Item={'access': 'public', 'date_id': date_id, **item})
+    publish.invoke({'Records': table.take_stream()})
+
+    gets = []
+    get_object = aws.s3.get_object
+
+    def get(Bucket, Key, **kwargs):
+        if Key != key[1]:
+            return get_object(Bucket, Key, **kwargs)
+        try:
+            response = get_object(Bucket, Key, **kwargs)
+        except Exception as e:
+            gets.append(e.response['Error']['Code'])
+            raise
+        gets.append('200')
+        return response
+
+    aws.s3.get_object = get
+
+    # Unchanged since this container wrote it: a 304, and its copy is updated
+    table.update_item(Key={'access': 'public', 'date_id': '2026-05-03#c'}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Choir Café'})
+    publish.invoke({'Records': table.take_stream()})
+    assert gets == ['304']
+    assert [d for d, _ in SearchIndex.from_gzip(aws.s3.objects[key]['Body']).search('cafe choir')][0] == '2026-05-03#c'
+
+    # Written by another container since: read again, and its change kept
+    other = SearchIndex.from_gzip(aws.s3.objects[key]['Body'])
+    other.add('2026-05-04#d', {'title': 'Organ Recital'})
+    aws.s3.put_object(Bucket=BUCKET, Key=key[1], Body=other.to_gzip())
+    table.update_item(Key={'access': 'public', 'date_id': '2026-05-02#b'}, UpdateExpression='SET title = :t', ExpressionAttributeValues={':t': 'Summer Fair'})
+    publish.invoke({'Records': table.take_stream()})
+    assert gets == ['304', '200']
+    index = SearchIndex.from_gzip(aws.s3.objects[key]['Body'])
+    assert [d for d, _ in index.search('organ')] == ['2026-05-04#d']
+    assert [d for d, _ in index.search('summer')] == ['2026-05-02#b']
@@ -13,3 +13,149 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+def test_common_layer_created():
+    app = core.App()
+    stack = StJamesStack(app, "st-james")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::LayerVersion", {
+        "LayerName": "StJames-common"
+    })
+
+
+def test_merged_events_api():
+    app = core.App(context={'merge_events_api': 'true'})
+    stack = StJamesStack(app, "st-james")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-events-api",
+        "Handler": "events_api/index.handler"
+    })
+    functions = template.find_resources("AWS::Lambda::Function")
+    names = {f['Properties'].get('FunctionName') for f in functions.values()}
+    assert 'StJames-events-create' not in names
+
+
+def test_scheduled_sweep_rule():
+    app = core.App(context={'sweep_schedule_minutes': '30'})
+    stack = StJamesStack(app, "st-james")
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Events::Rule", {
+        "Name": "StJames-scheduled-sweep",
+        "ScheduleExpression": "rate(30 minutes)"
+    })
+
+
+def test_api_compression():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {"MinimumCompressionSize": 1024})
+
+    app = core.App(context={'api_compression': 'lambda'})
+    template = assertions.Template.from_stack(StJamesStack(app, "st-james"))
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {"BinaryMediaTypes": ["*/*"]})
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-events-list",
+        "Environment": {"Variables": assertions.Match.object_like({"RESPONSE_COMPRESSION": "lambda"})}
+    })
+
+
+def test_ttl_is_on_for_finished_jobs():
+    # Without expire_after_days too: finished jobs and export checkpoints expire
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    template.resource_count_is("Custom::AWS", 1)
+
+
+def test_expiry():
+    app = core.App(context={'expire_after_days': '400'})
+    template = assertions.Template.from_stack(StJamesStack(app, "st-james"))
+
+    template.resource_count_is("Custom::AWS", 1)
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-events-create",
+        "Environment": {"Variables": assertions.Match.object_like({"EXPIRE_AFTER_DAYS": "400"})}
+    })
+
+
+def test_posters_from_the_site_registry():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    functions = template.find_resources("AWS::Lambda::Function")
+    names = {f['Properties'].get('FunctionName') for f in functions.values()}
+    # gov is disabled
+    assert {'StJames-post-to-patch', 'StJames-post-to-moms', 'StJames-post-to-sojourner', 'StJames-post-to-test'} <= names
+    assert 'StJames-post-to-gov' not in names
+    # The posting sweep plans batches for those sites only
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-process-events",
+        "Environment": {"Variables": assertions.Match.object_like({"POSTER_SITES": "patch,moms,sojourner,test"})}
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-post-to-patch",
+        "Environment": {"Variables": assertions.Match.object_like({
+            "SITES": "patch",
+            "PATCH_POST_URL": "https://api.patch.com/calendar/write-api/event"
+        })}
+    })
+
+    app = core.App(context={'merge_posters': 'true'})
+    template = assertions.Template.from_stack(StJamesStack(app, "st-james"))
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-post-to-sites",
+        "Environment": {"Variables": assertions.Match.object_like({"SITES": "patch,moms,sojourner,test"})}
+    })
+    template.has_resource_properties("AWS::SNS::Subscription", {
+        "FilterPolicy": {"post": ["patch", "moms", "sojourner", "test"]}
+    })
+    functions = template.find_resources("AWS::Lambda::Function")
+    names = {f['Properties'].get('FunctionName') for f in functions.values()}
+    assert 'StJames-post-to-patch' not in names
+
+
+def test_digest_flush_rule():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    assert not any(rule['Properties'].get('Name', '').startswith('StJames-flush-digest')
+                   for rule in template.find_resources("AWS::Events::Rule").values())
+
+    app = core.App(context={'digest_window_seconds': '600', 'merge_posters': 'true'})
+    template = assertions.Template.from_stack(StJamesStack(app, "st-james"))
+    template.has_resource_properties("AWS::Events::Rule", {
+        "Name": "StJames-flush-digest-sites",
+        "ScheduleExpression": "rate(10 minutes)"
+    })
+
+
+def test_status_takes_the_posters_api_key():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    template.has_resource_properties("AWS::ApiGateway::ApiKey", {"Name": "poster-key"})
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "StJames-post-to-patch",
+        "Environment": {"Variables": assertions.Match.object_like({"STATUS_API_KEY_SECRET": assertions.Match.any_value()})}
+    })
+    resources = template.to_json()['Resources']
+    status = next(name for name, resource in resources.items()
+                  if resource['Type'] == 'AWS::ApiGateway::Resource' and resource['Properties']['PathPart'] == 'status')
+    methods = [resource['Properties'] for resource in resources.values()
+               if resource['Type'] == 'AWS::ApiGateway::Method' and resource['Properties'].get('ResourceId') == {'Ref': status}]
+    assert [(m['HttpMethod'], m.get('ApiKeyRequired')) for m in methods if m['HttpMethod'] != 'OPTIONS'] == [('POST', True)]
+
+
+def test_calendar_index_rule():
+    template = assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))
+    template.has_resource_properties("AWS::Events::Rule", {
+        "Name": "StJames-calendar-index",
+        "ScheduleExpression": "cron(5 0 1 * ? *)"
+    })
+
+
+def test_trace_exporter_defaults_to_none():
+    def exporters(template):
+        return {f['Properties']['Environment']['Variables']['TRACE_EXPORTER']
+                for f in template.find_resources("AWS::Lambda::Function").values()
+                if 'TRACE_EXPORTER' in f['Properties'].get('Environment', {}).get('Variables', {})}
+
+    assert exporters(assertions.Template.from_stack(StJamesStack(core.App(), "st-james"))) == {'none'}
+    app = core.App(context={'trace_exporter': 'otlp'})
+    assert exporters(assertions.Template.from_stack(StJamesStack(app, "st-james"))) == {'otlp'}
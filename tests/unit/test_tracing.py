@@ -0,0 +1,66 @@
+import json
+
+from st_james import tracing
+from st_james.metrics import Metrics
+
+
+def exported(path):
+    with open(path) as f:
+        return [span for line in f for rs in json.loads(line)['resourceSpans']
+                for ss in rs['scopeSpans'] for span in ss['spans']]
+
+
+def test_parse_traceparent():
+    context = tracing.parse_traceparent('00-' + 'a' * 32 + '-' + 'b' * 16 + '-01')
+    assert (context.trace_id, context.span_id) == ('a' * 32, 'b' * 16)
+    assert context.traceparent == '00-' + 'a' * 32 + '-' + 'b' * 16 + '-01'
+    assert tracing.parse_traceparent('garbage') is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_span_without_trace_is_a_no_op():
+    with tracing.span('orphan') as context:
+        assert context is None
+        assert tracing.current_traceparent() is None
+
+
+def test_spans_join_trace_across_hops(tmp_path, monkeypatch):
+    path = tmp_path / 'spans.ndjson'
+    monkeypatch.setenv('TRACE_EXPORTER', 'file')
+    monkeypatch.setenv('TRACE_EXPORT_FILE', str(path))
+    trace_id = tracing.new_trace_id()
+    metrics = Metrics('post_to_test', site='test')
+
+    @metrics.handler
+    def poster(event, context):
+        record = event['Records'][0]
+        with tracing.span('post_to_test', parent=tracing.sns_traceparent(record)):
+            with metrics.phase('post'):
+                pass
+            return tracing.current_traceparent()
+
+    # process_events publishes with the root span's traceparent as a message attribute
+    with tracing.span('process_events', trace_id=trace_id) as root:
+        record = {'Sns': {'MessageAttributes': {'traceparent': {'Type': 'String', 'Value': root.traceparent}}}}
+    tracing.flush('process_events')
+    status_traceparent = poster({'Records': [record]}, None)
+
+    spans = {span['name']: span for span in exported(path)}
+    assert set(spans) == {'process_events', 'post_to_test', 'post'}
+    assert {span['traceId'] for span in spans.values()} == {trace_id}
+    assert spans['post_to_test']['parentSpanId'] == spans['process_events']['spanId']
+    assert spans['post']['parentSpanId'] == spans['post_to_test']['spanId']
+    assert tracing.parse_traceparent(status_traceparent).span_id == spans['post_to_test']['spanId']
+
+
+def test_failed_span_is_marked_error(tmp_path, monkeypatch):
+    path = tmp_path / 'spans.ndjson'
+    monkeypatch.setenv('TRACE_EXPORTER', 'file')
+    monkeypatch.setenv('TRACE_EXPORT_FILE', str(path))
+    try:
+        with tracing.span('boom', trace_id=tracing.new_trace_id()):
+            raise RuntimeError('boom')
+    except RuntimeError:
+        pass
+    tracing.flush('test')
+    assert exported(path)[0]['status']['code'] == 2